@@ -0,0 +1,144 @@
+"""
+Buffered CreditLedger writes.
+
+Debits made while generating images append their ledger entry to the Redis
+list credits:ledger:pending (one RPUSH) instead of inserting it in
+MongoDB. flush_ledger_buffer(), run every CREDIT_LEDGER_FLUSH_INTERVAL_SECONDS
+by the flush_credit_ledger_task beat entry, moves them into credit_ledger
+with insert_many. Entries are serialized with bson.json_util, so ObjectId
+references and datetimes survive the round trip.
+
+The buffer lives in Redis, not in the worker, so a crashed or restarted
+process loses nothing. If Redis is unavailable the entry is inserted
+directly, as before.
+
+A flush moves each batch into credits:ledger:processing (LMOVE, in one
+script) and deletes it only after insert_many succeeded. A flush that dies
+in between leaves the batch there, and the next flush inserts it again
+before taking new entries; the fixed _ids make that harmless. One flush
+runs at a time (credits:ledger:flush-lock).
+"""
+
+import logging
+import uuid
+
+from bson import ObjectId, json_util
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+LEDGER_BUFFER_KEY = 'credits:ledger:pending'
+LEDGER_PROCESSING_KEY = 'credits:ledger:processing'
+LEDGER_FLUSH_LOCK_KEY = 'credits:ledger:flush-lock'
+
+FLUSH_LOCK_SECONDS = 60
+
+# Unless an unfinished batch is still being processed, move up to ARGV[1]
+# entries from the buffer to the processing list; return the batch
+# KEYS[1] buffer  KEYS[2] processing list  ARGV[1] batch size
+_CLAIM_BATCH_SCRIPT = """
+if redis.call('LLEN', KEYS[2]) == 0 then
+    for i = 1, tonumber(ARGV[1]) do
+        if not redis.call('LMOVE', KEYS[1], KEYS[2], 'LEFT', 'RIGHT') then
+            break
+        end
+    end
+end
+return redis.call('LRANGE', KEYS[2], 0, -1)
+"""
+
+# KEYS[1] lock  ARGV[1] owner
+_UNLOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _redis():
+    from probackendapp.queue_load_manager import get_redis_client
+    return get_redis_client()
+
+
+def _batch_size() -> int:
+    return max(1, int(getattr(settings, 'CREDIT_LEDGER_FLUSH_BATCH_SIZE', 500)))
+
+
+def record_ledger_entry(entry):
+    """
+    Buffer an unsaved CreditLedger for a bulk insert.
+
+    Args:
+        entry: CreditLedger instance, not yet saved
+    """
+    try:
+        document = entry.to_mongo().to_dict()
+        # A fixed _id makes re-inserting after a partial flush harmless
+        document.setdefault('_id', ObjectId())
+        _redis().rpush(LEDGER_BUFFER_KEY, json_util.dumps(document))
+    except Exception as e:
+        logger.warning(f"Ledger buffer unavailable, writing entry directly: {e}")
+        entry.save()
+
+
+def flush_ledger_buffer() -> int:
+    """
+    Bulk-insert buffered ledger entries.
+
+    Returns:
+        Number of entries written
+    """
+    r = _redis()
+    owner = uuid.uuid4().hex
+    if not r.set(LEDGER_FLUSH_LOCK_KEY, owner, nx=True, ex=FLUSH_LOCK_SECONDS):
+        return 0
+    try:
+        return _flush(r)
+    finally:
+        r.eval(_UNLOCK_SCRIPT, 1, LEDGER_FLUSH_LOCK_KEY, owner)
+
+
+def _flush(r) -> int:
+    from .models import CreditLedger
+
+    batch_size = _batch_size()
+    written = 0
+    while True:
+        raw_entries = r.eval(_CLAIM_BATCH_SCRIPT, 2, LEDGER_BUFFER_KEY, LEDGER_PROCESSING_KEY, batch_size)
+        if not raw_entries:
+            return written
+
+        documents = [json_util.loads(raw) for raw in raw_entries]
+        try:
+            CreditLedger._get_collection().insert_many(documents, ordered=False)
+        except Exception as e:
+            from pymongo.errors import BulkWriteError
+
+            # Duplicate _ids were written by an earlier, interrupted flush
+            if isinstance(e, BulkWriteError):
+                written += e.details.get('nInserted', 0)
+                retry = [raw_entries[error['index']] for error in e.details.get('writeErrors', [])
+                         if error.get('code') != 11000]
+            else:
+                retry = raw_entries
+            if retry:
+                # Keep only the failed entries for the next flush
+                pipe = r.pipeline(transaction=True)
+                pipe.delete(LEDGER_PROCESSING_KEY)
+                pipe.rpush(LEDGER_PROCESSING_KEY, *retry)
+                pipe.execute()
+                logger.error(f"Ledger flush failed, {len(retry)} entries kept for retry: {e}")
+                return written
+            r.delete(LEDGER_PROCESSING_KEY)
+            continue
+        r.delete(LEDGER_PROCESSING_KEY)
+        written += len(documents)
+        if len(raw_entries) < batch_size:
+            return written
+
+
+def get_ledger_buffer_length() -> int:
+    """Entries waiting to be written."""
+    r = _redis()
+    return r.llen(LEDGER_BUFFER_KEY) + r.llen(LEDGER_PROCESSING_KEY)
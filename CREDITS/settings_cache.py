@@ -0,0 +1,135 @@
+"""
+Cached read path for the global CreditSettings singleton.
+
+Every image generation reads the credit costs, the image model name and
+the reminder thresholds, which used to be a CreditSettings query each.
+get_cached_settings() serves a plain dict snapshot instead:
+
+  process memory     kept for CREDIT_SETTINGS_CACHE_SECONDS
+  Redis credits:settings   shared snapshot, so a cold web or worker
+                           process does not go to MongoDB either
+  MongoDB            only when both are empty
+
+update_credit_settings calls invalidate_settings_cache() after saving. It
+writes the new snapshot to Redis and publishes on
+credits:settings:invalidate, and a subscriber thread in every process
+(probackendapp.redis_subscriber) drops its local copy on that message. The
+TTL bounds staleness if a message is missed.
+"""
+
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings as django_settings
+
+from probackendapp.redis_subscriber import ChannelSubscriber
+
+logger = logging.getLogger(__name__)
+
+CREDIT_SETTINGS_REDIS_KEY = 'credits:settings'
+CREDIT_SETTINGS_CHANNEL = 'credits:settings:invalidate'
+
+DEFAULT_SETTINGS = {
+    'credits_per_image_generation': 2,
+    'credits_per_regeneration': 1,
+    'default_image_model_name': 'gemini-3.1-flash-image-preview',
+    'credit_reminder_threshold_1': 20,
+    'credit_reminder_threshold_2': 10,
+}
+
+_lock = threading.Lock()
+_cached = None
+_cached_at = 0.0
+
+
+def _redis():
+    from probackendapp.queue_load_manager import get_redis_client
+    return get_redis_client()
+
+
+def _ttl() -> float:
+    return float(getattr(django_settings, 'CREDIT_SETTINGS_CACHE_SECONDS', 60))
+
+
+def snapshot(settings) -> dict:
+    """Plain dict of the cached fields of a CreditSettings document."""
+    return {
+        field: getattr(settings, field, None) if getattr(settings, field, None) is not None else default
+        for field, default in DEFAULT_SETTINGS.items()
+    }
+
+
+def _load() -> dict:
+    try:
+        raw = _redis().get(CREDIT_SETTINGS_REDIS_KEY)
+        if raw:
+            return {**DEFAULT_SETTINGS, **json.loads(raw)}
+    except Exception as e:
+        logger.warning(f"Credit settings cache unavailable: {e}")
+
+    from .models import CreditSettings
+    values = snapshot(CreditSettings.get_settings())
+    _publish(values, notify=False)
+    return values
+
+
+def get_cached_settings() -> dict:
+    """Current credit settings as a dict (a copy; safe to modify)."""
+    global _cached, _cached_at
+    _subscriber.ensure_running()
+
+    cached = _cached
+    if cached is None or time.monotonic() - _cached_at >= _ttl():
+        with _lock:
+            if _cached is None or time.monotonic() - _cached_at >= _ttl():
+                _cached = _load()
+                _cached_at = time.monotonic()
+            cached = _cached
+    return dict(cached)
+
+
+def _clear_local():
+    global _cached
+    with _lock:
+        _cached = None
+
+
+def _publish(values: dict, notify: bool = True):
+    try:
+        r = _redis()
+        # The Redis copy outlives local caches a little, never indefinitely
+        r.set(CREDIT_SETTINGS_REDIS_KEY, json.dumps(values), ex=int(_ttl() * 10) or None)
+        if notify:
+            r.publish(CREDIT_SETTINGS_CHANNEL, '1')
+    except Exception as e:
+        logger.warning(f"Could not share credit settings: {e}")
+
+
+def invalidate_settings_cache(settings=None):
+    """
+    Make every process pick up a CreditSettings change.
+
+    Args:
+        settings: The saved CreditSettings; when omitted the shared copy is
+            dropped and the next read goes to MongoDB
+    """
+    _clear_local()
+    if settings is not None:
+        _publish(snapshot(settings))
+        return
+    try:
+        r = _redis()
+        r.delete(CREDIT_SETTINGS_REDIS_KEY)
+        r.publish(CREDIT_SETTINGS_CHANNEL, '1')
+    except Exception as e:
+        logger.warning(f"Could not invalidate shared credit settings: {e}")
+
+
+_subscriber = ChannelSubscriber(
+    CREDIT_SETTINGS_CHANNEL, lambda message: _clear_local(),
+    # Anything published while disconnected is lost; start afresh
+    on_connect=_clear_local,
+    on_fork=_clear_local, name='credit-settings-listener',
+)
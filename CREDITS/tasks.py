@@ -0,0 +1,31 @@
+from celery import shared_task
+
+
+@shared_task
+def flush_credit_ledger_task():
+    """
+    Periodic (Celery beat) bulk insert of buffered CreditLedger entries
+    (see ledger_buffer.py). Runs on the "maintenance" queue.
+    """
+    from .ledger_buffer import flush_ledger_buffer
+
+    return {"written": flush_ledger_buffer()}
+
+
+@shared_task(autoretry_for=(Exception,), retry_backoff=5, retry_kwargs={"max_retries": 3})
+def send_credit_reminder_task(user_id, balance_after, organization_id=None):
+    """
+    Low-credit reminder check published by a debit. Looks up the cooldown
+    and sends the recharge email off the generation path.
+    """
+    from organization.models import Organization
+    from users.models import User
+    from .utils import maybe_send_credit_reminder, maybe_send_credit_reminder_user
+
+    user = User.objects(id=user_id).first() if user_id else None
+    if organization_id:
+        organization = Organization.objects(id=organization_id).first()
+        if organization:
+            maybe_send_credit_reminder(organization, user, balance_after)
+    elif user:
+        maybe_send_credit_reminder_user(user, balance_after)
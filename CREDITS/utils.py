@@ -1,7 +1,8 @@
 """
 Utility functions for credit management and global AI model settings.
 """
-from .models import CreditLedger, CreditSettings, CreditReminderSent
+from .models import CreditLedger, CreditReminderSent
+from .settings_cache import DEFAULT_SETTINGS, get_cached_settings
 from organization.models import Organization
 from users.models import User
 from datetime import datetime, timedelta
@@ -21,29 +22,14 @@ def get_credit_settings():
             'credit_reminder_threshold_1': int,
             'credit_reminder_threshold_2': int,
         }
+
+    Served from the settings cache (settings_cache.py), not a query per call.
     """
     try:
-        settings = CreditSettings.get_settings()
-        return {
-            'credits_per_image_generation': settings.credits_per_image_generation,
-            'credits_per_regeneration': settings.credits_per_regeneration,
-            'default_image_model_name': getattr(
-                settings,
-                'default_image_model_name',
-                'gemini-3.1-flash-image-preview'
-            ),
-            'credit_reminder_threshold_1': getattr(settings, 'credit_reminder_threshold_1', 20),
-            'credit_reminder_threshold_2': getattr(settings, 'credit_reminder_threshold_2', 10),
-        }
+        return get_cached_settings()
     except Exception:
         # Return sane defaults on error
-        return {
-            'credits_per_image_generation': 2,
-            'credits_per_regeneration': 1,
-            'default_image_model_name': 'gemini-3.1-flash-image-preview',
-            'credit_reminder_threshold_1': 20,
-            'credit_reminder_threshold_2': 10,
-        }
+        return dict(DEFAULT_SETTINGS)
 
 
 REMINDER_COOLDOWN_DAYS = 7  # Don't send same threshold reminder again within 7 days
@@ -73,9 +59,9 @@ def maybe_send_credit_reminder(organization, user, balance_after):
     that threshold reminder recently, send recharge reminder to org owner and record it.
     """
     try:
-        settings = CreditSettings.get_settings()
-        t1 = getattr(settings, 'credit_reminder_threshold_1', 20)
-        t2 = getattr(settings, 'credit_reminder_threshold_2', 10)
+        settings = get_cached_settings()
+        t1 = settings['credit_reminder_threshold_1']
+        t2 = settings['credit_reminder_threshold_2']
         thresholds = [t1, t2]
         # Dedupe and sort descending so we only send for the lowest applicable threshold if both hit
         thresholds = sorted(set(thresholds), reverse=True)
@@ -106,9 +92,9 @@ def maybe_send_credit_reminder_user(user, balance_after):
     that threshold reminder recently, send recharge reminder to user and record it.
     """
     try:
-        settings = CreditSettings.get_settings()
-        t1 = getattr(settings, 'credit_reminder_threshold_1', 20)
-        t2 = getattr(settings, 'credit_reminder_threshold_2', 10)
+        settings = get_cached_settings()
+        t1 = settings['credit_reminder_threshold_1']
+        t2 = settings['credit_reminder_threshold_2']
         thresholds = sorted(set([t1, t2]), reverse=True)
         recipient_email = getattr(user, 'email', None)
         if not recipient_email:
@@ -133,12 +119,12 @@ def get_image_model_name(default_model: str = "gemini-3.1-flash-image-preview")
     """
     Get the active AI model name for image generation.
 
-    This reads from CreditSettings.default_image_model_name, falling back to
-    the provided default_model if not configured.
+    This reads from CreditSettings.default_image_model_name (through the
+    settings cache), falling back to the provided default_model if not
+    configured.
     """
     try:
-        settings = CreditSettings.get_settings()
-        model_name = getattr(settings, "default_image_model_name", None)
+        model_name = get_cached_settings().get("default_image_model_name")
         if not model_name:
             return default_model
         normalized = str(model_name).strip()
@@ -157,34 +143,68 @@ def get_image_model_name(default_model: str = "gemini-3.1-flash-image-preview")
     except Exception:
         return default_model
 
+def publish_credit_reminder(user, balance_after, organization=None):
+    """
+    Hand a possible low-credit reminder to send_credit_reminder_task.
+
+    Only enqueues when balance_after is at or below a threshold of the
+    cached settings; the cooldown lookup and the email happen in the task.
+    """
+    try:
+        settings = get_cached_settings()
+        threshold = max(settings['credit_reminder_threshold_1'], settings['credit_reminder_threshold_2'])
+        if balance_after > threshold:
+            return
+        from .tasks import send_credit_reminder_task
+        send_credit_reminder_task.apply_async(
+            # Organization reminders go to the owner and need no user
+            args=[str(user.id) if user else None, balance_after],
+            kwargs={"organization_id": str(organization.id) if organization else None},
+            queue="maintenance",
+        )
+    except Exception as e:
+        print(f"Credit reminder publish failed: {e}")
+
+
 def deduct_credits(organization, user, amount, reason="Image generation", project=None, metadata=None):
+    """
+    Deduct credits from an organization's balance.
+
+    The conditional decrement and the read of the new balance are one
+    find_one_and_update; the ledger entry is buffered (ledger_buffer.py)
+    and the low-credit reminder is published to a task.
+
+    Returns:
+        dict: {'success': bool, 'message': str, 'balance_after': int}
+    """
     try:
-        from CREDITS.models import CreditLedger
+        from pymongo import ReturnDocument
+        from .ledger_buffer import record_ledger_entry
 
         OrgModel = organization.__class__   # <-- THIS fixes your import issue
-
-        # ✅ ATOMIC conditional decrement
-        updated = OrgModel.objects(
-            id=organization.id,
-            credit_balance__gte=amount
-        ).update_one(
-            dec__credit_balance=amount,
-            set__updated_at=datetime.utcnow()
+        collection = OrgModel._get_collection()
+
+        # ✅ ATOMIC conditional decrement, returning the new balance
+        updated = collection.find_one_and_update(
+            {"_id": organization.id, "credit_balance": {"$gte": amount}},
+            {"$inc": {"credit_balance": -amount}, "$set": {"updated_at": datetime.utcnow()}},
+            projection={"credit_balance": 1},
+            return_document=ReturnDocument.AFTER,
         )
 
-        if updated == 0:
-            organization.reload()
+        if updated is None:
+            current = collection.find_one({"_id": organization.id}, {"credit_balance": 1}) or {}
+            organization.credit_balance = current.get("credit_balance", organization.credit_balance)
             return {
                 'success': False,
                 'message': f'Insufficient credits. Available: {organization.credit_balance}, Required: {amount}',
                 'balance_after': organization.credit_balance
             }
 
-        # Reload after atomic update
-        organization.reload()
+        organization.credit_balance = updated["credit_balance"]
 
         # ✅ Ledger entry
-        CreditLedger(
+        record_ledger_entry(CreditLedger(
             user=user,
             organization=organization,
             project=project,
@@ -196,10 +216,10 @@ def deduct_credits(organization, user, amount, reason="Image generation", projec
             created_by=user,
             updated_by=user,
             updated_at=datetime.utcnow()
-        ).save()
+        ))
 
         # Credits low reminder (admin-configured thresholds)
-        maybe_send_credit_reminder(organization, user, organization.credit_balance)
+        publish_credit_reminder(user, organization.credit_balance, organization=organization)
 
         return {
             'success': True,
@@ -213,6 +233,57 @@ def deduct_credits(organization, user, amount, reason="Image generation", projec
             'message': f'Error deducting credits: {str(e)}',
             'balance_after': organization.credit_balance if organization else 0
         }
+
+
+def refund_credits(organization, user, amount, reason="Credit refund", metadata=None):
+    """
+    Give back credits deducted for work that never ran.
+
+    Unlike add_credits() this is one atomic increment, so it cannot lose a
+    concurrent deduct_credits(); the ledger entry is buffered the same way.
+
+    Returns:
+        dict: {'success': bool, 'message': str, 'balance_after': int}
+    """
+    try:
+        from pymongo import ReturnDocument
+        from .ledger_buffer import record_ledger_entry
+
+        updated = organization.__class__._get_collection().find_one_and_update(
+            {"_id": organization.id},
+            {"$inc": {"credit_balance": amount}, "$set": {"updated_at": datetime.utcnow()}},
+            projection={"credit_balance": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if updated is None:
+            return {'success': False, 'message': 'Organization not found', 'balance_after': 0}
+
+        organization.credit_balance = updated["credit_balance"]
+        record_ledger_entry(CreditLedger(
+            user=user,
+            organization=organization,
+            change_type="credit",
+            credits_changed=amount,
+            balance_after=organization.credit_balance,
+            reason=reason,
+            metadata=metadata or {},
+            created_by=user,
+            updated_by=user,
+            updated_at=datetime.utcnow()
+        ))
+        return {
+            'success': True,
+            'message': 'Credits refunded successfully',
+            'balance_after': organization.credit_balance
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'message': f'Error refunding credits: {str(e)}',
+            'balance_after': 0
+        }
+
+
 def add_credits(organization, user, amount, reason="Credit top-up", metadata=None):
     """
     Add credits to an organization's balance.
@@ -313,30 +384,30 @@ def deduct_user_credits(user, amount, reason="Image generation", project=None, m
         dict: {'success': bool, 'message': str, 'balance_after': int}
     """
     try:
-        from CREDITS.models import CreditLedger
-        
-        # Reload user to get latest balance
-        user.reload()
-        
-        # Check if user has sufficient credits
-        if (user.credit_balance or 0) < amount:
+        from pymongo import ReturnDocument
+        from .ledger_buffer import record_ledger_entry
+
+        # Check and deduct atomically, returning the new balance
+        updated = User._get_collection().find_one_and_update(
+            {"_id": user.id, "credit_balance": {"$gte": amount}},
+            {"$inc": {"credit_balance": -amount}, "$set": {"updated_at": datetime.utcnow()}},
+            projection={"credit_balance": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+
+        if updated is None:
+            current = User._get_collection().find_one({"_id": user.id}, {"credit_balance": 1}) or {}
+            user.credit_balance = current.get("credit_balance", user.credit_balance)
             return {
                 'success': False,
                 'message': f'Insufficient credits. Available: {user.credit_balance or 0}, Required: {amount}',
                 'balance_after': user.credit_balance or 0
             }
-        
-        # Deduct credits atomically
-        User.objects(id=user.id).update_one(
-            dec__credit_balance=amount,
-            set__updated_at=datetime.utcnow()
-        )
-        
-        # Reload after atomic update
-        user.reload()
-        
+
+        user.credit_balance = updated["credit_balance"]
+
         # Create ledger entry (organization is None for single users)
-        CreditLedger(
+        record_ledger_entry(CreditLedger(
             user=user,
             organization=None,  # Single user, no organization
             project=project,
@@ -348,11 +419,11 @@ def deduct_user_credits(user, amount, reason="Image generation", project=None, m
             created_by=user,
             updated_by=user,
             updated_at=datetime.utcnow()
-        ).save()
+        ))
 
         # Credits low reminder (admin-configured thresholds)
-        maybe_send_credit_reminder_user(user, user.credit_balance or 0)
-        
+        publish_credit_reminder(user, user.credit_balance or 0)
+
         return {
             'success': True,
             'message': 'Credits deducted successfully',
@@ -6,6 +6,7 @@ from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from django.views.decorators.csrf import csrf_exempt
 from .models import CreditLedger, CreditSettings
+from .settings_cache import invalidate_settings_cache
 from organization.models import Organization
 from users.models import User, Role
 from common.middleware import authenticate
@@ -570,6 +571,7 @@ def update_credit_settings(request):
         settings.updated_by = request.user
         settings.updated_at = datetime.utcnow()
         settings.save()
+        invalidate_settings_cache(settings)
         
         return JsonResponse({
             'success': True,
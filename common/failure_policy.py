@@ -0,0 +1,110 @@
+"""
+Failure taxonomy and retry policy for image generation.
+
+Used by imgbackendapp tasks (individual model generation) and probackendapp
+(project batch generation) to decide whether a failed attempt is worth
+another expensive call, and when:
+
+  transient             network errors, timeouts, 5xx       retry soon, backing off
+  quota                 429 / RESOURCE_EXHAUSTED            retry later, backing off more
+  upstream_unavailable  the model's circuit is open         retry once it may close
+  storage               Cloudinary upload, local files      retry a few times
+  safety_blocked        blocked by the safety filters      never retry
+  invalid_input         bad request, image or prompt        never retry
+  unknown               anything else                       retry once
+
+An exception can state its class with a `failure_class` attribute
+(e.g. probackendapp.circuit_breaker.CircuitOpenError); otherwise it is
+classified from its status code, type and message.
+"""
+
+import random
+from collections import namedtuple
+
+TRANSIENT = "transient"
+QUOTA = "quota"
+UPSTREAM_UNAVAILABLE = "upstream_unavailable"
+STORAGE = "storage"
+SAFETY_BLOCKED = "safety_blocked"
+INVALID_INPUT = "invalid_input"
+UNKNOWN = "unknown"
+
+# Failures that say the upstream model is unhealthy (feed the circuit breaker)
+UPSTREAM_FAILURES = (TRANSIENT, QUOTA)
+
+
+class RetryableFailure(Exception):
+    """An attempt failed in a way worth retrying after `countdown` seconds."""
+
+    def __init__(self, failure_class: str, countdown: float, error: str = ""):
+        super().__init__(f"{failure_class} failure, retry in {countdown:.0f}s: {error}")
+        self.failure_class = failure_class
+        self.countdown = countdown
+
+
+RetryPolicy = namedtuple("RetryPolicy", ["max_retries", "base_delay", "max_delay"])
+
+RETRY_POLICIES = {
+    TRANSIENT: RetryPolicy(max_retries=3, base_delay=5, max_delay=60),
+    QUOTA: RetryPolicy(max_retries=4, base_delay=30, max_delay=300),
+    UPSTREAM_UNAVAILABLE: RetryPolicy(max_retries=3, base_delay=60, max_delay=300),
+    STORAGE: RetryPolicy(max_retries=3, base_delay=10, max_delay=120),
+    SAFETY_BLOCKED: RetryPolicy(max_retries=0, base_delay=0, max_delay=0),
+    INVALID_INPUT: RetryPolicy(max_retries=0, base_delay=0, max_delay=0),
+    UNKNOWN: RetryPolicy(max_retries=1, base_delay=30, max_delay=30),
+}
+
+_SAFETY_MARKERS = ("safety", "prohibited_content", "blocklist", "block_reason", "blocked")
+_QUOTA_MARKERS = ("resource_exhausted", "429", "quota", "rate limit")
+_TRANSIENT_MARKERS = ("unavailable", "deadline_exceeded", "timed out", "timeout",
+                      "connection", "temporarily", "internal error", "500 internal", "502", "503", "504")
+_TRANSIENT_TYPES = ("ConnectionError", "ConnectError", "ConnectTimeout", "ReadTimeout", "ReadError",
+                    "WriteTimeout", "RemoteProtocolError", "Timeout", "ServerError")
+# Cloudinary errors that a retry cannot fix
+_STORAGE_REJECTIONS = ("BadRequest", "NotAllowed", "NotFound", "AuthorizationRequired")
+_INVALID_MARKERS = ("invalid_argument", "invalid", "not found", "unsupported", "permission_denied")
+
+
+def classify_failure(exc) -> str:
+    """Failure class of an exception (one of the constants above)."""
+    explicit = getattr(exc, "failure_class", None)
+    if explicit in RETRY_POLICIES:
+        return explicit
+
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    message = str(exc).lower()
+    name = type(exc).__name__
+    module = type(exc).__module__ or ""
+
+    if any(marker in message for marker in _SAFETY_MARKERS):
+        return SAFETY_BLOCKED
+    if code == 429 or any(marker in message for marker in _QUOTA_MARKERS):
+        return QUOTA
+    if module.startswith("cloudinary"):
+        return INVALID_INPUT if name in _STORAGE_REJECTIONS else STORAGE
+    if (isinstance(code, int) and code >= 500) or isinstance(exc, (ConnectionError, TimeoutError)) \
+            or name in _TRANSIENT_TYPES or any(marker in message for marker in _TRANSIENT_MARKERS):
+        return TRANSIENT
+    if code in (400, 403, 404) or isinstance(exc, (ValueError, KeyError, TypeError, FileNotFoundError)) \
+            or any(marker in message for marker in _INVALID_MARKERS):
+        return INVALID_INPUT
+    if isinstance(exc, OSError):
+        return STORAGE
+    return UNKNOWN
+
+
+def get_retry_countdown(failure_class: str, retries: int, minimum: float = 0):
+    """
+    Seconds to wait before the next attempt, or None when not to retry.
+
+    Args:
+        failure_class: classify_failure() result
+        retries: Retries already made after failed attempts
+        minimum: Lower bound, e.g. the time until an open circuit may close
+    """
+    policy = RETRY_POLICIES.get(failure_class, RETRY_POLICIES[UNKNOWN])
+    if retries >= policy.max_retries:
+        return None
+    delay = min(policy.max_delay, policy.base_delay * (2 ** retries))
+    # Jitter so a batch that failed together does not retry together
+    return max(minimum, delay * (1 + random.random() * 0.25))
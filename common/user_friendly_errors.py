@@ -14,7 +14,11 @@ IMAGE_GENERATION_ERROR_MAP = [
     ("quota", "We've reached our generation limit for now. Please try again in a few minutes."),
     ("rate limit", "Too many requests. Please wait a moment and try again."),
     ("429", "Service is busy. Please wait a moment and try again."),
+    # Upstream model unhealthy (circuit breaker)
+    ("Circuit open", "The image service is having trouble right now. Please try again in a few minutes."),
     # Invalid input / content
+    ("safety", "This image was blocked by the content safety filter. Please try a different prompt or image."),
+    ("prohibited_content", "This image was blocked by the content safety filter. Please try a different prompt or image."),
     ("No image returned", "We couldn't create an image from your photos. Please try different images."),
     ("invalid", "Something about the image or request wasn't valid. Please check your uploads and try again."),
     ("Invalid image_id", "The image reference was invalid. Please refresh and try again."),
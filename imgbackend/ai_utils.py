@@ -3,9 +3,26 @@ Compatibility layer for Gemini client usage across the backend.
 
 Exports `genai` and `types` so existing imports continue to work, while
 defaulting API key auth to environment variables from `.env`.
+
+get_client() hands out one long-lived client per API key and process, so
+calls reuse its pooled keep-alive connections instead of repeating the
+TLS/HTTP2 setup with a fresh genai.Client() each time. Celery warms it in
+worker_process_init; web processes create it on first use. A forked child
+never reuses its parent's client (or sockets): the pool is keyed by pid.
+
+Its generate_content calls check the model's circuit breaker
+(probackendapp.circuit_breaker) and take a permit from the cluster-wide
+Gemini rate limiter (probackendapp.gemini_rate_limiter) first.
+
+image_part() / image_part_from_file() build image content parts from raw
+bytes. Call sites used to pass {"inline_data": {"data": <base64 str>}},
+which the SDK decodes back to bytes before encoding the request, so every
+multi-MB image sat in memory as bytes, base64 text and bytes again.
 """
 
+import mimetypes
 import os
+import threading
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -24,4 +41,123 @@ class genai:
         return _genai.Client(*args, **kwargs)
 
 
-__all__ = ["genai", "types"]
+class _RateLimitedModels:
+    """client.models with generate_content behind the circuit breaker and rate limiter."""
+
+    def __init__(self, models):
+        self._models = models
+
+    def generate_content(self, *args, **kwargs):
+        from common.failure_policy import UPSTREAM_FAILURES, classify_failure
+        from probackendapp.circuit_breaker import check_circuit, record_failure, record_success
+        from probackendapp.gemini_rate_limiter import GeminiPermitTimeout, call_with_permit, get_budget
+
+        model = kwargs.get("model", args[0] if args else None)
+        check_circuit(model)
+        try:
+            result = call_with_permit(get_budget(model), self._models.generate_content, *args, **kwargs)
+        except Exception as e:
+            # A permit timeout is our own backlog, not an unhealthy model
+            if classify_failure(e) in UPSTREAM_FAILURES and not isinstance(e, GeminiPermitTimeout):
+                record_failure(model)
+            raise
+        record_success(model)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._models, name)
+
+
+class RateLimitedClient:
+    """A genai Client whose generate_content calls are rate limited."""
+
+    def __init__(self, client):
+        self._client = client
+        self.models = _RateLimitedModels(client.models)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def image_part(data, mime_type="image/jpeg"):
+    """
+    Gemini content part for an image, passed as raw bytes.
+
+    Args:
+        data: Image bytes (bytearray / memoryview are copied to bytes once;
+            the SDK only accepts bytes)
+        mime_type: MIME type of the image
+
+    Returns:
+        types.Part usable in contents or in a {"parts": [...]} entry
+    """
+    if not isinstance(data, bytes):
+        data = bytes(data)
+    return types.Part.from_bytes(data=data, mime_type=mime_type)
+
+
+def guess_image_mime_type(path, default="image/jpeg"):
+    """MIME type of an image file from its extension (default if unknown)."""
+    mime_type = mimetypes.guess_type(str(path))[0]
+    return mime_type if mime_type and mime_type.startswith("image/") else default
+
+
+def image_part_from_file(path, mime_type=None):
+    """Gemini content part for an image file, read once as raw bytes."""
+    with open(path, "rb") as f:
+        return image_part(f.read(), mime_type or guess_image_mime_type(path))
+
+
+_clients = {}
+_clients_pid = None
+_clients_lock = threading.Lock()
+
+
+def _resolve_api_key(api_key=None):
+    return (api_key or os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY") or "").strip()
+
+
+def get_client(api_key=None, rate_limited=True, **kwargs):
+    """
+    Process-wide Gemini client for an API key (thread-safe to share).
+
+    Args:
+        api_key: API key; defaults to GEMINI_API_KEY / GOOGLE_API_KEY
+        rate_limited: Take a rate-limiter permit for each generate_content
+        **kwargs: Extra genai.Client arguments, e.g. http_options; clients
+            with different arguments are pooled separately
+
+    Returns:
+        google.genai Client (wrapped in RateLimitedClient if rate_limited)
+    """
+    global _clients_pid
+    key = (_resolve_api_key(api_key), rate_limited, repr(sorted(kwargs.items())))
+    pid = os.getpid()
+    client = _clients.get(key) if _clients_pid == pid else None
+    if client is not None:
+        return client
+    with _clients_lock:
+        if _clients_pid != pid:
+            # Inherited from the parent across fork: drop without closing,
+            # the parent still owns those connections
+            _clients.clear()
+            _clients_pid = pid
+        client = _clients.get(key)
+        if client is None:
+            client = _genai.Client(api_key=key[0], **kwargs)
+            if rate_limited:
+                client = RateLimitedClient(client)
+            _clients[key] = client
+        return client
+
+
+def reset_clients():
+    """Forget this process's pooled clients (e.g. in a freshly forked worker)."""
+    global _clients_pid
+    with _clients_lock:
+        _clients.clear()
+        _clients_pid = os.getpid()
+
+
+__all__ = ["genai", "types", "get_client", "reset_clients", "RateLimitedClient",
+           "image_part", "image_part_from_file", "guess_image_mime_type"]
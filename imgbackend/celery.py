@@ -1,7 +1,7 @@
 import os
 from celery import Celery
 from kombu import Queue
-from celery.signals import task_prerun, task_postrun, task_failure
+from celery.signals import task_prerun, task_postrun, task_failure, worker_init, worker_process_init
 
 # -------------------------------------------------------------------
 # Django settings
@@ -26,7 +26,15 @@ QUEUES = [
     for i in range(NUM_QUEUES)
 ]
 
-app.conf.task_queues = QUEUES
+# Housekeeping tasks (counter reconciliation) run outside the load-tracked
+# queue_N queues; start a worker with -Q maintenance (or include it) for them.
+MAINTENANCE_QUEUE = Queue(
+    name="maintenance",
+    exchange="tasks",
+    routing_key="maintenance",
+)
+
+app.conf.task_queues = QUEUES + [MAINTENANCE_QUEUE]
 
 # Default fallback queue
 app.conf.task_default_queue = "queue_0"
@@ -46,9 +54,79 @@ app.conf.task_routes = {
 # Allow Celery to create queues dynamically if needed
 app.conf.task_create_missing_queues = True
 
+# -------------------------------------------------------------------
+# PRIORITIES
+# -------------------------------------------------------------------
+# Each queue_N is split into broker lists per priority step (0 served
+# first). Interactive tasks are sent at 0, bulk generation at 6 and
+# everything else at 3 (see probackendapp.queue_load_manager). Prefetching a
+# single message per process keeps a worker from sitting on bulk messages
+# while a newer interactive one waits in the broker.
+app.conf.broker_transport_options = {"priority_steps": [0, 3, 6, 9]}
+app.conf.task_default_priority = 3
+app.conf.worker_prefetch_multiplier = 1
+
 # Discover tasks from all installed apps
 app.autodiscover_tasks()
 
+# -------------------------------------------------------------------
+# PERIODIC TASKS (celery -A imgbackend beat)
+# -------------------------------------------------------------------
+
+app.conf.beat_schedule = {
+    "reconcile-queue-counters": {
+        "task": "probackendapp.tasks.reconcile_queue_counters_task",
+        "schedule": float(os.getenv("QUEUE_RECONCILE_INTERVAL_SECONDS", "60")),
+        "options": {"queue": "maintenance"},
+    },
+    # Safety net; dispatch normally runs whenever a queue task finishes
+    "fair-share-dispatch": {
+        "task": "probackendapp.tasks.fair_share_dispatch_task",
+        "schedule": float(os.getenv("FAIR_SHARE_DISPATCH_INTERVAL_SECONDS", "5")),
+        "options": {"queue": "maintenance", "expires": 30},
+    },
+    # Bulk insert of ledger entries buffered by credit deductions
+    "flush-credit-ledger": {
+        "task": "CREDITS.tasks.flush_credit_ledger_task",
+        "schedule": float(os.getenv("CREDIT_LEDGER_FLUSH_INTERVAL_SECONDS", "10")),
+        "options": {"queue": "maintenance", "expires": 60},
+    },
+}
+
+# -------------------------------------------------------------------
+# SIGNAL HANDLERS (WORKER PROCESS SETUP)
+# -------------------------------------------------------------------
+
+@worker_init.connect
+def worker_init_handler(**kwargs):
+    """
+    Gemini calls in a worker may wait the full permit timeout; web
+    processes use the short one (see probackendapp.gemini_rate_limiter).
+    Set before the pool starts, so prefork children inherit it.
+    """
+    from probackendapp.gemini_rate_limiter import mark_worker_process
+
+    mark_worker_process()
+
+
+@worker_process_init.connect
+def worker_process_init_handler(**kwargs):
+    """
+    Each prefork child starts with its own Gemini client (see
+    imgbackend.ai_utils.get_client) instead of one inherited across fork.
+    """
+    try:
+        from imgbackend.ai_utils import get_client, reset_clients
+
+        reset_clients()
+        get_client()
+    except Exception as e:
+        import logging
+        logging.getLogger(__name__).warning(
+            f"worker_process_init Gemini client setup failed: {e}"
+        )
+
+
 # -------------------------------------------------------------------
 # SIGNAL HANDLERS (QUEUE LOAD TRACKING)
 # -------------------------------------------------------------------
@@ -61,6 +139,9 @@ def task_prerun_handler(
     When a task STARTS:
     pending -= 1
     running += 1
+    (one atomic Redis call)
+    A task of a job whose pending slot cancel_job already released only
+    counts as running.
     """
     try:
         if task and hasattr(task, "request"):
@@ -68,13 +149,14 @@ def task_prerun_handler(
             queue_name = delivery_info.get("routing_key")
 
             if queue_name and queue_name.startswith("queue_"):
-                from probackendapp.queue_load_manager import (
-                    decrement_pending,
-                    increment_running,
-                )
-
-                decrement_pending(queue_name)
-                increment_running(queue_name)
+                from probackendapp.queue_load_manager import transition
+                from probackendapp.job_cancellation import claim_task_start, get_task_job_id
+
+                job_id = get_task_job_id(task, args, kwargs)
+                if job_id and not claim_task_start(job_id, task_id):
+                    transition(queue_name, None, "running")
+                else:
+                    transition(queue_name, "pending", "running")
     except Exception as e:
         import logging
         logging.getLogger(__name__).warning(
@@ -94,8 +176,9 @@ def task_postrun_handler(
     **kwds,
 ):
     """
-    When a task FINISHES successfully:
+    When a task FINISHES (successfully, with an error, or for a retry):
     running -= 1
+    and the freed slot goes to the next tenant in fair-share order
     """
     try:
         if task and hasattr(task, "request"):
@@ -103,8 +186,16 @@ def task_postrun_handler(
             queue_name = delivery_info.get("routing_key")
 
             if queue_name and queue_name.startswith("queue_"):
-                from probackendapp.queue_load_manager import decrement_running
+                from probackendapp.queue_load_manager import (
+                    PRIORITY_INTERACTIVE,
+                    decrement_running,
+                    release_interactive_slot,
+                )
+                from probackendapp.fair_share import dispatch
                 decrement_running(queue_name)
+                if delivery_info.get("priority") == PRIORITY_INTERACTIVE:
+                    release_interactive_slot(task_id)
+                dispatch()
     except Exception as e:
         import logging
         logging.getLogger(__name__).warning(
@@ -122,22 +213,9 @@ def task_failure_handler(
     **kwds,
 ):
     """
-    When a task FAILS:
-    running -= 1
+    When a task FAILS nothing is counted here: task_postrun also fires for
+    failed tasks and releases the running slot. Decrementing in both places
+    made every failure take two slots off the queue.
     """
-    try:
-        from celery import current_task
-
-        task = current_task.request if current_task else None
-        if task:
-            delivery_info = task.delivery_info or {}
-            queue_name = delivery_info.get("routing_key")
-
-            if queue_name and queue_name.startswith("queue_"):
-                from probackendapp.queue_load_manager import decrement_running
-                decrement_running(queue_name)
-    except Exception as e:
-        import logging
-        logging.getLogger(__name__).warning(
-            f"task_failure queue counter update failed: {e}"
-        )
+    import logging
+    logging.getLogger(__name__).debug(f"task {task_id} failed: {exception}")
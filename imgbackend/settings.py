@@ -119,6 +119,116 @@ CELERY_TASK_RESULT_EXPIRES = None
 # You can override this at runtime with the -c flag on the worker.
 CELERY_WORKER_CONCURRENCY = int(os.getenv("CELERY_WORKER_CONCURRENCY", "4"))
 
+# Batch placement (probackendapp.queue_load_manager.place_batch):
+# task slots served at once per queue_N, and how many queues one tenant's
+# live jobs may spread over.
+QUEUE_WORKER_CAPACITY = int(os.getenv("QUEUE_WORKER_CAPACITY", str(CELERY_WORKER_CONCURRENCY)))
+MAX_QUEUES_PER_TENANT = int(os.getenv("MAX_QUEUES_PER_TENANT", "5"))
+
+# Fair-share dispatch of bulk generation across tenants
+# (probackendapp.fair_share): tasks per round per unit of weight, how far
+# past queue capacity to keep the Celery queues filled, and weights by
+# plan name (a plan's custom_settings["fair_share_weight"] overrides).
+FAIR_SHARE_QUANTUM = int(os.getenv("FAIR_SHARE_QUANTUM", "2"))
+FAIR_SHARE_OVERCOMMIT = float(os.getenv("FAIR_SHARE_OVERCOMMIT", "1.5"))
+FAIR_SHARE_DEFAULT_WEIGHT = 1
+FAIR_SHARE_PLAN_WEIGHTS = {
+    "free": 1,
+    "basic": 2,
+    "pro": 4,
+    "enterprise": 8,
+}
+
+# Priority lane: largest share of all queue slots that interactive tasks
+# (regenerate, single-image requests) may hold ahead of bulk work.
+INTERACTIVE_MAX_SHARE = float(os.getenv("INTERACTIVE_MAX_SHARE", "0.5"))
+
+# Threads per task for the Cloudinary uploads and Gemini analyses of
+# workflow images (probackendapp.workflow_uploads).
+WORKFLOW_UPLOAD_MAX_WORKERS = int(os.getenv("WORKFLOW_UPLOAD_MAX_WORKERS", "8"))
+# Workflow images still pending/processing this long after their last status
+# change are marked failed, e.g. when their task was lost with its worker.
+WORKFLOW_UPLOAD_STALE_SECONDS = int(os.getenv("WORKFLOW_UPLOAD_STALE_SECONDS", "900"))
+
+# Concurrent Gemini text calls per process for independent prompts, e.g.
+# the per-category master analyses (probackendapp.utils.call_gemini_api_many).
+GEMINI_TEXT_CONCURRENCY = int(os.getenv("GEMINI_TEXT_CONCURRENCY", "5"))
+
+# Cluster-wide Gemini limits shared by all workers through Redis
+# (probackendapp.gemini_rate_limiter): a token bucket per budget plus an
+# AIMD concurrency limit that halves on 429s and creeps back on success.
+GEMINI_RATE_LIMITS = {
+    "image": {
+        "requests_per_minute": int(os.getenv("GEMINI_IMAGE_RPM", "60")),
+        "burst": int(os.getenv("GEMINI_IMAGE_BURST", "10")),
+        "min_concurrency": 1,
+        "initial_concurrency": int(os.getenv("GEMINI_IMAGE_INITIAL_CONCURRENCY", "8")),
+        "max_concurrency": int(os.getenv("GEMINI_IMAGE_MAX_CONCURRENCY", "20")),
+    },
+    "text": {
+        "requests_per_minute": int(os.getenv("GEMINI_TEXT_RPM", "600")),
+        "burst": int(os.getenv("GEMINI_TEXT_BURST", "50")),
+        "min_concurrency": 2,
+        "initial_concurrency": int(os.getenv("GEMINI_TEXT_INITIAL_CONCURRENCY", "20")),
+        "max_concurrency": int(os.getenv("GEMINI_TEXT_MAX_CONCURRENCY", "50")),
+    },
+}
+# Longest a call waits for a permit, and how often a throttled call is
+# retried under a fresh permit before the error reaches the task.
+GEMINI_PERMIT_TIMEOUT_SECONDS = int(os.getenv("GEMINI_PERMIT_TIMEOUT_SECONDS", "600"))
+GEMINI_THROTTLE_RETRIES = int(os.getenv("GEMINI_THROTTLE_RETRIES", "5"))
+# The same for calls made while serving a web request (not in a Celery
+# worker), which must give up before the HTTP request times out.
+GEMINI_WEB_PERMIT_TIMEOUT_SECONDS = int(os.getenv("GEMINI_WEB_PERMIT_TIMEOUT_SECONDS", "15"))
+GEMINI_WEB_THROTTLE_RETRIES = int(os.getenv("GEMINI_WEB_THROTTLE_RETRIES", "1"))
+
+# Per-model circuit breaker (probackendapp.circuit_breaker): this many
+# upstream failures within the window open the circuit for CIRCUIT_OPEN_SECONDS.
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_FAILURE_WINDOW_SECONDS = int(os.getenv("CIRCUIT_FAILURE_WINDOW_SECONDS", "60"))
+CIRCUIT_OPEN_SECONDS = int(os.getenv("CIRCUIT_OPEN_SECONDS", "60"))
+
+# Longest a job progress long-poll (api_job_images ?wait=) may block. Under
+# WSGI each waiting poll holds a worker thread; the SSE stream
+# (probackendapp.job_events) needs the ASGI entry point instead.
+JOB_LONG_POLL_MAX_SECONDS = float(os.getenv("JOB_LONG_POLL_MAX_SECONDS", "10"))
+
+# Upper bound on how long a process serves its cached PromptMaster prompts
+# without a reload; edits normally arrive sooner via Redis pub/sub
+# (probackendapp.prompt_registry).
+PROMPT_REGISTRY_MAX_AGE_SECONDS = int(os.getenv("PROMPT_REGISTRY_MAX_AGE_SECONDS", "300"))
+
+# Pre-flight normalisation of uploaded images (probackendapp.image_preflight):
+# EXIF orientation, sRGB, downscale to the kind's max edge, re-encode without
+# metadata. Kinds not listed here use the module defaults.
+IMAGE_PREFLIGHT_ENABLED = os.getenv("IMAGE_PREFLIGHT_ENABLED", "true").lower() == "true"
+IMAGE_PREFLIGHT_FORMAT = os.getenv("IMAGE_PREFLIGHT_FORMAT", "JPEG")  # JPEG or WEBP
+IMAGE_PREFLIGHT_LIMITS = {
+    "product": {
+        "max_edge": int(os.getenv("IMAGE_PREFLIGHT_PRODUCT_MAX_EDGE", "2048")),
+        "quality": int(os.getenv("IMAGE_PREFLIGHT_PRODUCT_QUALITY", "90")),
+    },
+    "ornament": {
+        "max_edge": int(os.getenv("IMAGE_PREFLIGHT_PRODUCT_MAX_EDGE", "2048")),
+        "quality": int(os.getenv("IMAGE_PREFLIGHT_PRODUCT_QUALITY", "90")),
+    },
+    "model": {
+        "max_edge": int(os.getenv("IMAGE_PREFLIGHT_MODEL_MAX_EDGE", "2048")),
+        "quality": int(os.getenv("IMAGE_PREFLIGHT_MODEL_QUALITY", "88")),
+    },
+    "theme": {
+        "max_edge": int(os.getenv("IMAGE_PREFLIGHT_THEME_MAX_EDGE", "1536")),
+        "quality": int(os.getenv("IMAGE_PREFLIGHT_THEME_QUALITY", "85")),
+    },
+    "pose": {
+        "max_edge": int(os.getenv("IMAGE_PREFLIGHT_POSE_MAX_EDGE", "1024")),
+        "quality": int(os.getenv("IMAGE_PREFLIGHT_POSE_QUALITY", "80")),
+    },
+}
+# Normalised outputs are cached on local disk by content hash; entries
+# unused this long are pruned.
+IMAGE_PREFLIGHT_CACHE_DAYS = int(os.getenv("IMAGE_PREFLIGHT_CACHE_DAYS", "30"))
+
 # Windows-specific: Use 'solo' pool instead of 'prefork' to avoid PermissionError
 # On Windows, multiprocessing has issues with shared memory/semaphores
 # Use 'solo' for Windows development, 'prefork' for Linux production
@@ -282,16 +392,21 @@ ADMIN_EMAIL = [email.strip() for email in ADMIN_EMAIL.split(",") if email]
 # Frontend URL for password reset links
 FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:3000')
 
-# AI Model Configuration - Dynamically loaded from database
+# AI Model Configuration
 DEFAULT_GEMINI_IMAGE_MODEL = config(
     "GEMINI_IMAGE_MODEL",
     default="gemini-3.1-flash-image-preview",
 )
-try:
-    from CREDITS.utils import get_image_model_name
-    # Get the model name from database, with fallback to default
-    IMAGE_MODEL_NAME = get_image_model_name(default_model=DEFAULT_GEMINI_IMAGE_MODEL)
-except Exception as e:
-    # Fallback if database connection fails during settings load
-    print(f"Warning: Could not load IMAGE_MODEL_NAME from database: {e}")
-    IMAGE_MODEL_NAME = DEFAULT_GEMINI_IMAGE_MODEL
+# Fallback image model only. The admin-configured model
+# (CreditSettings.default_image_model_name) is resolved when it is used,
+# via CREDITS.utils.get_image_model_name(default_model=IMAGE_MODEL_NAME),
+# so loading settings no longer queries the database.
+IMAGE_MODEL_NAME = DEFAULT_GEMINI_IMAGE_MODEL
+
+# How long a process reuses its cached CreditSettings (CREDITS.settings_cache);
+# admin updates are pushed to all processes immediately via Redis pub/sub.
+CREDIT_SETTINGS_CACHE_SECONDS = int(os.getenv("CREDIT_SETTINGS_CACHE_SECONDS", "60"))
+
+# Most ledger entries written per insert_many when the buffered credit ledger
+# is flushed (CREDITS.ledger_buffer; interval set by the celery beat entry).
+CREDIT_LEDGER_FLUSH_BATCH_SIZE = int(os.getenv("CREDIT_LEDGER_FLUSH_BATCH_SIZE", "500"))
@@ -21,12 +21,13 @@ from .models import Ornament
 from bson import ObjectId
 from common.error_reporter import report_handled_exception
 from common.user_friendly_errors import get_user_friendly_message
+from common.failure_policy import classify_failure, get_retry_countdown
 
 logger = logging.getLogger(__name__)
 
 # Check for Gemini SDK
 try:
-    from imgbackend.ai_utils import genai, types
+    from imgbackend.ai_utils import types, get_client, guess_image_mime_type, image_part, image_part_from_file
     has_genai = True
 except ImportError:
     has_genai = False
@@ -48,11 +49,6 @@ def generate_white_background_task(self, ornament_id, user_id, bg_color, extra_p
         # Get ornament from database
         ornament = Ornament.objects.get(id=ornament_id)
         
-        # Read image file
-        with open(ornament.image.path, "rb") as f:
-            img_bytes = f.read()
-        img_b64 = base64.b64encode(img_bytes).decode("utf-8")
-
         # Get prompt from database
         from probackendapp.prompt_initializer import get_prompt_from_db
         extra_prompt_text = f" {extra_prompt}" if extra_prompt else ""
@@ -68,20 +64,23 @@ def generate_white_background_task(self, ornament_id, user_id, bg_color, extra_p
         if dimension and dimension not in text_prompt:
             text_prompt = f"{text_prompt} Generate the image in {dimension} aspect ratio (width:height)."
 
+        # Read the upload once: it is sent to Gemini and uploaded to Cloudinary
+        with open(ornament.image.path, "rb") as f:
+            img_bytes = f.read()
+
         generated_bytes = None
 
         if has_genai:
             if not (getattr(settings, "GEMINI_API_KEY", "") or getattr(settings, "GOOGLE_API_KEY", "")):
                 raise Exception("GEMINI/GOOGLE API key not configured")
 
-            client = genai.Client()
+            client = get_client()
             model_name = get_image_model_name(default_model=settings.IMAGE_MODEL_NAME)
 
             contents = [
                 {
                     "parts": [
-                        {"inline_data": {
-                            "mime_type": "image/jpeg", "data": img_b64}},
+                        image_part(img_bytes, guess_image_mime_type(ornament.image.path)),
                         {"text": text_prompt}
                     ]
                 }
@@ -114,7 +113,7 @@ def generate_white_background_task(self, ornament_id, user_id, bg_color, extra_p
 
         # Fallback
         if not generated_bytes:
-            original = Image.open(ornament.image.path).convert("RGB")
+            original = Image.open(BytesIO(img_bytes)).convert("RGB")
             img_array = np.array(original)
             img_bgr = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
             gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
@@ -216,8 +215,11 @@ def generate_white_background_task(self, ornament_id, user_id, bg_color, extra_p
     except Exception as e:
         traceback.print_exc()
         report_handled_exception(e, request=self.request, context={"user_id": user_id})
-        if self.request.retries < self.max_retries:
-            raise self.retry(exc=e, countdown=60 * (self.request.retries + 1))
+        # Safety blocks and bad input are final; the rest back off per failure class
+        countdown = get_retry_countdown(classify_failure(e), self.request.retries,
+                                        minimum=getattr(e, "retry_in", 0))
+        if countdown is not None and self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=countdown)
         return {
             "success": False,
             "error": str(e)
@@ -258,24 +260,20 @@ def change_background_task(
         if not uploaded_image_paths:
             raise FileNotFoundError("No valid uploaded product image paths provided.")
 
-        product_b64_list = []
+        product_parts = []
         for idx, image_path in enumerate(uploaded_image_paths):
-            with open(image_path, "rb") as f:
-                ornament_bytes = f.read()
-            ornament_img = Image.open(BytesIO(ornament_bytes)).convert("RGB")
-            buf_ornament = BytesIO()
-            ornament_img.save(buf_ornament, format="JPEG")
-            product_b64_list.append(base64.b64encode(buf_ornament.getvalue()).decode("utf-8"))
+            with Image.open(image_path) as ornament_img:
+                buf_ornament = BytesIO()
+                ornament_img.convert("RGB").save(buf_ornament, format="JPEG")
+            product_parts.append(image_part(buf_ornament.getvalue()))
             buf_ornament.close()
 
-        bg_b64 = None
+        bg_part = None
         if background_image_path and os.path.exists(background_image_path):
-            with open(background_image_path, "rb") as f:
-                bg_bytes = f.read()
-            bg_img = Image.open(BytesIO(bg_bytes)).convert("RGB")
-            buf_bg = BytesIO()
-            bg_img.save(buf_bg, format="JPEG")
-            bg_b64 = base64.b64encode(buf_bg.getvalue()).decode("utf-8")
+            with Image.open(background_image_path) as bg_img:
+                buf_bg = BytesIO()
+                bg_img.convert("RGB").save(buf_bg, format="JPEG")
+            bg_part = image_part(buf_bg.getvalue())
             buf_bg.close()
 
         from probackendapp.prompt_initializer import get_prompt_from_db
@@ -283,7 +281,7 @@ def change_background_task(
         if reference_analysis and reference_analysis.strip():
             user_prompt = f"{user_prompt} {reference_analysis.strip()}".strip()
 
-        if bg_b64:
+        if bg_part:
             bg_prompt = get_prompt_from_db(
                 "images_background_change_with_image",
                 "Replace the background using the uploaded background image.",
@@ -324,7 +322,7 @@ def change_background_task(
             api_key = getattr(settings, "GEMINI_API_KEY", None) or getattr(
                 settings, "GOOGLE_API_KEY", None
             )
-            client = genai.Client(api_key=api_key)
+            client = get_client(api_key=api_key)
             configured_model = get_image_model_name(
                 default_model="gemini-3.1-flash-image-preview"
             )
@@ -335,19 +333,12 @@ def change_background_task(
             )
 
             contents = []
-            multiple_products = len(product_b64_list) > 1
-            for idx, product_b64 in enumerate(product_b64_list):
-                contents.append(
-                    {
-                        "inline_data": {
-                            "mime_type": "image/jpeg",
-                            "data": product_b64,
-                        }
-                    }
-                )
+            multiple_products = len(product_parts) > 1
+            for idx, product_part in enumerate(product_parts):
+                contents.append(product_part)
                 if multiple_products:
                     contents.append(
-                        f"This is product reference image {idx + 1} of {len(product_b64_list)}. "
+                        f"This is product reference image {idx + 1} of {len(product_parts)}. "
                         "Preserve this product accurately in the final image."
                     )
                 else:
@@ -362,15 +353,10 @@ def change_background_task(
                     "in a single composition with the new background. Do not omit any product."
                 )
 
-            if bg_b64:
+            if bg_part:
                 contents.extend(
                     [
-                        {
-                            "inline_data": {
-                                "mime_type": "image/jpeg",
-                                "data": bg_b64,
-                            }
-                        },
+                        bg_part,
                         "Use this image strictly as the new background.",
                     ]
                 )
@@ -485,8 +471,11 @@ def change_background_task(
         logger.exception("change_background_task failed for user=%s", user_id)
         traceback.print_exc()
         report_handled_exception(e, request=self.request, context={"user_id": user_id})
-        if self.request.retries < self.max_retries:
-            raise self.retry(exc=e, countdown=60 * (self.request.retries + 1))
+        # Safety blocks and bad input are final; the rest back off per failure class
+        countdown = get_retry_countdown(classify_failure(e), self.request.retries,
+                                        minimum=getattr(e, "retry_in", 0))
+        if countdown is not None and self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=countdown)
         if local_generated_path and os.path.exists(local_generated_path):
             try:
                 os.remove(local_generated_path)
@@ -502,15 +491,11 @@ def generate_model_with_ornament_task(self, ornament_image_path, user_id, pose_i
     """
     try:
         # Read images
-        with open(ornament_image_path, "rb") as f:
-            ornament_bytes = f.read()
-        ornament_b64 = base64.b64encode(ornament_bytes).decode("utf-8")
-        
-        pose_b64 = None
+        ornament_part = image_part_from_file(ornament_image_path)
+
+        pose_part = None
         if pose_image_path and os.path.exists(pose_image_path):
-            with open(pose_image_path, "rb") as f:
-                pose_bytes = f.read()
-            pose_b64 = base64.b64encode(pose_bytes).decode('utf-8')
+            pose_part = image_part_from_file(pose_image_path)
 
         if not (getattr(settings, "GEMINI_API_KEY", "") or getattr(settings, "GOOGLE_API_KEY", "")):
             raise Exception("GEMINI/GOOGLE API key not configured")
@@ -518,16 +503,12 @@ def generate_model_with_ornament_task(self, ornament_image_path, user_id, pose_i
         generated_bytes = None
 
         if has_genai:
-            client = genai.Client()
+            client = get_client()
             model_name = get_image_model_name(default_model=settings.IMAGE_MODEL_NAME)
 
-            contents = [
-                {"inline_data": {"mime_type": "image/jpeg", "data": ornament_b64}},
-            ]
-            if pose_b64:
-                contents.append(
-                    {"inline_data": {"mime_type": "image/jpeg", "data": pose_b64}}
-                )
+            contents = [ornament_part]
+            if pose_part:
+                contents.append(pose_part)
 
             # Parse ornament measurements
             import json
@@ -655,8 +636,11 @@ def generate_model_with_ornament_task(self, ornament_image_path, user_id, pose_i
     except Exception as e:
         traceback.print_exc()
         report_handled_exception(e, request=self.request, context={"user_id": user_id})
-        if self.request.retries < self.max_retries:
-            raise self.retry(exc=e, countdown=60 * (self.request.retries + 1))
+        # Safety blocks and bad input are final; the rest back off per failure class
+        countdown = get_retry_countdown(classify_failure(e), self.request.retries,
+                                        minimum=getattr(e, "retry_in", 0))
+        if countdown is not None and self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=countdown)
         return {
             "status": "error",
             "message": str(e),
@@ -671,19 +655,12 @@ def generate_real_model_with_ornament_task(self, model_image_path, ornament_imag
     """
     try:
         # Read images
-        with open(model_image_path, "rb") as f:
-            model_bytes = f.read()
-        model_b64 = base64.b64encode(model_bytes).decode("utf-8")
-        
-        with open(ornament_image_path, "rb") as f:
-            ornament_bytes = f.read()
-        ornament_b64 = base64.b64encode(ornament_bytes).decode("utf-8")
-        
-        pose_b64 = None
+        model_part = image_part_from_file(model_image_path)
+        ornament_part = image_part_from_file(ornament_image_path)
+
+        pose_part = None
         if pose_image_path and os.path.exists(pose_image_path):
-            with open(pose_image_path, "rb") as f:
-                pose_bytes = f.read()
-            pose_b64 = base64.b64encode(pose_bytes).decode("utf-8")
+            pose_part = image_part_from_file(pose_image_path)
 
         if not (getattr(settings, "GEMINI_API_KEY", "") or getattr(settings, "GOOGLE_API_KEY", "")):
             raise Exception("GEMINI/GOOGLE API key not configured")
@@ -691,16 +668,12 @@ def generate_real_model_with_ornament_task(self, model_image_path, ornament_imag
         generated_bytes = None
 
         if has_genai:
-            client = genai.Client()
+            client = get_client()
             model_name = get_image_model_name(default_model=settings.IMAGE_MODEL_NAME)
 
-            contents = [
-                {"inline_data": {"mime_type": "image/jpeg", "data": ornament_b64}},
-                {"inline_data": {"mime_type": "image/jpeg", "data": model_b64}},
-            ]
-            if pose_b64:
-                contents.append(
-                    {"inline_data": {"mime_type": "image/jpeg", "data": pose_b64}})
+            contents = [ornament_part, model_part]
+            if pose_part:
+                contents.append(pose_part)
 
             # Parse ornament measurements
             import json
@@ -837,8 +810,11 @@ def generate_real_model_with_ornament_task(self, model_image_path, ornament_imag
     except Exception as e:
         traceback.print_exc()
         report_handled_exception(e, request=self.request, context={"user_id": user_id})
-        if self.request.retries < self.max_retries:
-            raise self.retry(exc=e, countdown=60 * (self.request.retries + 1))
+        # Safety blocks and bad input are final; the rest back off per failure class
+        countdown = get_retry_countdown(classify_failure(e), self.request.retries,
+                                        minimum=getattr(e, "retry_in", 0))
+        if countdown is not None and self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=countdown)
         return {
             "status": "error",
             "message": str(e),
@@ -866,7 +842,7 @@ def generate_campaign_shot_advanced_task(
     try:
         # Upload ornaments to Cloudinary & encode
         ornament_urls = []
-        ornament_b64_list = []
+        ornament_list = []
 
         # Parse optional per-ornament measurements (JSON array of dicts)
         import json
@@ -877,9 +853,6 @@ def generate_campaign_shot_advanced_task(
             ornament_measurements_list = []
 
         for idx, ornament_path in enumerate(ornament_image_paths):
-            with open(ornament_path, "rb") as f:
-                ornament_bytes = f.read()
-            
             # Upload
             result = cloudinary.uploader.upload(
                 ornament_path, folder="ornaments", overwrite=True)
@@ -901,32 +874,27 @@ def generate_campaign_shot_advanced_task(
             ):
                 per_ornament_measurements = ornament_measurements_list[idx]
 
-            ornament_b64_list.append({
+            ornament_list.append({
                 "name": ornament_name,
                 "type": ornament_type,
                 "measurements": per_ornament_measurements,
-                "data": base64.b64encode(ornament_bytes).decode('utf-8')
+                "part": image_part_from_file(ornament_path)
             })
 
         # Model upload & encoding
         model_url = None
-        model_b64 = None
+        model_part = None
         if model_image_path and os.path.exists(model_image_path):
-            with open(model_image_path, "rb") as f:
-                model_bytes = f.read()
             model_upload = cloudinary.uploader.upload(
                 model_image_path, folder="models", overwrite=True)
             model_url = model_upload['secure_url']
-            model_b64 = base64.b64encode(model_bytes).decode('utf-8')
+            model_part = image_part_from_file(model_image_path)
 
         # Theme images encoding
-        theme_b64_list = []
+        theme_parts = []
         for theme_path in theme_image_paths:
             if os.path.exists(theme_path):
-                with open(theme_path, "rb") as f:
-                    theme_bytes = f.read()
-                theme_b64_list.append(base64.b64encode(
-                    theme_bytes).decode('utf-8'))
+                theme_parts.append(image_part_from_file(theme_path))
 
         # Check Gemini configuration
         if not (getattr(settings, "GEMINI_API_KEY", "") or getattr(settings, "GOOGLE_API_KEY", "")):
@@ -935,22 +903,19 @@ def generate_campaign_shot_advanced_task(
             raise Exception("Gemini SDK not available. Please install or configure it.")
 
         # Build Gemini request
-        client = genai.Client()
+        client = get_client()
         model_name = get_image_model_name(default_model=settings.IMAGE_MODEL_NAME)
 
         parts = []
 
         # Model (optional)
-        if model_b64:
-            parts.append(
-                {"inline_data": {"mime_type": "image/jpeg", "data": model_b64}})
+        if model_part:
+            parts.append(model_part)
             parts.append({"text": "Reference for the real model."})
 
         # Ornaments
-        for ornament in ornament_b64_list:
-            parts.append(
-                {"inline_data": {"mime_type": "image/jpeg", "data": ornament["data"]}}
-            )
+        for ornament in ornament_list:
+            parts.append(ornament["part"])
             type_text = f" (type: {ornament['type']})" if ornament.get("type") else ""
 
             measurements_text = ""
@@ -970,9 +935,8 @@ def generate_campaign_shot_advanced_task(
             )
 
         # Themes (optional)
-        for theme_b64 in theme_b64_list:
-            parts.append(
-                {"inline_data": {"mime_type": "image/jpeg", "data": theme_b64}})
+        for theme_part in theme_parts:
+            parts.append(theme_part)
             parts.append(
                 {"text": "Reference for background or theme styling."})
 
@@ -1068,8 +1032,11 @@ def generate_campaign_shot_advanced_task(
     except Exception as e:
         traceback.print_exc()
         report_handled_exception(e, request=self.request, context={"user_id": user_id})
-        if self.request.retries < self.max_retries:
-            raise self.retry(exc=e, countdown=60 * (self.request.retries + 1))
+        # Safety blocks and bad input are final; the rest back off per failure class
+        countdown = get_retry_countdown(classify_failure(e), self.request.retries,
+                                        minimum=getattr(e, "retry_in", 0))
+        if countdown is not None and self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=countdown)
         return {
             "status": "error",
             "message": str(e)
@@ -1124,7 +1091,6 @@ def regenerate_image_task(self, image_id, user_id, new_prompt):
         # Download the previous generated image from Cloudinary
         with urlopen(prev_generated_url) as resp:
             img_bytes = resp.read()
-        img_b64 = base64.b64encode(img_bytes).decode("utf-8")
 
         # Generate new image using Gemini
         generated_bytes = None
@@ -1133,11 +1099,11 @@ def regenerate_image_task(self, image_id, user_id, new_prompt):
             if not (getattr(settings, "GEMINI_API_KEY", "") or getattr(settings, "GOOGLE_API_KEY", "")):
                 raise Exception("GEMINI/GOOGLE API key not configured")
 
-            client = genai.Client()
+            client = get_client()
             model_name = get_image_model_name(default_model=settings.IMAGE_MODEL_NAME)
 
             contents = [
-                {"inline_data": {"mime_type": "image/jpeg", "data": img_b64}},
+                image_part(img_bytes),
                 {"text": combined_prompt},
                 {"text": measurements_text}
             ]
@@ -1270,8 +1236,11 @@ def regenerate_image_task(self, image_id, user_id, new_prompt):
     except Exception as e:
         traceback.print_exc()
         report_handled_exception(e, request=self.request, context={"user_id": user_id})
-        if self.request.retries < self.max_retries:
-            raise self.retry(exc=e, countdown=60 * (self.request.retries + 1))
+        # Safety blocks and bad input are final; the rest back off per failure class
+        countdown = get_retry_countdown(classify_failure(e), self.request.retries,
+                                        minimum=getattr(e, "retry_in", 0))
+        if countdown is not None and self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=countdown)
         return {
             "success": False,
             "error": str(e),
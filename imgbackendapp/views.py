@@ -35,6 +35,8 @@ from .tasks import (
     generate_campaign_shot_advanced_task,
     regenerate_image_task
 )
+from probackendapp.utils import enqueue_interactive_task
+from probackendapp.image_preflight import normalized_content_file, save_normalized_upload
 
 # Check for Gemini SDK
 try:
@@ -54,7 +56,9 @@ def upload_ornament(request):
 
     form = OrnamentForm(request.POST, request.FILES)
     if form.is_valid():
-        ornament = form.save()
+        ornament = form.save(commit=False)
+        ornament.image = normalized_content_file(request.FILES["image"], "ornament")
+        ornament.save()
         try:
             bg_color = request.POST.get(
                 "background_color", "white").strip()
@@ -62,7 +66,8 @@ def upload_ornament(request):
             dimension = request.POST.get("dimension", "1:1").strip()
 
             # Call Celery task asynchronously
-            task = generate_white_background_task.delay(
+            task = enqueue_interactive_task(
+                generate_white_background_task,
                 ornament_id=ornament.id,
                 user_id=user_id,
                 bg_color=bg_color,
@@ -169,20 +174,16 @@ def change_background(request):
         for idx, ornament in enumerate(ornaments):
             base_name, ext = os.path.splitext(ornament.name)
             safe_name = f"{base_name}_{idx}{ext}" if len(ornaments) > 1 else ornament.name
-            local_uploaded_path = os.path.join(upload_dir, safe_name)
-            with open(local_uploaded_path, "wb+") as dest:
-                for chunk in ornament.chunks():
-                    dest.write(chunk)
+            local_uploaded_path = save_normalized_upload(
+                ornament, os.path.join(upload_dir, safe_name), "ornament")
             ornament_image_paths.append(local_uploaded_path)
 
         background_image_path = None
         if background:
             bg_dir = os.path.join(settings.MEDIA_ROOT, "uploaded_backgrounds")
             os.makedirs(bg_dir, exist_ok=True)
-            background_image_path = os.path.join(bg_dir, background.name)
-            with open(background_image_path, "wb+") as dest:
-                for chunk in background.chunks():
-                    dest.write(chunk)
+            background_image_path = save_normalized_upload(
+                background, os.path.join(bg_dir, background.name), "background")
 
         task_kwargs = {
             "uploaded_image_paths": ornament_image_paths,
@@ -197,7 +198,7 @@ def change_background(request):
         if len(ornament_image_paths) == 1 and num_images > 1:
             task_ids = []
             for _ in range(num_images):
-                task = change_background_task.delay(**task_kwargs)
+                task = enqueue_interactive_task(change_background_task, **task_kwargs)
                 task_ids.append(task.id)
             return JsonResponse({
                 "success": True,
@@ -206,7 +207,7 @@ def change_background(request):
                 "status": "processing",
             })
 
-        task = change_background_task.delay(**task_kwargs)
+        task = enqueue_interactive_task(change_background_task, **task_kwargs)
         return JsonResponse({
             "success": True,
             "message": "Background change task started",
@@ -281,23 +282,20 @@ def generate_model_with_ornament(request):
         upload_dir = os.path.join(
             settings.MEDIA_ROOT, "uploaded_ornaments")
         os.makedirs(upload_dir, exist_ok=True)
-        local_uploaded_path = os.path.join(upload_dir, ornament_img.name)
-        with open(local_uploaded_path, "wb+") as dest:
-            for chunk in ornament_img.chunks():
-                dest.write(chunk)
+        local_uploaded_path = save_normalized_upload(
+            ornament_img, os.path.join(upload_dir, ornament_img.name), "ornament")
 
         # STEP 2: Save pose image locally (if provided)
         pose_image_path = None
         if pose_img:
             pose_dir = os.path.join(settings.MEDIA_ROOT, "uploaded_poses")
             os.makedirs(pose_dir, exist_ok=True)
-            pose_image_path = os.path.join(pose_dir, pose_img.name)
-            with open(pose_image_path, "wb+") as dest:
-                for chunk in pose_img.chunks():
-                    dest.write(chunk)
+            pose_image_path = save_normalized_upload(
+                pose_img, os.path.join(pose_dir, pose_img.name), "pose")
 
         # Call Celery task asynchronously
-        task = generate_model_with_ornament_task.delay(
+        task = enqueue_interactive_task(
+            generate_model_with_ornament_task,
             ornament_image_path=local_uploaded_path,
             user_id=user_id,
             pose_image_path=pose_image_path,
@@ -395,31 +393,25 @@ def generate_real_model_with_ornament(request):
         os.makedirs(model_dir, exist_ok=True)
         os.makedirs(ornament_dir, exist_ok=True)
 
-        local_model_path = os.path.join(model_dir, model_img.name)
-        local_ornament_path = os.path.join(ornament_dir, ornament_img.name)
-
         # Save model image locally
-        with open(local_model_path, "wb+") as dest:
-            for chunk in model_img.chunks():
-                dest.write(chunk)
+        local_model_path = save_normalized_upload(
+            model_img, os.path.join(model_dir, model_img.name), "model")
 
         # Save ornament image locally
-        with open(local_ornament_path, "wb+") as dest:
-            for chunk in ornament_img.chunks():
-                dest.write(chunk)
+        local_ornament_path = save_normalized_upload(
+            ornament_img, os.path.join(ornament_dir, ornament_img.name), "ornament")
 
         # Save pose image locally (if provided)
         pose_image_path = None
         if pose_img:
             pose_dir = os.path.join(settings.MEDIA_ROOT, "uploaded_poses")
             os.makedirs(pose_dir, exist_ok=True)
-            pose_image_path = os.path.join(pose_dir, pose_img.name)
-            with open(pose_image_path, "wb+") as dest:
-                for chunk in pose_img.chunks():
-                    dest.write(chunk)
+            pose_image_path = save_normalized_upload(
+                pose_img, os.path.join(pose_dir, pose_img.name), "pose")
 
         # Call Celery task asynchronously
-        task = generate_real_model_with_ornament_task.delay(
+        task = enqueue_interactive_task(
+            generate_real_model_with_ornament_task,
             model_image_path=local_model_path,
             ornament_image_path=local_ornament_path,
             user_id=user_id,
@@ -521,10 +513,8 @@ def generate_campaign_shot_advanced(request):
         os.makedirs(ornament_dir, exist_ok=True)
         ornament_image_paths = []
         for idx, ornament in enumerate(ornaments):
-            ornament_path = os.path.join(ornament_dir, ornament.name)
-            with open(ornament_path, "wb+") as dest:
-                for chunk in ornament.chunks():
-                    dest.write(chunk)
+            ornament_path = save_normalized_upload(
+                ornament, os.path.join(ornament_dir, ornament.name), "ornament")
             ornament_image_paths.append(ornament_path)
 
         # === Save model image locally (if provided) ===
@@ -532,24 +522,21 @@ def generate_campaign_shot_advanced(request):
         if model_img:
             model_dir = os.path.join(settings.MEDIA_ROOT, "uploaded_models")
             os.makedirs(model_dir, exist_ok=True)
-            model_image_path = os.path.join(model_dir, model_img.name)
-            with open(model_image_path, "wb+") as dest:
-                for chunk in model_img.chunks():
-                    dest.write(chunk)
+            model_image_path = save_normalized_upload(
+                model_img, os.path.join(model_dir, model_img.name), "model")
 
         # === Save theme images locally ===
         theme_dir = os.path.join(settings.MEDIA_ROOT, "uploaded_themes")
         os.makedirs(theme_dir, exist_ok=True)
         theme_image_paths = []
         for theme in theme_images:
-            theme_path = os.path.join(theme_dir, theme.name)
-            with open(theme_path, "wb+") as dest:
-                for chunk in theme.chunks():
-                    dest.write(chunk)
+            theme_path = save_normalized_upload(
+                theme, os.path.join(theme_dir, theme.name), "theme")
             theme_image_paths.append(theme_path)
 
         # Call Celery task asynchronously
-        task = generate_campaign_shot_advanced_task.delay(
+        task = enqueue_interactive_task(
+            generate_campaign_shot_advanced_task,
             user_id=user_id,
             model_type=model_type,
             model_image_path=model_image_path,
@@ -879,7 +866,8 @@ def regenerate_image(request):
             return JsonResponse({"error": "You don't have permission to regenerate this image"}, status=403)
 
         # Call Celery task asynchronously
-        task = regenerate_image_task.delay(
+        task = enqueue_interactive_task(
+            regenerate_image_task,
             image_id=image_id,
             user_id=user_id,
             new_prompt=new_prompt
@@ -0,0 +1,212 @@
+"""
+Content-addressed cache of reference-image analyses.
+
+The same mood-board and theme images are uploaded into many collections.
+Their Gemini vision analysis only depends on the image bytes, the category
+and the analysis prompt, so it is cached under
+
+  sha256(image bytes) : category : prompt version
+
+where the prompt version is a hash of the resolved <category>_analysis_prompt
+(PromptMaster entry, or its default in analysisprompt.py). Editing,
+deactivating or deleting that entry changes the version, so entries made
+with an older prompt are never served again;
+invalidate_analysis_cache() additionally drops them right away.
+
+  MongoDB  image_analysis_cache           durable store, TTL on last use
+  Redis    analysis:cache:<cat>:<ver>:<sha>  front, sliding TTL
+  Redis    analysis:cache:touched:<key>   marker, last_used_at refreshed today
+  Redis    analysis:cache:stats           hash of <category>:<outcome> counts
+
+Outcomes are redis_hit, mongo_hit and miss. Hits are only counted in Redis;
+entries have no hits field (the daily touch removes it from entries written
+before). A Redis hit writes MongoDB's last_used_at at most once a day per
+entry, which is plenty for a 90-day TTL.
+"""
+
+import hashlib
+import json
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_CACHE_PREFIX = 'analysis:cache'
+ANALYSIS_CACHE_STATS_KEY = 'analysis:cache:stats'
+ANALYSIS_CACHE_TOUCHED_PREFIX = 'analysis:cache:touched'
+# Redis is only the hot front; every use pushes the expiry out again
+ANALYSIS_CACHE_REDIS_TTL_SECONDS = 7 * 24 * 60 * 60
+# How stale MongoDB's last_used_at may get while Redis serves the entry
+ANALYSIS_CACHE_TOUCH_SECONDS = 24 * 60 * 60
+
+CACHE_OUTCOMES = ('redis_hit', 'mongo_hit', 'miss')
+
+
+def _redis():
+    from .queue_load_manager import get_redis_client
+    return get_redis_client()
+
+
+def get_analysis_prompt_key(category: str) -> str:
+    """PromptMaster key of a category's analysis prompt."""
+    return f'{category}_analysis_prompt'
+
+
+def get_analysis_prompt(category: str) -> str:
+    """Resolved analysis prompt of a category."""
+    from .analysisprompt import ANALYSIS_PROMPTS, theme_prompt
+    from .prompt_initializer import get_prompt_from_db
+
+    return get_prompt_from_db(get_analysis_prompt_key(category),
+                              ANALYSIS_PROMPTS.get(category, theme_prompt))
+
+
+def get_prompt_version(prompt: str) -> str:
+    """Version of an analysis prompt: a hash of its text."""
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]
+
+
+def get_analysis_cache_key(content_hash: str, category: str, prompt_version: str) -> str:
+    """Cache key of one analysis, also used as the Redis key."""
+    return f'{ANALYSIS_CACHE_PREFIX}:{category}:{prompt_version}:{content_hash}'
+
+
+def _count(category: str, outcome: str):
+    try:
+        _redis().hincrby(ANALYSIS_CACHE_STATS_KEY, f'{category}:{outcome}', 1)
+    except Exception:
+        pass
+
+
+def get_cached_analysis(image_bytes: bytes, category: str, prompt: str):
+    """
+    Look up the analysis of an image.
+
+    Returns:
+        Tuple (cache key, result dict or None on a miss)
+    """
+    from .models import ImageAnalysisCacheEntry
+
+    content_hash = hashlib.sha256(image_bytes).hexdigest()
+    key = get_analysis_cache_key(content_hash, category, get_prompt_version(prompt))
+
+    try:
+        r = _redis()
+        raw = r.get(key)
+        if raw:
+            r.expire(key, ANALYSIS_CACHE_REDIS_TTL_SECONDS)
+            _count(category, 'redis_hit')
+            if r.set(f'{ANALYSIS_CACHE_TOUCHED_PREFIX}:{key}', 1, nx=True, ex=ANALYSIS_CACHE_TOUCH_SECONDS):
+                # Also drops the per-entry hits counter older entries carry
+                ImageAnalysisCacheEntry._get_collection().update_one(
+                    {'key': key},
+                    {'$set': {'last_used_at': datetime.utcnow()}, '$unset': {'hits': ''}},
+                )
+            return key, json.loads(raw)
+    except Exception as e:
+        logger.warning(f"Analysis cache front unavailable: {e}")
+
+    entry = ImageAnalysisCacheEntry.objects(key=key).modify(
+        set__last_used_at=datetime.utcnow(), new=True)
+    if entry:
+        _count(category, 'mongo_hit')
+        _set_front(key, entry.result)
+        return key, dict(entry.result)
+
+    _count(category, 'miss')
+    return key, None
+
+
+def store_analysis(key: str, category: str, result: dict):
+    """Cache a fresh analysis under the key from get_cached_analysis()."""
+    from .models import ImageAnalysisCacheEntry
+
+    _, prompt_version, content_hash = key.rsplit(':', 2)
+    now = datetime.utcnow()
+    ImageAnalysisCacheEntry.objects(key=key).update_one(
+        upsert=True,
+        set__result=result,
+        set__last_used_at=now,
+        set_on_insert__content_hash=content_hash,
+        set_on_insert__category=category,
+        set_on_insert__prompt_version=prompt_version,
+        set_on_insert__created_at=now,
+    )
+    _set_front(key, result)
+
+
+def _set_front(key: str, result: dict):
+    try:
+        _redis().set(key, json.dumps(result), ex=ANALYSIS_CACHE_REDIS_TTL_SECONDS)
+    except Exception as e:
+        logger.warning(f"Could not cache analysis {key} in Redis: {e}")
+
+
+def invalidate_analysis_cache(category: str, keep_current: bool = True) -> int:
+    """
+    Drop cached analyses of a category, e.g. after its analysis prompt changed.
+
+    Args:
+        category: Workflow category
+        keep_current: Keep entries made with the current prompt version
+
+    Returns:
+        Number of MongoDB entries removed
+    """
+    from .models import ImageAnalysisCacheEntry
+
+    current = get_prompt_version(get_analysis_prompt(category)) if keep_current else None
+    query = ImageAnalysisCacheEntry.objects(category=category)
+    if current:
+        query = query.filter(prompt_version__ne=current)
+    removed = query.delete()
+
+    try:
+        r = _redis()
+        stale = [key for key in r.scan_iter(match=f'{ANALYSIS_CACHE_PREFIX}:{category}:*', count=500)
+                 if key.split(':')[3] != current]
+        for start in range(0, len(stale), 500):
+            r.delete(*stale[start:start + 500])
+    except Exception as e:
+        logger.warning(f"Could not invalidate Redis analysis cache for {category}: {e}")
+    return removed
+
+
+def invalidate_for_prompt_key(prompt_key: str) -> int:
+    """Invalidate after a PromptMaster change if the key is an analysis prompt."""
+    from .analysisprompt import ANALYSIS_PROMPTS
+
+    for category in ANALYSIS_PROMPTS:
+        if prompt_key == get_analysis_prompt_key(category):
+            try:
+                return invalidate_analysis_cache(category)
+            except Exception as e:
+                logger.warning(f"Could not invalidate analysis cache for {prompt_key}: {e}")
+    return 0
+
+
+def get_analysis_cache_stats() -> dict:
+    """Hit counts and hit rates per category and overall."""
+    from .models import ImageAnalysisCacheEntry
+
+    raw = _redis().hgetall(ANALYSIS_CACHE_STATS_KEY)
+    categories = {}
+    for field, value in raw.items():
+        category, outcome = field.rsplit(':', 1)
+        categories.setdefault(category, dict.fromkeys(CACHE_OUTCOMES, 0))[outcome] = int(value)
+
+    def with_rate(counts):
+        lookups = sum(counts.values())
+        hits = counts['redis_hit'] + counts['mongo_hit']
+        return {**counts, 'lookups': lookups, 'hit_rate': round(hits / lookups, 4) if lookups else None}
+
+    total = dict.fromkeys(CACHE_OUTCOMES, 0)
+    for counts in categories.values():
+        for outcome in CACHE_OUTCOMES:
+            total[outcome] += counts[outcome]
+
+    return {
+        'categories': {category: with_rate(counts) for category, counts in sorted(categories.items())},
+        'total': with_rate(total),
+        'entries': ImageAnalysisCacheEntry.objects.count(),
+    }
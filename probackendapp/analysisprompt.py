@@ -80,3 +80,13 @@ STRICT RULES:
 
 Return only one clean paragraph.
 """
+
+
+# Defaults of the <category>_analysis_prompt PromptMaster entries
+ANALYSIS_PROMPTS = {
+    'theme': theme_prompt,
+    'background': background_prompt,
+    'pose': pose_prompt,
+    'location': location_prompt,
+    'color': color_prompt,
+}
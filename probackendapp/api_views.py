@@ -13,12 +13,24 @@ from .views import (
 from users.models import User
 from organization.models import Organization
 from .models import Project, Collection, CollectionItem, ProjectRole, ProjectMember, UploadedImage, PromptMaster
-from .permissions import get_user_role_in_project
+from .permissions import can_access_job, check_job_access, get_user_role_in_project, require_collection_role
 import re
 import logging
 from cloudinary.utils import cloudinary_url
 from .models import Project, ProjectInvite, ProjectMember, ImageGenerationHistory
 from .job_models import ImageGenerationJob
+from .job_progress import init_job_progress, wait_for_job_delta
+from .job_cancellation import cancel_job
+from .analysis_cache import invalidate_for_prompt_key
+from .prompt_registry import invalidate_prompt_registry
+from .image_results import (
+    get_generated_images_by_product,
+    page_generated_images_by_product,
+    count_generated_images,
+    clear_generated_images,
+    remove_product_generated_images,
+    page_product_generated_images,
+)
 from django.views.decorators.csrf import csrf_exempt
 from django.shortcuts import get_object_or_404
 from mongoengine.errors import DoesNotExist
@@ -27,9 +39,7 @@ from django.conf import settings
 from common.user_friendly_errors import get_user_friendly_message
 import json
 import os
-from datetime import datetime, timezone, timedelta
-import cloudinary
-import cloudinary.uploader
+from datetime import datetime, timezone
 import jwt
 
 logger = logging.getLogger(__name__)
@@ -59,6 +69,20 @@ def get_project_by_id_or_slug(project_id):
             raise DoesNotExist(f"Project with ID or slug '{project_id}' not found")
 
 
+def get_generated_images_page(request):
+    """
+    Page of generated images embedded per product in collection reads.
+    Query params: images_page (default 1), images_page_size (default 20, max 100).
+    Invalid values fall back to the defaults.
+    """
+    try:
+        page = int(request.GET.get("images_page", 1))
+        page_size = int(request.GET.get("images_page_size", 20))
+    except (TypeError, ValueError):
+        page, page_size = 1, 20
+    return max(1, page), max(1, min(page_size, 100))
+
+
 @api_view(['GET','OPTIONS'])
 @csrf_exempt
 @authenticate
@@ -86,25 +110,15 @@ def api_projects_list(request):
                 # Get the first collection for each project
                 collection = Collection.objects(project=project).first()
 
-                # Calculate total images
                 # Calculate total images
                 total_images = 0
                 if collection and collection.items:
                     for item in collection.items:
-                        # Check each product image under the item
-                        if item.product_images:
-                            for prod_img in item.product_images:
-                                total_images += 1  # count the product image itself
+                        # count the product images themselves
+                        total_images += len(item.product_images or [])
 
-                                # Count generated images under this product
-                                if hasattr(prod_img, "generated_images") and prod_img.generated_images:
-                                    for gen_img in prod_img.generated_images:
-                                        total_images += 1  # count generated image
-
-                                        # Count regenerated images under this generated image
-                                        if hasattr(gen_img, "regenerated_images") and gen_img.regenerated_images:
-                                            total_images += len(
-                                                gen_img.regenerated_images)
+                    # Count generated and regenerated images
+                    total_images += count_generated_images(collection)
 
                 # Build team members list safely, handling invalid user references
                 team_members_data = []
@@ -202,6 +216,10 @@ def api_project_detail(request, project_id):
                 'items': []
             }
 
+            images_page, images_page_size = get_generated_images_page(request)
+            generated_by_product, generated_totals = page_generated_images_by_product(
+                collection, page=images_page, page_size=images_page_size)
+
             for item in collection.items:
                 item_data = {
                     'suggested_themes': item.suggested_themes or [],
@@ -228,11 +246,12 @@ def api_project_detail(request, project_id):
                 }
 
                 # Add product images data
-                for product_img in item.product_images:
+                for idx, product_img in enumerate(item.product_images):
                     product_data = {
                         'uploaded_image_url': product_img.uploaded_image_url,
                         'uploaded_image_path': product_img.uploaded_image_path,
-                        'generated_images': product_img.generated_images or [],
+                        'generated_images': generated_by_product.get(idx, []),
+                        'generated_images_total': generated_totals.get(idx, 0),
                         'generation_selections': product_img.generation_selections if hasattr(product_img, 'generation_selections') and product_img.generation_selections else {
                             'plainBg': False,
                             'bgReplace': False,
@@ -390,6 +409,10 @@ def api_collection_detail(request, collection_id):
             'items': []
         }
 
+        images_page, images_page_size = get_generated_images_page(request)
+        generated_by_product, generated_totals = page_generated_images_by_product(
+            collection, page=images_page, page_size=images_page_size)
+
         for item in collection.items:
             item_data = {
                 'suggested_themes': item.suggested_themes or [],
@@ -417,11 +440,12 @@ def api_collection_detail(request, collection_id):
                 'product_images': []
             }
 
-            for product_img in item.product_images:
+            for idx, product_img in enumerate(item.product_images):
                 product_data = {
                     'uploaded_image_url': product_img.uploaded_image_url,
                     'uploaded_image_path': product_img.uploaded_image_path,
-                    'generated_images': product_img.generated_images or [],
+                    'generated_images': generated_by_product.get(idx, []),
+                    'generated_images_total': generated_totals.get(idx, 0),
                     'generation_selections': product_img.generation_selections if hasattr(product_img, 'generation_selections') and product_img.generation_selections else {
                         'plainBg': False,
                         'bgReplace': False,
@@ -551,30 +575,23 @@ def api_project_setup_description(request, project_id):
         return Response({'error': str(e)}, status=500)
 
 
-def analyze_uploaded_image(cloud_url, category):
+def analyze_uploaded_image(cloud_url, category, image_bytes=None, mime_type=None):
     """
     Analyze an uploaded image using Gemini Vision API based on its category.
     Uses the utility function from utils.py for REST API calls.
     Returns a descriptive analysis paragraph.
     For theme images, also extracts ornament_type, angle_shot, and theme_description.
+    Pass image_bytes when the file is at hand to skip downloading cloud_url.
+
+    Results are cached by image content, category and analysis prompt
+    version (see analysis_cache.py); a hit makes no Gemini call.
     """
     try:
-        from .analysisprompt import (
-            theme_prompt, background_prompt, pose_prompt,
-            location_prompt, color_prompt
-        )
+        from .analysis_cache import get_analysis_prompt, get_cached_analysis, store_analysis
         from .utils import call_gemini_api
 
-        # Map category to appropriate prompt
-        category_prompts = {
-            'theme': theme_prompt,
-            'background': background_prompt,
-            'pose': pose_prompt,
-            'location': location_prompt,
-            'color': color_prompt
-        }
-
-        analysis_prompt = category_prompts.get(category, theme_prompt)
+        # <category>_analysis_prompt from PromptMaster, else the analysisprompt.py default
+        analysis_prompt = get_analysis_prompt(category)
 
         # Check if Gemini API key is configured
         import os
@@ -585,12 +602,30 @@ def analyze_uploaded_image(cloud_url, category):
             return {"analysis": "", "ornament_type": "", "angle_shot": "", "theme_description": ""}
 
         # Use the utility function to call Gemini API with image URL
-        if not cloud_url:
+        if not cloud_url and image_bytes is None:
             print("⚠️ No cloud URL provided for image analysis")
             return {"analysis": "", "ornament_type": "", "angle_shot": "", "theme_description": ""}
 
-        print(f"DEBUG: Analyzing {category} image from URL: {cloud_url}")
-        analysis_result = call_gemini_api(analysis_prompt, image_url=cloud_url)
+        # The cache is keyed by content, so fetch the bytes once here
+        if image_bytes is None:
+            import requests
+            img_response = requests.get(cloud_url, timeout=30)
+            img_response.raise_for_status()
+            image_bytes = img_response.content
+            mime_type = img_response.headers.get("content-type", "image/jpeg").split(";")[0]
+
+        cache_key = None
+        try:
+            cache_key, cached = get_cached_analysis(image_bytes, category, analysis_prompt)
+            if cached:
+                print(f"DEBUG: Analysis cache hit for {category} image")
+                return cached
+        except Exception as cache_error:
+            print(f"⚠️ Analysis cache unavailable: {cache_error}")
+
+        print(f"DEBUG: Analyzing {category} image from {len(image_bytes)} bytes")
+        analysis_result = call_gemini_api(
+            analysis_prompt, image_bytes=image_bytes, mime_type=mime_type)
 
         if analysis_result:
             print("DEBUG: Analysis completed successfully")
@@ -598,9 +633,16 @@ def analyze_uploaded_image(cloud_url, category):
 
             # For theme images, extract ornament_type, angle_shot, and theme_description
             if category == 'theme':
-                return extract_theme_analysis(analysis_text)
+                result = extract_theme_analysis(analysis_text)
             else:
-                return {"analysis": analysis_text, "ornament_type": "", "angle_shot": "", "theme_description": ""}
+                result = {"analysis": analysis_text, "ornament_type": "", "angle_shot": "", "theme_description": ""}
+
+            if cache_key and isinstance(result, dict) and result.get("analysis"):
+                try:
+                    store_analysis(cache_key, category, result)
+                except Exception as cache_error:
+                    print(f"⚠️ Could not cache analysis: {cache_error}")
+            return result
         else:
             print("⚠️ Gemini API returned no analysis result")
             return {"analysis": "", "ornament_type": "", "angle_shot": "", "theme_description": ""}
@@ -900,7 +942,6 @@ def api_upload_workflow_image(request, project_id, collection_id):
             print("DEBUG: No collection items found")
             return Response({'error': 'No collection items found'}, status=404)
 
-        item = collection.items[0]
         print(f"DEBUG: Collection item found")
 
         # Get uploaded files and category
@@ -943,133 +984,56 @@ def api_upload_workflow_image(request, project_id, collection_id):
             settings.MEDIA_ROOT, "workflow_images", category)
         os.makedirs(local_dir, exist_ok=True)
 
+        import uuid
+        from .image_preflight import save_normalized_upload
+
         uploaded_images = []
 
         for file in uploaded_files:
             # Generate unique filename
             timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
             filename = f"{timestamp}_{file.name}"
-            local_path = os.path.join(local_dir, filename)
-
-            # Save locally
-            with open(local_path, "wb") as f:
-                for chunk in file.chunks():
-                    f.write(chunk)
-
-            # Reset file pointer to beginning for Cloudinary upload
-            file.seek(0)
-
-            # Upload to Cloudinary
-            upload_result = cloudinary.uploader.upload(
-                file,
-                folder=f"workflow_images/{category}",
-                public_id=f"{category}_{timestamp}_{os.path.splitext(file.name)[0]}",
-                overwrite=True
-            )
-            cloud_url = upload_result.get("secure_url")
 
-            # Analyze the image based on its category using cloud URL
-            print(f"DEBUG: Analyzing {category} image: {filename}")
-            analysis_result = analyze_uploaded_image(cloud_url, category)
-
-            # Handle both old format (string) and new format (dict)
-            if isinstance(analysis_result, dict):
-                analysis_text = analysis_result.get("analysis", "")
-                ornament_type = analysis_result.get("ornament_type", "")
-                angle_shot = analysis_result.get("angle_shot", "")
-                theme_description = analysis_result.get(
-                    "theme_description", analysis_text)
-            else:
-                # Legacy format (string)
-                analysis_text = analysis_result if analysis_result else ""
-                ornament_type = ""
-                angle_shot = ""
-                theme_description = analysis_text
-
-            if analysis_text:
-                print(f"DEBUG: Analysis completed for {filename}")
-                if category == 'theme' and ornament_type:
-                    print(
-                        f"DEBUG: Extracted ornament_type: {ornament_type}, angle_shot: {angle_shot}")
-            else:
-                print(f"DEBUG: Analysis returned empty for {filename}")
-
-            # For theme images: Store analysis as JSON with type and description (angle shot included in description)
-            if category == 'theme':
-                # The analysis from extract_theme_analysis is already a JSON string with type and description
-                # where description includes the angle shot
-                if isinstance(analysis_result, dict):
-                    analysis_text = analysis_result.get("analysis", "")
-                    if not analysis_text:
-                        # Fallback: create JSON structure if extraction failed
-                        import json
-                        ornament_readable = ornament_type.replace(
-                            '_', ' ').replace('-', ' ') if ornament_type else ""
-                        angle_readable = angle_shot.replace(
-                            '_', ' ').replace('-', ' ') if angle_shot else ""
-                        description_with_angle = theme_description
-                        if angle_readable and angle_readable.lower() not in theme_description.lower():
-                            description_with_angle = f"{theme_description} The overall angle shot is {angle_readable}."
-                        analysis_json = {
-                            "type": ornament_readable,
-                            "description": description_with_angle
-                        }
-                        analysis_text = json.dumps(analysis_json)
-                    print(
-                        f"DEBUG: Stored theme analysis as JSON with type and description (angle shot included in description)")
-                else:
-                    # Legacy format: create JSON structure
-                    import json
-                    ornament_readable = ornament_type.replace(
-                        '_', ' ').replace('-', ' ') if ornament_type else ""
-                    angle_readable = angle_shot.replace(
-                        '_', ' ').replace('-', ' ') if angle_shot else ""
-                    description_with_angle = theme_description
-                    if angle_readable and angle_readable.lower() not in theme_description.lower():
-                        description_with_angle = f"{theme_description} The overall angle shot is {angle_readable}."
-                    analysis_json = {
-                        "type": ornament_readable,
-                        "description": description_with_angle
-                    }
-                    analysis_text = json.dumps(analysis_json)
-                    print(
-                        f"DEBUG: Created JSON analysis for theme image (type and description with angle shot)")
+            # Save a normalised copy locally; Cloudinary upload and analysis
+            # run in the background
+            local_path = save_normalized_upload(
+                file, os.path.join(local_dir, filename), category)
 
-            # Create UploadedImage object with analysis
-            uploaded_image = UploadedImage(
+            uploaded_images.append(UploadedImage(
+                image_id=str(uuid.uuid4()),
+                status="pending",
                 local_path=local_path,
-                cloud_url=cloud_url,
                 original_filename=file.name,
                 uploaded_by=user_id,
                 file_size=file.size,
                 category=category,
-                analysis=analysis_text,  # Store combined analysis for theme, or original for others
-                ornament_type=ornament_type if category == 'theme' else "",  # Only for theme images
-                angle_shot=angle_shot if category == 'theme' else "",  # Only for theme images
-                # Only for theme images
-                theme_description=theme_description if category == 'theme' else ""
-            )
-
-            uploaded_images.append(uploaded_image)
+            ))
 
-        # Add to the appropriate category in the collection item
-        category_field = f"uploaded_{category}_images"
-        if not hasattr(item, category_field):
-            setattr(item, category_field, [])
-
-        current_images = getattr(item, category_field)
-        current_images.extend(uploaded_images)
-        setattr(item, category_field, current_images)
+        from .workflow_uploads import add_pending_uploads, update_uploaded_image
+        from .tasks import process_workflow_images_task
+        from .utils import enqueue_interactive_task
 
-        # Save the collection
-        collection.items[0] = item
-        collection.save()
-
-        # Return the uploaded images data
+        add_pending_uploads(collection_id, category, uploaded_images)
+        try:
+            enqueue_interactive_task(
+                process_workflow_images_task, collection_id, category,
+                [{"image_id": img.image_id, "local_path": img.local_path} for img in uploaded_images],
+            )
+        except Exception as e:
+            # Nothing will process them; don't leave them pending
+            for img in uploaded_images:
+                update_uploaded_image(collection_id, category, img.image_id,
+                                      {"status": "failed", "error": get_user_friendly_message(e)})
+            raise
+
+        # Return the uploaded images data; poll workflow-images/status/ for
+        # cloud_url and analysis
         response_data = []
         for img in uploaded_images:
             response_data.append({
-                'id': str(img.id) if hasattr(img, 'id') else None,
+                'id': img.image_id,
+                'image_id': img.image_id,
+                'status': img.status,
                 'local_path': img.local_path,
                 'cloud_url': img.cloud_url,
                 'original_filename': img.original_filename,
@@ -1083,8 +1047,8 @@ def api_upload_workflow_image(request, project_id, collection_id):
         return Response({
             'success': True,
             'uploaded_images': response_data,
-            'message': f'Successfully uploaded {len(uploaded_images)} {category} image(s)'
-        })
+            'message': f'Uploading {len(uploaded_images)} {category} image(s)'
+        }, status=202)
 
     except Exception as e:
         import traceback
@@ -1093,6 +1057,42 @@ def api_upload_workflow_image(request, project_id, collection_id):
         return Response({'error': str(e)}, status=500)
 
 
+@csrf_exempt
+@api_view(['GET'])
+@authenticate
+def api_workflow_image_status(request, project_id, collection_id):
+    """
+    Status of uploaded workflow images while they are uploaded to Cloudinary
+    and analyzed in the background. Optional ?category= filter.
+    """
+    try:
+        from .workflow_uploads import WORKFLOW_CATEGORIES, get_uploaded_images, settle_stale_uploads
+
+        collection = Collection.objects(id=collection_id).only('project').first()
+        if not collection:
+            return Response({'error': 'Collection not found'}, status=404)
+        if not get_user_role_in_project(request.user, collection.project):
+            return Response({'error': 'You are not a member of this project'}, status=403)
+
+        category = request.GET.get('category')
+        if category and category.rstrip('s') in WORKFLOW_CATEGORIES:
+            category = category.rstrip('s')
+        elif category:
+            return Response({'error': 'Invalid category'}, status=400)
+
+        settle_stale_uploads(collection_id)
+        images = get_uploaded_images(collection_id, category)
+        return Response({
+            'success': True,
+            'images': images,
+            'pending': sum(1 for img in images if img['status'] in ('pending', 'processing')),
+        })
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return Response({'error': str(e)}, status=500)
+
+
 @api_view(['DELETE'])
 @csrf_exempt
 @authenticate
@@ -1150,6 +1150,9 @@ def api_remove_workflow_image(request, project_id, collection_id):
             # Match by id if provided and cloud_url didn't match
             elif image_id and hasattr(img, 'id') and str(img.id) == str(image_id):
                 continue  # Skip this image
+            # Images still uploading have no cloud_url yet
+            elif image_id and getattr(img, 'image_id', None) == str(image_id):
+                continue  # Skip this image
             # Keep the image if it doesn't match
             new_images.append(img)
 
@@ -1174,12 +1177,118 @@ def api_remove_workflow_image(request, project_id, collection_id):
         return Response({'error': str(e)}, status=500)
 
 
+def build_master_analysis_prompt(category, uploaded_imgs):
+    """
+    Build the Gemini prompt that merges the analyses of several reference
+    images of one category into a master analysis.
+
+    Returns:
+        The prompt, or None if fewer than two images have an analysis
+    """
+    # Collect all analyses from this category
+    all_analyses = []
+    image_urls = []
+    for img in uploaded_imgs:
+        if hasattr(img, 'analysis') and img.analysis and img.analysis.strip():
+            # For theme category, extract description from JSON analysis
+            if category == 'theme':
+                try:
+                    # Try to parse as JSON
+                    analysis_json = json.loads(
+                        img.analysis.strip())
+                    if isinstance(analysis_json, dict) and 'description' in analysis_json:
+                        analysis_to_use = analysis_json['description'].strip(
+                        )
+                    else:
+                        # Fallback to theme_description if available
+                        if hasattr(img, 'theme_description') and img.theme_description and img.theme_description.strip():
+                            analysis_to_use = img.theme_description.strip()
+                        else:
+                            analysis_to_use = img.analysis.strip()
+                except (json.JSONDecodeError, TypeError):
+                    # Not JSON, fallback to theme_description or analysis
+                    if hasattr(img, 'theme_description') and img.theme_description and img.theme_description.strip():
+                        analysis_to_use = img.theme_description.strip()
+                    else:
+                        analysis_to_use = img.analysis.strip()
+            else:
+                analysis_to_use = img.analysis.strip()
+
+            all_analyses.append({
+                'filename': img.original_filename,
+                'analysis': analysis_to_use,
+                'cloud_url': img.cloud_url if hasattr(img, 'cloud_url') else None
+            })
+            if hasattr(img, 'cloud_url') and img.cloud_url:
+                image_urls.append(img.cloud_url)
+
+    # If we have multiple analyses, generate master analysis for each image
+    if len(all_analyses) > 1:
+        # Create a prompt to combine all analyses into a master paragraph
+        # Special handling for theme category to include ornament information
+        if category == 'theme':
+            master_prompt = f"""You are a professional image analysis expert specializing in theme analysis. I have {len(all_analyses)} reference images in the {category} category, each with their own theme description (artistic style, mood, creative concept).
+
+Your task is to create a comprehensive master theme description that synthesizes all the individual theme descriptions into a single, cohesive paragraph. The master theme description MUST:
+1. Combine all the key artistic styles, moods, and creative concepts from all images
+2. Identify common themes, patterns, and aesthetic qualities across all images
+3. Highlight unique elements that complement each other
+4. Create a unified description that captures the overall artistic style and mood of the entire set
+5. Focus on artistic style, mood, and creative concept (ornament type and angle shot information are not needed here)
+6. Be written as a flowing, descriptive paragraph (not bullet points)
+
+Individual theme descriptions:
+"""
+        elif category == 'background':
+            master_prompt = f"""You are a professional image analysis expert specializing in background and ornament analysis. I have {len(all_analyses)} reference images in the {category} category, each with their own detailed analysis. 
+
+Your task is to create a comprehensive master analysis that synthesizes all the individual analyses into a single, cohesive paragraph. The master analysis MUST:
+1. Combine all the key visual elements, styles, and characteristics from all images
+2. Identify common themes, patterns, and aesthetic qualities across all images
+3. Highlight unique elements that complement each other
+4. Create a unified description that captures the overall style and mood of the entire set
+5. CRITICALLY IMPORTANT: If ornaments are mentioned, include ALL SPECIFIC ornament types with ALL MODIFIERS and SUBCATEGORIES (e.g., "long necklace", "short necklace", "multi-strand pearl necklace", "jhumka-style earrings", "stud earrings", "delicate necklace", etc.) - DO NOT use generic terms if specific descriptors are available
+6. CRITICALLY IMPORTANT: Preserve ALL ornament type modifiers and subcategories exactly as mentioned
+7. Be written as a flowing, descriptive paragraph (not bullet points)
+
+Individual analyses:
+"""
+        else:
+            master_prompt = f"""You are a professional image analysis expert. I have {len(all_analyses)} reference images in the {category} category, each with their own detailed analysis. 
+
+Your task is to create a comprehensive master analysis that synthesizes all the individual analyses into a single, cohesive paragraph. The master analysis should:
+1. Combine all the key visual elements, styles, and characteristics from all images
+2. Identify common themes, patterns, and aesthetic qualities across all images
+3. Highlight unique elements that complement each other
+4. Create a unified description that captures the overall style and mood of the entire set
+5. Be written as a flowing, descriptive paragraph (not bullet points)
+
+Individual analyses:
+"""
+
+        for idx, img_data in enumerate(all_analyses, 1):
+            master_prompt += f"\nImage {idx} ({img_data['filename']}):\n{img_data['analysis']}\n"
+
+        if category == 'theme':
+            master_prompt += f"\n\nGenerate a comprehensive master theme description paragraph that synthesizes all the above theme descriptions for the {category} category. Focus on artistic style, mood, and creative concept. The paragraph should be detailed, cohesive, and capture the essence of all the reference images combined. Do NOT include ornament type or angle shot information - only the theme description (artistic style, mood, creative concept)."
+        elif category == 'background':
+            master_prompt += f"\n\nGenerate a comprehensive master analysis paragraph that synthesizes all the above analyses for the {category} category. If ornaments are mentioned, the paragraph MUST include all SPECIFIC ornament types WITH ALL MODIFIERS and SUBCATEGORIES (e.g., 'long necklace', 'jhumka-style earrings', etc.) - DO NOT use generic terms. The paragraph should be detailed, cohesive, and capture the essence of all the reference images combined."
+        else:
+            master_prompt += f"\n\nGenerate a comprehensive master analysis paragraph that synthesizes all the above analyses for the {category} category. The paragraph should be detailed, cohesive, and capture the essence of all the reference images combined."
+
+        return master_prompt
+    return None
+
+
 @api_view(['POST'])
 @csrf_exempt
 def api_project_setup_select(request, project_id, collection_id):
     """API wrapper for project setup select - saves user selections and generates prompts"""
     try:
-        from .utils import call_gemini_api, parse_gemini_response
+        import time
+        from .utils import call_gemini_api, get_prompt_fingerprint, parse_gemini_response
+
+        request_started = time.monotonic()
 
         # Handle both JSON and FormData requests
         if request.content_type and 'multipart/form-data' in request.content_type:
@@ -1195,6 +1304,20 @@ def api_project_setup_select(request, project_id, collection_id):
             data = json.loads(request.body)
             uploaded_files = {}
 
+        # Reference images still uploading/analyzing in the background (see
+        # workflow_uploads.py) would be left out of a master analysis that is
+        # then stored for good, and saving the collection here could overwrite
+        # their results; the client retries once workflow-images/status/ settles.
+        # Stuck images are marked failed first, before the collection is loaded
+        # so the save below keeps that.
+        from .workflow_uploads import settle_stale_uploads
+        pending_categories = settle_stale_uploads(collection_id)
+        if pending_categories:
+            return Response({
+                'error': 'Reference images are still being processed. Please try again shortly.',
+                'pending_categories': pending_categories,
+            }, status=409)
+
         # Get the collection
         try:
             collection = Collection.objects.get(id=collection_id)
@@ -1300,7 +1423,9 @@ def api_project_setup_select(request, project_id, collection_id):
 
         # Generate master analysis for categories with multiple images (only if not already present)
         # For each category with more than one image, generate a master analysis for each image
-        # that combines all analyses from that category into a comprehensive paragraph
+        # that combines all analyses from that category into a comprehensive paragraph.
+        # The categories are independent, so their Gemini calls run concurrently.
+        master_prompts = {}
         for category in ['theme', 'background', 'pose', 'location', 'color']:
             category_field = f"uploaded_{category}_images"
             if hasattr(item, category_field):
@@ -1324,140 +1449,54 @@ def api_project_setup_select(request, project_id, collection_id):
                     print(
                         f"DEBUG: Generating master analysis for {category} category with {len(uploaded_imgs)} images")
 
-                    # Collect all analyses from this category
-                    all_analyses = []
-                    image_urls = []
-                    for img in uploaded_imgs:
-                        if hasattr(img, 'analysis') and img.analysis and img.analysis.strip():
-                            # For theme category, extract description from JSON analysis
-                            if category == 'theme':
-                                try:
-                                    # Try to parse as JSON
-                                    analysis_json = json.loads(
-                                        img.analysis.strip())
-                                    if isinstance(analysis_json, dict) and 'description' in analysis_json:
-                                        analysis_to_use = analysis_json['description'].strip(
-                                        )
-                                    else:
-                                        # Fallback to theme_description if available
-                                        if hasattr(img, 'theme_description') and img.theme_description and img.theme_description.strip():
-                                            analysis_to_use = img.theme_description.strip()
-                                        else:
-                                            analysis_to_use = img.analysis.strip()
-                                except (json.JSONDecodeError, TypeError):
-                                    # Not JSON, fallback to theme_description or analysis
-                                    if hasattr(img, 'theme_description') and img.theme_description and img.theme_description.strip():
-                                        analysis_to_use = img.theme_description.strip()
-                                    else:
-                                        analysis_to_use = img.analysis.strip()
-                            else:
-                                analysis_to_use = img.analysis.strip()
-
-                            all_analyses.append({
-                                'filename': img.original_filename,
-                                'analysis': analysis_to_use,
-                                'cloud_url': img.cloud_url if hasattr(img, 'cloud_url') else None
-                            })
-                            if hasattr(img, 'cloud_url') and img.cloud_url:
-                                image_urls.append(img.cloud_url)
-
                     # If we have multiple analyses, generate master analysis for each image
-                    if len(all_analyses) > 1:
-                        # Create a prompt to combine all analyses into a master paragraph
-                        # Special handling for theme category to include ornament information
-                        if category == 'theme':
-                            master_prompt = f"""You are a professional image analysis expert specializing in theme analysis. I have {len(all_analyses)} reference images in the {category} category, each with their own theme description (artistic style, mood, creative concept).
-
-Your task is to create a comprehensive master theme description that synthesizes all the individual theme descriptions into a single, cohesive paragraph. The master theme description MUST:
-1. Combine all the key artistic styles, moods, and creative concepts from all images
-2. Identify common themes, patterns, and aesthetic qualities across all images
-3. Highlight unique elements that complement each other
-4. Create a unified description that captures the overall artistic style and mood of the entire set
-5. Focus on artistic style, mood, and creative concept (ornament type and angle shot information are not needed here)
-6. Be written as a flowing, descriptive paragraph (not bullet points)
-
-Individual theme descriptions:
-"""
-                        elif category == 'background':
-                            master_prompt = f"""You are a professional image analysis expert specializing in background and ornament analysis. I have {len(all_analyses)} reference images in the {category} category, each with their own detailed analysis. 
-
-Your task is to create a comprehensive master analysis that synthesizes all the individual analyses into a single, cohesive paragraph. The master analysis MUST:
-1. Combine all the key visual elements, styles, and characteristics from all images
-2. Identify common themes, patterns, and aesthetic qualities across all images
-3. Highlight unique elements that complement each other
-4. Create a unified description that captures the overall style and mood of the entire set
-5. CRITICALLY IMPORTANT: If ornaments are mentioned, include ALL SPECIFIC ornament types with ALL MODIFIERS and SUBCATEGORIES (e.g., "long necklace", "short necklace", "multi-strand pearl necklace", "jhumka-style earrings", "stud earrings", "delicate necklace", etc.) - DO NOT use generic terms if specific descriptors are available
-6. CRITICALLY IMPORTANT: Preserve ALL ornament type modifiers and subcategories exactly as mentioned
-7. Be written as a flowing, descriptive paragraph (not bullet points)
-
-Individual analyses:
-"""
-                        else:
-                            master_prompt = f"""You are a professional image analysis expert. I have {len(all_analyses)} reference images in the {category} category, each with their own detailed analysis. 
-
-Your task is to create a comprehensive master analysis that synthesizes all the individual analyses into a single, cohesive paragraph. The master analysis should:
-1. Combine all the key visual elements, styles, and characteristics from all images
-2. Identify common themes, patterns, and aesthetic qualities across all images
-3. Highlight unique elements that complement each other
-4. Create a unified description that captures the overall style and mood of the entire set
-5. Be written as a flowing, descriptive paragraph (not bullet points)
-
-Individual analyses:
-"""
-
-                        for idx, img_data in enumerate(all_analyses, 1):
-                            master_prompt += f"\nImage {idx} ({img_data['filename']}):\n{img_data['analysis']}\n"
-
-                        if category == 'theme':
-                            master_prompt += f"\n\nGenerate a comprehensive master theme description paragraph that synthesizes all the above theme descriptions for the {category} category. Focus on artistic style, mood, and creative concept. The paragraph should be detailed, cohesive, and capture the essence of all the reference images combined. Do NOT include ornament type or angle shot information - only the theme description (artistic style, mood, creative concept)."
-                        elif category == 'background':
-                            master_prompt += f"\n\nGenerate a comprehensive master analysis paragraph that synthesizes all the above analyses for the {category} category. If ornaments are mentioned, the paragraph MUST include all SPECIFIC ornament types WITH ALL MODIFIERS and SUBCATEGORIES (e.g., 'long necklace', 'jhumka-style earrings', etc.) - DO NOT use generic terms. The paragraph should be detailed, cohesive, and capture the essence of all the reference images combined."
-                        else:
-                            master_prompt += f"\n\nGenerate a comprehensive master analysis paragraph that synthesizes all the above analyses for the {category} category. The paragraph should be detailed, cohesive, and capture the essence of all the reference images combined."
-
-                        # Generate master analysis using Gemini API
-                        try:
-                            from .utils import call_gemini_api
-                            master_analysis = call_gemini_api(master_prompt)
-
-                            if master_analysis and master_analysis.strip():
-                                master_analysis_text = master_analysis.strip()
-
-                                # For theme category, the master analysis should already be just the theme description
-                                # (since we used theme_description from individual images to build it)
-                                if category == 'theme':
-                                    # The master_analysis_text should already be the theme description only
-                                    # But we ensure it doesn't contain ornament type or angle shot
-                                    print(
-                                        f"DEBUG: Master theme analysis generated (theme description only)")
-
-                                # Store master analysis in the database for this category
-                                if not hasattr(item, 'master_analyses') or item.master_analyses is None:
-                                    item.master_analyses = {}
-                                item.master_analyses[category] = master_analysis_text
-                                print(
-                                    f"DEBUG: Stored master analysis for {category} category in database")
-
-                                # Update each image's analysis with the master analysis
-                                for img in uploaded_imgs:
-                                    img.analysis = master_analysis_text
-                                    print(
-                                        f"DEBUG: Updated master analysis for {img.original_filename} in {category} category")
+                    master_prompt = build_master_analysis_prompt(category, uploaded_imgs)
+                    if master_prompt:
+                        master_prompts[category] = master_prompt
+
+        from .utils import call_gemini_api_many
+        master_started = time.monotonic()
+        master_results = call_gemini_api_many(master_prompts)
+        master_wall_s = time.monotonic() - master_started
+
+        for category, (master_analysis, error, _) in master_results.items():
+            uploaded_imgs = getattr(item, f"uploaded_{category}_images")
+            if error:
+                print(
+                    f"⚠️ Error generating master analysis for {category} category: {error}")
+            elif master_analysis and master_analysis.strip():
+                master_analysis_text = master_analysis.strip()
+
+                # For theme category, the master analysis should already be just the theme description
+                # (since we used theme_description from individual images to build it)
+                if category == 'theme':
+                    # The master_analysis_text should already be the theme description only
+                    # But we ensure it doesn't contain ornament type or angle shot
+                    print(
+                        f"DEBUG: Master theme analysis generated (theme description only)")
+
+                # Store master analysis in the database for this category
+                if not hasattr(item, 'master_analyses') or item.master_analyses is None:
+                    item.master_analyses = {}
+                item.master_analyses[category] = master_analysis_text
+                print(
+                    f"DEBUG: Stored master analysis for {category} category in database")
+
+                # Update each image's analysis with the master analysis
+                for img in uploaded_imgs:
+                    img.analysis = master_analysis_text
+                    print(
+                        f"DEBUG: Updated master analysis for {img.original_filename} in {category} category")
 
-                                # Also update the category_analysis dictionary for all images in this category
-                                for img_data in category_analysis[category]:
-                                    img_data['analysis'] = master_analysis_text
+                # Also update the category_analysis dictionary for all images in this category
+                for img_data in category_analysis[category]:
+                    img_data['analysis'] = master_analysis_text
 
-                                print(
-                                    f"DEBUG: Successfully generated and applied master analysis for {category} category")
-                            else:
-                                print(
-                                    f"⚠️ Master analysis generation returned empty for {category} category")
-                        except Exception as e:
-                            print(
-                                f"⚠️ Error generating master analysis for {category} category: {str(e)}")
-                            import traceback
-                            traceback.print_exc()
+                print(
+                    f"DEBUG: Successfully generated and applied master analysis for {category} category")
+            else:
+                print(
+                    f"⚠️ Master analysis generation returned empty for {category} category")
 
         # Build category-specific analysis strings for each prompt type
         def build_analysis_string(categories):
@@ -1785,32 +1824,68 @@ Generate prompts for the following 4 types. Respond ONLY in valid JSON:
         print(
             f"DEBUG: Final selections - Themes: {final_themes}, Backgrounds: {final_backgrounds}, Poses: {final_poses}, Locations: {final_locations}, Colors: {final_colors}")
 
-        # Call Gemini API
-        print(f"DEBUG: Gemini prompt: {gemini_prompt}")
-        ai_json_text = call_gemini_api(gemini_prompt)
-        ai_response = parse_gemini_response(ai_json_text)
-
-        # Fallback if parsing failed
-        if not ai_response or "error" in ai_response or not isinstance(ai_response, dict):
-            print("⚠️ Gemini API parsing failed, using fallback prompts")
-            ai_response = {
-                "white_background": "Professional product photography with clean white background, studio lighting, sharp focus on product details",
-                "background_replace": "Same product with themed background replacement, maintaining product integrity and lighting",
-                "model_image": "Realistic model wearing/holding the product, professional fashion photography, accurate facial features and body proportions, photo focused mainly on the product",
-                "campaign_image": "Stylish campaign shot with model in themed setting, creative composition, promotional quality",
-            }
-
-        # Ensure all required keys exist
-        required_keys = ["white_background",
-                         "background_replace", "model_image", "campaign_image"]
-        for key in required_keys:
-            if key not in ai_response or not ai_response[key]:
-                ai_response[key] = f"Generated prompt for {key.replace('_', ' ')} based on your collection theme"
+        # The rendered prompt contains every input (selections, picked colors,
+        # instructions, analyses, PromptMaster templates), so its fingerprint
+        # identifies a resubmission that would produce the same prompts
+        fingerprint = get_prompt_fingerprint(gemini_prompt)
+        force_refresh = bool(data.get('forceRefresh')) or \
+            request.GET.get('force_refresh', '').lower() in ('1', 'true')
+        prompts_cached = bool(
+            not force_refresh and
+            item.generated_prompts and
+            getattr(item, 'prompt_fingerprint', None) == fingerprint
+        )
 
-        # Save prompts in item
-        item.final_moodboard_prompt = gemini_prompt
-        item.moodboard_explanation = ai_json_text
-        item.generated_prompts = ai_response
+        final_s = 0.0
+        if prompts_cached:
+            print("DEBUG: Inputs unchanged, reusing generated prompts")
+            ai_response = dict(item.generated_prompts)
+        else:
+            # Call Gemini API
+            print(f"DEBUG: Gemini prompt: {gemini_prompt}")
+            final_started = time.monotonic()
+            ai_json_text = call_gemini_api(gemini_prompt)
+            final_s = time.monotonic() - final_started
+            ai_response = parse_gemini_response(ai_json_text)
+
+            # Fallback if parsing failed
+            if not ai_response or "error" in ai_response or not isinstance(ai_response, dict):
+                print("⚠️ Gemini API parsing failed, using fallback prompts")
+                ai_response = {
+                    "white_background": "Professional product photography with clean white background, studio lighting, sharp focus on product details",
+                    "background_replace": "Same product with themed background replacement, maintaining product integrity and lighting",
+                    "model_image": "Realistic model wearing/holding the product, professional fashion photography, accurate facial features and body proportions, photo focused mainly on the product",
+                    "campaign_image": "Stylish campaign shot with model in themed setting, creative composition, promotional quality",
+                }
+                # Let the next submission retry Gemini
+                item.prompt_fingerprint = None
+            else:
+                item.prompt_fingerprint = fingerprint
+
+            # Ensure all required keys exist
+            required_keys = ["white_background",
+                             "background_replace", "model_image", "campaign_image"]
+            for key in required_keys:
+                if key not in ai_response or not ai_response[key]:
+                    ai_response[key] = f"Generated prompt for {key.replace('_', ' ')} based on your collection theme"
+
+            # Save prompts in item
+            item.final_moodboard_prompt = gemini_prompt
+            item.moodboard_explanation = ai_json_text
+            item.generated_prompts = ai_response
+
+        # Master analyses ran concurrently; their summed durations are what
+        # the old one-after-another loop would have taken
+        master_sequential_s = sum(seconds for _, _, seconds in master_results.values())
+        timings = {
+            "master_analyses": {category: round(seconds, 3) for category, (_, _, seconds) in master_results.items()},
+            "master_wall_s": round(master_wall_s, 3),
+            "master_sequential_s": round(master_sequential_s, 3),
+            "master_saved_s": round(master_sequential_s - master_wall_s, 3),
+            "final_prompt_s": round(final_s, 3),
+            "total_s": round(time.monotonic() - request_started, 3),
+        }
+        logger.info(f"Project setup select {collection_id} timings: {timings}")
 
         collection.save()
 
@@ -1830,6 +1905,8 @@ Generate prompts for the following 4 types. Respond ONLY in valid JSON:
                 'globalInstructions': item.global_instructions,
             },
             'generated_prompts': ai_response,
+            'prompts_cached': prompts_cached,
+            'timings': timings,
             'message': 'Selections saved and prompts generated successfully'
         })
     except Exception as e:
@@ -1908,10 +1985,8 @@ def api_generate_all_product_model_images(request, collection_id):
     }
     If not provided, generates all 4 types for all products (backward compatibility).
     """
-    from .tasks import generate_single_image_task
     from .models import Collection
-    from .utils import get_queue_for_user
-    from celery import group
+    from .job_context import build_job_context, store_job_context, JobContextError
     import uuid
     import json
 
@@ -1919,40 +1994,8 @@ def api_generate_all_product_model_images(request, collection_id):
         user = getattr(request, "user", None)
         user_id = str(user.id) if user else None
 
-        # Soft per-tenant concurrency limit with stale job detection
-        # Only count jobs that are actually active (updated within last 30 minutes)
-        if user_id:
-            cutoff_time = datetime.utcnow() - timedelta(minutes=5)
-            
-            # Count only recently updated active jobs (exclude stale jobs)
-            active_jobs = ImageGenerationJob.objects(
-                user=user,
-                status__in=["pending", "running"],
-                updated_at__gte=cutoff_time
-            ).count()
-            
-            # Also mark stale jobs as failed (jobs running for more than 30 minutes without updates)
-            stale_jobs = ImageGenerationJob.objects(
-                user=user,
-                status__in=["pending", "running"],
-                updated_at__lt=cutoff_time
-            )
-            for stale_job in stale_jobs:
-                stale_job.status = "failed"
-                stale_job.error = "Job timed out - no updates for 30 minutes"
-                stale_job.save()
-            
-            # Increased limit to 10 active jobs per user (configurable)
-            MAX_ACTIVE_JOBS = 10
-            if active_jobs >= MAX_ACTIVE_JOBS:
-                return Response(
-                    {
-                        "success": False,
-                        "error": f"Too many active image generation jobs ({active_jobs}/{MAX_ACTIVE_JOBS}). Please wait for existing jobs to finish.",
-                    },
-                    status=429,
-                )
-
+        # No per-user cap on active jobs: waiting tasks queue per tenant and
+        # fair_share.dispatch() shares the workers between tenants
         collection = Collection.objects.get(id=collection_id)
         if not collection.items:
             return Response(
@@ -2018,6 +2061,16 @@ def api_generate_all_product_model_images(request, collection_id):
             selected_keys = list(
                 selected_keys_set) if selected_keys_set else available_prompt_keys
 
+        # Resolve everything the single-image tasks share once, up front,
+        # so each task only has to load this snapshot
+        try:
+            job_context = build_job_context(collection, user)
+        except JobContextError as context_error:
+            return Response(
+                {"success": False, "error": str(context_error)},
+                status=400,
+            )
+
         # Cancel any other running jobs for this collection to prevent mixing batches
         # This ensures only the latest batch's images are shown
         other_running_jobs = ImageGenerationJob.objects(
@@ -2025,11 +2078,9 @@ def api_generate_all_product_model_images(request, collection_id):
             status__in=["pending", "running"],
         )
         for old_job in other_running_jobs:
-            old_job.status = "failed"
-            old_job.error = "Cancelled: New batch started"
-            old_job.save()
+            revoked = cancel_job(old_job, "Cancelled: New batch started")
             logger.info(
-                f"Cancelled old job {old_job.job_id} for collection {collection_id}")
+                f"Cancelled old job {old_job.job_id} for collection {collection_id} ({revoked} queued tasks revoked)")
 
         # Clear existing generated images from all products before starting new batch
         # This ensures only images from the current batch are shown
@@ -2039,6 +2090,7 @@ def api_generate_all_product_model_images(request, collection_id):
 
         # Save the collection to persist the cleared images
         collection.save()
+        clear_generated_images(collection.id)
 
         # Determine how many images will be generated
         # If selections provided, count only selected types per product
@@ -2074,20 +2126,17 @@ def api_generate_all_product_model_images(request, collection_id):
             total_images=total_images,
             completed_images=0,
             status="running",
+            context=job_context,
         )
         job.save()
+        store_job_context(job_id, job_context)
+        init_job_progress(job_id, total_images)
 
-        # Use load-based queue selection for optimal distribution
-        from probackendapp.queue_load_manager import (
-            select_best_queue,
-            increment_pending
-        )
-
-        # Select the least-loaded queue for this batch
-        queue_name = select_best_queue()
+        # Tasks wait in the tenant's fair-share queue and are dispatched
+        # into the Celery queues by weighted round robin across tenants
+        from probackendapp.fair_share import get_plan_weight, get_tenant_id, submit_tasks
 
-        # Build a Celery group of single-image tasks, all routed to the selected queue
-        task_sigs = []
+        task_entries = []
         for idx in range(len(item.product_images)):
             product_idx_str = str(idx)
 
@@ -2108,30 +2157,36 @@ def api_generate_all_product_model_images(request, collection_id):
                 # No selections provided: generate all types for all products (backward compatibility)
                 product_selected_keys = selected_keys
 
-            # Create tasks only for selected keys
+            # Create tasks only for selected keys, with a known task id so the job can revoke it
             for key in product_selected_keys:
-                task_sig = generate_single_image_task.s(
-                    job_id,
-                    str(collection_id),
-                    user_id,
-                    idx,
-                    key,
-                )
-                # Set queue for this task
-                task_sig.set(queue=queue_name)
-                task_sigs.append(task_sig)
-                # Increment pending counter for each task BEFORE enqueueing
-                increment_pending(queue_name)
+                task_entries.append({
+                    "job_id": job_id,
+                    "collection_id": str(collection_id),
+                    "user_id": user_id,
+                    "product_index": idx,
+                    "prompt_key": key,
+                    "task_id": str(uuid.uuid4()),
+                })
 
-        # Apply the group asynchronously
-        result_group = group(task_sigs).apply_async()
+        # Store task ids before enqueueing so a cancel can always find them
+        ImageGenerationJob.objects(job_id=job_id).update_one(
+            set__task_ids=[entry["task_id"] for entry in task_entries],
+        )
+
+        organization = getattr(user, "organization", None) if user else None
+        submit_tasks(
+            get_tenant_id(job_context.get("organization_id"), user_id),
+            get_plan_weight(organization),
+            task_entries,
+        )
 
-        # Return job_id for progressive polling; include group id for backward compatibility
+        # Return job_id for progressive polling
         return Response({
             "success": True,
             "message": "Image generation started.",
             "job_id": job_id,
-            "task_id": result_group.id,
+            # Kept for older clients; get_task_status reports a job id as a task
+            "task_id": job_id,
             "total_images": total_images,
             "selected_types": selected_keys,
         })
@@ -2141,14 +2196,49 @@ def api_generate_all_product_model_images(request, collection_id):
         return Response({"success": False, "error": get_user_friendly_message(e)}, status=500)
 
 
+# ImageGenerationJob status -> Celery state, for get_task_status
+JOB_TASK_STATES = {
+    "pending": "PENDING",
+    "running": "STARTED",
+    "completed": "SUCCESS",
+    "failed": "FAILURE",
+    "cancelled": "REVOKED",
+}
+
+
 @csrf_exempt
 @api_view(['GET'])
 @authenticate
 def get_task_status(request, task_id):
-    """Get the status of a Celery task"""
+    """
+    Get the status of a Celery task. Bulk generation returns its job id as
+    task_id for older clients; for a job id the job's status is reported
+    in Celery terms.
+    """
     from celery.result import AsyncResult
 
     try:
+        job = ImageGenerationJob.objects(job_id=task_id).only(
+            "status", "error", "completed_images", "total_images").first()
+        if job:
+            if not check_job_access(request.user, task_id):
+                return Response({"success": False, "error": "Permission denied"}, status=403)
+            status = JOB_TASK_STATES.get(job.status, "PENDING")
+            response_data = {
+                "task_id": task_id,
+                "status": status,
+                "completed_images": job.completed_images,
+                "total_images": job.total_images,
+            }
+            if status == "SUCCESS":
+                response_data["success"] = True
+            elif status in ("FAILURE", "REVOKED"):
+                response_data["success"] = False
+                response_data["error"] = job.error or "Task failed"
+            else:
+                response_data["success"] = None  # In progress
+            return Response(response_data)
+
         result = AsyncResult(task_id)
 
         response_data = {
@@ -2184,9 +2274,55 @@ def api_job_images(request, job_id):
     Return the current state of a bulk generation job without blocking.
     This is used by the frontend to fetch images progressively as they finish.
 
-    Also returns the latest collection data so frontend can display images immediately.
+    Also returns the latest collection data so frontend can display images immediately,
+    with one page of generated images per product (see get_generated_images_page).
+
+    With a `since` cursor (number of images already received) only images
+    completed after the cursor are returned, served from the Redis progress
+    mirror without touching MongoDB. The response carries the next `cursor`.
+    Adding `wait=<seconds>` (max JOB_LONG_POLL_MAX_SECONDS) turns the request
+    into a long-poll that returns as soon as a new image or the end of the
+    job is published; this is the fallback for clients that cannot use the
+    job event stream. Under WSGI a waiting poll holds a worker thread, hence
+    the short cap; the event stream needs the ASGI entry point instead.
+
+    Only the user who started the job and members of its project may read it.
     """
     try:
+        allowed = check_job_access(request.user, job_id)
+        if allowed is None:
+            return Response(
+                {"success": False, "error": "Job not found."},
+                status=404,
+            )
+        if not allowed:
+            return Response(
+                {"success": False, "error": "You do not have permission to view this job."},
+                status=403,
+            )
+
+        since = request.GET.get("since")
+        if since is not None:
+            max_wait = float(getattr(settings, "JOB_LONG_POLL_MAX_SECONDS", 10))
+            try:
+                since = max(0, int(since))
+                wait = min(max(float(request.GET.get("wait", 0)), 0), max_wait)
+            except ValueError:
+                return Response(
+                    {"success": False, "error": "since and wait must be numbers."},
+                    status=400,
+                )
+            progress = wait_for_job_delta(job_id, since, timeout=wait)
+            if not progress:
+                return Response(
+                    {"success": False, "error": "Job not found."},
+                    status=404,
+                )
+            payload = {"success": True, "job_id": job_id, **progress}
+            if not payload["error"]:
+                payload.pop("error")
+            return Response(payload)
+
         job = ImageGenerationJob.objects(job_id=job_id).first()
         if not job:
             return Response(
@@ -2201,15 +2337,19 @@ def api_job_images(request, job_id):
             # Build collection data similar to api_collection_detail
             if collection.items:
                 item = collection.items[0]
+                images_page, images_page_size = get_generated_images_page(request)
+                generated_by_product, generated_totals = page_generated_images_by_product(
+                    collection, page=images_page, page_size=images_page_size)
                 collection_data = {
                     'id': str(collection.id),
                     'product_images': []
                 }
-                for product_img in item.product_images:
+                for idx, product_img in enumerate(item.product_images):
                     product_data = {
                         'uploaded_image_url': product_img.uploaded_image_url,
                         'uploaded_image_path': product_img.uploaded_image_path,
-                        'generated_images': product_img.generated_images or []
+                        'generated_images': generated_by_product.get(idx, []),
+                        'generated_images_total': generated_totals.get(idx, 0),
                     }
                     collection_data['product_images'].append(product_data)
         except Exception as coll_error:
@@ -2236,6 +2376,51 @@ def api_job_images(request, job_id):
         return Response({"success": False, "error": get_user_friendly_message(e)}, status=500)
 
 
+@csrf_exempt
+@api_view(['POST'])
+@authenticate
+def api_cancel_job(request, job_id):
+    """
+    Cancel a running bulk generation job. Tasks that have not started are
+    revoked; tasks already running stop before deducting credits.
+    """
+    try:
+        job = ImageGenerationJob.objects(job_id=job_id).only(
+            "job_id", "user", "collection", "status", "task_ids", "task_queues", "queue_name").first()
+        if not job:
+            return Response(
+                {"success": False, "error": "Job not found."},
+                status=404,
+            )
+        # The job's user may cancel it; a job without one, a project member
+        if job.user:
+            allowed = str(job.user.id) == str(request.user.id)
+        else:
+            allowed = can_access_job(request.user, job)
+        if not allowed:
+            return Response(
+                {"success": False, "error": "You do not have permission to cancel this job."},
+                status=403,
+            )
+        if job.status not in ["pending", "running"]:
+            return Response(
+                {"success": False, "error": f"Job is already {job.status}."},
+                status=400,
+            )
+
+        revoked = cancel_job(job, "Cancelled by user")
+        return Response({
+            "success": True,
+            "job_id": job_id,
+            "status": "cancelled",
+            "revoked_tasks": revoked,
+        })
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return Response({"success": False, "error": get_user_friendly_message(e)}, status=500)
+
+
 @csrf_exempt
 @api_view(['GET'])
 @authenticate
@@ -2243,6 +2428,9 @@ def api_collection_images_status(request, collection_id):
     """
     Quick endpoint to check if a collection has generated images.
     Useful for frontend polling to see when images are ready.
+
+    Each product carries one page of its images, newest first (see
+    get_generated_images_page); generated_count is the product's total.
     """
     try:
         collection = Collection.objects.get(id=collection_id)
@@ -2256,10 +2444,10 @@ def api_collection_images_status(request, collection_id):
 
         item = collection.items[0]
         total_products = len(item.product_images) if item.product_images else 0
-        total_generated = sum(
-            len(p.generated_images) if p.generated_images else 0
-            for p in item.product_images
-        )
+        images_page, images_page_size = get_generated_images_page(request)
+        generated_by_product, generated_totals = page_generated_images_by_product(
+            collection, page=images_page, page_size=images_page_size)
+        total_generated = sum(generated_totals.values())
 
         return Response({
             "success": True,
@@ -2270,8 +2458,8 @@ def api_collection_images_status(request, collection_id):
                 {
                     "index": idx,
                     "uploaded_image_url": p.uploaded_image_url,
-                    "generated_count": len(p.generated_images) if p.generated_images else 0,
-                    "generated_images": p.generated_images or []
+                    "generated_count": generated_totals.get(idx, 0),
+                    "generated_images": generated_by_product.get(idx, [])
                 }
                 for idx, p in enumerate(item.product_images)
             ]
@@ -2284,6 +2472,45 @@ def api_collection_images_status(request, collection_id):
         return Response({"success": False, "error": str(e)}, status=500)
 
 
+@csrf_exempt
+@api_view(['GET'])
+@authenticate
+@require_collection_role(['owner', 'editor', 'viewer'])
+def api_product_generated_images(request, collection_id, product_index):
+    """
+    Page through the generated images of one product, newest first.
+    Query params: page (default 1), page_size (default 20, max 100).
+
+    Includes legacy records still embedded in collections generated before
+    GeneratedProductImage existed.
+    """
+    try:
+        try:
+            page = int(request.GET.get("page", 1))
+            page_size = int(request.GET.get("page_size", 20))
+        except ValueError:
+            return Response({"success": False, "error": "page and page_size must be integers"}, status=400)
+        page = max(1, page)
+        page_size = max(1, min(page_size, 100))
+
+        collection = Collection.objects.get(id=collection_id)
+        images, total = page_product_generated_images(
+            collection_id, product_index, page=page, page_size=page_size, collection=collection)
+
+        return Response({
+            "success": True,
+            "product_index": product_index,
+            "page": page,
+            "page_size": page_size,
+            "total": total,
+            "generated_images": images,
+        })
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return Response({"success": False, "error": str(e)}, status=500)
+
+
 @csrf_exempt
 @api_view(['POST'])
 @csrf_exempt
@@ -2322,23 +2549,22 @@ def api_upload_real_models(request, collection_id):
         local_dir = os.path.join(settings.MEDIA_ROOT, "model_images", "real")
         os.makedirs(local_dir, exist_ok=True)
 
+        from .image_preflight import save_normalized_upload
+
         new_real_models = []
 
         for file in uploaded_files:
-            # Upload to Cloudinary
+            # Normalised copy is what gets uploaded and later sent to Gemini
+            local_path = save_normalized_upload(
+                file, os.path.join(local_dir, file.name), "model")
+
             upload_result = cloudinary.uploader.upload(
-                file,
+                local_path,
                 folder="collection_real_models",
                 overwrite=True
             )
             cloud_url = upload_result.get("secure_url")
 
-            # Save locally
-            local_path = os.path.join(local_dir, file.name)
-            with open(local_path, "wb") as f:
-                for chunk in file.chunks():
-                    f.write(chunk)
-
             # Create entry
             entry = {"local": local_path,
                      "cloud": cloud_url, "name": file.name}
@@ -3357,11 +3583,13 @@ def api_image_enhance(request):
 
             item = collection.items[0]
             product_image = None
+            product_index = None
 
             # Find the specific product image
-            for product in item.product_images:
+            for idx, product in enumerate(item.product_images):
                 if product.uploaded_image_path == product_image_path:
                     product_image = product
+                    product_index = idx
                     break
 
             if not product_image:
@@ -3369,7 +3597,7 @@ def api_image_enhance(request):
 
             # Find the specific generated image
             generated_image = None
-            for img in product_image.generated_images:
+            for img in get_generated_images_by_product(collection).get(product_index, []):
                 if img.get("local_path") == generated_image_path:
                     generated_image = img
                     break
@@ -3393,13 +3621,10 @@ def api_image_enhance(request):
             }
 
             # Add enhanced image to the generated image's enhanced_images list
-            if "enhanced_images" not in generated_image:
-                generated_image["enhanced_images"] = []
-
-            generated_image["enhanced_images"].append(enhanced_image_entry)
-
-            # Save the collection
-            collection.save()
+            # in a single update instead of rewriting the collection
+            from .image_results import push_enhanced_image
+            if not push_enhanced_image(collection_id, product_index, generated_image_path, enhanced_image_entry):
+                return Response({"error": "Generated image not found"}, status=404)
 
             # Track enhancement in history
             from .history_utils import track_project_image_generation
@@ -3535,11 +3760,14 @@ def api_remove_product_image(request, collection_id):
 
         # Filter out the product image to delete
         new_product_images = []
-        for product_img in item.product_images:
+        removed_indexes = []
+        for idx, product_img in enumerate(item.product_images):
             # Match by URL or path
             if product_image_url and product_img.uploaded_image_url == product_image_url:
+                removed_indexes.append(idx)
                 continue  # Skip this product image
             if product_image_path and product_img.uploaded_image_path == product_image_path:
+                removed_indexes.append(idx)
                 continue  # Skip this product image
             new_product_images.append(product_img)
 
@@ -3547,6 +3775,10 @@ def api_remove_product_image(request, collection_id):
         item.product_images = new_product_images
         collection.save()
 
+        # Keep generated image records aligned with the shifted product indexes
+        for idx in reversed(removed_indexes):
+            remove_product_generated_images(collection.id, idx)
+
         return Response({"success": True, "message": "Product image removed successfully"})
 
     except Exception as e:
@@ -3840,6 +4072,8 @@ def api_prompt_master_create(request):
             metadata=data.get('metadata', {})
         )
         prompt.save()
+        invalidate_prompt_registry(prompt.prompt_key)
+        invalidate_for_prompt_key(prompt.prompt_key)
 
         # Safely handle created_by and updated_by (should be fine for new prompts, but adding safety)
         # Access _data directly to avoid automatic dereferencing
@@ -3934,6 +4168,8 @@ def api_prompt_master_update(request, prompt_id):
         prompt.updated_by = user
         prompt.updated_at = datetime.now(timezone.utc)
         prompt.save()
+        invalidate_prompt_registry(prompt.prompt_key)
+        invalidate_for_prompt_key(prompt.prompt_key)
 
         # Safely handle created_by reference (may point to deleted user)
         # Access _data directly to avoid automatic dereferencing
@@ -4007,6 +4243,8 @@ def api_prompt_master_delete(request, prompt_id):
         user = request.user
         prompt = PromptMaster.objects.get(id=prompt_id)
         prompt.delete()
+        invalidate_prompt_registry(prompt.prompt_key)
+        invalidate_for_prompt_key(prompt.prompt_key)
 
         return Response({"success": True, "message": "Prompt deleted successfully"})
 
@@ -2,14 +2,17 @@
 Extended API views for advanced features:
 - Model usage statistics
 - Role-based access control endpoints
+- Scheduler administration
 """
 
 from django.http import JsonResponse
 from rest_framework.decorators import api_view
 from mongoengine.errors import DoesNotExist
 from .models import Collection, Project
+from .image_results import get_generated_images_by_product
 from .permissions import require_collection_role, get_user_role_in_project
 from common.middleware import authenticate
+from users.models import Role
 
 
 def get_project_by_id_or_slug(project_id):
@@ -50,15 +53,14 @@ def api_get_model_usage_stats(request, collection_id):
                 "total_generations": 0
             })
 
-        item = collection.items[0]
-        products = item.product_images or []
+        generated_by_product = get_generated_images_by_product(collection)
 
         # Track model usage
         model_usage = {}  # key: model identifier, value: count
         total_generations = 0
 
-        for product in products:
-            for gen_img in product.generated_images:
+        for generated_images in generated_by_product.values():
+            for gen_img in generated_images:
                 # Count initial generation
                 model_info = gen_img.get("model_used", {})
                 if model_info:
@@ -145,3 +147,85 @@ def api_get_user_role(request, project_id):
             "success": False,
             "error": str(e)
         }, status=500)
+
+
+@api_view(['GET'])
+@authenticate
+def api_admin_fair_share(request):
+    """
+    Show the fair-share scheduler policy (quantum, overcommit, plan weights)
+    and every tenant currently waiting with its weight, deficit and backlog.
+    Admin only.
+    """
+    if request.user.role != Role.ADMIN:
+        return JsonResponse({
+            "success": False,
+            "error": "Admin access required"
+        }, status=403)
+
+    try:
+        from .fair_share import get_fair_share_state
+        return JsonResponse({
+            "success": True,
+            **get_fair_share_state(),
+        })
+    except Exception as e:
+        print("Error in api_admin_fair_share: ", e)
+        return JsonResponse({
+            "success": False,
+            "error": str(e)
+        }, status=500)
+
+
+@api_view(['GET'])
+@authenticate
+def api_admin_analysis_cache(request):
+    """
+    Show hit rates of the reference-image analysis cache per category and
+    overall. Admin only.
+    """
+    if request.user.role != Role.ADMIN:
+        return JsonResponse({
+            "success": False,
+            "error": "Admin access required"
+        }, status=403)
+
+    try:
+        from .analysis_cache import get_analysis_cache_stats
+        return JsonResponse({
+            "success": True,
+            **get_analysis_cache_stats(),
+        })
+    except Exception as e:
+        print("Error in api_admin_analysis_cache: ", e)
+        return JsonResponse({
+            "success": False,
+            "error": str(e)
+        }, status=500)
+
+
+@api_view(['GET'])
+@authenticate
+def api_admin_image_preflight(request):
+    """
+    Show what upload normalisation saves per image kind (bytes and cache
+    hits) and the time it adds to uploads. Admin only.
+    """
+    if request.user.role != Role.ADMIN:
+        return JsonResponse({
+            "success": False,
+            "error": "Admin access required"
+        }, status=403)
+
+    try:
+        from .image_preflight import get_preflight_stats
+        return JsonResponse({
+            "success": True,
+            **get_preflight_stats(),
+        })
+    except Exception as e:
+        print("Error in api_admin_image_preflight: ", e)
+        return JsonResponse({
+            "success": False,
+            "error": str(e)
+        }, status=500)
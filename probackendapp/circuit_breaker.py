@@ -0,0 +1,104 @@
+"""
+Per-model circuit breaker for Gemini calls.
+
+When a model keeps failing upstream (transient errors or quota after the
+rate limiter's own retries, see common.failure_policy), further calls
+only add load and make users wait for timeouts. After
+CIRCUIT_FAILURE_THRESHOLD such failures within CIRCUIT_FAILURE_WINDOW_SECONDS
+the model's circuit opens for CIRCUIT_OPEN_SECONDS and calls fail at once
+with CircuitOpenError (failure class upstream_unavailable), whose retry_in
+tells tasks when to try again.
+
+When the open period ends the circuit is half-open: the failure count is
+left one short of the threshold, so the first call that fails again
+reopens it, while a success closes it.
+
+  circuit:gemini:<model>:open      set while open (PX = open period)
+  circuit:gemini:<model>:failures  recent upstream failures
+
+If Redis is unavailable every call is allowed.
+"""
+
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """The model's circuit is open; the call was not made."""
+
+    failure_class = "upstream_unavailable"
+
+    def __init__(self, model: str, retry_in: float):
+        super().__init__(f"Circuit open for {model}: upstream unhealthy, retry in {retry_in:.0f}s")
+        self.model = model
+        self.retry_in = retry_in
+
+
+def _redis():
+    from .queue_load_manager import get_redis_client
+    return get_redis_client()
+
+
+def _keys(model: str):
+    return f'circuit:gemini:{model}:open', f'circuit:gemini:{model}:failures'
+
+
+def _setting(name: str, default: int) -> int:
+    return int(getattr(settings, name, default))
+
+
+def check_circuit(model: str):
+    """Raise CircuitOpenError while the model's circuit is open."""
+    open_key, _ = _keys(model)
+    try:
+        remaining_ms = _redis().pttl(open_key)
+    except Exception as e:
+        logger.warning(f"Circuit breaker unavailable for {model}: {e}")
+        return
+    if remaining_ms and remaining_ms > 0:
+        raise CircuitOpenError(model, remaining_ms / 1000)
+
+
+def record_success(model: str):
+    """A call went through: close the circuit."""
+    _, failures_key = _keys(model)
+    try:
+        _redis().delete(failures_key)
+    except Exception:
+        pass
+
+
+def record_failure(model: str):
+    """An upstream failure: open the circuit once the threshold is reached."""
+    open_key, failures_key = _keys(model)
+    threshold = _setting('CIRCUIT_FAILURE_THRESHOLD', 5)
+    window_ms = _setting('CIRCUIT_FAILURE_WINDOW_SECONDS', 60) * 1000
+    open_ms = _setting('CIRCUIT_OPEN_SECONDS', 60) * 1000
+    try:
+        r = _redis()
+        pipe = r.pipeline()
+        pipe.incr(failures_key)
+        pipe.pexpire(failures_key, window_ms)
+        failures, _ = pipe.execute()
+        if failures >= threshold and r.set(open_key, 1, px=open_ms, nx=True):
+            # Half-open afterwards: one more failure reopens it
+            r.set(failures_key, threshold - 1, px=open_ms + window_ms)
+            logger.warning(f"Circuit opened for {model} after {failures} upstream failures")
+    except Exception as e:
+        logger.warning(f"Could not record failure for {model}: {e}")
+
+
+def get_circuit_state(model: str) -> dict:
+    """Whether a model's circuit is open, for how long, and recent failures."""
+    open_key, failures_key = _keys(model)
+    r = _redis()
+    remaining_ms = r.pttl(open_key)
+    return {
+        "model": model,
+        "open": bool(remaining_ms and remaining_ms > 0),
+        "retry_in": max(remaining_ms or 0, 0) / 1000,
+        "failures": int(r.get(failures_key) or 0),
+    }
@@ -0,0 +1,351 @@
+"""
+Weighted fair-share dispatch of single-image generation tasks across tenants.
+
+Bulk jobs no longer go straight into the Celery queues. Their tasks wait in
+a per-tenant virtual queue in Redis and are dispatched by deficit round
+robin (DRR): tenants with waiting tasks take turns, and a turn grants
+FAIR_SHARE_QUANTUM x weight credits. The tenant is served until they are
+spent (or its queue empties) before the next tenant's turn starts; if the
+Celery queues fill up mid-turn, the next dispatch resumes the same turn
+without granting it again. The deficit is reset at every turn and dropped
+when a queue empties, so it never grows beyond one quantum. The
+weight comes from the organization's plan. Each batch is placed with the
+queues the tenant's live jobs already use (get_tenant_queues), so the
+MAX_QUEUES_PER_TENANT cap holds across rounds, not just within one. Dispatch only fills the queues
+up to their capacity (times FAIR_SHARE_OVERCOMMIT), so the backlog stays in
+the virtual queues, where fairness is decided. A small job that arrives
+while bulk jobs saturate the workers is served in the next round, so its
+wait is bounded by about one task duration rather than by the bulk backlog.
+
+A tenant is the organization, or the user when they have none.
+
+  fairshare:tenant:<tenant>:tasks  list    JSON task entries waiting for dispatch
+  fairshare:active                 set     tenants with waiting tasks
+  fairshare:deficit                hash    tenant -> DRR deficit
+  fairshare:weight                 hash    tenant -> weight
+  fairshare:cursor                 string  tenant whose turn finished last
+  fairshare:turn                   string  tenant whose turn is in progress
+  fairshare:dispatch-lock          string  held by the one running dispatcher
+
+dispatch() runs after every submission, after every finished queue task
+(task_postrun) and periodically from Celery beat.
+"""
+
+import json
+import logging
+import uuid
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+FAIR_SHARE_ACTIVE_KEY = 'fairshare:active'
+FAIR_SHARE_DEFICIT_KEY = 'fairshare:deficit'
+FAIR_SHARE_WEIGHT_KEY = 'fairshare:weight'
+FAIR_SHARE_CURSOR_KEY = 'fairshare:cursor'
+FAIR_SHARE_TURN_KEY = 'fairshare:turn'
+FAIR_SHARE_LOCK_KEY = 'fairshare:dispatch-lock'
+
+DISPATCH_LOCK_MS = 10 * 1000
+
+# Pops up to ARGV[1] entries from a tenant's list; when the list is left
+# empty the tenant is deactivated in the same call, so a concurrent submit
+# (RPUSH + SADD in one MULTI) can never be stranded.
+# KEYS[1] tenant list  KEYS[2] active set  KEYS[3] deficit hash
+# ARGV[1] count  ARGV[2] tenant
+_POP_SCRIPT = """
+local count = tonumber(ARGV[1])
+local entries = redis.call('LRANGE', KEYS[1], 0, count - 1)
+redis.call('LTRIM', KEYS[1], count, -1)
+local emptied = 0
+if redis.call('LLEN', KEYS[1]) == 0 then
+    redis.call('SREM', KEYS[2], ARGV[2])
+    redis.call('HDEL', KEYS[3], ARGV[2])
+    emptied = 1
+end
+return {emptied, entries}
+"""
+
+# KEYS[1] lock  ARGV[1] owner
+_UNLOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def get_tenant_tasks_key(tenant: str) -> str:
+    """Get Redis key for a tenant's virtual queue."""
+    return f'fairshare:tenant:{tenant}:tasks'
+
+
+def get_tenant_id(organization_id=None, user_id=None) -> str:
+    """Tenant of a job: its organization, else its user."""
+    if organization_id:
+        return f'org:{organization_id}'
+    return f'user:{user_id}'
+
+
+def get_fair_share_policy() -> dict:
+    """Current scheduler settings."""
+    return {
+        'quantum': int(getattr(settings, 'FAIR_SHARE_QUANTUM', 2)),
+        'overcommit': float(getattr(settings, 'FAIR_SHARE_OVERCOMMIT', 1.5)),
+        'plan_weights': dict(getattr(settings, 'FAIR_SHARE_PLAN_WEIGHTS', {})),
+        'default_weight': int(getattr(settings, 'FAIR_SHARE_DEFAULT_WEIGHT', 1)),
+    }
+
+
+def get_plan_weight(organization=None) -> int:
+    """
+    Weight of a tenant from its organization's plan.
+
+    A plan can override the name-based weight with
+    custom_settings["fair_share_weight"].
+    """
+    policy = get_fair_share_policy()
+    plan = getattr(organization, 'plan', None) if organization else None
+    if not plan:
+        return policy['default_weight']
+    custom = (plan.custom_settings or {}).get('fair_share_weight')
+    if custom:
+        return max(1, int(custom))
+    return max(1, int(policy['plan_weights'].get((plan.name or '').lower(), policy['default_weight'])))
+
+
+def _redis():
+    from .queue_load_manager import get_redis_client
+    return get_redis_client()
+
+
+def submit_tasks(tenant: str, weight: int, entries: list) -> int:
+    """
+    Queue a job's tasks in the tenant's virtual queue and dispatch.
+
+    Args:
+        tenant: Tenant id from get_tenant_id()
+        weight: Tenant weight from get_plan_weight()
+        entries: Task entries with job_id, collection_id, user_id,
+            product_index, prompt_key and a pre-assigned task_id
+
+    Returns:
+        Number of tasks dispatched to Celery by this call (any job's)
+    """
+    pipe = _redis().pipeline(transaction=True)
+    pipe.rpush(get_tenant_tasks_key(tenant), *[json.dumps(entry) for entry in entries])
+    pipe.sadd(FAIR_SHARE_ACTIVE_KEY, tenant)
+    pipe.hset(FAIR_SHARE_WEIGHT_KEY, tenant, weight)
+    pipe.execute()
+    return dispatch()
+
+
+def get_dispatch_budget() -> int:
+    """How many more tasks the Celery queues should be given right now."""
+    from .queue_load_manager import NUM_QUEUES, get_all_queue_loads, get_queue_capacity
+
+    limit = int(NUM_QUEUES * get_queue_capacity() * get_fair_share_policy()['overcommit'])
+    outstanding = sum(pending + running for pending, running in get_all_queue_loads().values())
+    return max(0, limit - outstanding)
+
+
+def _round_robin(tenants, cursor, turn=None):
+    """
+    Order tenants to start right after the one served last, or with the
+    tenant whose turn is still in progress.
+    """
+    tenants = sorted(tenants)
+    if cursor in tenants:
+        start = tenants.index(cursor) + 1
+        tenants = tenants[start:] + tenants[:start]
+    if turn in tenants:
+        tenants.remove(turn)
+        tenants.insert(0, turn)
+    return tenants
+
+
+def dispatch() -> int:
+    """
+    Move waiting tasks into the Celery queues by weighted deficit round robin
+    until the queues are full or nothing waits. Only one dispatcher runs at
+    a time; a call that finds another one running returns at once.
+
+    Returns:
+        Number of tasks dispatched
+    """
+    r = _redis()
+    owner = uuid.uuid4().hex
+    if not r.set(FAIR_SHARE_LOCK_KEY, owner, nx=True, px=DISPATCH_LOCK_MS):
+        return 0
+
+    dispatched = 0
+    try:
+        budget = get_dispatch_budget()
+        if not budget:
+            return 0
+
+        quantum = get_fair_share_policy()['quantum']
+        weights = r.hgetall(FAIR_SHARE_WEIGHT_KEY)
+        turn = r.get(FAIR_SHARE_TURN_KEY)
+        tenants = _round_robin(r.smembers(FAIR_SHARE_ACTIVE_KEY), r.get(FAIR_SHARE_CURSOR_KEY), turn)
+        pop = r.register_script(_POP_SCRIPT)
+
+        while budget > 0 and tenants:
+            tenant = tenants[0]
+            if tenant == turn:
+                deficit = int(float(r.hget(FAIR_SHARE_DEFICIT_KEY, tenant) or 0))
+            else:
+                # A new turn: grant the quantum once
+                deficit = max(1, quantum * int(weights.get(tenant) or 1))
+                r.hset(FAIR_SHARE_DEFICIT_KEY, tenant, deficit)
+                r.set(FAIR_SHARE_TURN_KEY, tenant)
+                turn = tenant
+
+            emptied = False
+            requeued = 0
+            take = min(deficit, budget)
+            if take > 0:
+                emptied, raw_entries = pop(
+                    keys=[get_tenant_tasks_key(tenant), FAIR_SHARE_ACTIVE_KEY, FAIR_SHARE_DEFICIT_KEY],
+                    args=[take, tenant],
+                )
+                sent, requeued = _send(tenant, [json.loads(raw) for raw in raw_entries])
+                budget -= sent
+                dispatched += sent
+                deficit -= len(raw_entries) - requeued
+                if not emptied:
+                    r.hincrby(FAIR_SHARE_DEFICIT_KEY, tenant, -(len(raw_entries) - requeued))
+            if requeued:
+                # The broker refused tasks; leave the turn for the next dispatch
+                break
+            if not emptied and deficit > 0:
+                # Out of budget mid-turn; the next dispatch resumes it
+                break
+
+            # Turn over: move on to the next tenant
+            r.set(FAIR_SHARE_CURSOR_KEY, tenant)
+            r.delete(FAIR_SHARE_TURN_KEY)
+            turn = None
+            tenants.pop(0)
+            if not emptied:
+                tenants.append(tenant)
+    except Exception as e:
+        logger.warning(f"Fair-share dispatch failed after {dispatched} tasks: {e}")
+    finally:
+        r.eval(_UNLOCK_SCRIPT, 1, FAIR_SHARE_LOCK_KEY, owner)
+    return dispatched
+
+
+def get_tenant_queues(tenant: str) -> set:
+    """
+    Queues the tenant's live jobs already have tasks on. They count towards
+    the tenant's cap in place_batch, so the cap holds across dispatch rounds.
+    """
+    from .job_models import ImageGenerationJob
+
+    from bson import ObjectId
+
+    kind, _, tenant_key = tenant.partition(':')
+    if kind == 'org':
+        query = {'context__organization_id': tenant_key}
+    elif ObjectId.is_valid(tenant_key):
+        query = {'user': tenant_key}
+    else:
+        return set()
+
+    occupied = set()
+    for live_job in ImageGenerationJob.objects(
+        status__in=["pending", "running"], **query,
+    ).only("queue_allocation", "queue_name"):
+        occupied.update(live_job.queue_allocation or {})
+        if live_job.queue_name and not live_job.queue_allocation:
+            occupied.add(live_job.queue_name)
+    return occupied
+
+
+def _send(tenant: str, entries: list):
+    """
+    Send a tenant's task entries to Celery, spread over the queues. If the
+    broker refuses a task, it and the entries after it go back to the front
+    of the tenant's virtual queue.
+
+    Returns:
+        Tuple of (sent, requeued)
+    """
+    from .job_cancellation import is_job_cancelled
+    from .job_models import ImageGenerationJob
+    from .queue_load_manager import PRIORITY_BULK, decrement_pending, interleave_placement, place_batch
+    from .tasks import generate_single_image_task
+
+    cancelled = {job_id for job_id in {e['job_id'] for e in entries} if is_job_cancelled(job_id)}
+    entries = [e for e in entries if e['job_id'] not in cancelled]
+    if not entries:
+        return 0, 0
+
+    placement = place_batch(len(entries), get_tenant_queues(tenant))
+    updates = {}
+    sent = 0
+    failed = []
+    for entry, queue_name in zip(entries, interleave_placement(placement)):
+        if failed:
+            # Not attempted; give the reserved slot back as well
+            decrement_pending(queue_name)
+            failed.append(entry)
+            continue
+        try:
+            generate_single_image_task.apply_async(
+                args=[entry['job_id'], entry['collection_id'], entry['user_id'],
+                      entry['product_index'], entry['prompt_key']],
+                task_id=entry['task_id'],
+                queue=queue_name,
+                # Interactive requests on the same queue go first
+                priority=PRIORITY_BULK,
+            )
+        except Exception as e:
+            decrement_pending(queue_name)
+            logger.warning(f"Could not enqueue task {entry['task_id']}, requeueing: {e}")
+            failed.append(entry)
+            continue
+        sent += 1
+        job_update = updates.setdefault(entry['job_id'], {})
+        job_update[f"set__task_queues__{entry['task_id']}"] = queue_name
+        inc_key = f"inc__queue_allocation__{queue_name}"
+        job_update[inc_key] = job_update.get(inc_key, 0) + 1
+
+    if failed:
+        pipe = _redis().pipeline(transaction=True)
+        pipe.lpush(get_tenant_tasks_key(tenant), *[json.dumps(entry) for entry in reversed(failed)])
+        pipe.sadd(FAIR_SHARE_ACTIVE_KEY, tenant)
+        pipe.execute()
+
+    for job_id, update in updates.items():
+        ImageGenerationJob.objects(job_id=job_id).update_one(**update)
+    return sent, len(failed)
+
+
+def get_fair_share_state() -> dict:
+    """Scheduler policy and per-tenant backlog, for the admin endpoint."""
+    r = _redis()
+    tenants = sorted(r.smembers(FAIR_SHARE_ACTIVE_KEY))
+    pipe = r.pipeline()
+    for tenant in tenants:
+        pipe.llen(get_tenant_tasks_key(tenant))
+    backlogs = pipe.execute() if tenants else []
+    weights = r.hgetall(FAIR_SHARE_WEIGHT_KEY)
+    deficits = r.hgetall(FAIR_SHARE_DEFICIT_KEY)
+
+    return {
+        'policy': get_fair_share_policy(),
+        'dispatch_budget': get_dispatch_budget(),
+        'cursor': r.get(FAIR_SHARE_CURSOR_KEY),
+        'turn': r.get(FAIR_SHARE_TURN_KEY),
+        'tenants': [
+            {
+                'tenant': tenant,
+                'weight': int(weights.get(tenant) or 1),
+                'deficit': float(deficits.get(tenant) or 0),
+                'waiting_tasks': backlog,
+            }
+            for tenant, backlog in zip(tenants, backlogs)
+        ],
+    }
@@ -0,0 +1,300 @@
+"""
+Cluster-wide rate limiting of Gemini calls.
+
+Every queue worker used to call generate_content on its own, so when the
+API answered 429 / RESOURCE_EXHAUSTED all of them failed and retried at
+once. Each call now takes a permit from a budget shared through Redis:
+
+  image   models with "image" in their name
+  text    every other model (prompts, analyses, vision descriptions)
+
+A budget is a token bucket (requests_per_minute, burst) plus a concurrency
+limit driven by AIMD:
+
+  success    limit += 1 / limit      (about +1 per round of `limit` calls)
+  throttled  limit *= DECREASE_FACTOR, at most once per DECREASE_COOLDOWN_MS,
+             and the bucket is emptied so every caller backs off together
+
+bounded by min_concurrency and max_concurrency. Permits are leases in a
+sorted set, so a crashed worker's permit expires after PERMIT_LEASE_MS.
+
+call_with_permit() waits for a permit (up to GEMINI_PERMIT_TIMEOUT_SECONDS)
+and retries throttled calls itself, up to GEMINI_THROTTLE_RETRIES times,
+instead of failing the task. Outside Celery workers (web requests such as
+setup-select or an image analysis) a caller is holding an HTTP request
+open, so the shorter GEMINI_WEB_PERMIT_TIMEOUT_SECONDS and
+GEMINI_WEB_THROTTLE_RETRIES apply; imgbackend.celery marks worker
+processes with mark_worker_process(). ai_utils.get_client() routes every
+generate_content call through it. If Redis is unavailable calls go
+through unlimited, as before.
+
+  gemini:ratelimit:<budget>:state   hash: tokens, ts, limit, decreased_at
+  gemini:ratelimit:<budget>:leases  zset: permit id -> lease expiry (ms)
+"""
+
+import logging
+import random
+import time
+import uuid
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+IMAGE_BUDGET = 'image'
+TEXT_BUDGET = 'text'
+
+PERMIT_LEASE_MS = 5 * 60 * 1000
+DECREASE_FACTOR = 0.5
+DECREASE_COOLDOWN_MS = 2000
+# Idle budgets disappear; the next call starts from initial_concurrency
+STATE_TTL_MS = 24 * 60 * 60 * 1000
+# Poll interval while every permit is taken
+CONCURRENCY_POLL_SECONDS = 0.2
+
+DEFAULT_BUDGETS = {
+    IMAGE_BUDGET: {
+        "requests_per_minute": 60,
+        "burst": 10,
+        "min_concurrency": 1,
+        "initial_concurrency": 8,
+        "max_concurrency": 20,
+    },
+    TEXT_BUDGET: {
+        "requests_per_minute": 600,
+        "burst": 50,
+        "min_concurrency": 2,
+        "initial_concurrency": 20,
+        "max_concurrency": 50,
+    },
+}
+
+# KEYS[1] state  KEYS[2] leases
+# ARGV[1] permit id  ARGV[2] lease ms  ARGV[3] requests/min  ARGV[4] burst
+# ARGV[5] initial limit  ARGV[6] state ttl ms
+# Returns {1, 0} when granted, {0, wait ms} when short of tokens and
+# {0, -1} when every permit is taken
+_ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'limit')
+local rate = tonumber(ARGV[3]) / 60000
+local burst = tonumber(ARGV[4])
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+local limit = tonumber(state[3]) or tonumber(ARGV[5])
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+
+local result
+if redis.call('ZCARD', KEYS[2]) >= math.floor(limit) then
+    result = {0, -1}
+elseif tokens < 1 then
+    result = {0, math.ceil((1 - tokens) / rate)}
+else
+    tokens = tokens - 1
+    redis.call('ZADD', KEYS[2], now + tonumber(ARGV[2]), ARGV[1])
+    result = {1, 0}
+end
+redis.call('HMSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now, 'limit', tostring(limit))
+redis.call('PEXPIRE', KEYS[1], ARGV[6])
+redis.call('PEXPIRE', KEYS[2], ARGV[6])
+return result
+"""
+
+# KEYS[1] state  KEYS[2] leases
+# ARGV[1] permit id  ARGV[2] outcome (success|throttled|error)
+# ARGV[3] min limit  ARGV[4] max limit  ARGV[5] initial limit
+# ARGV[6] decrease factor  ARGV[7] decrease cooldown ms
+# Returns the new concurrency limit as a string
+_RELEASE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZREM', KEYS[2], ARGV[1])
+
+local limit = tonumber(redis.call('HGET', KEYS[1], 'limit')) or tonumber(ARGV[5])
+if ARGV[2] == 'success' then
+    limit = math.min(tonumber(ARGV[4]), limit + 1 / limit)
+elseif ARGV[2] == 'throttled' then
+    local decreased_at = tonumber(redis.call('HGET', KEYS[1], 'decreased_at')) or 0
+    if now - decreased_at >= tonumber(ARGV[7]) then
+        limit = math.max(tonumber(ARGV[3]), limit * tonumber(ARGV[6]))
+        redis.call('HMSET', KEYS[1], 'decreased_at', now, 'tokens', '0', 'ts', now)
+    end
+end
+redis.call('HSET', KEYS[1], 'limit', tostring(limit))
+return tostring(limit)
+"""
+
+
+_worker_process = False
+
+
+def mark_worker_process():
+    """Let calls in this process wait the full worker permit timeout."""
+    global _worker_process
+    _worker_process = True
+
+
+def get_permit_timeout() -> float:
+    """Seconds a call may wait for a permit in this process."""
+    if _worker_process:
+        return float(getattr(settings, 'GEMINI_PERMIT_TIMEOUT_SECONDS', 600))
+    return float(getattr(settings, 'GEMINI_WEB_PERMIT_TIMEOUT_SECONDS', 15))
+
+
+def get_throttle_retries() -> int:
+    """How often a throttled call is retried in this process."""
+    if _worker_process:
+        return int(getattr(settings, 'GEMINI_THROTTLE_RETRIES', 5))
+    return int(getattr(settings, 'GEMINI_WEB_THROTTLE_RETRIES', 1))
+
+
+class GeminiPermitTimeout(Exception):
+    """No Gemini permit became free within the permit timeout."""
+
+    failure_class = "quota"
+
+
+def _redis():
+    from .queue_load_manager import get_redis_client
+    return get_redis_client()
+
+
+def _keys(budget: str):
+    return f'gemini:ratelimit:{budget}:state', f'gemini:ratelimit:{budget}:leases'
+
+
+def get_budget(model: str) -> str:
+    """Budget a model's calls are counted against."""
+    return IMAGE_BUDGET if 'image' in (model or '').lower() else TEXT_BUDGET
+
+
+def get_budget_config(budget: str) -> dict:
+    """Limits of a budget: defaults overlaid with settings.GEMINI_RATE_LIMITS."""
+    configured = getattr(settings, 'GEMINI_RATE_LIMITS', {}).get(budget, {})
+    return {**DEFAULT_BUDGETS.get(budget, DEFAULT_BUDGETS[TEXT_BUDGET]), **configured}
+
+
+def is_throttling_error(exc: Exception) -> bool:
+    """Whether an API error means the provider is rate limiting us."""
+    code = getattr(exc, 'code', None) or getattr(exc, 'status_code', None)
+    if code == 429:
+        return True
+    message = str(exc)
+    return '429' in message or 'RESOURCE_EXHAUSTED' in message or 'rate limit' in message.lower()
+
+
+def acquire_permit(budget: str, timeout: float = None, config: dict = None) -> str:
+    """
+    Wait for a permit of a budget.
+
+    Args:
+        budget: IMAGE_BUDGET, TEXT_BUDGET (or a custom name with config)
+        timeout: Seconds to wait; defaults to get_permit_timeout()
+        config: Budget limits; defaults to get_budget_config(budget)
+
+    Returns:
+        Permit id, or None if Redis is unavailable (call unlimited)
+
+    Raises:
+        GeminiPermitTimeout: No permit within the timeout
+    """
+    config = config or get_budget_config(budget)
+    if timeout is None:
+        timeout = get_permit_timeout()
+    state_key, leases_key = _keys(budget)
+    permit_id = uuid.uuid4().hex
+    deadline = time.monotonic() + timeout
+
+    while True:
+        try:
+            granted, wait_ms = _redis().eval(
+                _ACQUIRE_SCRIPT, 2, state_key, leases_key, permit_id, PERMIT_LEASE_MS,
+                config['requests_per_minute'], config['burst'], config['initial_concurrency'],
+                STATE_TTL_MS)
+        except Exception as e:
+            logger.warning(f"Gemini rate limiter unavailable, calling without a permit: {e}")
+            return None
+        if granted:
+            return permit_id
+
+        wait = CONCURRENCY_POLL_SECONDS if wait_ms < 0 else wait_ms / 1000
+        # Jitter so waiting workers do not all come back in the same instant
+        wait = wait * (1 + random.random() * 0.5)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise GeminiPermitTimeout(f"No {budget} Gemini permit within {timeout:.0f}s")
+        time.sleep(min(wait, remaining))
+
+
+def release_permit(budget: str, permit_id: str, outcome: str = 'success', config: dict = None):
+    """
+    Return a permit and feed the outcome to the AIMD controller.
+
+    Args:
+        budget: Budget the permit came from
+        permit_id: acquire_permit() result (None is ignored)
+        outcome: success, throttled or error (error leaves the limit alone)
+        config: Budget limits; defaults to get_budget_config(budget)
+    """
+    if permit_id is None:
+        return
+    config = config or get_budget_config(budget)
+    state_key, leases_key = _keys(budget)
+    try:
+        _redis().eval(
+            _RELEASE_SCRIPT, 2, state_key, leases_key, permit_id, outcome,
+            config['min_concurrency'], config['max_concurrency'], config['initial_concurrency'],
+            DECREASE_FACTOR, DECREASE_COOLDOWN_MS)
+    except Exception as e:
+        logger.warning(f"Could not release Gemini permit {permit_id}: {e}")
+
+
+def call_with_permit(budget: str, fn, *args, config: dict = None, **kwargs):
+    """
+    Call fn under a permit, waiting out throttling instead of failing.
+
+    A throttled call releases its permit as "throttled" (shrinking the
+    limit for every worker) and is retried once a permit is free again, up
+    to get_throttle_retries() times; then the error is raised.
+    """
+    retries = get_throttle_retries()
+    attempt = 0
+    while True:
+        permit_id = acquire_permit(budget, config=config)
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            throttled = is_throttling_error(e)
+            release_permit(budget, permit_id, 'throttled' if throttled else 'error', config=config)
+            if not throttled or attempt >= retries:
+                raise
+            attempt += 1
+            logger.info(f"Gemini {budget} call throttled, waiting for a permit (retry {attempt}/{retries})")
+            if permit_id is None:
+                # No limiter to wait on: back off locally
+                time.sleep(min(60, 2 ** attempt) * (1 + random.random() * 0.5))
+            continue
+        release_permit(budget, permit_id, 'success', config=config)
+        return result
+
+
+def get_limiter_state(budget: str) -> dict:
+    """Current concurrency limit, permits in use and tokens of a budget."""
+    state_key, leases_key = _keys(budget)
+    r = _redis()
+    r.zremrangebyscore(leases_key, '-inf', int(time.time() * 1000))
+    state = r.hgetall(state_key)
+    return {
+        "budget": budget,
+        "limit": float(state['limit']) if state.get('limit') else None,
+        "in_use": r.zcard(leases_key),
+        "tokens": float(state['tokens']) if state.get('tokens') else None,
+    }
+
+
+def reset_limiter(budget: str):
+    """Forget a budget's state (limit, tokens and permits)."""
+    _redis().delete(*_keys(budget))
@@ -0,0 +1,273 @@
+"""
+Lease-based locks for single-image generation tasks.
+
+A lease is held while a task works and must be renewed by its heartbeat; if
+the worker dies the lease simply expires and the redelivered task (acks_late)
+takes over. When the work finishes the lease is replaced by a "done" marker
+that expires with the job, so a late duplicate delivery is still skipped but
+nothing is left behind permanently.
+
+Redis is the primary store (SET NX PX with an owner token, renewed and
+released by compare-and-set scripts). If Redis is unreachable the lease is
+kept in the GenerationLeaseRecord collection instead, using the same semantics.
+"""
+
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# How long a lease survives without a heartbeat
+LEASE_TTL_MS = 120 * 1000
+# How long a finished generation blocks duplicate deliveries
+DONE_TTL_MS = 24 * 60 * 60 * 1000
+
+class LeaseLost(Exception):
+    """The lease expired and another delivery took the work over."""
+
+
+ACQUIRED = "acquired"
+HELD = "held"
+DONE = "done"
+
+# KEYS[1] lease key  ARGV[1] owner  ARGV[2] ttl ms
+_ACQUIRE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current == 'done' then
+    return {'done', redis.call('PTTL', KEYS[1])}
+end
+if current then
+    return {'held', redis.call('PTTL', KEYS[1])}
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return {'acquired', tonumber(ARGV[2])}
+"""
+
+# KEYS[1] lease key  ARGV[1] owner  ARGV[2] ttl ms  ARGV[3] new value ('' keeps owner)
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+if ARGV[3] ~= '' then
+    redis.call('SET', KEYS[1], ARGV[3], 'PX', ARGV[2])
+else
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 1
+"""
+
+# KEYS[1] lease key  ARGV[1] owner
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def get_generation_lock_key(job_id: str, product_index: int, prompt_key: str) -> str:
+    """Get lease key for one image of a job."""
+    return f'lock:generation:{job_id}:{product_index}:{prompt_key}'
+
+
+def _redis():
+    from .queue_load_manager import get_redis_client
+    return get_redis_client()
+
+
+class GenerationLease:
+    """
+    A lease on one unit of generation work.
+
+    Usage:
+        lease = GenerationLease(key)
+        status, retry_in_ms = lease.acquire()
+        if status == ACQUIRED:
+            with lease.heartbeat():
+                ...
+            lease.complete()
+    """
+
+    def __init__(self, key: str, ttl_ms: int = LEASE_TTL_MS):
+        self.key = key
+        self.ttl_ms = ttl_ms
+        self.owner = uuid.uuid4().hex
+        self.backend = None
+        self.lost = threading.Event()
+
+    # ---- Redis -----------------------------------------------------------
+
+    def _redis_acquire(self):
+        status, ttl = _redis().eval(_ACQUIRE_SCRIPT, 1, self.key, self.owner, self.ttl_ms)
+        return status, max(int(ttl), 0)
+
+    def _redis_renew(self, ttl_ms, value=""):
+        return bool(_redis().eval(_RENEW_SCRIPT, 1, self.key, self.owner, ttl_ms, value))
+
+    def _redis_release(self):
+        _redis().eval(_RELEASE_SCRIPT, 1, self.key, self.owner)
+
+    # ---- MongoDB fallback ------------------------------------------------
+
+    def _mongo_acquire(self):
+        from .job_models import GenerationLeaseRecord
+
+        now = datetime.utcnow()
+        leases = GenerationLeaseRecord._get_collection()
+        try:
+            leases.find_one_and_update(
+                {"key": self.key, "expires_at": {"$lt": now}},
+                {"$set": {
+                    "owner": self.owner,
+                    "expires_at": now + timedelta(milliseconds=self.ttl_ms),
+                    "done": False,
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            return ACQUIRED, self.ttl_ms
+        except DuplicateKeyError:
+            # A live lease (or done marker) exists for this key
+            current = leases.find_one({"key": self.key}, {"done": 1, "expires_at": 1}) or {}
+            remaining = (current.get("expires_at", now) - now).total_seconds() * 1000
+            return (DONE if current.get("done") else HELD), max(int(remaining), 0)
+
+    def _mongo_renew(self, ttl_ms, done=False):
+        from .job_models import GenerationLeaseRecord
+
+        update = {"expires_at": datetime.utcnow() + timedelta(milliseconds=ttl_ms)}
+        if done:
+            update["done"] = True
+        result = GenerationLeaseRecord._get_collection().update_one(
+            {"key": self.key, "owner": self.owner, "done": False},
+            {"$set": update},
+        )
+        return result.matched_count > 0
+
+    def _mongo_release(self):
+        from .job_models import GenerationLeaseRecord
+        GenerationLeaseRecord._get_collection().delete_one({"key": self.key, "owner": self.owner})
+
+    # ---- Public API ------------------------------------------------------
+
+    def acquire(self):
+        """
+        Try to take the lease.
+
+        Returns:
+            Tuple of (status, ms) where status is ACQUIRED, HELD (another live
+            owner; ms until its lease expires) or DONE (work already finished)
+        """
+        try:
+            status, ttl = self._redis_acquire()
+            self.backend = "redis"
+        except Exception as e:
+            logger.warning(f"Redis unavailable for lease {self.key}, using MongoDB: {e}")
+            status, ttl = self._mongo_acquire()
+            self.backend = "mongo"
+        return status, ttl
+
+    def renew(self) -> bool:
+        """Extend the lease. Returns False if it was lost to another owner."""
+        if self.backend == "redis":
+            return self._redis_renew(self.ttl_ms)
+        return self._mongo_renew(self.ttl_ms)
+
+    def complete(self):
+        """Replace the lease with a done marker that expires with the job."""
+        try:
+            if self.backend == "redis":
+                self._redis_renew(DONE_TTL_MS, value=DONE)
+            else:
+                self._mongo_renew(DONE_TTL_MS, done=True)
+        except Exception as e:
+            logger.warning(f"Could not mark lease {self.key} done: {e}")
+
+    def check(self):
+        """
+        Raise LeaseLost if the heartbeat found the lease taken over. Call
+        before charging credits or storing results, which the new owner
+        will do itself.
+        """
+        if self.lost.is_set():
+            raise LeaseLost(self.key)
+
+    def release(self):
+        """Give the lease up so another delivery can retry the work."""
+        try:
+            if self.backend == "redis":
+                self._redis_release()
+            else:
+                self._mongo_release()
+        except Exception as e:
+            logger.warning(f"Could not release lease {self.key}: {e}")
+
+    def heartbeat(self, interval_s: float = None):
+        """Context manager renewing the lease in a daemon thread while work runs."""
+        return _Heartbeat(self, interval_s or self.ttl_ms / 3000)
+
+
+class _Heartbeat:
+    def __init__(self, lease: GenerationLease, interval_s: float):
+        self.lease = lease
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                if not self.lease.renew():
+                    logger.warning(f"Lease {self.lease.key} was lost to another owner")
+                    self.lease.lost.set()
+                    return
+            except Exception as e:
+                # Keep trying; the lease survives a few missed beats
+                logger.warning(f"Heartbeat for lease {self.lease.key} failed: {e}")
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name=f"lease-heartbeat-{self.lease.key}", daemon=True)
+        self._thread.start()
+        return self.lease
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join(timeout=5)
+        return False
+
+
+def get_credit_charge_key(job_id: str, product_index: int, prompt_key: str) -> str:
+    """Marker key of the credits charged for one image of a job."""
+    return f'charged:generation:{job_id}:{product_index}:{prompt_key}'
+
+
+def claim_credit_charge(key: str) -> bool:
+    """
+    Whether credits still have to be charged for this image.
+
+    A retried attempt (see common.failure_policy) finds the marker left by
+    the first one and is not charged again. Without a key, or without
+    Redis, every attempt charges as before.
+    """
+    if not key:
+        return True
+    try:
+        return bool(_redis().set(key, 1, px=DONE_TTL_MS, nx=True))
+    except Exception as e:
+        logger.warning(f"Could not check credit charge marker {key}: {e}")
+        return True
+
+
+def release_credit_charge(key: str):
+    """Forget a claimed charge whose deduction did not go through."""
+    if not key:
+        return
+    try:
+        _redis().delete(key)
+    except Exception:
+        pass
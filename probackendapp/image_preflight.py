@@ -0,0 +1,316 @@
+"""
+Pre-flight normalisation of uploaded images before they reach Gemini.
+
+Product, model, theme and pose images used to be stored and sent at
+whatever resolution the user uploaded, often 6000 px phone photos of
+8-15 MB. Every upload site now persists a normalised copy instead:
+
+  1. EXIF orientation applied (phones store portraits sideways + a tag)
+  2. embedded colour profile converted to sRGB
+  3. downscaled to the kind's max_edge (never upscaled)
+  4. re-encoded to JPEG (alpha flattened on white) or WebP at the kind's
+     quality, without EXIF, GPS or other metadata
+
+Limits per image kind are DEFAULT_LIMITS overlaid with
+settings.IMAGE_PREFLIGHT_LIMITS; IMAGE_PREFLIGHT_FORMAT picks JPEG or WEBP.
+An image that cannot be decoded is stored unchanged.
+
+Results are cached on local disk by content hash, so the same source image
+(re-uploaded into another collection, or another ornament name) is only
+normalised once per server:
+
+  MEDIA_ROOT/preflight_cache/<kind>/<sha256 of source>_<config version>.<ext>
+
+The config version changes with the kind's limits and output format. Each
+hit refreshes the entry's mtime; entries unused for
+IMAGE_PREFLIGHT_CACHE_DAYS are pruned, at most once an hour per process.
+
+  Redis  image:preflight:stats  hash of <kind>:<counter>
+
+Counters are images, cache_hits, failed, source_bytes, output_bytes and
+elapsed_ms (time spent normalising, i.e. the latency added to uploads).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+from io import BytesIO
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+PREFLIGHT_STATS_KEY = 'image:preflight:stats'
+# Bump when the pipeline itself changes; cached outputs are then redone
+PREFLIGHT_VERSION = 1
+PRUNE_INTERVAL_SECONDS = 60 * 60
+
+DEFAULT_LIMITS = {
+    "product": {"max_edge": 2048, "quality": 90},
+    "ornament": {"max_edge": 2048, "quality": 90},
+    "model": {"max_edge": 2048, "quality": 88},
+    "background": {"max_edge": 2048, "quality": 85},
+    "theme": {"max_edge": 1536, "quality": 85},
+    "location": {"max_edge": 1536, "quality": 85},
+    "pose": {"max_edge": 1024, "quality": 80},
+    "color": {"max_edge": 1024, "quality": 80},
+}
+
+STATS_COUNTERS = ('images', 'cache_hits', 'failed', 'source_bytes', 'output_bytes', 'elapsed_ms')
+
+_FORMATS = {
+    "JPEG": (".jpg", "image/jpeg"),
+    "WEBP": (".webp", "image/webp"),
+}
+
+PreflightResult = namedtuple(
+    "PreflightResult", ["data", "extension", "mime_type", "content_hash", "source_bytes", "cached"])
+
+_last_prune = 0.0
+
+
+def _redis():
+    from .queue_load_manager import get_redis_client
+    return get_redis_client()
+
+
+def get_preflight_config(kind: str) -> dict:
+    """Limits of an image kind: defaults overlaid with settings.IMAGE_PREFLIGHT_LIMITS."""
+    configured = getattr(settings, 'IMAGE_PREFLIGHT_LIMITS', {}).get(kind, {})
+    config = {**DEFAULT_LIMITS.get(kind, DEFAULT_LIMITS["product"]), **configured}
+    config.setdefault("format", str(getattr(settings, 'IMAGE_PREFLIGHT_FORMAT', 'JPEG')).upper())
+    if config["format"] not in _FORMATS:
+        config["format"] = "JPEG"
+    return config
+
+
+def _config_version(config: dict) -> str:
+    raw = json.dumps({**config, "pipeline": PREFLIGHT_VERSION}, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:12]
+
+
+def _cache_dir(kind: str) -> str:
+    return os.path.join(settings.MEDIA_ROOT, "preflight_cache", kind)
+
+
+def _count(kind: str, **counters):
+    try:
+        pipe = _redis().pipeline()
+        for name, value in counters.items():
+            pipe.hincrby(PREFLIGHT_STATS_KEY, f'{kind}:{name}', int(value))
+        pipe.execute()
+    except Exception:
+        pass
+
+
+def _encode(data: bytes, config: dict) -> bytes:
+    from PIL import Image, ImageOps
+
+    max_edge = int(config["max_edge"])
+    with Image.open(BytesIO(data)) as source:
+        if source.format == "JPEG":
+            # Let the decoder skip detail we would throw away anyway
+            source.draft("RGB", (max_edge, max_edge))
+        img = ImageOps.exif_transpose(source)
+        icc_profile = source.info.get("icc_profile")
+
+        has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+        img = img.convert("RGBA" if has_alpha else "RGB")
+
+        if icc_profile:
+            try:
+                from PIL import ImageCms
+                img = ImageCms.profileToProfile(
+                    img, ImageCms.ImageCmsProfile(BytesIO(icc_profile)), ImageCms.createProfile("sRGB"),
+                    outputMode=img.mode)
+            except Exception as e:
+                logger.warning(f"Could not convert image colour profile to sRGB: {e}")
+
+        if max(img.size) > max_edge:
+            img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+        if config["format"] == "JPEG" and has_alpha:
+            flattened = Image.new("RGB", img.size, (255, 255, 255))
+            flattened.paste(img, mask=img.getchannel("A"))
+            img = flattened
+
+        out = BytesIO()
+        # No exif / icc_profile arguments: metadata is not carried over
+        if config["format"] == "WEBP":
+            img.save(out, format="WEBP", quality=int(config["quality"]), method=4)
+        else:
+            img.save(out, format="JPEG", quality=int(config["quality"]), optimize=True, progressive=True)
+        return out.getvalue()
+
+
+def _store_cached(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def prune_preflight_cache(max_age_days: float = None) -> int:
+    """
+    Delete cached outputs not used for max_age_days.
+
+    Args:
+        max_age_days: Defaults to settings.IMAGE_PREFLIGHT_CACHE_DAYS
+
+    Returns:
+        Number of files removed
+    """
+    if max_age_days is None:
+        max_age_days = float(getattr(settings, 'IMAGE_PREFLIGHT_CACHE_DAYS', 30))
+    cutoff = time.time() - max_age_days * 24 * 60 * 60
+    root = os.path.join(settings.MEDIA_ROOT, "preflight_cache")
+    removed = 0
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def _maybe_prune():
+    global _last_prune
+    now = time.monotonic()
+    if _last_prune and now - _last_prune < PRUNE_INTERVAL_SECONDS:
+        return
+    _last_prune = now
+    try:
+        prune_preflight_cache()
+    except Exception as e:
+        logger.warning(f"Could not prune image preflight cache: {e}")
+
+
+def normalize_image(data: bytes, kind: str) -> PreflightResult:
+    """
+    Normalise an image for a Gemini call, reusing a cached result.
+
+    Args:
+        data: Source image bytes as uploaded
+        kind: Image kind (product, ornament, model, background, theme,
+            location, pose, color); selects the limits
+
+    Returns:
+        PreflightResult; data is the source unchanged (and extension None)
+        if preflight is disabled or the image could not be decoded
+    """
+    content_hash = hashlib.sha256(data).hexdigest()
+    if not getattr(settings, 'IMAGE_PREFLIGHT_ENABLED', True):
+        return PreflightResult(data, None, None, content_hash, len(data), False)
+
+    config = get_preflight_config(kind)
+    extension, mime_type = _FORMATS[config["format"]]
+    cache_path = os.path.join(_cache_dir(kind), f"{content_hash}_{_config_version(config)}{extension}")
+
+    started = time.perf_counter()
+    try:
+        with open(cache_path, "rb") as f:
+            output = f.read()
+        os.utime(cache_path)
+        cached = True
+    except OSError:
+        cached = False
+        try:
+            output = _encode(data, config)
+        except Exception as e:
+            logger.warning(f"Image preflight failed for a {kind} image, storing it unchanged: {e}")
+            _count(kind, images=1, failed=1, source_bytes=len(data), output_bytes=len(data))
+            return PreflightResult(data, None, None, content_hash, len(data), False)
+        try:
+            _store_cached(cache_path, output)
+            _maybe_prune()
+        except OSError as e:
+            logger.warning(f"Could not cache preflight output {cache_path}: {e}")
+
+    _count(kind, images=1, cache_hits=int(cached), source_bytes=len(data), output_bytes=len(output),
+           elapsed_ms=round((time.perf_counter() - started) * 1000))
+    return PreflightResult(output, extension, mime_type, content_hash, len(data), cached)
+
+
+def _read_upload(uploaded_file) -> bytes:
+    uploaded_file.seek(0)
+    return b"".join(uploaded_file.chunks())
+
+
+def _with_extension(name: str, extension: str) -> str:
+    """
+    name with the output extension. A different original extension stays
+    in the stem (photo.png -> photo_png.jpg), so photo.png and photo.jpg
+    uploaded side by side do not overwrite each other.
+    """
+    stem, original = os.path.splitext(name)
+    if not extension or original.lower() == extension:
+        return name
+    if original:
+        stem = f"{stem}_{original.lstrip('.').lower()}"
+    return f"{stem}{extension}"
+
+
+def save_normalized_upload(uploaded_file, path: str, kind: str) -> str:
+    """
+    Persist an uploaded file (Django UploadedFile) normalised.
+
+    Args:
+        uploaded_file: The upload from request.FILES
+        path: Where the caller would have written the raw upload
+        kind: Image kind, see normalize_image()
+
+    Returns:
+        Path written: `path` with the extension of the output format
+        (see _with_extension())
+    """
+    result = normalize_image(_read_upload(uploaded_file), kind)
+    path = _with_extension(path, result.extension)
+    with open(path, "wb") as f:
+        f.write(result.data)
+    return path
+
+
+def normalized_content_file(uploaded_file, kind: str):
+    """Normalised copy of an upload as a ContentFile, for model FileFields."""
+    from django.core.files.base import ContentFile
+
+    result = normalize_image(_read_upload(uploaded_file), kind)
+    return ContentFile(result.data, name=_with_extension(os.path.basename(uploaded_file.name), result.extension))
+
+
+def get_preflight_stats() -> dict:
+    """Counters per image kind and overall, with bytes saved and mean added latency."""
+    raw = _redis().hgetall(PREFLIGHT_STATS_KEY)
+    kinds = {}
+    for field, value in raw.items():
+        kind, counter = field.rsplit(':', 1)
+        kinds.setdefault(kind, dict.fromkeys(STATS_COUNTERS, 0))[counter] = int(value)
+
+    def summarize(counts):
+        images = counts['images']
+        saved = counts['source_bytes'] - counts['output_bytes']
+        return {
+            **counts,
+            'bytes_saved': saved,
+            'size_reduction': round(saved / counts['source_bytes'], 4) if counts['source_bytes'] else None,
+            'cache_hit_rate': round(counts['cache_hits'] / images, 4) if images else None,
+            'mean_elapsed_ms': round(counts['elapsed_ms'] / images, 1) if images else None,
+        }
+
+    total = dict.fromkeys(STATS_COUNTERS, 0)
+    for counts in kinds.values():
+        for counter in STATS_COUNTERS:
+            total[counter] += counts.get(counter, 0)
+
+    return {
+        'kinds': {kind: summarize(counts) for kind, counts in sorted(kinds.items())},
+        'total': summarize(total),
+    }
@@ -0,0 +1,257 @@
+"""
+Storage of generated product image results.
+
+Generated images are stored one document per image in GeneratedProductImage,
+indexed on (collection, product_index, created_at). Collections generated
+before that model still carry embedded records in
+items[0].product_images[i].generated_images until they are backfilled with
+`manage.py migrate_generated_images`; the read helpers here merge both so
+callers do not need to care which layout a collection uses.
+
+Every write is a single insert or positional update, never a reload and
+save() of the whole Collection document, so concurrent workers cannot lose
+each other's results.
+"""
+
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+from .models import Collection, GeneratedProductImage
+
+# Keys of an embedded generated image record that map to model fields
+RECORD_FIELDS = ("type", "prompt", "local_path", "cloud_url", "model_used",
+                 "regenerated_images", "enhanced_images")
+
+
+def _product_path(product_index: int) -> str:
+    return f"items.0.product_images.{int(product_index)}"
+
+
+def _parse_created_at(value):
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return datetime.now(timezone.utc)
+
+
+def make_generated_product_image(collection_id, product_index, image_data: dict) -> GeneratedProductImage:
+    """Build an unsaved GeneratedProductImage from an embedded-format record."""
+    fields = {key: image_data[key] for key in RECORD_FIELDS if image_data.get(key) is not None}
+    metadata = {key: value for key, value in image_data.items()
+                if key not in RECORD_FIELDS and key not in ("id", "created_at")}
+    return GeneratedProductImage(
+        collection=ObjectId(str(collection_id)),
+        product_index=int(product_index),
+        created_at=_parse_created_at(image_data.get("created_at")),
+        metadata=metadata,
+        **fields,
+    )
+
+
+def _push_embedded_result(collection_id, product_index, list_path, entry, array_filters=None) -> bool:
+    """$push one entry onto a list under a legacy embedded product image."""
+    product_path = _product_path(product_index)
+    result = Collection._get_collection().update_one(
+        {"_id": ObjectId(str(collection_id)), product_path: {"$exists": True}},
+        {"$push": {f"{product_path}.{list_path}": entry}},
+        array_filters=array_filters,
+    )
+    return result.modified_count > 0
+
+
+def _push_child_result(collection_id, product_index, generated_local_path, list_name, entry) -> bool:
+    updated = GeneratedProductImage.objects(
+        collection=ObjectId(str(collection_id)),
+        local_path=generated_local_path,
+    ).update_one(**{f"push__{list_name}": entry})
+    if updated:
+        return True
+    # Not backfilled yet - the parent is still embedded in the collection
+    return _push_embedded_result(
+        collection_id,
+        product_index,
+        f"generated_images.$[parent].{list_name}",
+        entry,
+        array_filters=[{"parent.local_path": generated_local_path}],
+    )
+
+
+def push_generated_image(collection_id, product_index, image_data: dict):
+    """
+    Store a newly generated image for a product as its own document.
+
+    Args:
+        collection_id: Collection id
+        product_index: Index of the product in items[0].product_images
+        image_data: Generated image record (type, prompt, local_path, cloud_url, ...)
+    """
+    make_generated_product_image(collection_id, product_index, image_data).save()
+
+
+def push_regenerated_image(collection_id, product_index, generated_local_path, regenerated_data: dict) -> bool:
+    """
+    Append a regeneration to the generated image identified by its local_path.
+
+    Returns:
+        True if the regeneration was stored
+    """
+    return _push_child_result(collection_id, product_index, generated_local_path,
+                              "regenerated_images", regenerated_data)
+
+
+def push_enhanced_image(collection_id, product_index, generated_local_path, enhanced_data: dict) -> bool:
+    """
+    Append an enhanced version to the generated image identified by its local_path.
+
+    Returns:
+        True if the enhanced image was stored
+    """
+    return _push_child_result(collection_id, product_index, generated_local_path,
+                              "enhanced_images", enhanced_data)
+
+
+def get_generated_images_by_product(collection) -> dict:
+    """
+    Get all generated images of a collection grouped by product index.
+
+    Loads every image; read APIs should use page_generated_images_by_product.
+
+    Args:
+        collection: Collection document (embedded records are read from it)
+
+    Returns:
+        Dict mapping product index -> list of generated image records, oldest first
+    """
+    images = _embedded_generated_images(collection)
+    for doc in GeneratedProductImage.objects(collection=collection.id):
+        images.setdefault(doc.product_index, []).append(doc.to_record())
+    return images
+
+
+def _embedded_generated_images(collection) -> dict:
+    """Legacy embedded generated images of a collection by product index, oldest first."""
+    embedded = {}
+    if collection.items:
+        for idx, product in enumerate(collection.items[0].product_images or []):
+            if getattr(product, "generated_images", None):
+                embedded[idx] = list(product.generated_images)
+    return embedded
+
+
+def _page_product_records(collection_id, product_index, doc_total, embedded, page, page_size):
+    """
+    One page of a product's images, newest first: stored documents first, then
+    legacy embedded records (which all predate the stored documents).
+    """
+    offset = (page - 1) * page_size
+    records = []
+    if offset < doc_total:
+        qs = GeneratedProductImage.objects(
+            collection=ObjectId(str(collection_id)),
+            product_index=int(product_index),
+        ).order_by("-created_at")
+        records = [doc.to_record() for doc in qs.skip(offset).limit(page_size)]
+    if len(records) < page_size and embedded:
+        start = max(0, offset - doc_total)
+        newest_first = embedded[::-1]
+        records.extend(newest_first[start:start + page_size - len(records)])
+    return records
+
+
+def _count_docs_by_product(collection_id) -> dict:
+    pipeline = [
+        {"$match": {"collection": ObjectId(str(collection_id))}},
+        {"$group": {"_id": "$product_index", "count": {"$sum": 1}}},
+    ]
+    return {row["_id"]: row["count"] for row in GeneratedProductImage.objects.aggregate(pipeline)}
+
+
+def page_product_generated_images(collection_id, product_index, page=1, page_size=20, collection=None):
+    """
+    Page through the generated images of one product, newest first.
+
+    Args:
+        collection: Collection document, to include its legacy embedded records
+
+    Returns:
+        Tuple of (records, total)
+    """
+    embedded = _embedded_generated_images(collection).get(int(product_index), []) if collection else []
+    doc_total = GeneratedProductImage.objects(
+        collection=ObjectId(str(collection_id)),
+        product_index=int(product_index),
+    ).count()
+    records = _page_product_records(collection_id, product_index, doc_total, embedded, page, page_size)
+    return records, doc_total + len(embedded)
+
+
+def page_generated_images_by_product(collection, page=1, page_size=20):
+    """
+    The same page of generated images for every product of a collection.
+
+    Only the requested page is read for each product, so collection reads stay
+    bounded however many images have been generated.
+
+    Args:
+        collection: Collection document (embedded records are read from it)
+        page: 1-based page number
+        page_size: Images per product and page
+
+    Returns:
+        Tuple of (dict product index -> records newest first,
+                  dict product index -> total images of that product)
+    """
+    embedded = _embedded_generated_images(collection)
+    doc_totals = _count_docs_by_product(collection.id)
+
+    images, totals = {}, {}
+    for idx in set(embedded) | set(doc_totals):
+        doc_total = doc_totals.get(idx, 0)
+        product_embedded = embedded.get(idx, [])
+        totals[idx] = doc_total + len(product_embedded)
+        images[idx] = _page_product_records(
+            collection.id, idx, doc_total, product_embedded, page, page_size)
+    return images, totals
+
+
+def count_generated_images(collection) -> int:
+    """Count generated and regenerated images of a collection."""
+    total = 0
+    if collection.items:
+        for product in collection.items[0].product_images or []:
+            for image in getattr(product, "generated_images", None) or []:
+                total += 1 + len(image.get("regenerated_images") or [])
+
+    pipeline = [
+        {"$match": {"collection": collection.id}},
+        {"$group": {
+            "_id": None,
+            "images": {"$sum": 1},
+            "regenerated": {"$sum": {"$size": {"$ifNull": ["$regenerated_images", []]}}},
+        }},
+    ]
+    for row in GeneratedProductImage.objects.aggregate(pipeline):
+        total += row["images"] + row["regenerated"]
+    return total
+
+
+def clear_generated_images(collection_id):
+    """Delete every generated image record of a collection."""
+    GeneratedProductImage.objects(collection=ObjectId(str(collection_id))).delete()
+
+
+def remove_product_generated_images(collection_id, product_index):
+    """
+    Delete the generated images of a removed product and shift the
+    product_index of later products down to match the embedded list.
+    """
+    collection_oid = ObjectId(str(collection_id))
+    GeneratedProductImage.objects(collection=collection_oid, product_index=product_index).delete()
+    GeneratedProductImage.objects(
+        collection=collection_oid, product_index__gt=product_index
+    ).update(dec__product_index=1)
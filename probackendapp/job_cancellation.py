@@ -0,0 +1,239 @@
+"""
+Cancellation of bulk image generation jobs.
+
+A job stores the Celery task ids of its group and the queue each was sent
+to. Cancelling a job:
+
+  1. flips ImageGenerationJob to "cancelled" (only if still pending/running)
+  2. sets job:<job_id>:cancelled in Redis, which every task checks before it
+     takes a lock, deducts credits or calls Gemini
+  3. revokes the tasks that have not started so workers discard them unrun
+  4. gives those tasks' slots back to the queue's pending counter, since
+     revoked tasks never reach task_prerun
+  5. refunds credits a single-image job charged before enqueueing, if its
+     task did not run (refund_job_credits)
+
+job:<job_id>:started is the claim on each task's pending slot: task_prerun
+(claim_task_start) and cancel_job both add the task id and only the one
+that added it first moves the slot out of pending, so a task that starts
+while its job is being cancelled is never decremented twice. A task that
+retries takes its id back out (release_task_start), since the retry is a
+new pending message.
+"""
+
+import inspect
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Must outlive any task of the job that can still be delivered
+JOB_CANCEL_TTL_SECONDS = 24 * 60 * 60
+
+
+def get_job_cancelled_key(job_id: str) -> str:
+    """Get Redis key flagging a cancelled job."""
+    return f'job:{job_id}:cancelled'
+
+
+def get_job_started_key(job_id: str) -> str:
+    """Get Redis key for the set of started task ids of a job."""
+    return f'job:{job_id}:started'
+
+
+def _redis():
+    from .queue_load_manager import get_redis_client
+    return get_redis_client()
+
+
+# Add each task id to the started set; return the ids this call added
+_CLAIM_SCRIPT = """
+local claimed = {}
+for i, task_id in ipairs(ARGV) do
+    if i > 1 and redis.call('SADD', KEYS[1], task_id) == 1 then
+        table.insert(claimed, task_id)
+    end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return claimed
+"""
+
+
+def get_task_job_id(task, args, kwargs):
+    """The job_id argument of a task call, or None if the task has none."""
+    if kwargs and kwargs.get("job_id"):
+        return kwargs["job_id"]
+    try:
+        bound = inspect.signature(task.run).bind_partial(*(args or ()), **(kwargs or {}))
+    except (TypeError, ValueError):
+        return None
+    return bound.arguments.get("job_id")
+
+
+def claim_task_start(job_id: str, task_id: str) -> bool:
+    """
+    Claim a starting task's pending slot (see module docstring).
+
+    Returns:
+        False if cancel_job already released the slot, so the caller must
+        not decrement pending again
+    """
+    try:
+        started_key = get_job_started_key(job_id)
+        pipe = _redis().pipeline()
+        pipe.sadd(started_key, task_id)
+        pipe.expire(started_key, JOB_CANCEL_TTL_SECONDS)
+        return bool(pipe.execute()[0])
+    except Exception as e:
+        logger.warning(f"Could not claim start of task {task_id} of job {job_id}: {e}")
+        return True
+
+
+def release_task_start(job_id: str, task_id: str):
+    """Mark a retrying task as not started again; its retry is pending."""
+    try:
+        _redis().srem(get_job_started_key(job_id), task_id)
+    except Exception as e:
+        logger.warning(f"Could not release start of task {task_id} of job {job_id}: {e}")
+
+
+def mark_task_started(job_id: str, task_id: str) -> bool:
+    """
+    Record that a task of the job started and check for cancellation in
+    the same round trip. task_prerun normally added the id already; adding
+    it again is a no-op.
+
+    Returns:
+        True if the job has been cancelled and the task should stop
+    """
+    try:
+        started_key = get_job_started_key(job_id)
+        pipe = _redis().pipeline()
+        if task_id:
+            pipe.sadd(started_key, task_id)
+            pipe.expire(started_key, JOB_CANCEL_TTL_SECONDS)
+        pipe.exists(get_job_cancelled_key(job_id))
+        return bool(pipe.execute()[-1])
+    except Exception as e:
+        logger.warning(f"Could not check cancellation of job {job_id}: {e}")
+        return False
+
+
+def is_job_cancelled(job_id: str) -> bool:
+    """Cheap Redis check whether a job has been cancelled."""
+    if not job_id:
+        return False
+    try:
+        return bool(_redis().exists(get_job_cancelled_key(job_id)))
+    except Exception as e:
+        logger.warning(f"Could not check cancellation of job {job_id}: {e}")
+        return False
+
+
+def refund_job_credits(job_id: str, reason: str = "Refund: generation did not run") -> bool:
+    """
+    Refund the credits a single-image job charged before enqueueing
+    (ImageGenerationJob.credit_charge) when its task never ran or failed
+    without storing its image. The credits_refunded flag is set atomically,
+    so a job is refunded at most once whichever path (enqueue failure,
+    cancel, cancelled task, failed generation) gets here first.
+
+    Returns:
+        True if credits were refunded
+    """
+    from .job_models import ImageGenerationJob
+
+    try:
+        job = ImageGenerationJob.objects(
+            job_id=job_id, credit_charge__amount__gt=0, credits_refunded__ne=True,
+        ).modify(set__credits_refunded=True)
+        if not job:
+            return False
+
+        from CREDITS.utils import refund_credits
+        from organization.models import Organization
+        from users.models import User
+
+        charge = job.credit_charge
+        result = refund_credits(
+            organization=Organization(id=charge["organization_id"]),
+            user=User(id=charge["user_id"]) if charge.get("user_id") else None,
+            amount=charge["amount"],
+            reason=reason,
+            metadata={"type": "job_refund", "job_id": job_id},
+        )
+        if not result['success']:
+            logger.warning(f"Could not refund job {job_id}: {result['message']}")
+            ImageGenerationJob.objects(job_id=job_id).update_one(set__credits_refunded=False)
+            return False
+        return True
+    except Exception as e:
+        logger.warning(f"Could not refund job {job_id}: {e}")
+        return False
+
+
+def cancel_job(job, reason: str = "Cancelled") -> int:
+    """
+    Cancel a bulk generation job and revoke its tasks that have not started.
+
+    Args:
+        job: ImageGenerationJob document
+        reason: Stored as the job error
+
+    Returns:
+        Number of tasks revoked before they started
+    """
+    from .job_models import ImageGenerationJob
+    from .job_progress import record_job_status
+    from .queue_load_manager import decrement_pending
+
+    # Only a live job can be cancelled; a finished one keeps its status
+    updated = ImageGenerationJob.objects(
+        job_id=job.job_id, status__in=["pending", "running"]
+    ).update_one(set__status="cancelled", set__error=reason, set__updated_at=datetime.utcnow())
+    if not updated:
+        return 0
+
+    r = _redis()
+    try:
+        r.set(get_job_cancelled_key(job.job_id), 1, ex=JOB_CANCEL_TTL_SECONDS)
+    except Exception as e:
+        logger.warning(f"Could not flag job {job.job_id} as cancelled: {e}")
+    record_job_status(job.job_id, "cancelled", reason)
+
+    task_ids = list(job.task_ids or [])
+    if not task_ids:
+        return 0
+
+    # Claim the slots of tasks not started yet in one atomic step; a task
+    # that reaches task_prerun meanwhile finds its id taken and skips pending
+    try:
+        not_started = r.eval(
+            _CLAIM_SCRIPT, 1, get_job_started_key(job.job_id),
+            JOB_CANCEL_TTL_SECONDS, *task_ids,
+        ) or []
+    except Exception as e:
+        logger.warning(f"Could not claim unstarted tasks of job {job.job_id}: {e}")
+        not_started = []
+    if not not_started:
+        return 0
+
+    from imgbackend.celery import app
+    app.control.revoke(not_started)
+    # A single-image job charged its credits up front and will not run now
+    refund_job_credits(job.job_id)
+
+    released = {}
+    task_queues = job.task_queues or {}
+    for task_id in not_started:
+        queue_name = task_queues.get(task_id) or job.queue_name
+        if queue_name:
+            released[queue_name] = released.get(queue_name, 0) + 1
+    try:
+        for queue_name, count in released.items():
+            decrement_pending(queue_name, count)
+    except Exception as e:
+        logger.warning(f"Could not release pending slots of job {job.job_id}: {e}")
+
+    logger.info(f"Cancelled job {job.job_id}: revoked {len(not_started)} of {len(task_ids)} tasks")
+    return len(not_started)
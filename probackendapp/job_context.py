@@ -0,0 +1,164 @@
+"""
+Per-job execution context for bulk product image generation.
+
+A bulk job fans out into one Celery task per (product, prompt key). Everything
+those tasks share - prompt templates, image model name, credit price, the
+selected model image and the product image locations - is resolved once when
+the job is created and stored as a versioned snapshot. Tasks then load only
+the snapshot instead of re-reading the user, collection, credit settings and
+prompt masters on every image.
+
+The snapshot is written once and never modified. It is cached in Redis for
+fast access by workers and persisted on the ImageGenerationJob document so a
+Redis flush does not break in-flight jobs.
+"""
+
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Bump when the snapshot layout changes; tasks rebuild stale snapshots.
+JOB_CONTEXT_VERSION = 1
+
+# Snapshots only need to outlive the job they belong to.
+JOB_CONTEXT_TTL_SECONDS = 24 * 60 * 60
+
+
+class JobContextError(Exception):
+    """Raised when a collection is not in a state that can be generated from."""
+
+
+def get_job_context_key(job_id: str) -> str:
+    """Get Redis key for a job's context snapshot."""
+    return f'job:{job_id}:context'
+
+
+def build_job_context(collection, user):
+    """
+    Resolve everything the single-image tasks of a job share.
+
+    Args:
+        collection: Collection document the job generates for
+        user: User document that requested the job
+
+    Returns:
+        JSON-serialisable snapshot dict
+
+    Raises:
+        JobContextError: If the collection has no model, prompts or products
+    """
+    from django.conf import settings
+    from CREDITS.utils import get_credit_settings, get_image_model_name, get_user_organization
+    from .views import get_product_model_prompt_templates
+
+    if not collection.items:
+        raise JobContextError("No items found in collection.")
+
+    item = collection.items[0]
+
+    selected_model = item.selected_model if hasattr(item, "selected_model") else None
+    if not selected_model:
+        raise JobContextError("No model selected. Please select a model first.")
+
+    if not hasattr(item, "generated_prompts") or not item.generated_prompts:
+        raise JobContextError("No generated prompts found.")
+
+    credit_settings = get_credit_settings()
+    organization = get_user_organization(user) if user else None
+
+    products = {}
+    for idx, product in enumerate(item.product_images or []):
+        products[str(idx)] = {
+            "path": getattr(product, "uploaded_image_path", None) or "",
+            "url": getattr(product, "uploaded_image_url", None) or "",
+        }
+
+    return {
+        "version": JOB_CONTEXT_VERSION,
+        "collection_id": str(collection.id),
+        "project_id": str(collection.project.id) if collection.project else None,
+        "user_id": str(user.id) if user else None,
+        "organization_id": str(organization.id) if organization else None,
+        "model_name": get_image_model_name(default_model=settings.IMAGE_MODEL_NAME),
+        "credits_per_image": credit_settings['credits_per_image_generation'],
+        "prompt_templates": get_product_model_prompt_templates(),
+        "generated_prompts": dict(item.generated_prompts),
+        "selected_model": {
+            "type": selected_model.get("type"),
+            "local": selected_model.get("local"),
+            "cloud": selected_model.get("cloud"),
+            "name": selected_model.get("name", ""),
+        },
+        "products": products,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def store_job_context(job_id: str, context: dict):
+    """
+    Cache a job's context snapshot in Redis.
+    The durable copy lives on ImageGenerationJob.context.
+    """
+    try:
+        from .queue_load_manager import get_redis_client
+        r = get_redis_client()
+        r.set(get_job_context_key(job_id), json.dumps(context), ex=JOB_CONTEXT_TTL_SECONDS)
+    except Exception as e:
+        logger.warning(f"Could not cache context for job {job_id}: {e}")
+
+
+def load_job_context(job_id: str):
+    """
+    Load a job's context snapshot, preferring Redis over MongoDB.
+
+    Returns:
+        Snapshot dict, or None if the job has no snapshot of the current version
+    """
+    if not job_id:
+        return None
+
+    context = None
+    try:
+        from .queue_load_manager import get_redis_client
+        raw = get_redis_client().get(get_job_context_key(job_id))
+        if raw:
+            context = json.loads(raw)
+    except Exception as e:
+        logger.warning(f"Could not read cached context for job {job_id}: {e}")
+
+    if context is None:
+        from .job_models import ImageGenerationJob
+        job = ImageGenerationJob.objects(job_id=job_id).only("context").first()
+        context = job.context if job and job.context else None
+        if context:
+            store_job_context(job_id, context)
+
+    if not context or context.get("version") != JOB_CONTEXT_VERSION:
+        return None
+    return context
+
+
+@lru_cache(maxsize=8)
+def _read_image_bytes(path: str, mtime_ns: int, size: int) -> bytes:
+    # mtime_ns and size are part of the cache key so a replaced file is re-read
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def get_model_image_bytes(context: dict):
+    """
+    Return the selected model image of a job as raw bytes.
+    The file is read once per worker process, not once per task.
+
+    Returns:
+        Image bytes, or None if the image is missing on this server
+    """
+    path = (context.get("selected_model") or {}).get("local")
+    if not path or not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return _read_image_bytes(path, stat.st_mtime_ns, stat.st_size)
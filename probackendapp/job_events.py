@@ -0,0 +1,171 @@
+"""
+Server-Sent Events stream of bulk image generation job progress.
+
+GET /probackendapp/api/jobs/<job_id>/events/ streams the events that tasks
+publish through probackendapp.job_progress:
+
+  event: image_completed   id: <cursor>   data: {"image": {...}, "cursor": n}
+  event: image_failed                     data: {"product_index", "prompt_key", "error"}
+  event: job_completed                    data: {"status": ..., "error": ...}
+
+The stream starts by replaying images after the `since` cursor (or the
+Last-Event-ID header sent by a reconnecting EventSource), so clients never
+miss an image between connections. It closes after job_completed, or after
+STREAM_MAX_SECONDS so that EventSource reconnects with its last id.
+
+This view is async and is only non-blocking when served through
+imgbackend/asgi.py; under WSGI clients should long-poll
+api_job_images with `since` and `wait` instead.
+"""
+
+import asyncio
+import json
+import logging
+import time
+
+import jwt
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from .job_progress import TERMINAL_JOB_STATUSES, get_job_delta, get_job_events_channel
+from .permissions import check_job_access
+
+logger = logging.getLogger(__name__)
+
+# Comment line sent when idle so proxies keep the connection open
+KEEPALIVE_SECONDS = 15
+# EventSource reconnects by itself; bound how long one request holds a socket
+STREAM_MAX_SECONDS = 600
+
+
+def _format_event(event: str, data: dict, event_id=None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _get_authenticated_user(request):
+    """
+    Resolve the user from a Bearer token, or from a `token` query parameter
+    because browsers' EventSource cannot send an Authorization header.
+    """
+    from users.models import User
+
+    auth_header = request.META.get('HTTP_AUTHORIZATION') or ''
+    token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else request.GET.get('token')
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+    except jwt.InvalidTokenError:
+        return None
+    return User.objects(id=payload.get('id')).first()
+
+
+async def _stream_job_events(job_id: str, since: int, snapshot: dict):
+    from .queue_load_manager import get_async_redis_client
+
+    cursor = since
+    for image in snapshot["images"]:
+        cursor += 1
+        yield _format_event("image_completed", {"image": image, "cursor": cursor}, cursor)
+    if snapshot["status"] in TERMINAL_JOB_STATUSES:
+        yield _format_event("job_completed", {"status": snapshot["status"], "error": snapshot.get("error")})
+        return
+
+    client = get_async_redis_client()
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    try:
+        await pubsub.subscribe(get_job_events_channel(job_id))
+
+        # Catch up on anything published between the snapshot and subscribing
+        caught_up = await sync_to_async(get_job_delta)(job_id, cursor)
+        if caught_up:
+            for image in caught_up["images"]:
+                cursor += 1
+                yield _format_event("image_completed", {"image": image, "cursor": cursor}, cursor)
+            if caught_up["status"] in TERMINAL_JOB_STATUSES:
+                yield _format_event("job_completed", {"status": caught_up["status"], "error": caught_up.get("error")})
+                return
+
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            message = await pubsub.get_message(timeout=KEEPALIVE_SECONDS)
+            if not message:
+                yield ": keepalive\n\n"
+                continue
+            if message.get("type") != "message":
+                continue
+
+            payload = json.loads(message["data"])
+            event, data = payload.get("event"), payload.get("data") or {}
+            if event == "image_completed":
+                # Already replayed from the snapshot
+                if data.get("cursor", 0) <= cursor:
+                    continue
+                cursor = data["cursor"]
+                yield _format_event(event, data, cursor)
+            else:
+                yield _format_event(event, data)
+                if event == "job_completed":
+                    return
+    except asyncio.CancelledError:
+        # Client disconnected
+        raise
+    except Exception as e:
+        logger.warning(f"Job event stream for {job_id} stopped: {e}")
+    finally:
+        await pubsub.aclose()
+        await client.aclose()
+
+
+@csrf_exempt
+async def api_job_events(request, job_id):
+    """
+    Stream progress events of a bulk generation job as Server-Sent Events.
+
+    Only the user who started the job and members of its project may
+    follow it.
+
+    Query params:
+        since: Number of images the client already has (default 0)
+        token: JWT, for clients that cannot send an Authorization header
+    """
+    if request.method == "OPTIONS":
+        return JsonResponse({}, status=200)
+    if request.method != "GET":
+        return JsonResponse({"success": False, "error": "Method not allowed."}, status=405)
+
+    user = await sync_to_async(_get_authenticated_user)(request)
+    if not user:
+        return JsonResponse({'message': 'Authorization denied'}, status=401)
+
+    allowed = await sync_to_async(check_job_access)(user, job_id)
+    if allowed is None:
+        return JsonResponse({"success": False, "error": "Job not found."}, status=404)
+    if not allowed:
+        return JsonResponse({"success": False, "error": "You do not have permission to view this job."}, status=403)
+
+    try:
+        since = int(request.META.get("HTTP_LAST_EVENT_ID") or request.GET.get("since") or 0)
+    except ValueError:
+        return JsonResponse({"success": False, "error": "since must be an integer."}, status=400)
+    since = max(0, since)
+
+    snapshot = await sync_to_async(get_job_delta)(job_id, since)
+    if not snapshot:
+        return JsonResponse({"success": False, "error": "Job not found."}, status=404)
+
+    response = StreamingHttpResponse(
+        _stream_job_events(job_id, since, snapshot),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
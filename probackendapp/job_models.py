@@ -8,6 +8,7 @@ from mongoengine import (
     DictField,
     ListField,
     ReferenceField,
+    BooleanField,
 )
 
 from users.models import User
@@ -34,7 +35,7 @@ class ImageGenerationJob(Document):
 
     # Status for simple job lifecycle tracking
     status = StringField(
-        choices=["pending", "running", "completed", "failed"],
+        choices=["pending", "running", "completed", "failed", "cancelled"],
         default="pending",
     )
     error = StringField()
@@ -43,6 +44,26 @@ class ImageGenerationJob(Document):
     # Each entry is a small dict with URLs and minimal metadata.
     images = ListField(DictField(), default=list)
 
+    # Immutable snapshot shared by the job's single-image tasks
+    # (prompt templates, model name, credit price, product paths).
+    # See job_context.py.
+    context = DictField()
+
+    # Celery task ids of the job's group and the queue each was sent to,
+    # so the job can be cancelled. See job_cancellation.py.
+    task_ids = ListField(StringField(), default=list)
+    task_queues = DictField()
+    # Tasks per queue (see queue_load_manager.place_batch); queue_name is
+    # the single queue of jobs placed before batches were spread
+    queue_allocation = DictField()
+    queue_name = StringField()
+
+    # Credits a single-image job charged before enqueueing (organization_id,
+    # user_id, amount); refunded once if its task never runs or fails. See
+    # job_cancellation.refund_job_credits.
+    credit_charge = DictField()
+    credits_refunded = BooleanField(default=False)
+
     created_at = DateTimeField(default=datetime.utcnow)
     updated_at = DateTimeField(default=datetime.utcnow)
 
@@ -58,5 +79,23 @@ class ImageGenerationJob(Document):
         return super().save(*args, **kwargs)
 
 
+class GenerationLeaseRecord(Document):
+    """
+    MongoDB fallback for generation_lock leases, used when Redis is down.
+    Expired leases are removed by the TTL index on expires_at.
+    """
 
+    key = StringField(required=True, unique=True)
+    owner = StringField(required=True)
+    expires_at = DateTimeField(required=True)
+    # Set once the work finished; blocks redelivered duplicates until expiry
+    done = BooleanField(default=False)
 
+    meta = {
+        "collection": "generation_leases",
+        "indexes": [
+            {"fields": ["expires_at"], "expireAfterSeconds": 0},
+        ],
+        "strict": False,
+        "allow_inheritance": False
+    }
@@ -0,0 +1,250 @@
+"""
+Redis mirror of bulk image generation job progress.
+
+ImageGenerationJob in MongoDB stays the durable record. Tasks additionally
+mirror counters, status and each completed image into Redis so clients can
+poll for only the images completed since their last poll without a MongoDB
+round trip:
+
+  job:<job_id>:progress  hash  status, total_images, completed_images, error
+  job:<job_id>:images    list  JSON image records in completion order
+
+A poll cursor is simply the number of images the client has already seen.
+
+Every change is also published on the job:<job_id>:events pub/sub channel
+as {"event": ..., "data": ...} with events image_completed (data carries the
+image and its cursor), image_failed and job_completed (data carries the
+final status), which feed the job event stream and long-poll waits.
+"""
+
+import json
+import logging
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Progress only needs to outlive the polling of the job it belongs to.
+JOB_PROGRESS_TTL_SECONDS = 24 * 60 * 60
+
+
+def get_job_progress_key(job_id: str) -> str:
+    """Get Redis key for a job's progress hash."""
+    return f'job:{job_id}:progress'
+
+
+def get_job_images_key(job_id: str) -> str:
+    """Get Redis key for a job's completed images list."""
+    return f'job:{job_id}:images'
+
+
+def get_job_events_channel(job_id: str) -> str:
+    """Get Redis pub/sub channel for a job's events."""
+    return f'job:{job_id}:events'
+
+
+# Statuses after which a job produces no further events
+TERMINAL_JOB_STATUSES = ("completed", "failed", "cancelled")
+
+
+# KEYS[1] progress  KEYS[2] images
+# ARGV[1] image JSON  ARGV[2] updated_at  ARGV[3] ttl seconds
+# Returns {cursor, completed, total}, or nil if the job is not mirrored.
+# Status only moves to running from pending/running, so an image finishing
+# after the job was cancelled or failed leaves that terminal status alone.
+_IMAGE_COMPLETED_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+local cursor = redis.call('RPUSH', KEYS[2], ARGV[1])
+local completed = redis.call('HINCRBY', KEYS[1], 'completed_images', 1)
+local status = redis.call('HGET', KEYS[1], 'status')
+if not status or status == 'pending' or status == 'running' then
+    redis.call('HSET', KEYS[1], 'status', 'running')
+end
+redis.call('HSET', KEYS[1], 'updated_at', ARGV[2])
+local total = tonumber(redis.call('HGET', KEYS[1], 'total_images')) or 0
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return {cursor, completed, total}
+"""
+
+
+def _redis():
+    from .queue_load_manager import get_redis_client
+    return get_redis_client()
+
+
+def init_job_progress(job_id: str, total_images: int, status: str = "running"):
+    """Create the progress mirror for a new job."""
+    try:
+        progress_key = get_job_progress_key(job_id)
+        pipe = _redis().pipeline()
+        pipe.hset(progress_key, mapping={
+            "status": status,
+            "total_images": total_images,
+            "completed_images": 0,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        })
+        pipe.expire(progress_key, JOB_PROGRESS_TTL_SECONDS)
+        pipe.delete(get_job_images_key(job_id))
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not initialise progress for job {job_id}: {e}")
+
+
+def record_image_completed(job_id: str, image_info: dict):
+    """
+    Append a completed image and bump the completed counter.
+
+    Returns:
+        Tuple of (completed_images, total_images), or None if the job is not
+        mirrored or Redis is unavailable
+    """
+    try:
+        result = _redis().eval(
+            _IMAGE_COMPLETED_SCRIPT, 2, get_job_progress_key(job_id), get_job_images_key(job_id),
+            json.dumps(image_info), datetime.now(timezone.utc).isoformat(), JOB_PROGRESS_TTL_SECONDS)
+        # A partial mirror would report wrong totals; let Mongo serve this job
+        if result is None:
+            return None
+        cursor, completed, total = result
+        publish_job_event(job_id, "image_completed", {
+            "image": image_info,
+            "cursor": int(cursor),
+        })
+        return int(completed), int(total)
+    except Exception as e:
+        logger.warning(f"Could not record progress for job {job_id}: {e}")
+        return None
+
+
+def record_job_status(job_id: str, status: str, error: str = None):
+    """Mirror a job status change (completed, failed, cancelled)."""
+    try:
+        mapping = {
+            "status": status,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if error:
+            mapping["error"] = error
+        progress_key = get_job_progress_key(job_id)
+        r = _redis()
+        # Never create a mirror for a job that has none (e.g. expired)
+        if r.exists(progress_key):
+            r.hset(progress_key, mapping=mapping)
+        if status in TERMINAL_JOB_STATUSES:
+            publish_job_event(job_id, "job_completed", {"status": status, "error": error})
+    except Exception as e:
+        logger.warning(f"Could not record status for job {job_id}: {e}")
+
+
+def record_image_failed(job_id: str, product_index: int, prompt_key: str, error: str):
+    """Announce that one image of a job failed."""
+    publish_job_event(job_id, "image_failed", {
+        "product_index": product_index,
+        "prompt_key": prompt_key,
+        "error": error,
+    })
+
+
+def publish_job_event(job_id: str, event: str, data: dict):
+    """Publish a job event to its pub/sub channel. Never raises."""
+    try:
+        _redis().publish(get_job_events_channel(job_id), json.dumps({"event": event, "data": data}))
+    except Exception as e:
+        logger.warning(f"Could not publish {event} for job {job_id}: {e}")
+
+
+def get_job_progress(job_id: str, since: int = 0):
+    """
+    Read a job's progress and the images completed after `since`.
+
+    Returns:
+        Dict with status, counters, images and next cursor, or None if the
+        job has no mirror in Redis
+    """
+    pipe = _redis().pipeline()
+    pipe.hgetall(get_job_progress_key(job_id))
+    pipe.lrange(get_job_images_key(job_id), max(0, since), -1)
+    progress, raw_images = pipe.execute()
+    if not progress:
+        return None
+
+    images = [json.loads(raw) for raw in raw_images]
+    return {
+        "status": progress.get("status"),
+        "total_images": int(progress.get("total_images") or 0),
+        "completed_images": int(progress.get("completed_images") or 0),
+        "error": progress.get("error"),
+        "updated_at": progress.get("updated_at"),
+        "images": images,
+        "cursor": max(0, since) + len(images),
+    }
+
+
+def get_job_delta(job_id: str, since: int = 0):
+    """
+    Like get_job_progress(), falling back to the ImageGenerationJob document
+    when the job has no Redis mirror (e.g. it expired).
+
+    Returns:
+        Progress dict, or None if the job does not exist
+    """
+    try:
+        progress = get_job_progress(job_id, since)
+    except Exception as e:
+        logger.warning(f"Job progress mirror unavailable for {job_id}: {e}")
+        progress = None
+    if progress:
+        return progress
+
+    from .job_models import ImageGenerationJob
+    job = ImageGenerationJob.objects(job_id=job_id).only(
+        "status", "total_images", "completed_images", "error", "updated_at", "images").first()
+    if not job:
+        return None
+    since = max(0, since)
+    images = (job.images or [])[since:]
+    return {
+        "status": job.status,
+        "total_images": job.total_images,
+        "completed_images": job.completed_images,
+        "error": job.error,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+        "images": images,
+        "cursor": since + len(images),
+    }
+
+
+def wait_for_job_delta(job_id: str, since: int = 0, timeout: float = 25):
+    """
+    Long-poll: return as soon as the job has images after `since` or has
+    finished, waiting up to `timeout` seconds for its next event otherwise.
+
+    Returns:
+        Progress dict as get_job_delta(), or None if the job does not exist
+    """
+    progress = get_job_delta(job_id, since)
+    if not progress or progress["images"] or progress["status"] in TERMINAL_JOB_STATUSES or timeout <= 0:
+        return progress
+
+    pubsub = _redis().pubsub(ignore_subscribe_messages=True)
+    try:
+        pubsub.subscribe(get_job_events_channel(job_id))
+        # Re-read after subscribing so an event published in between is not missed
+        progress = get_job_delta(job_id, since)
+        if progress["images"] or progress["status"] in TERMINAL_JOB_STATUSES:
+            return progress
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            message = pubsub.get_message(timeout=min(1.0, deadline - time.monotonic()))
+            if message and message.get("type") == "message":
+                return get_job_delta(job_id, since)
+        return progress
+    except Exception as e:
+        logger.warning(f"Long-poll wait failed for job {job_id}: {e}")
+        return get_job_delta(job_id, since)
+    finally:
+        pubsub.close()
@@ -0,0 +1,98 @@
+"""
+Django management command measuring the per-call cost of a fresh Gemini client.
+
+Serves a minimal generateContent stand-in on 127.0.0.1 (HTTP/1.1
+keep-alive) and sends the same text request through it repeatedly:
+
+  fresh  - genai.Client() per call, as tasks and call_gemini_api used to
+  pooled - imgbackend.ai_utils.get_client(), one client per process
+
+Each new connection to the stand-in waits --handshake-ms first, standing in
+for the TCP + TLS setup a real connection to the API pays; the pooled
+client only pays it once. The rate limiter is bypassed so only the client
+cost is measured. Nothing is sent to Google.
+
+Run with: python manage.py benchmark_gemini_client [--calls 50] [--handshake-ms 60]
+"""
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+from imgbackend.ai_utils import genai, get_client, types
+
+RESPONSE = json.dumps({
+    "candidates": [{
+        "content": {"role": "model", "parts": [{"text": "ok"}]},
+        "finishReason": "STOP",
+    }],
+}).encode("utf-8")
+
+
+def _handler(handshake_seconds, connections):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            connections.append(1)
+            time.sleep(handshake_seconds)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(RESPONSE)))
+            self.end_headers()
+            self.wfile.write(RESPONSE)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class Command(BaseCommand):
+    help = 'Compare a fresh Gemini client per call with the pooled per-process client'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=50)
+        parser.add_argument('--handshake-ms', type=float, default=60.0,
+                            help='Delay per new connection, standing in for TCP + TLS setup')
+        parser.add_argument('--model', default='gemini-2.5-flash')
+
+    def handle(self, *args, **options):
+        connections = []
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _handler(options['handshake_ms'] / 1000, connections))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        http_options = types.HttpOptions(base_url=f"http://127.0.0.1:{server.server_address[1]}")
+
+        try:
+            results = {}
+            for mode in ('fresh', 'pooled'):
+                connections.clear()
+                timings = []
+                for _ in range(options['calls']):
+                    started = time.perf_counter()
+                    if mode == 'fresh':
+                        client = genai.Client(api_key='benchmark', http_options=http_options)
+                    else:
+                        client = get_client(api_key='benchmark', rate_limited=False, http_options=http_options)
+                    client.models.generate_content(model=options['model'], contents='ping')
+                    timings.append(time.perf_counter() - started)
+                results[mode] = timings
+                timings = sorted(timings)
+                self.stdout.write(
+                    f"{mode:>6} calls={len(timings)} connections={len(connections):<3} "
+                    f"mean={statistics.mean(timings) * 1000:7.1f}ms "
+                    f"p50={statistics.median(timings) * 1000:7.1f}ms "
+                    f"p95={timings[max(0, int(len(timings) * 0.95) - 1)] * 1000:7.1f}ms")
+        finally:
+            server.shutdown()
+
+        saved = statistics.mean(results['fresh']) - statistics.mean(results['pooled'])
+        self.stdout.write(f"saved per call: {saved * 1000:.1f}ms")
@@ -0,0 +1,151 @@
+"""
+Django management command measuring the memory cost of sending images to Gemini.
+
+Builds the campaign shot request (generate_campaign_shot_advanced_task) for
+--ornaments ornament images and --themes theme images, both ways:
+
+  base64 - {"inline_data": {"data": base64.b64encode(...).decode()}} per
+           image, as the tasks used to
+  bytes  - imgbackend.ai_utils.image_part_from_file()
+
+and sends it to a generateContent stand-in on 127.0.0.1 through the pooled
+client, so the SDK's own conversion and request encoding are included.
+Every task runs in a fresh forked process and reports its peak RSS (growth
+over the RSS it started with) and the tracemalloc peak of Python
+allocations. The images are random-noise JPEGs of --size x --size pixels,
+which compress about as badly as real product photos. Nothing is sent to
+Google.
+
+Run with: python manage.py benchmark_image_parts [--ornaments 5] [--themes 3] [--runs 3]
+"""
+import base64
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import statistics
+import tempfile
+import threading
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from imgbackend.ai_utils import get_client, image_part_from_file, types
+
+RESPONSE = json.dumps({
+    "candidates": [{
+        "content": {"role": "model", "parts": [{"text": "ok"}]},
+        "finishReason": "STOP",
+    }],
+}).encode("utf-8")
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        remaining = int(self.headers.get("Content-Length") or 0)
+        while remaining > 0:
+            remaining -= len(self.rfile.read(min(remaining, 1 << 20)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(RESPONSE)))
+        self.end_headers()
+        self.wfile.write(RESPONSE)
+
+    def log_message(self, *args):
+        pass
+
+
+def _base64_part(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    return {"inline_data": {"mime_type": "image/jpeg", "data": base64.b64encode(data).decode("utf-8")}}
+
+
+def _campaign_task(mode, ornament_paths, theme_paths, base_url, model, queue):
+    """One campaign request, as the task builds it; runs in its own process."""
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    build_part = _base64_part if mode == 'base64' else image_part_from_file
+    tracemalloc.start()
+
+    parts = []
+    for idx, path in enumerate(ornament_paths):
+        parts.append(build_part(path))
+        parts.append({"text": f"Reference for ornament: Ornament {idx + 1}"})
+    for path in theme_paths:
+        parts.append(build_part(path))
+        parts.append({"text": "Reference for background or theme styling."})
+    parts.append({"text": "Generate a campaign shot of the model wearing all the ornaments."})
+
+    client = get_client(api_key='benchmark', rate_limited=False,
+                        http_options=types.HttpOptions(base_url=base_url))
+    client.models.generate_content(model=model, contents=[{"parts": parts}])
+
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # ru_maxrss is in KiB on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put({"rss_growth": (peak_rss - start_rss) * 1024, "peak_rss": peak_rss * 1024, "traced_peak": traced_peak})
+
+
+class Command(BaseCommand):
+    help = 'Compare peak memory of base64 and raw-bytes image parts for a campaign request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ornaments', type=int, default=5)
+        parser.add_argument('--themes', type=int, default=3)
+        parser.add_argument('--size', type=int, default=2000,
+                            help='Width and height of each test image in pixels')
+        parser.add_argument('--runs', type=int, default=3,
+                            help='Tasks (fresh processes) per mode')
+        parser.add_argument('--model', default='gemini-3-pro-image-preview')
+
+    def handle(self, *args, **options):
+        workdir = tempfile.mkdtemp(prefix='benchmark_image_parts_')
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        try:
+            rng = np.random.default_rng(0)
+            paths = []
+            for idx in range(options['ornaments'] + options['themes']):
+                path = os.path.join(workdir, f"image_{idx}.jpg")
+                pixels = rng.integers(0, 256, (options['size'], options['size'], 3), dtype=np.uint8)
+                Image.fromarray(pixels).save(path, format="JPEG", quality=90)
+                paths.append(path)
+            ornament_paths, theme_paths = paths[:options['ornaments']], paths[options['ornaments']:]
+            total_mb = sum(os.path.getsize(p) for p in paths) / 2 ** 20
+            self.stdout.write(
+                f"{len(ornament_paths)} ornaments + {len(theme_paths)} themes, {total_mb:.1f} MB of JPEG")
+
+            ctx = multiprocessing.get_context('fork')
+            results = {}
+            for mode in ('base64', 'bytes'):
+                runs = []
+                for _ in range(options['runs']):
+                    queue = ctx.Queue()
+                    process = ctx.Process(target=_campaign_task, args=(
+                        mode, ornament_paths, theme_paths, base_url, options['model'], queue))
+                    process.start()
+                    runs.append(queue.get(timeout=300))
+                    process.join()
+                results[mode] = runs
+                self.stdout.write(
+                    f"{mode:>6} runs={len(runs)} "
+                    f"rss_growth={statistics.mean(r['rss_growth'] for r in runs) / 2 ** 20:7.1f}MB "
+                    f"peak_rss={max(r['peak_rss'] for r in runs) / 2 ** 20:7.1f}MB "
+                    f"traced_peak={statistics.mean(r['traced_peak'] for r in runs) / 2 ** 20:7.1f}MB")
+        finally:
+            server.shutdown()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        saved = (statistics.mean(r['rss_growth'] for r in results['base64'])
+                 - statistics.mean(r['rss_growth'] for r in results['bytes']))
+        self.stdout.write(f"saved per task: {saved / 2 ** 20:.1f}MB")
@@ -0,0 +1,66 @@
+"""
+Django management command timing master-analysis generation for a collection.
+
+Builds the master-analysis prompt of every category with two or more
+analyzed reference images (existing master analyses are ignored) and sends
+them to Gemini twice:
+
+  sequential - one after another, as api_project_setup_select used to
+  concurrent - utils.call_gemini_api_many, as it does now
+
+Nothing is saved. Use a collection with all five categories populated to
+see the full saving.
+
+Run with: python manage.py benchmark_master_analysis --collection <id>
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from probackendapp.api_views import build_master_analysis_prompt
+from probackendapp.models import Collection
+from probackendapp.utils import call_gemini_api, call_gemini_api_many
+
+
+class Command(BaseCommand):
+    help = 'Compare sequential and concurrent master-analysis generation on a collection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collection', required=True, help='Collection id')
+
+    def handle(self, *args, **options):
+        collection = Collection.objects(id=options['collection']).first()
+        if not collection or not collection.items:
+            raise CommandError('Collection not found or has no items')
+        item = collection.items[0]
+
+        prompts = {}
+        for category in ('theme', 'background', 'pose', 'location', 'color'):
+            prompt = build_master_analysis_prompt(category, getattr(item, f'uploaded_{category}_images', []))
+            if prompt:
+                prompts[category] = prompt
+        if not prompts:
+            raise CommandError('No category has two or more analyzed images')
+        self.stdout.write(f"{len(prompts)} categories: {', '.join(prompts)}")
+
+        started = time.monotonic()
+        sequential = {}
+        for category, prompt in prompts.items():
+            call_started = time.monotonic()
+            call_gemini_api(prompt)
+            sequential[category] = time.monotonic() - call_started
+        sequential_wall = time.monotonic() - started
+
+        started = time.monotonic()
+        concurrent = call_gemini_api_many(prompts)
+        concurrent_wall = time.monotonic() - started
+
+        for category in prompts:
+            _, error, seconds = concurrent[category]
+            self.stdout.write(
+                f"  {category:<10} sequential={sequential[category]:6.2f}s concurrent={seconds:6.2f}s"
+                + (f" error={error}" if error else ""))
+        self.stdout.write(
+            f"sequential wall={sequential_wall:.2f}s  concurrent wall={concurrent_wall:.2f}s  "
+            f"saved={sequential_wall - concurrent_wall:.2f}s "
+            f"({(1 - concurrent_wall / sequential_wall) * 100:.0f}%)")
@@ -0,0 +1,126 @@
+"""
+Django management command reporting interactive latency under synthetic bulk load.
+
+Discrete-event simulation (no Redis, no workers) of NUM_QUEUES queues with
+`capacity` worker slots each, every queue kept saturated with a bulk
+backlog, while interactive tasks arrive as a Poisson stream:
+
+  shared - old behaviour: interactive .delay() lands on queue_0 behind bulk
+  lane   - select_interactive_queue(): least loaded queue, priority 0 while
+           interactive tasks hold less than INTERACTIVE_MAX_SHARE of slots
+
+Reports p50/p95/max interactive latency (enqueue -> done) and bulk
+throughput, so starvation of bulk shows up as a throughput drop. Use
+--interactive-per-minute well above capacity to check the share cap.
+
+Run with: python manage.py benchmark_priority_lane [--interactive-per-minute 6]
+"""
+import heapq
+import random
+import statistics
+
+from django.core.management.base import BaseCommand
+
+from probackendapp.queue_load_manager import NUM_QUEUES, PRIORITY_BULK, PRIORITY_INTERACTIVE
+
+
+class Command(BaseCommand):
+    help = 'Simulate p95 interactive latency with and without the priority lane'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--capacity', type=int, default=4,
+                            help='Worker slots per queue')
+        parser.add_argument('--bulk-backlog', type=int, default=50,
+                            help='Bulk tasks kept waiting per queue')
+        parser.add_argument('--interactive-per-minute', type=float, default=6.0)
+        parser.add_argument('--max-share', type=float, default=0.5,
+                            help='INTERACTIVE_MAX_SHARE')
+        parser.add_argument('--duration', type=float, default=3600)
+        parser.add_argument('--bulk-task-seconds', type=float, default=20.0)
+        parser.add_argument('--interactive-task-seconds', type=float, default=15.0)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{NUM_QUEUES} queues x {options['capacity']} slots, bulk backlog "
+            f"{options['bulk_backlog']}/queue, {options['interactive_per_minute']} interactive/min")
+        for policy in ('shared', 'lane'):
+            latencies, bulk_done = self._simulate(policy, options, random.Random(options['seed']))
+            latencies.sort()
+            p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)] if latencies else 0
+            self.stdout.write(
+                f"{policy:>6} interactive={len(latencies):<5} "
+                f"p50={statistics.median(latencies) if latencies else 0:7.1f}s "
+                f"p95={p95:7.1f}s max={latencies[-1] if latencies else 0:7.1f}s "
+                f"bulk/hour={bulk_done * 3600 / options['duration']:8.0f}")
+
+    def _service(self, mean, rng):
+        sigma = 0.5
+        return mean * rng.lognormvariate(-sigma * sigma / 2, sigma)
+
+    def _simulate(self, policy, options, rng):
+        capacity = options['capacity']
+        cap_inflight = max(1, int(NUM_QUEUES * capacity * options['max_share']))
+        waiting = [[] for _ in range(NUM_QUEUES)]   # heaps of (priority, seq, kind, enqueued_at)
+        running = [0] * NUM_QUEUES
+        inflight = 0
+        seq = 0
+        events = []
+        latencies = []
+        bulk_done = 0
+
+        def push(q, priority, kind, now):
+            nonlocal seq
+            seq += 1
+            heapq.heappush(waiting[q], (priority, seq, kind, now))
+
+        def start(q, now):
+            nonlocal seq
+            while waiting[q] and running[q] < capacity:
+                priority, _, kind, enqueued_at = heapq.heappop(waiting[q])
+                running[q] += 1
+                mean = options['interactive_task_seconds'] if kind != 'bulk' else options['bulk_task_seconds']
+                seq += 1
+                heapq.heappush(events, (now + self._service(mean, rng), seq, 'finish', q, (kind, enqueued_at)))
+
+        for q in range(NUM_QUEUES):
+            for _ in range(options['bulk_backlog'] + capacity):
+                push(q, PRIORITY_BULK, 'bulk', 0.0)
+            start(q, 0.0)
+
+        rate = options['interactive_per_minute'] / 60
+        t = rng.expovariate(rate)
+        while t < options['duration']:
+            seq += 1
+            heapq.heappush(events, (t, seq, 'arrive', None, None))
+            t += rng.expovariate(rate)
+
+        while events:
+            now, _, kind, q, payload = heapq.heappop(events)
+            if now > options['duration']:
+                break
+            if kind == 'arrive':
+                if policy == 'shared':
+                    q = 0
+                    push(q, PRIORITY_BULK, 'interactive', now)
+                else:
+                    q = min(range(NUM_QUEUES), key=lambda i: (len(waiting[i]) + running[i], i))
+                    if inflight < cap_inflight:
+                        inflight += 1
+                        push(q, PRIORITY_INTERACTIVE, 'interactive-lane', now)
+                    else:
+                        push(q, PRIORITY_BULK, 'interactive', now)
+                start(q, now)
+            else:
+                task_kind, enqueued_at = payload
+                running[q] -= 1
+                if task_kind == 'bulk':
+                    bulk_done += 1
+                    # The dispatcher keeps every queue saturated with bulk work
+                    push(q, PRIORITY_BULK, 'bulk', now)
+                else:
+                    latencies.append(now - enqueued_at)
+                    if task_kind == 'interactive-lane':
+                        inflight -= 1
+                start(q, now)
+        return latencies, bulk_done
@@ -0,0 +1,127 @@
+"""
+Django management command comparing generated-image result commits.
+
+  legacy - reload collection, append in Python, save(), reload to verify
+  push   - single write through probackendapp.image_results
+
+Runs against a throwaway collection at several writer concurrencies and
+reports per-image write latency, approximate bytes on the wire (BSON size of
+the documents read and the updates sent) and lost appends.
+
+Run with: python manage.py benchmark_result_writes
+"""
+import statistics
+import threading
+import time
+import uuid
+
+import bson
+from django.core.management.base import BaseCommand
+
+from probackendapp.image_results import (
+    count_generated_images,
+    make_generated_product_image,
+    push_generated_image,
+)
+from probackendapp.models import Collection, CollectionItem, ProductImage, Project
+
+
+class Command(BaseCommand):
+    help = 'Benchmark whole-collection save() against single-write commits for generated image results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', default='1,10,50',
+                            help='Comma-separated concurrent writer counts')
+        parser.add_argument('--writes-per-writer', type=int, default=5)
+        parser.add_argument('--products', type=int, default=40)
+        parser.add_argument('--existing-images', type=int, default=8,
+                            help='Generated images already stored per product')
+        parser.add_argument('--prompt-chars', type=int, default=2000,
+                            help='Prompt length stored with each image')
+
+    def handle(self, *args, **options):
+        writer_counts = [int(w) for w in options['writers'].split(',') if w.strip()]
+        project = Project(name=f"benchmark-{uuid.uuid4().hex[:8]}")
+        project.save()
+        try:
+            for writers in writer_counts:
+                for approach in ('legacy', 'push'):
+                    collection = self._make_collection(project, options)
+                    try:
+                        self._run(approach, collection, writers, options)
+                    finally:
+                        collection.delete()
+        finally:
+            project.delete()
+
+    def _make_collection(self, project, options):
+        products = []
+        for idx in range(options['products']):
+            products.append(ProductImage(
+                uploaded_image_url=f"https://example.com/product_{idx}.jpg",
+                uploaded_image_path=f"media/benchmark/product_{idx}.jpg",
+                generated_images=[self._image_record(options) for _ in range(options['existing_images'])],
+            ))
+        collection = Collection(project=project, items=[CollectionItem(product_images=products)])
+        collection.save()
+        return collection
+
+    def _image_record(self, options):
+        return {
+            "type": "model_image",
+            "prompt": "x" * options['prompt_chars'],
+            "local_path": f"media/benchmark/{uuid.uuid4()}.png",
+            "cloud_url": "https://example.com/generated.png",
+            "model_used": {"type": "ai", "local": "", "cloud": "", "name": ""},
+        }
+
+    def _legacy_write(self, collection_id, product_index, record):
+        collection = Collection.objects.get(id=collection_id)
+        read_bytes = len(bson.encode(collection.to_mongo()))
+        collection.items[0].product_images[product_index].generated_images.append(record)
+        sets, _ = collection._delta()
+        sent_bytes = len(bson.encode(sets))
+        collection.save()
+        collection.reload()
+        return sent_bytes + 2 * read_bytes
+
+    def _push_write(self, collection_id, product_index, record):
+        push_generated_image(collection_id, product_index, record)
+        return len(bson.encode(make_generated_product_image(collection_id, product_index, record).to_mongo()))
+
+    def _run(self, approach, collection, writers, options):
+        write = self._legacy_write if approach == 'legacy' else self._push_write
+        per_writer = options['writes_per_writer']
+        products = options['products']
+        latencies, wire_bytes = [], []
+        lock = threading.Lock()
+
+        def worker(worker_idx):
+            for n in range(per_writer):
+                record = self._image_record(options)
+                started = time.perf_counter()
+                sent = write(collection.id, (worker_idx + n) % products, record)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    wire_bytes.append(sent)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(writers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        collection.reload()
+        stored = count_generated_images(collection)
+        expected = products * options['existing_images'] + writers * per_writer
+
+        latencies.sort()
+        p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+        self.stdout.write(
+            f"{approach:>6} writers={writers:<3} "
+            f"mean={statistics.mean(latencies) * 1000:8.1f}ms "
+            f"p95={p95 * 1000:8.1f}ms "
+            f"bytes/image={int(statistics.mean(wire_bytes)):>9} "
+            f"lost={expected - stored}"
+        )
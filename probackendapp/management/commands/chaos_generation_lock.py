@@ -0,0 +1,122 @@
+"""
+Django management command that kills a worker mid-task to check generation leases.
+
+  1. a child process takes a lease and keeps it alive with its heartbeat
+  2. while the child lives, contenders must see HELD even after several TTLs
+  3. the child is SIGKILLed (no release, no cleanup, like a crashed worker)
+  4. a contender must take over once the lease expires, and not before
+  5. after the new owner completes, further deliveries must see DONE
+
+Run with: python manage.py chaos_generation_lock [--backend redis|mongo] [--ttl-ms 3000]
+"""
+import os
+import signal
+import subprocess
+import sys
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from probackendapp.generation_lock import ACQUIRED, DONE, HELD, GenerationLease
+
+
+class MongoOnlyLease(GenerationLease):
+    """Lease that behaves as if Redis were down."""
+
+    def _redis_acquire(self):
+        raise ConnectionError("Redis disabled for chaos test")
+
+
+class Command(BaseCommand):
+    help = 'Kill a lease holder mid-task and verify another worker takes over after expiry'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', choices=['redis', 'mongo'], default='redis')
+        parser.add_argument('--ttl-ms', type=int, default=3000)
+        parser.add_argument('--hold', help='internal: hold this lease key until killed')
+
+    def _lease(self, key, options):
+        lease_class = MongoOnlyLease if options['backend'] == 'mongo' else GenerationLease
+        return lease_class(key, ttl_ms=options['ttl_ms'])
+
+    def handle(self, *args, **options):
+        if options['hold']:
+            return self._hold(options['hold'], options)
+
+        key = f"lock:generation:chaos:{uuid.uuid4().hex}"
+        ttl_s = options['ttl_ms'] / 1000
+        child = subprocess.Popen(
+            [sys.executable, sys.argv[0], 'chaos_generation_lock', '--hold', key,
+             '--backend', options['backend'], '--ttl-ms', str(options['ttl_ms'])],
+            stdout=subprocess.PIPE, text=True,
+        )
+        try:
+            # Skip anything printed while Django starts up in the child
+            line = child.stdout.readline()
+            while line and line.strip() not in (ACQUIRED, HELD, DONE):
+                line = child.stdout.readline()
+            if line.strip() != ACQUIRED:
+                raise CommandError('Worker process could not take the lease')
+            self.stdout.write(f'worker pid={child.pid} holds {key} ({options["backend"]})')
+
+            # Heartbeat must keep the lease alive well past its TTL
+            deadline = time.monotonic() + 3 * ttl_s
+            while time.monotonic() < deadline:
+                status, _ = self._lease(key, options).acquire()
+                if status != HELD:
+                    raise CommandError(f'Lease of a live worker was lost: got {status}')
+                time.sleep(ttl_s / 4)
+            self.stdout.write(self.style.SUCCESS('✅ live worker kept its lease for 3 TTLs'))
+
+            os.kill(child.pid, signal.SIGKILL)
+            child.wait()
+            killed_at = time.monotonic()
+            self.stdout.write('worker killed mid-task')
+
+            successor = self._lease(key, options)
+            timeout = ttl_s * 2 + 5
+            while True:
+                status, _ = successor.acquire()
+                if status == ACQUIRED:
+                    break
+                if time.monotonic() - killed_at > timeout:
+                    raise CommandError(f'No takeover {timeout:.1f}s after the crash')
+                time.sleep(0.1)
+            takeover_s = time.monotonic() - killed_at
+            # The last heartbeat was at most a third of the TTL before the kill
+            if takeover_s < ttl_s * 2 / 3 - 0.2:
+                raise CommandError(f'Takeover after {takeover_s:.2f}s, before the lease could expire')
+            if takeover_s > ttl_s + 1:
+                raise CommandError(f'Takeover took {takeover_s:.2f}s, lease TTL is {ttl_s:.2f}s')
+            self.stdout.write(self.style.SUCCESS(f'✅ retry took over {takeover_s:.2f}s after the crash'))
+
+            successor.complete()
+            status, _ = self._lease(key, options).acquire()
+            if status != DONE:
+                raise CommandError(f'Duplicate delivery after completion got {status}, expected {DONE}')
+            self.stdout.write(self.style.SUCCESS('✅ duplicate delivery after completion is blocked'))
+        finally:
+            if child.poll() is None:
+                child.kill()
+            self._cleanup(key)
+
+    def _hold(self, key, options):
+        lease = self._lease(key, options)
+        status, _ = lease.acquire()
+        print(status, flush=True)
+        if status != ACQUIRED:
+            return
+        with lease.heartbeat():
+            # "Generating" until SIGKILLed
+            while True:
+                time.sleep(1)
+
+    def _cleanup(self, key):
+        from probackendapp.job_models import GenerationLeaseRecord
+        from probackendapp.queue_load_manager import get_redis_client
+        try:
+            get_redis_client().delete(key)
+        except Exception:
+            pass
+        GenerationLeaseRecord.objects(key=key).delete()
@@ -3,7 +3,8 @@ Django management command to ensure MongoDB indexes are created.
 Run with: python manage.py ensure_indexes
 """
 from django.core.management.base import BaseCommand
-from probackendapp.models import ImageGenerationHistory
+from probackendapp.models import ImageGenerationHistory, GeneratedProductImage, ImageAnalysisCacheEntry
+from probackendapp.job_models import GenerationLeaseRecord
 
 
 class Command(BaseCommand):
@@ -17,6 +18,18 @@ class Command(BaseCommand):
             self.stdout.write(
                 self.style.SUCCESS('✅ Successfully ensured ImageGenerationHistory unique index!')
             )
+            GeneratedProductImage.ensure_indexes()
+            self.stdout.write(
+                self.style.SUCCESS('✅ Successfully ensured GeneratedProductImage indexes!')
+            )
+            GenerationLeaseRecord.ensure_indexes()
+            self.stdout.write(
+                self.style.SUCCESS('✅ Successfully ensured GenerationLeaseRecord indexes!')
+            )
+            ImageAnalysisCacheEntry.ensure_indexes()
+            self.stdout.write(
+                self.style.SUCCESS('✅ Successfully ensured ImageAnalysisCacheEntry indexes!')
+            )
         except Exception as e:
             self.stdout.write(
                 self.style.WARNING(f'⚠️  Warning: {e}')
@@ -0,0 +1,95 @@
+"""
+Django management command to move generated images out of Collection documents.
+
+Copies every items[0].product_images[i].generated_images record into the
+GeneratedProductImage collection and then empties the embedded list, so
+Collection documents stay small. Safe to re-run: records already stored for
+the same product with the same cloud_url and local_path are skipped, and a
+product's embedded list is only emptied if it has not changed since it was
+copied.
+
+Run with: python manage.py migrate_generated_images [--collection <id>] [--dry-run]
+"""
+from bson import ObjectId
+from django.core.management.base import BaseCommand
+
+from probackendapp.image_results import make_generated_product_image
+from probackendapp.models import Collection, GeneratedProductImage
+
+
+def _record_key(product_index, record):
+    """Identity of a generated image within a collection."""
+    return (int(product_index), record.get("cloud_url") or "", record.get("local_path") or "")
+
+
+class Command(BaseCommand):
+    help = 'Backfill GeneratedProductImage from embedded collection generated_images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collection', help='Only migrate this collection id')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be migrated without writing')
+        parser.add_argument('--keep-embedded', action='store_true',
+                            help='Copy records but leave the embedded lists in place')
+
+    def handle(self, *args, **options):
+        GeneratedProductImage.ensure_indexes()
+
+        query = {"items.0.product_images.generated_images.0": {"$exists": True}}
+        if options['collection']:
+            query["_id"] = ObjectId(options['collection'])
+
+        collections = Collection._get_collection()
+        images = GeneratedProductImage._get_collection()
+        migrated_collections = copied = skipped = changed = 0
+
+        cursor = collections.find(query, {"items.product_images.generated_images": 1})
+        for raw in cursor:
+            collection_id = raw["_id"]
+            products = (raw.get("items") or [{}])[0].get("product_images") or []
+            existing = {
+                _record_key(doc.get("product_index", 0), doc)
+                for doc in images.find(
+                    {"collection": collection_id},
+                    {"product_index": 1, "cloud_url": 1, "local_path": 1},
+                )
+            }
+
+            for idx, product in enumerate(products):
+                embedded = product.get("generated_images") or []
+                if not embedded:
+                    continue
+
+                docs = []
+                for record in embedded:
+                    key = _record_key(idx, record)
+                    if key in existing:
+                        skipped += 1
+                        continue
+                    existing.add(key)
+                    docs.append(make_generated_product_image(collection_id, idx, record).to_mongo())
+
+                copied += len(docs)
+                if options['dry_run']:
+                    continue
+                if docs:
+                    images.insert_many(docs, ordered=False)
+
+                if not options['keep_embedded']:
+                    path = f"items.0.product_images.{idx}.generated_images"
+                    # Only clear if no result was appended while copying
+                    result = collections.update_one(
+                        {"_id": collection_id, path: embedded},
+                        {"$set": {path: []}},
+                    )
+                    if not result.modified_count:
+                        changed += 1
+                        self.stdout.write(self.style.WARNING(
+                            f'Collection {collection_id} product {idx} changed during copy; re-run to finish it'))
+
+            migrated_collections += 1
+
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}✅ {migrated_collections} collections, {copied} images copied, '
+            f'{skipped} already present, {changed} products left for a re-run'))
@@ -0,0 +1,33 @@
+"""
+Django management command to delete legacy lock placeholder history rows.
+
+Before generation leases, generate_single_image_task locked by inserting an
+ImageGenerationHistory row with image_url "http://lock-pending" that was
+never removed. Those rows are not real images and only pollute history.
+
+Run with: python manage.py purge_history_locks [--dry-run]
+"""
+from django.core.management.base import BaseCommand
+
+from probackendapp.models import ImageGenerationHistory
+
+
+class Command(BaseCommand):
+    help = 'Delete "http://lock-pending" placeholder rows from image generation history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the rows that would be deleted')
+
+    def handle(self, *args, **options):
+        query = {"image_url": "http://lock-pending", "image_type": "pending"}
+        history = ImageGenerationHistory._get_collection()
+
+        if options['dry_run']:
+            count = history.count_documents(query)
+            self.stdout.write(f'[dry run] {count} lock placeholder rows would be deleted')
+            return
+
+        result = history.delete_many(query)
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Deleted {result.deleted_count} lock placeholder rows'))
@@ -0,0 +1,38 @@
+"""
+Django management command to reconcile queue load counters.
+
+Compares queue:<name>:pending/running with the broker lists of queue_0..19
+and the tasks workers report through Celery inspect, prints the drift and
+corrects it (the same work the periodic reconcile_queue_counters_task does).
+
+Run with: python manage.py reconcile_queue_counters [--dry-run]
+"""
+from django.core.management.base import BaseCommand
+
+from probackendapp.queue_load_manager import reconcile_queue_counters
+
+
+class Command(BaseCommand):
+    help = 'Correct queue pending/running counters from broker and worker state'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only measure and report drift')
+
+    def handle(self, *args, **options):
+        result = reconcile_queue_counters(apply=not options['dry_run'])
+
+        if not result['inspected']:
+            self.stdout.write(self.style.WARNING(
+                '⚠️  No worker answered inspect; only raised pending counters below broker depth'))
+
+        for queue_name, entry in result['queues'].items():
+            if not entry['pending_drift'] and not entry['running_drift']:
+                continue
+            status = 'corrected' if entry['corrected'] else 'not corrected'
+            self.stdout.write(
+                f"{queue_name:>9} pending {entry['pending']}->{entry['actual_pending']} "
+                f"running {entry['running']}->{entry['actual_running']} ({status})")
+
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(f"{prefix}✅ total drift {result['total_drift']}"))
@@ -0,0 +1,199 @@
+"""
+Django management command simulating Gemini throttling with and without the
+cluster-wide rate limiter.
+
+Starts a throttling stub server on 127.0.0.1 that answers 429
+RESOURCE_EXHAUSTED whenever more than --provider-concurrency requests are in
+flight or its --provider-rps token bucket is empty, then runs --tasks
+calls from --workers threads against it:
+
+  uncoordinated - old behaviour: call straight away; a 429 fails the
+                  attempt and the task is retried after
+                  --retry-countdown x attempt (60s x attempt in the tasks,
+                  scaled down here), at most 3 times
+  limiter       - gemini_rate_limiter.call_with_permit() on a throwaway
+                  budget configured above the provider's real quota, so
+                  the AIMD controller has to find it
+
+Reports completed and failed tasks, 429s seen, throughput and task latency
+(submit -> done). Needs Redis; the throwaway budget is deleted afterwards.
+
+Run with: python manage.py simulate_gemini_rate_limit [--workers 40] [--tasks 300]
+"""
+import heapq
+import itertools
+import json
+import statistics
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from django.core.management.base import BaseCommand
+
+from probackendapp.gemini_rate_limiter import call_with_permit, get_limiter_state, mark_worker_process, reset_limiter
+
+
+class StubProvider:
+    """Quota of the stub server: a token bucket plus a concurrency cap."""
+
+    def __init__(self, rps, concurrency, latency):
+        self.rps = rps
+        self.concurrency = concurrency
+        self.latency = latency
+        self.tokens = float(rps)
+        self.updated = time.monotonic()
+        self.in_flight = 0
+        self.throttled = 0
+        self.served = 0
+        self.lock = threading.Lock()
+
+    def admit(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rps, self.tokens + (now - self.updated) * self.rps)
+            self.updated = now
+            if self.in_flight >= self.concurrency or self.tokens < 1:
+                self.throttled += 1
+                return False
+            self.tokens -= 1
+            self.in_flight += 1
+            return True
+
+    def done(self):
+        with self.lock:
+            self.in_flight -= 1
+            self.served += 1
+
+
+def _handler(provider):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if provider.admit():
+                time.sleep(provider.latency)
+                provider.done()
+                status, body = 200, {"candidates": [{"content": {"parts": [{"text": "ok"}]}}]}
+            else:
+                status, body = 429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}}
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class StubThrottled(Exception):
+    code = 429
+
+
+class Command(BaseCommand):
+    help = 'Simulate Gemini throttling with and without the shared rate limiter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=40)
+        parser.add_argument('--tasks', type=int, default=300)
+        parser.add_argument('--provider-rps', type=float, default=10.0)
+        parser.add_argument('--provider-concurrency', type=int, default=8)
+        parser.add_argument('--latency', type=float, default=0.3,
+                            help='Seconds per successful call')
+        parser.add_argument('--retry-countdown', type=float, default=3.0,
+                            help='Stand-in for the tasks\' 60s retry countdown')
+
+    def handle(self, *args, **options):
+        # The simulated callers are queue workers, with their permit timeout
+        mark_worker_process()
+        for mode in ('uncoordinated', 'limiter'):
+            provider = StubProvider(options['provider_rps'], options['provider_concurrency'], options['latency'])
+            server = ThreadingHTTPServer(('127.0.0.1', 0), _handler(provider))
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            url = f"http://127.0.0.1:{server.server_address[1]}/generate"
+            try:
+                result = self._run(mode, url, options)
+            finally:
+                server.shutdown()
+
+            latencies = sorted(result['latencies'])
+            p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)] if latencies else 0
+            self.stdout.write(
+                f"{mode:>13} completed={len(latencies):<4} failed={result['failed']:<4} "
+                f"429s={provider.throttled:<5} wall={result['wall']:6.1f}s "
+                f"throughput={len(latencies) / result['wall']:5.1f}/s "
+                f"p50={statistics.median(latencies) if latencies else 0:5.1f}s p95={p95:5.1f}s"
+                + (f" final_limit={result['limit']:.1f}" if result.get('limit') else ""))
+
+    def _call(self, session, url):
+        response = session.post(url, data=b'{}', timeout=30)
+        if response.status_code == 429:
+            raise StubThrottled("429 RESOURCE_EXHAUSTED")
+        response.raise_for_status()
+
+    def _run(self, mode, url, options):
+        budget = f"sim-{uuid.uuid4().hex[:8]}"
+        config = {
+            # Deliberately above the provider's real quota
+            "requests_per_minute": options['provider_rps'] * 60 * 1.5,
+            "burst": max(1, int(options['provider_rps'])),
+            "min_concurrency": 1,
+            "initial_concurrency": options['workers'],
+            "max_concurrency": options['workers'],
+        }
+        seq = itertools.count()
+        # (ready_at, seq, submitted_at, attempt)
+        pending = [(0.0, next(seq), 0.0, 0) for _ in range(options['tasks'])]
+        lock = threading.Lock()
+        latencies = []
+        failed = [0]
+        started = time.monotonic()
+
+        def worker():
+            session = requests.Session()
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    ready_at, _, submitted_at, attempt = heapq.heappop(pending)
+                    wait = ready_at - (time.monotonic() - started)
+                    if wait > 0:
+                        heapq.heappush(pending, (ready_at, next(seq), submitted_at, attempt))
+                if wait > 0:
+                    time.sleep(min(wait, 0.05))
+                    continue
+                try:
+                    if mode == 'limiter':
+                        call_with_permit(budget, self._call, session, url, config=config)
+                    else:
+                        self._call(session, url)
+                except Exception:
+                    if mode == 'uncoordinated' and attempt < 3:
+                        retry_at = time.monotonic() - started + options['retry_countdown'] * (attempt + 1)
+                        with lock:
+                            heapq.heappush(pending, (retry_at, next(seq), submitted_at, attempt + 1))
+                    else:
+                        with lock:
+                            failed[0] += 1
+                    continue
+                with lock:
+                    latencies.append(time.monotonic() - started - submitted_at)
+
+        threads = [threading.Thread(target=worker) for _ in range(options['workers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        result = {"latencies": latencies, "failed": failed[0], "wall": time.monotonic() - started}
+        if mode == 'limiter':
+            result["limit"] = get_limiter_state(budget)["limit"]
+            reset_limiter(budget)
+        return result
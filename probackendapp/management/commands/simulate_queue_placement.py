@@ -0,0 +1,142 @@
+"""
+Django management command simulating bulk job placement over the Celery queues.
+
+Discrete-event simulation (no Redis, no workers) of a mixed multi-tenant
+workload on NUM_QUEUES queues with `capacity` worker slots each:
+
+  single - old behaviour: the whole job goes to the least loaded queue
+  spread - queue_load_manager.plan_batch_placement with the per-tenant cap
+
+Reports job makespan (submit -> last image done) per job size class.
+
+Run with: python manage.py simulate_queue_placement [--seed 1] [--capacity 4]
+"""
+import heapq
+import random
+import statistics
+from collections import deque
+
+from django.core.management.base import BaseCommand
+
+from probackendapp.queue_load_manager import NUM_QUEUES, plan_batch_placement
+
+
+class Command(BaseCommand):
+    help = 'Simulate job makespan under single-queue and spread batch placement'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--capacity', type=int, default=4,
+                            help='Worker slots per queue')
+        parser.add_argument('--max-queues-per-tenant', type=int, default=5)
+        parser.add_argument('--duration', type=float, default=1800,
+                            help='Seconds over which jobs are submitted')
+        parser.add_argument('--bulk-tenants', type=int, default=3,
+                            help='Tenants each submitting several 200-image jobs')
+        parser.add_argument('--medium-jobs', type=int, default=30,
+                            help='40-image jobs from random tenants')
+        parser.add_argument('--small-jobs', type=int, default=150,
+                            help='4-image jobs from random tenants')
+        parser.add_argument('--mean-task-seconds', type=float, default=20.0)
+
+    def handle(self, *args, **options):
+        jobs = self._workload(options)
+        self.stdout.write(
+            f"{len(jobs)} jobs, {sum(j['size'] for j in jobs)} images, "
+            f"{NUM_QUEUES} queues x {options['capacity']} slots")
+
+        for policy in ('single', 'spread'):
+            rng = random.Random(options['seed'])
+            makespans = self._simulate(policy, jobs, options, rng)
+            self._report(policy, jobs, makespans)
+
+    def _workload(self, options):
+        rng = random.Random(options['seed'])
+        duration = options['duration']
+        jobs = []
+        for tenant in range(options['bulk_tenants']):
+            for n in range(3):
+                jobs.append({'tenant': f'bulk{tenant}', 'size': 200,
+                             'arrival': rng.uniform(0, duration / 3) + n * duration / 3})
+        for _ in range(options['medium_jobs']):
+            jobs.append({'tenant': f't{rng.randrange(20)}', 'size': 40,
+                         'arrival': rng.uniform(0, duration)})
+        for _ in range(options['small_jobs']):
+            jobs.append({'tenant': f't{rng.randrange(50)}', 'size': 4,
+                         'arrival': rng.uniform(0, duration)})
+        jobs.sort(key=lambda j: j['arrival'])
+        for job_id, job in enumerate(jobs):
+            job['id'] = job_id
+        return jobs
+
+    def _service_time(self, options, rng):
+        # Long-tailed like Gemini image calls
+        sigma = 0.5
+        mu = -sigma * sigma / 2
+        return options['mean_task_seconds'] * rng.lognormvariate(mu, sigma)
+
+    def _simulate(self, policy, jobs, options, rng):
+        capacity = options['capacity']
+        waiting = [deque() for _ in range(NUM_QUEUES)]
+        running = [0] * NUM_QUEUES
+        remaining = {}
+        job_queues = {}
+        live_by_tenant = {}
+        makespans = {}
+
+        events = [(job['arrival'], 0, 'arrive', job['id'], None) for job in jobs]
+        heapq.heapify(events)
+        by_id = {job['id']: job for job in jobs}
+        seq = 1
+
+        def start_tasks(q, now):
+            nonlocal seq
+            while waiting[q] and running[q] < capacity:
+                job_id = waiting[q].popleft()
+                running[q] += 1
+                heapq.heappush(events, (now + self._service_time(options, rng), seq, 'finish', job_id, q))
+                seq += 1
+
+        while events:
+            now, _, kind, job_id, q = heapq.heappop(events)
+            job = by_id[job_id]
+            if kind == 'arrive':
+                loads = [len(waiting[i]) + running[i] for i in range(NUM_QUEUES)]
+                if policy == 'single':
+                    best = min(range(NUM_QUEUES), key=lambda i: (loads[i], i))
+                    counts = [0] * NUM_QUEUES
+                    counts[best] = job['size']
+                else:
+                    occupied = set()
+                    for live_id in live_by_tenant.get(job['tenant'], ()):
+                        occupied.update(job_queues[live_id])
+                    counts = plan_batch_placement(
+                        loads, job['size'], capacity, occupied, options['max_queues_per_tenant'])
+
+                remaining[job_id] = job['size']
+                job_queues[job_id] = {i for i, c in enumerate(counts) if c}
+                live_by_tenant.setdefault(job['tenant'], set()).add(job_id)
+                for i, c in enumerate(counts):
+                    waiting[i].extend([job_id] * c)
+                    start_tasks(i, now)
+            else:
+                running[q] -= 1
+                remaining[job_id] -= 1
+                if not remaining[job_id]:
+                    makespans[job_id] = now - job['arrival']
+                    live_by_tenant[job['tenant']].discard(job_id)
+                start_tasks(q, now)
+        return makespans
+
+    def _report(self, policy, jobs, makespans):
+        self.stdout.write(f"\n{policy}")
+        for label, size in (('small (4)', 4), ('medium (40)', 40), ('bulk (200)', 200), ('all', None)):
+            values = sorted(makespans[j['id']] for j in jobs if size is None or j['size'] == size)
+            if not values:
+                continue
+            p95 = values[max(0, int(len(values) * 0.95) - 1)]
+            self.stdout.write(
+                f"  {label:<12} jobs={len(values):<4} "
+                f"mean={statistics.mean(values):8.1f}s "
+                f"p50={statistics.median(values):8.1f}s "
+                f"p95={p95:8.1f}s max={values[-1]:8.1f}s")
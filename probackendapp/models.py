@@ -122,7 +122,8 @@ class ProductImage(EmbeddedDocument):
 class UploadedImage(EmbeddedDocument):
     """Embedded document for uploaded images with both local and cloud storage"""
     local_path = StringField(required=True)
-    cloud_url = URLField(required=True)
+    # Empty until the background upload finished (see workflow_uploads.py)
+    cloud_url = URLField()
     original_filename = StringField(required=True)
     uploaded_by = StringField(required=True)  # User ID who uploaded
     uploaded_at = DateTimeField(default=datetime.now(timezone.utc))
@@ -137,6 +138,15 @@ class UploadedImage(EmbeddedDocument):
     angle_shot = StringField(default="")
     # Theme description without ornament type and angle shot
     theme_description = StringField(default="")
+    # Background processing: id to address the image, and its progress
+    # (images uploaded before the pipeline existed are "completed")
+    image_id = StringField()
+    status = StringField(
+        choices=["pending", "processing", "completed", "failed"],
+        default="completed",
+    )
+    status_updated_at = DateTimeField()
+    error = StringField()
 
     meta = {
         'strict': False,
@@ -180,6 +190,9 @@ class CollectionItem(EmbeddedDocument):
     final_moodboard_prompt = StringField()
     moodboard_explanation = StringField()
     generated_prompts = DictField()
+    # Fingerprint of the input generated_prompts were made from; an
+    # identical resubmission reuses them (see api_project_setup_select)
+    prompt_fingerprint = StringField()
     generated_model_images = ListField(DictField())
     uploaded_model_images = ListField(DictField())
     # Stores the single selected model (type: 'ai' or 'real', local, cloud)
@@ -245,6 +258,69 @@ class GeneratedImage(Document):
     }
 
 
+# -----------------------------
+# Generated Product Image Model
+# -----------------------------
+
+
+class GeneratedProductImage(Document):
+    """
+    One generated image for a product of a collection.
+
+    Replaces the unbounded CollectionItem.product_images[*].generated_images
+    list so Collection documents stay small and per-product listing is an
+    index scan. Collections generated before this model keep their embedded
+    records until backfilled with `manage.py migrate_generated_images`.
+    """
+    collection = ReferenceField(
+        Collection, required=True, reverse_delete_rule=2)
+    # Position of the product in collection.items[0].product_images
+    product_index = IntField(required=True)
+
+    # 'white_background', 'background_replace', 'model_image', 'campaign_image'
+    type = StringField()
+    prompt = StringField()
+    local_path = StringField()
+    cloud_url = StringField()
+    model_used = DictField()
+    regenerated_images = ListField(DictField(), default=list)
+    enhanced_images = ListField(DictField(), default=list)
+
+    created_at = DateTimeField(default=lambda: datetime.now(timezone.utc))
+
+    # Any other keys of the legacy embedded record
+    metadata = DictField()
+
+    meta = {
+        'collection': 'generated_product_images',
+        'ordering': ['product_index', 'created_at'],
+        'indexes': [
+            ('collection', 'product_index', 'created_at'),
+            ('collection', 'local_path'),
+        ],
+        'strict': False,  # Allow extra fields for backward compatibility
+        'allow_inheritance': False
+    }
+
+    def to_record(self):
+        """Return the image in the embedded generated_images dict format."""
+        record = dict(self.metadata or {})
+        record.update({
+            "id": str(self.id),
+            "type": self.type,
+            "prompt": self.prompt,
+            "local_path": self.local_path,
+            "cloud_url": self.cloud_url,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "model_used": self.model_used or {},
+        })
+        if self.regenerated_images:
+            record["regenerated_images"] = self.regenerated_images
+        if self.enhanced_images:
+            record["enhanced_images"] = self.enhanced_images
+        return record
+
+
 # New model for tracking all image generation activities
 class ImageGenerationHistory(Document):
     """Track all image generation activities across the system"""
@@ -412,3 +488,30 @@ class PromptMaster(Document):
     }
 
 
+
+
+class ImageAnalysisCacheEntry(Document):
+    """
+    Gemini analysis of a reference image, keyed by the image content,
+    category and analysis prompt version. See analysis_cache.py.
+    Entries not used for a while are removed by the TTL index on last_used_at.
+    Hit counts live in Redis (analysis:cache:stats), not here.
+    """
+    key = StringField(required=True, unique=True)
+    content_hash = StringField(required=True)
+    category = StringField(required=True)
+    prompt_version = StringField(required=True)
+    # analysis, ornament_type, angle_shot, theme_description
+    result = DictField()
+    created_at = DateTimeField(default=datetime.utcnow)
+    last_used_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'image_analysis_cache',
+        'indexes': [
+            ('category', 'prompt_version'),
+            {'fields': ['last_used_at'], 'expireAfterSeconds': 90 * 24 * 60 * 60},
+        ],
+        'strict': False,
+        'allow_inheritance': False
+    }
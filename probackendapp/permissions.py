@@ -146,6 +146,48 @@ def require_collection_role(allowed_roles):
     return decorator
 
 
+# Positive job access answers are cached so progress polls stay off MongoDB
+JOB_ACCESS_CACHE_SECONDS = 5 * 60
+
+
+def can_access_job(user, job):
+    """Whether a user started a job or is a member of its collection's project."""
+    if job.user and str(job.user.id) == str(user.id):
+        return True
+    collection = job.collection
+    return bool(collection and get_user_role_in_project(user, collection.project))
+
+
+def check_job_access(user, job_id):
+    """
+    Whether a user may follow a bulk generation job (see can_access_job).
+
+    Returns:
+        True or False, or None if the job does not exist
+    """
+    from .job_models import ImageGenerationJob
+    from .queue_load_manager import get_redis_client
+
+    cache_key = f'job:{job_id}:access:{user.id}'
+    try:
+        r = get_redis_client()
+        if r.get(cache_key):
+            return True
+    except Exception:
+        r = None
+
+    job = ImageGenerationJob.objects(job_id=job_id).only("user", "collection").first()
+    if not job:
+        return None
+    allowed = can_access_job(user, job)
+    if allowed and r is not None:
+        try:
+            r.set(cache_key, 1, ex=JOB_ACCESS_CACHE_SECONDS)
+        except Exception:
+            pass
+    return allowed
+
+
 # Role check helpers
 def can_generate_images(user_role):
     """Only owners can generate images"""
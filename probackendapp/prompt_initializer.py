@@ -737,6 +737,19 @@ Campaign instructions: {user_prompt}""",
         },
     ]
 
+    # Reference-image analysis prompts (see analysis_cache.py)
+    from .analysisprompt import ANALYSIS_PROMPTS
+    for category, prompt_content in ANALYSIS_PROMPTS.items():
+        default_prompts.append({
+            "prompt_key": f"{category}_analysis_prompt",
+            "title": f"{category.capitalize()} Image Analysis Prompt",
+            "description": f"Vision prompt for analyzing uploaded {category} reference images",
+            "prompt_content": prompt_content,
+            "category": "analysis",
+            "prompt_type": category,
+            "is_active": True,
+        })
+
     created_count = 0
     updated_count = 0
 
@@ -824,15 +837,21 @@ Campaign instructions: {user_prompt}""",
     print(f"   Created: {created_count} prompts")
     print(f"   Already existed: {updated_count} prompts")
 
+    from .prompt_registry import invalidate_prompt_registry
+    invalidate_prompt_registry()
+
     return created_count, updated_count
 
 
 def get_prompt_from_db(prompt_key, default_prompt=None, **format_kwargs):
     """
-    Fetch a prompt from the database by key. If not found or inactive, return default_prompt.
+    Fetch a prompt by key. If not found or inactive, return default_prompt.
     Format the prompt with provided kwargs if it's a template.
     Automatically inserts instructions and rules from the database if {instructions} and {rules} placeholders exist.
 
+    Active prompts are served from the process-local registry
+    (prompt_registry.py) instead of a query per call.
+
     Args:
         prompt_key: The key identifier for the prompt
         default_prompt: Fallback prompt if not found in database
@@ -841,78 +860,5 @@ def get_prompt_from_db(prompt_key, default_prompt=None, **format_kwargs):
     Returns:
         The formatted prompt content from database or default_prompt
     """
-    try:
-        prompt = PromptMaster.objects(
-            prompt_key=prompt_key, is_active=True).first()
-        if prompt:
-            prompt_content = prompt.prompt_content
-            instructions = prompt.instructions or ""
-            rules = prompt.rules or ""
-
-            # Add instructions and rules to format_kwargs if they exist in the prompt
-            if '{instructions}' in prompt_content or '{rules}' in prompt_content:
-                if 'instructions' not in format_kwargs:
-                    format_kwargs['instructions'] = instructions
-                if 'rules' not in format_kwargs:
-                    format_kwargs['rules'] = rules
-            elif instructions or rules:
-                # If placeholders don't exist but instructions/rules do, append them
-                # Find insertion point (before "Generate prompts" or before JSON section)
-                insertion_text = ""
-                if instructions:
-                    insertion_text += f"\n\n{instructions}"
-                if rules:
-                    insertion_text += f"\n\n{rules}"
-
-                # Also add global_instruction_rule if provided
-                global_rule = format_kwargs.get('global_instruction_rule', '')
-                if global_rule:
-                    insertion_text += f"\n{global_rule}"
-
-                # Insert before "Generate prompts" if it exists
-                if 'Generate prompts for the following' in prompt_content:
-                    parts = prompt_content.split(
-                        'Generate prompts for the following', 1)
-                    if len(parts) == 2:
-                        prompt_content = parts[0].rstrip(
-                        ) + insertion_text + '\n\nGenerate prompts for the following' + parts[1]
-                # Or insert before JSON section
-                elif 'Respond ONLY in valid JSON' in prompt_content:
-                    prompt_content = prompt_content.replace(
-                        'Respond ONLY in valid JSON',
-                        insertion_text + '\n\nRespond ONLY in valid JSON'
-                    )
-                # Or just append at the end before any closing braces
-                else:
-                    prompt_content = prompt_content.rstrip() + insertion_text
-
-            # Format the prompt if kwargs are provided
-            if format_kwargs:
-                try:
-                    return prompt_content.format(**format_kwargs)
-                except KeyError as e:
-                    print(
-                        f"Warning: Missing format variable {e} in prompt {prompt_key}, using as-is")
-                    return prompt_content
-            return prompt_content
-    except Exception as e:
-        print(f"Error fetching prompt from database: {e}")
-
-    # Fallback to default and format if needed
-    if default_prompt:
-        # Add default empty strings for instructions and rules if placeholders exist
-        if '{instructions}' in default_prompt or '{rules}' in default_prompt:
-            if 'instructions' not in format_kwargs:
-                format_kwargs['instructions'] = ""
-            if 'rules' not in format_kwargs:
-                format_kwargs['rules'] = ""
-        if format_kwargs:
-            try:
-                return default_prompt.format(**format_kwargs)
-            except KeyError as e:
-                print(
-                    f"Warning: Missing format variable {e} in default prompt, using as-is")
-                return default_prompt
-        return default_prompt
-
-    return None
+    from .prompt_registry import get_prompt_from_db as get_registry_prompt
+    return get_registry_prompt(prompt_key, default_prompt, **format_kwargs)
@@ -0,0 +1,235 @@
+"""
+Process-local registry of the active PromptMaster prompts.
+
+get_prompt_from_db() used to query PromptMaster once per lookup, and a
+bulk image task makes several lookups. The registry instead loads every
+active prompt with one query and keeps them in memory until a prompt
+changes:
+
+  - the api_prompt_master_* endpoints call invalidate_prompt_registry(),
+    which clears the local copy, bumps prompts:registry:generation and
+    publishes on prompts:registry:invalidate;
+  - every process runs a subscriber thread (redis_subscriber.py) on that
+    channel and clears its copy on each message;
+  - a copy older than PROMPT_REGISTRY_MAX_AGE_SECONDS, or older than the
+    last generation seen after the subscriber (re)connects, is reloaded
+    as well, so a missed message only delays an update.
+
+Each prompt is compiled once per version (a hash of its content,
+instructions and rules): the instructions/rules insertion is worked out
+at load time, leaving only str.format() for each lookup.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from .redis_subscriber import ChannelSubscriber
+
+logger = logging.getLogger(__name__)
+
+PROMPT_REGISTRY_CHANNEL = 'prompts:registry:invalidate'
+PROMPT_REGISTRY_GENERATION_KEY = 'prompts:registry:generation'
+
+# Markers before which instructions and rules are inserted when a prompt
+# has no {instructions}/{rules} placeholders, in order of preference
+GENERATE_MARKER = 'Generate prompts for the following'
+JSON_MARKER = 'Respond ONLY in valid JSON'
+
+_lock = threading.Lock()
+_prompts = None          # prompt_key -> CompiledPrompt, None until loaded
+_loaded_at = 0.0
+_compiled = {}           # (prompt_key, version) -> CompiledPrompt, survives reloads
+_seen_generation = None  # last generation seen by the subscriber
+
+
+def _redis():
+    from .queue_load_manager import get_redis_client
+    return get_redis_client()
+
+
+def get_prompt_version(prompt_content: str, instructions: str = '', rules: str = '') -> str:
+    """Version stamp of a prompt: a hash of everything that shapes its text."""
+    digest = hashlib.sha256()
+    for part in (prompt_content, instructions, rules):
+        digest.update((part or '').encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+class CompiledPrompt:
+    """A PromptMaster prompt with its instructions/rules insertion resolved."""
+
+    def __init__(self, prompt_key: str, prompt_content: str, instructions: str, rules: str):
+        self.prompt_key = prompt_key
+        self.version = get_prompt_version(prompt_content, instructions, rules)
+        self.instructions = instructions
+        self.rules = rules
+        self.has_placeholders = '{instructions}' in prompt_content or '{rules}' in prompt_content
+
+        # Pieces joined with the insertion text; None when nothing is inserted
+        self.segments = None
+        self.insertion = ''
+        if not self.has_placeholders and (instructions or rules):
+            if instructions:
+                self.insertion += f"\n\n{instructions}"
+            if rules:
+                self.insertion += f"\n\n{rules}"
+            if GENERATE_MARKER in prompt_content:
+                head, tail = prompt_content.split(GENERATE_MARKER, 1)
+                self.segments = [head.rstrip(), f"\n\n{GENERATE_MARKER}{tail}"]
+            elif JSON_MARKER in prompt_content:
+                pieces = prompt_content.split(JSON_MARKER)
+                self.segments = [pieces[0]] + [f"\n\n{JSON_MARKER}{piece}" for piece in pieces[1:]]
+            else:
+                self.segments = [prompt_content.rstrip(), '']
+        self.template = self.insertion.join(self.segments) if self.segments else prompt_content
+
+    def render(self, format_kwargs: dict) -> str:
+        """Insert instructions/rules and format the prompt."""
+        template = self.template
+        if self.has_placeholders:
+            format_kwargs.setdefault('instructions', self.instructions)
+            format_kwargs.setdefault('rules', self.rules)
+        elif self.segments:
+            global_rule = format_kwargs.get('global_instruction_rule', '')
+            if global_rule:
+                template = f"{self.insertion}\n{global_rule}".join(self.segments)
+
+        if format_kwargs:
+            try:
+                return template.format(**format_kwargs)
+            except KeyError as e:
+                print(f"Warning: Missing format variable {e} in prompt {self.prompt_key}, using as-is")
+        return template
+
+
+def _max_age() -> float:
+    return float(getattr(settings, 'PROMPT_REGISTRY_MAX_AGE_SECONDS', 300))
+
+
+def _load() -> dict:
+    from .models import PromptMaster
+
+    prompts = {}
+    fields = ('prompt_key', 'prompt_content', 'instructions', 'rules')
+    for prompt in PromptMaster.objects(is_active=True).only(*fields):
+        content = prompt.prompt_content or ''
+        instructions = prompt.instructions or ''
+        rules = prompt.rules or ''
+        key = (prompt.prompt_key, get_prompt_version(content, instructions, rules))
+        if key not in _compiled:
+            _compiled[key] = CompiledPrompt(prompt.prompt_key, content, instructions, rules)
+        prompts[prompt.prompt_key] = _compiled[key]
+
+    # Drop compiled versions no prompt uses any more
+    live = {(compiled.prompt_key, compiled.version) for compiled in prompts.values()}
+    for key in list(_compiled):
+        if key not in live:
+            del _compiled[key]
+    return prompts
+
+
+def get_registry() -> dict:
+    """Active prompts by key, loading them when missing or stale."""
+    global _prompts, _loaded_at
+    _subscriber.ensure_running()
+
+    prompts = _prompts
+    if prompts is not None and time.monotonic() - _loaded_at < _max_age():
+        return prompts
+    with _lock:
+        if _prompts is None or time.monotonic() - _loaded_at >= _max_age():
+            _prompts = _load()
+            _loaded_at = time.monotonic()
+        return _prompts
+
+
+def get_compiled_prompt(prompt_key: str):
+    """Compiled active prompt of a key, or None."""
+    return get_registry().get(prompt_key)
+
+
+def clear_local_registry():
+    """Forget this process's copy; the next lookup reloads it."""
+    global _prompts
+    with _lock:
+        _prompts = None
+
+
+def invalidate_prompt_registry(prompt_key: str = None):
+    """
+    Reload prompts in every process after a PromptMaster write.
+
+    Args:
+        prompt_key: Changed prompt, for the log only; all prompts are reloaded
+    """
+    clear_local_registry()
+    try:
+        r = _redis()
+        r.incr(PROMPT_REGISTRY_GENERATION_KEY)
+        r.publish(PROMPT_REGISTRY_CHANNEL, prompt_key or '*')
+    except Exception as e:
+        logger.warning(f"Could not publish prompt registry invalidation for {prompt_key}: {e}")
+
+
+def _on_connect():
+    # Writes made while disconnected only show in the generation
+    global _seen_generation
+    generation = _redis().get(PROMPT_REGISTRY_GENERATION_KEY)
+    if _seen_generation is not None and generation != _seen_generation:
+        clear_local_registry()
+    _seen_generation = generation
+
+
+def _on_message(message):
+    global _seen_generation
+    clear_local_registry()
+    _seen_generation = _redis().get(PROMPT_REGISTRY_GENERATION_KEY)
+
+
+_subscriber = ChannelSubscriber(
+    PROMPT_REGISTRY_CHANNEL, _on_message, on_connect=_on_connect,
+    # Forked child: the parent's copy may have missed messages
+    on_fork=clear_local_registry, name='prompt-registry-listener',
+)
+
+
+def get_prompt_from_db(prompt_key, default_prompt=None, **format_kwargs):
+    """
+    Resolve a prompt from the registry, falling back to default_prompt.
+
+    Args:
+        prompt_key: The key identifier for the prompt
+        default_prompt: Fallback prompt if not found or inactive
+        **format_kwargs: Variables to format into the prompt template
+
+    Returns:
+        The formatted prompt content from the registry or default_prompt
+    """
+    try:
+        compiled = get_compiled_prompt(prompt_key)
+        if compiled:
+            return compiled.render(format_kwargs)
+    except Exception as e:
+        print(f"Error fetching prompt from database: {e}")
+
+    # Fallback to default and format if needed
+    if default_prompt:
+        # Add default empty strings for instructions and rules if placeholders exist
+        if '{instructions}' in default_prompt or '{rules}' in default_prompt:
+            format_kwargs.setdefault('instructions', "")
+            format_kwargs.setdefault('rules', "")
+        if format_kwargs:
+            try:
+                return default_prompt.format(**format_kwargs)
+            except KeyError as e:
+                print(
+                    f"Warning: Missing format variable {e} in default prompt, using as-is")
+                return default_prompt
+        return default_prompt
+
+    return None
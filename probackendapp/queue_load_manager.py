@@ -15,6 +15,38 @@ _redis_client = None
 NUM_QUEUES = 20
 
 
+def _get_redis_connection_kwargs() -> dict:
+    """Connection settings for the Redis instance behind CELERY_BROKER_URL."""
+    # Parse Redis URL from Celery broker URL
+    broker_url = getattr(settings, 'CELERY_BROKER_URL', 'redis://127.0.0.1:6379/0')
+
+    # Extract connection details
+    if broker_url.startswith('redis://'):
+        # Parse redis://host:port/db
+        parts = broker_url.replace('redis://', '').split('/')
+        host_port = parts[0]
+        db = int(parts[1]) if len(parts) > 1 else 0
+
+        if ':' in host_port:
+            host, port = host_port.split(':')
+            port = int(port)
+        else:
+            host = host_port
+            port = 6379
+    else:
+        # Fallback to default
+        host, port, db = '127.0.0.1', 6379, 0
+
+    return {
+        "host": host,
+        "port": port,
+        "db": db,
+        "decode_responses": True,  # Return strings instead of bytes
+        "socket_connect_timeout": 5,
+        "socket_timeout": 5,
+    }
+
+
 def get_redis_client():
     """
     Get or create a Redis client connection.
@@ -23,45 +55,39 @@ def get_redis_client():
     global _redis_client
     
     if _redis_client is None:
-        # Parse Redis URL from Celery broker URL
-        broker_url = getattr(settings, 'CELERY_BROKER_URL', 'redis://127.0.0.1:6379/0')
-        
-        # Extract connection details
-        if broker_url.startswith('redis://'):
-            # Parse redis://host:port/db
-            parts = broker_url.replace('redis://', '').split('/')
-            host_port = parts[0]
-            db = int(parts[1]) if len(parts) > 1 else 0
-            
-            if ':' in host_port:
-                host, port = host_port.split(':')
-                port = int(port)
-            else:
-                host = host_port
-                port = 6379
-            
-            _redis_client = redis.Redis(
-                host=host,
-                port=port,
-                db=db,
-                decode_responses=True,  # Return strings instead of bytes
-                socket_connect_timeout=5,
-                socket_timeout=5,
-            )
-        else:
-            # Fallback to default
-            _redis_client = redis.Redis(
-                host='127.0.0.1',
-                port=6379,
-                db=0,
-                decode_responses=True,
-                socket_connect_timeout=5,
-                socket_timeout=5,
-            )
+        _redis_client = redis.Redis(**_get_redis_connection_kwargs())
     
     return _redis_client
 
 
+def get_async_redis_client():
+    """
+    Create an asyncio Redis client for use inside ASGI views.
+
+    A new client is returned per call because asyncio connections are bound
+    to the event loop that created them; close it with `await client.aclose()`.
+    """
+    import redis.asyncio as aioredis
+    kwargs = _get_redis_connection_kwargs()
+    # Pub/sub readers block on purpose; they time out via get_message()
+    kwargs["socket_timeout"] = None
+    return aioredis.Redis(**kwargs)
+
+
+def get_pubsub_redis_client():
+    """
+    Create a Redis client for a long-lived pub/sub subscriber thread.
+
+    Unlike get_redis_client() reads never time out, so an idle channel does
+    not drop the subscription every socket_timeout seconds; TCP keepalive
+    still notices a dead connection.
+    """
+    kwargs = _get_redis_connection_kwargs()
+    kwargs["socket_timeout"] = None
+    kwargs["socket_keepalive"] = True
+    return redis.Redis(**kwargs)
+
+
 def get_queue_pending_key(queue_name: str) -> str:
     """Get Redis key for pending tasks counter."""
     return f'queue:{queue_name}:pending'
@@ -72,45 +98,117 @@ def get_queue_running_key(queue_name: str) -> str:
     return f'queue:{queue_name}:running'
 
 
-def increment_pending(queue_name: str) -> int:
+# Moves `count` tasks between two counters of one queue, clamping at zero.
+# KEYS[1] source counter, KEYS[2] destination counter (either may be '')
+# ARGV[1] count
+# Returns {source value, destination value} after the move (-1 when unused)
+_TRANSITION_SCRIPT = """
+local count = tonumber(ARGV[1])
+local from_value = -1
+local to_value = -1
+if KEYS[1] ~= '' then
+    from_value = tonumber(redis.call('GET', KEYS[1]) or '0') - count
+    if from_value < 0 then
+        from_value = 0
+    end
+    redis.call('SET', KEYS[1], from_value)
+end
+if KEYS[2] ~= '' then
+    to_value = redis.call('INCRBY', KEYS[2], count)
+end
+return {from_value, to_value}
+"""
+
+# Picks the queue with the lowest pending + running (lowest index on ties)
+# and reserves `count` pending slots on it in the same call.
+# KEYS[1..n] pending counters, KEYS[n+1..2n] running counters (same order)
+# ARGV[1] count
+# Returns index of the chosen queue
+_SELECT_AND_RESERVE_SCRIPT = """
+local n = #KEYS / 2
+local values = redis.call('MGET', unpack(KEYS))
+local best, best_load = 1, nil
+for i = 1, n do
+    local load = tonumber(values[i] or '0') + tonumber(values[n + i] or '0')
+    if best_load == nil or load < best_load then
+        best, best_load = i, load
+    end
+end
+local count = tonumber(ARGV[1])
+if count > 0 then
+    redis.call('INCRBY', KEYS[best], count)
+end
+return best - 1
+"""
+
+_scripts = {}
+
+
+def _get_script(name: str, source: str):
+    """Register a Lua script once per process; calls then use EVALSHA."""
+    script = _scripts.get(name)
+    if script is None:
+        script = _scripts[name] = get_redis_client().register_script(source)
+    return script
+
+
+def _state_key(queue_name: str, state: Optional[str]) -> str:
+    if state is None:
+        return ''
+    if state == 'pending':
+        return get_queue_pending_key(queue_name)
+    if state == 'running':
+        return get_queue_running_key(queue_name)
+    raise ValueError(f"Unknown queue state: {state}")
+
+
+def transition(queue_name: str, from_state: Optional[str], to_state: Optional[str], count: int = 1) -> Tuple[int, int]:
+    """
+    Atomically move tasks between the counters of a queue in one round trip.
+
+    Args:
+        queue_name: Name of the queue (e.g., 'queue_0')
+        from_state: 'pending', 'running' or None (task enters the queue)
+        to_state: 'pending', 'running' or None (task leaves the queue)
+        count: Number of tasks to move
+
+    Returns:
+        Tuple of (from_count, to_count) after the move; -1 for a None state.
+        from_count never goes below zero.
+    """
+    script = _get_script('transition', _TRANSITION_SCRIPT)
+    keys = [_state_key(queue_name, from_state), _state_key(queue_name, to_state)]
+    from_value, to_value = script(keys=keys, args=[count])
+    return int(from_value), int(to_value)
+
+
+def increment_pending(queue_name: str, count: int = 1) -> int:
     """
     Atomically increment the pending tasks counter for a queue.
     
     Args:
         queue_name: Name of the queue (e.g., 'queue_0')
+        count: Number of tasks being enqueued
     
     Returns:
         New pending count after increment
     """
-    r = get_redis_client()
-    key = get_queue_pending_key(queue_name)
-    return r.incr(key)
+    return transition(queue_name, None, 'pending', count)[1]
 
 
-def decrement_pending(queue_name: str) -> int:
+def decrement_pending(queue_name: str, count: int = 1) -> int:
     """
     Atomically decrement the pending tasks counter for a queue.
     Prevents negative values.
     
     Args:
         queue_name: Name of the queue
+        count: Number of tasks leaving the queue unstarted
     
     Returns:
         New pending count after decrement
     """
-    r = get_redis_client()
-    key = get_queue_pending_key(queue_name)
-    # Use MAX(0, value - 1) to prevent negative values
-    pipe = r.pipeline()
-    pipe.get(key)
-    pipe.decr(key)
-    result = pipe.execute()
-    current = int(result[0] or 0)
-    new_value = max(0, current - 1)
-    if new_value != current - 1:
-        # If we prevented negative, set it explicitly
-        r.set(key, new_value)
-    return new_value
+    return transition(queue_name, 'pending', None, count)[0]
 
 
 def increment_running(queue_name: str) -> int:
@@ -123,9 +221,7 @@ def increment_running(queue_name: str) -> int:
     Returns:
         New running count after increment
     """
-    r = get_redis_client()
-    key = get_queue_running_key(queue_name)
-    return r.incr(key)
+    return transition(queue_name, None, 'running')[1]
 
 
 def decrement_running(queue_name: str) -> int:
@@ -139,19 +235,7 @@ def decrement_running(queue_name: str) -> int:
     Returns:
         New running count after decrement
     """
-    r = get_redis_client()
-    key = get_queue_running_key(queue_name)
-    # Use MAX(0, value - 1) to prevent negative values
-    pipe = r.pipeline()
-    pipe.get(key)
-    pipe.decr(key)
-    result = pipe.execute()
-    current = int(result[0] or 0)
-    new_value = max(0, current - 1)
-    if new_value != current - 1:
-        # If we prevented negative, set it explicitly
-        r.set(key, new_value)
-    return new_value
+    return transition(queue_name, 'running', None)[0]
 
 
 def get_queue_load(queue_name: str) -> Tuple[int, int]:
@@ -216,28 +300,289 @@ def get_all_queue_loads() -> dict:
     return loads
 
 
-def select_best_queue() -> str:
+def select_best_queue(reserve: int = 0) -> str:
     """
     Select the queue with the lowest total load (pending + running).
     If multiple queues have the same lowest load, pick deterministically
     (by queue index).
+
+    Reading the counters and reserving happen in one Lua script, so two
+    concurrent enqueues cannot both pick the same "least loaded" queue
+    from a stale read.
+    
+    Args:
+        reserve: Pending slots to reserve on the chosen queue. Pass the
+            number of tasks about to be enqueued instead of calling
+            increment_pending() afterwards.
     
     Returns:
         Queue name (e.g., 'queue_0')
     """
-    loads = get_all_queue_loads()
-    
-    # Calculate total load for each queue
-    queue_loads = []
-    for queue_name, (pending, running) in loads.items():
-        total_load = pending + running
-        queue_loads.append((total_load, queue_name))
-    
-    # Sort by load (ascending), then by queue name for determinism
-    queue_loads.sort(key=lambda x: (x[0], x[1]))
-    
-    # Return the queue with lowest load
-    return queue_loads[0][1]
+    queue_names = [f'queue_{i}' for i in range(NUM_QUEUES)]
+    keys = ([get_queue_pending_key(q) for q in queue_names]
+            + [get_queue_running_key(q) for q in queue_names])
+    script = _get_script('select_and_reserve', _SELECT_AND_RESERVE_SCRIPT)
+    return queue_names[int(script(keys=keys, args=[reserve]))]
+
+
+# -------------------------------------------------------------------
+# Priority lane
+# -------------------------------------------------------------------
+
+# Broker message priorities. With the Redis transport 0 is served first;
+# each queue_N is split into one broker list per BROKER_PRIORITY_STEPS step.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DEFAULT = 3
+PRIORITY_BULK = 6
+
+# Interactive tasks in flight: sorted set of task id -> enqueue time
+INTERACTIVE_INFLIGHT_KEY = 'priority:interactive:inflight'
+# Entries older than this are treated as lost (worker died before postrun)
+INTERACTIVE_INFLIGHT_TTL_SECONDS = 15 * 60
+
+
+def get_interactive_max_share() -> float:
+    """Largest share of all queue slots interactive tasks may hold ahead of bulk."""
+    return float(getattr(settings, 'INTERACTIVE_MAX_SHARE', 0.5))
+
+
+# Picks the least loaded queue, reserves a pending slot and, if interactive
+# tasks in flight are under the cap, admits the task to the priority lane.
+# KEYS[1..n] pending counters, KEYS[n+1..2n] running counters,
+# KEYS[2n+1] interactive in-flight set
+# ARGV[1] task id  ARGV[2] now  ARGV[3] in-flight ttl  ARGV[4] in-flight cap
+# Returns {index of the chosen queue, 1 if admitted to the lane else 0}
+_SELECT_INTERACTIVE_SCRIPT = """
+local inflight_key = KEYS[#KEYS]
+local n = (#KEYS - 1) / 2
+local best, best_load = 1, nil
+for i = 1, n do
+    local load = tonumber(redis.call('GET', KEYS[i]) or '0')
+        + tonumber(redis.call('GET', KEYS[n + i]) or '0')
+    if best_load == nil or load < best_load then
+        best, best_load = i, load
+    end
+end
+redis.call('INCR', KEYS[best])
+
+local now = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', inflight_key, '-inf', now - tonumber(ARGV[3]))
+local admitted = 0
+if redis.call('ZCARD', inflight_key) < tonumber(ARGV[4]) then
+    redis.call('ZADD', inflight_key, now, ARGV[1])
+    admitted = 1
+end
+return {best - 1, admitted}
+"""
+
+
+def select_interactive_queue(task_id: str) -> Tuple[str, int]:
+    """
+    Choose queue and priority for an interactive task and reserve its slot.
+
+    The task goes to the least loaded queue. It gets PRIORITY_INTERACTIVE,
+    jumping every bulk message there, unless interactive tasks already hold
+    INTERACTIVE_MAX_SHARE of all slots; then it gets PRIORITY_BULK and waits
+    its turn, so a burst of interactive work cannot starve bulk jobs.
+
+    Args:
+        task_id: Id the task will be sent with
+
+    Returns:
+        Tuple of (queue_name, priority)
+    """
+    import time
+
+    queue_names = [f'queue_{i}' for i in range(NUM_QUEUES)]
+    keys = ([get_queue_pending_key(q) for q in queue_names]
+            + [get_queue_running_key(q) for q in queue_names]
+            + [INTERACTIVE_INFLIGHT_KEY])
+    cap = max(1, int(NUM_QUEUES * get_queue_capacity() * get_interactive_max_share()))
+    script = _get_script('select_interactive', _SELECT_INTERACTIVE_SCRIPT)
+    index, admitted = script(keys=keys, args=[task_id, time.time(), INTERACTIVE_INFLIGHT_TTL_SECONDS, cap])
+    priority = PRIORITY_INTERACTIVE if int(admitted) else PRIORITY_BULK
+    return queue_names[int(index)], priority
+
+
+def release_interactive_slot(task_id: str):
+    """Remove a finished (or never sent) task from the interactive in-flight set."""
+    get_redis_client().zrem(INTERACTIVE_INFLIGHT_KEY, task_id)
+
+
+# -------------------------------------------------------------------
+# Batch placement
+# -------------------------------------------------------------------
+
+def get_queue_capacity() -> int:
+    """Task slots each queue's workers can run at once."""
+    return int(getattr(settings, 'QUEUE_WORKER_CAPACITY',
+                       getattr(settings, 'CELERY_WORKER_CONCURRENCY', 4)))
+
+
+def get_max_queues_per_tenant() -> int:
+    """How many queues one tenant's live jobs may occupy at the same time."""
+    return int(getattr(settings, 'MAX_QUEUES_PER_TENANT', 5))
+
+
+# Spreads a batch over the queues in proportion to their free capacity and
+# reserves the pending slots, atomically. See plan_batch_placement() for the
+# algorithm; the two must stay in step.
+# KEYS[1..n] pending counters, KEYS[n+1..2n] running counters (same order)
+# ARGV[1] tasks  ARGV[2] capacity per queue  ARGV[3] max queues
+# ARGV[4..n+3] '1' if the tenant already occupies that queue
+# Returns per-queue task counts
+_PLACE_BATCH_SCRIPT = """
+local q = #KEYS / 2
+local n = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local max_queues = tonumber(ARGV[3])
+local values = redis.call('MGET', unpack(KEYS))
+
+local loads, allowed, counts = {}, {}, {}
+local n_allowed = 0
+for i = 1, q do
+    loads[i] = tonumber(values[i] or '0') + tonumber(values[q + i] or '0')
+    counts[i] = 0
+    if ARGV[3 + i] == '1' then
+        allowed[i] = true
+        n_allowed = n_allowed + 1
+    end
+end
+while n_allowed < max_queues do
+    local best = nil
+    for i = 1, q do
+        if not allowed[i] and (best == nil or loads[i] < loads[best]) then
+            best = i
+        end
+    end
+    if best == nil then break end
+    allowed[best] = true
+    n_allowed = n_allowed + 1
+end
+
+local free_total = 0
+for i = 1, q do
+    if allowed[i] then
+        free_total = free_total + math.max(0, capacity - loads[i])
+    end
+end
+local placed = 0
+if free_total > 0 then
+    local take = math.min(n, free_total)
+    for i = 1, q do
+        if allowed[i] then
+            counts[i] = math.floor(take * math.max(0, capacity - loads[i]) / free_total)
+            placed = placed + counts[i]
+        end
+    end
+end
+while placed < n do
+    local best = nil
+    for i = 1, q do
+        if allowed[i] and (best == nil or loads[i] + counts[i] < loads[best] + counts[best]) then
+            best = i
+        end
+    end
+    counts[best] = counts[best] + 1
+    placed = placed + 1
+end
+
+for i = 1, q do
+    if counts[i] > 0 then
+        redis.call('INCRBY', KEYS[i], counts[i])
+    end
+end
+return counts
+"""
+
+
+def plan_batch_placement(loads, num_tasks: int, capacity: int, occupied=(), max_queues: int = None) -> list:
+    """
+    Decide how many tasks of a batch go to each queue.
+
+    The allowed queues are those the tenant already occupies plus the least
+    loaded others, up to max_queues. Tasks are split over the allowed queues
+    in proportion to their free capacity (capacity - pending - running);
+    rounding leftovers and any tasks beyond the total free capacity go one at
+    a time to the allowed queue with the lowest load.
+
+    Args:
+        loads: Current pending + running per queue, in queue order
+        num_tasks: Tasks in the batch
+        capacity: Task slots per queue
+        occupied: Indexes of queues the tenant already has live tasks on
+        max_queues: Cap on queues per tenant (default: all)
+
+    Returns:
+        List of task counts per queue
+    """
+    q = len(loads)
+    max_queues = q if max_queues is None else max_queues
+    allowed = set(occupied)
+    for i in sorted(range(q), key=lambda i: (loads[i], i)):
+        if len(allowed) >= max_queues:
+            break
+        allowed.add(i)
+    if not allowed:
+        allowed.add(min(range(q), key=lambda i: (loads[i], i)))
+
+    counts = [0] * q
+    free = {i: max(0, capacity - loads[i]) for i in allowed}
+    free_total = sum(free.values())
+    placed = 0
+    if free_total > 0:
+        take = min(num_tasks, free_total)
+        for i in allowed:
+            counts[i] = take * free[i] // free_total
+            placed += counts[i]
+    while placed < num_tasks:
+        best = min(sorted(allowed), key=lambda i: loads[i] + counts[i])
+        counts[best] += 1
+        placed += 1
+    return counts
+
+
+def place_batch(num_tasks: int, occupied_queues=(), max_queues: int = None) -> dict:
+    """
+    Spread a batch of tasks over the queues and reserve their pending slots
+    in one atomic Redis call.
+
+    Args:
+        num_tasks: Tasks in the batch
+        occupied_queues: Queue names the tenant's live jobs already use; they
+            count towards the tenant's cap
+        max_queues: Cap on queues per tenant (default MAX_QUEUES_PER_TENANT)
+
+    Returns:
+        Dictionary mapping queue_name -> number of tasks to send there
+    """
+    queue_names = [f'queue_{i}' for i in range(NUM_QUEUES)]
+    if max_queues is None:
+        max_queues = get_max_queues_per_tenant()
+    occupied = set(occupied_queues)
+    keys = ([get_queue_pending_key(q) for q in queue_names]
+            + [get_queue_running_key(q) for q in queue_names])
+    args = [num_tasks, get_queue_capacity(), max(1, max_queues)]
+    args += ['1' if q in occupied else '0' for q in queue_names]
+    script = _get_script('place_batch', _PLACE_BATCH_SCRIPT)
+    counts = script(keys=keys, args=args)
+    return {queue_names[i]: int(c) for i, c in enumerate(counts) if int(c) > 0}
+
+
+def interleave_placement(placement: dict) -> list:
+    """
+    Expand a placement into one queue name per task, round-robin across
+    queues, so the first products of a batch start on different queues.
+    """
+    remaining = dict(placement)
+    order = []
+    while remaining:
+        for queue_name in list(remaining):
+            order.append(queue_name)
+            remaining[queue_name] -= 1
+            if not remaining[queue_name]:
+                del remaining[queue_name]
+    return order
 
 
 def reset_queue_counters(queue_name: Optional[str] = None):
@@ -264,3 +609,174 @@ def reset_queue_counters(queue_name: Optional[str] = None):
         if keys_to_delete:
             r.delete(*keys_to_delete)
 
+
+
+# -------------------------------------------------------------------
+# Drift reconciliation
+# -------------------------------------------------------------------
+
+QUEUE_DRIFT_KEY = 'queue:drift'
+
+# kombu's Redis transport keeps messages of non-zero priority in separate lists
+BROKER_PRIORITY_SEPARATOR = '\x06\x16'
+BROKER_PRIORITY_STEPS = (0, 3, 6, 9)
+
+# Sets KEYS[1] to ARGV[2] only if it still holds ARGV[1], so a correction
+# never overwrites a change made by a task between the read and the write.
+_COMPARE_AND_SET_SCRIPT = """
+if tonumber(redis.call('GET', KEYS[1]) or '0') == tonumber(ARGV[1]) then
+    redis.call('SET', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+def get_broker_queue_depths(queue_names) -> dict:
+    """
+    Get the number of messages waiting in the broker for each queue.
+
+    Returns:
+        Dictionary mapping queue_name -> message count
+    """
+    r = get_redis_client()
+    pipe = r.pipeline()
+    for queue_name in queue_names:
+        for priority in BROKER_PRIORITY_STEPS:
+            if priority:
+                pipe.llen(f'{queue_name}{BROKER_PRIORITY_SEPARATOR}{priority}')
+            else:
+                pipe.llen(queue_name)
+    results = pipe.execute()
+
+    steps = len(BROKER_PRIORITY_STEPS)
+    return {
+        queue_name: sum(results[i * steps:(i + 1) * steps])
+        for i, queue_name in enumerate(queue_names)
+    }
+
+
+def get_worker_task_counts(timeout: float = 2.0):
+    """
+    Ask the workers which tasks they hold, per queue.
+
+    Scheduled tasks (retries waiting for their countdown/eta) sit in the
+    worker rather than the broker but are counted as pending, so they are
+    added to the reserved counts.
+
+    Returns:
+        Tuple of (reserved, active) dicts mapping queue_name -> count, or
+        (None, None) if the workers could not be inspected
+    """
+    from imgbackend.celery import app
+
+    try:
+        inspector = app.control.inspect(timeout=timeout)
+        active = inspector.active()
+        reserved = inspector.reserved()
+        scheduled = inspector.scheduled()
+    except Exception:
+        return None, None
+    if active is None or reserved is None or scheduled is None:
+        return None, None
+
+    def count(*replies):
+        counts = {}
+        for reply in replies:
+            for tasks in reply.values():
+                for task in tasks or []:
+                    # scheduled() wraps the task request with its eta
+                    task = task.get('request', task)
+                    queue_name = (task.get('delivery_info') or {}).get('routing_key')
+                    if queue_name:
+                        counts[queue_name] = counts.get(queue_name, 0) + 1
+        return counts
+
+    return count(reserved, scheduled), count(active)
+
+
+def reconcile_queue_counters(apply: bool = True) -> dict:
+    """
+    Correct pending/running counters from the real broker and worker state.
+
+    Actual pending = messages still in the broker + messages prefetched by
+    workers but not started + retries scheduled in workers; actual running = tasks workers report active.
+    If no worker answers inspect, only pending counters that are lower than
+    the broker depth are raised (everything else is left alone).
+
+    The per-queue drift (counter - actual) is stored in the `queue:drift`
+    hash together with the total absolute drift and the run time.
+
+    Args:
+        apply: Write the corrections; False only measures drift
+
+    Returns:
+        Dictionary with 'queues' (queue_name -> {pending, running,
+        actual_pending, actual_running, pending_drift, running_drift,
+        corrected}), 'total_drift' and 'inspected'
+    """
+    import time
+
+    r = get_redis_client()
+    queue_names = [f'queue_{i}' for i in range(NUM_QUEUES)]
+
+    loads = get_all_queue_loads()
+    depths = get_broker_queue_depths(queue_names)
+    reserved, active = get_worker_task_counts()
+    inspected = reserved is not None
+
+    cas = _get_script('compare_and_set', _COMPARE_AND_SET_SCRIPT)
+    report = {}
+    total_drift = 0
+    for queue_name in queue_names:
+        pending, running = loads[queue_name]
+        entry = {'pending': pending, 'running': running, 'corrected': False}
+
+        if inspected:
+            actual_pending = depths[queue_name] + reserved.get(queue_name, 0)
+            actual_running = active.get(queue_name, 0)
+        else:
+            actual_pending = max(pending, depths[queue_name])
+            actual_running = running
+
+        entry.update({
+            'actual_pending': actual_pending,
+            'actual_running': actual_running,
+            'pending_drift': pending - actual_pending,
+            'running_drift': running - actual_running,
+        })
+        total_drift += abs(entry['pending_drift']) + abs(entry['running_drift'])
+
+        if apply:
+            if entry['pending_drift']:
+                entry['corrected'] |= bool(cas(keys=[get_queue_pending_key(queue_name)],
+                                               args=[pending, actual_pending]))
+            if entry['running_drift']:
+                entry['corrected'] |= bool(cas(keys=[get_queue_running_key(queue_name)],
+                                               args=[running, actual_running]))
+        report[queue_name] = entry
+
+    drift = {q: f"{e['pending_drift']},{e['running_drift']}" for q, e in report.items()}
+    drift.update({'total': total_drift, 'inspected': int(inspected), 'at': int(time.time())})
+    r.hset(QUEUE_DRIFT_KEY, mapping=drift)
+
+    return {'queues': report, 'total_drift': total_drift, 'inspected': inspected}
+
+
+def get_queue_drift() -> dict:
+    """
+    Get the drift measured by the last reconciliation run.
+
+    Returns:
+        Dictionary with 'total', 'inspected', 'at' and, per queue,
+        (pending_drift, running_drift)
+    """
+    raw = get_redis_client().hgetall(QUEUE_DRIFT_KEY)
+    drift = {}
+    for key, value in raw.items():
+        if key.startswith('queue_'):
+            pending_drift, running_drift = value.split(',')
+            drift[key] = (int(pending_drift), int(running_drift))
+        else:
+            drift[key] = int(value)
+    return drift
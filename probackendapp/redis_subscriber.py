@@ -0,0 +1,78 @@
+"""
+Process-wide Redis pub/sub listener for cache invalidation.
+
+Caches that keep a copy per process (prompt_registry.py,
+CREDITS/settings_cache.py) drop it when another process publishes on
+their channel. ChannelSubscriber runs the daemon thread that listens:
+
+  - one thread per process, started again in a forked child (whose copy
+    may predate messages the parent received; on_fork drops it);
+  - a dedicated connection without a read timeout
+    (queue_load_manager.get_pubsub_redis_client), so an idle channel is
+    not mistaken for a dropped one;
+  - on every (re)connect on_connect runs, for catching up on anything
+    published while disconnected.
+"""
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_DELAY_SECONDS = 5
+
+
+class ChannelSubscriber:
+    """
+    Usage:
+        subscriber = ChannelSubscriber('cache:invalidate', on_message=clear)
+        subscriber.ensure_running()   # before each read of the cache
+    """
+
+    def __init__(self, channel: str, on_message, on_connect=None, on_fork=None, name=None):
+        self.channel = channel
+        self.on_message = on_message
+        self.on_connect = on_connect
+        self.on_fork = on_fork
+        self.name = name or f'{channel}-listener'
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def ensure_running(self):
+        """Start the listener once per process (again after a fork)."""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            forked = self._pid is not None
+            self._pid = pid
+        if forked and self.on_fork:
+            self.on_fork()
+        threading.Thread(target=self._listen, name=self.name, daemon=True).start()
+
+    def _listen(self):
+        from .queue_load_manager import get_pubsub_redis_client
+
+        while True:
+            pubsub = None
+            try:
+                pubsub = get_pubsub_redis_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                if self.on_connect:
+                    self.on_connect()
+                for message in pubsub.listen():
+                    if message.get('type') == 'message':
+                        self.on_message(message)
+            except Exception as e:
+                logger.warning(f"Subscriber of {self.channel} disconnected: {e}")
+                time.sleep(RECONNECT_DELAY_SECONDS)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
@@ -4,74 +4,146 @@ from celery import shared_task
 from .views import (
     generate_single_product_model_image_background,
     generate_ai_images_background,
+    generate_product_model_composite_background,
+    regenerate_product_model_image_background,
 )
 
-from mongoengine.errors import NotUniqueError, OperationError, ValidationError
-from datetime import datetime
-from .models import ImageGenerationHistory
+from .job_context import load_job_context
+from .job_cancellation import mark_task_started, refund_job_credits, release_task_start
+from .generation_lock import DONE, HELD, GenerationLease, LeaseLost, get_generation_lock_key
+from .queue_load_manager import increment_pending
 from common.error_reporter import report_handled_exception
+from common.failure_policy import RetryableFailure
 
-@shared_task(bind=True, acks_late=True)
-def generate_single_image_task(self, job_id, collection_id, user_id, product_index, prompt_key):
+
+def _count_retry_pending(task, job_id):
+    """A retry is a new message on the same queue; count it as pending."""
+    queue_name = (task.request.delivery_info or {}).get("routing_key")
+    if queue_name and queue_name.startswith("queue_"):
+        increment_pending(queue_name)
+        release_task_start(job_id, task.request.id)
+
+
+def _generate_once(task, job_id, product_index, prompt_key, generate, user_id=None):
     """
-    Generate a single image with atomic lock acquisition to prevent duplicates.
-    
-    Uses a unique compound index on (job_id, product_index, prompt_key) to ensure
-    only ONE worker can acquire the lock, preventing duplicate image generation
-    and duplicate credit deductions.
+    Run generate() exactly once per (job, product, prompt) under a lease
+    (see generation_lock.py) that a heartbeat renews while it runs:
+      - a duplicate delivery that finds a live lease retries once it expires
+      - if this worker dies mid-task its lease expires and the redelivered
+        task (acks_late) takes over instead of being blocked forever
+      - finished work leaves a done marker, so late duplicates return
+        "duplicate-blocked" without regenerating or charging credits
+      - an attempt whose lease was taken over (a stalled heartbeat) stops at
+        its next lease.check() and returns "lease-lost"; generate(lease)
+        checks before charging credits and before storing its result
     """
+    # Superseded/cancelled jobs stop here, before any lock, credit or Gemini work
+    if mark_task_started(job_id, task.request.id):
+        refund_job_credits(job_id)
+        return "cancelled"
+
+    lease = GenerationLease(get_generation_lock_key(job_id, product_index, prompt_key))
+    status, retry_in_ms = lease.acquire()
+    if status == DONE:
+        return "duplicate-blocked"
+    if status == HELD:
+        _count_retry_pending(task, job_id)
+        raise task.retry(countdown=retry_in_ms / 1000 + 1)
+
     try:
-        # 🔒 ATOMIC LOCK ACQUISITION using unique index
-        # Try to create the lock - only ONE worker will succeed due to unique index
-        # Use placeholder URL and bypass validation for lock records (just a locking mechanism)
-        lock_record = ImageGenerationHistory(
-            collection=collection_id,
-            image_type="pending",
-            image_url="http://lock-pending",  # Placeholder - validation bypassed for lock records
-            user_id=str(user_id),
-            metadata={
-                "job_id": job_id,
-                "product_index": product_index,
-                "prompt_key": prompt_key,
-                "status": "started",
-            },
-            created_at=datetime.utcnow(),
-        )
-        # Bypass validation for lock records - we only need the unique index constraint
-        lock_record.save(validate=False)
-        
-        # 🔐 Lock acquired successfully - this worker won the race
         # 🚀 generate exactly once
+        with lease.heartbeat():
+            result = generate(lease)
+    except LeaseLost:
+        # The new owner does the work; its lease is not ours to release
+        return "lease-lost"
+    except RetryableFailure as e:
+        # Classified as worth another attempt (common.failure_policy). The
+        # failures kwarg counts these retries apart from lease-held ones.
+        lease.release()
+        _count_retry_pending(task, job_id)
+        kwargs = dict(task.request.kwargs or {})
+        kwargs["failures"] = kwargs.get("failures", 0) + 1
+        raise task.retry(countdown=e.countdown, exc=e, kwargs=kwargs)
+    except Exception as e:
+        # Let a redelivery retry the work
+        lease.release()
+        report_handled_exception(e, request=task.request, context={"user_id": user_id})
+        raise
+
+    # The attempt is final either way (credits may have been charged)
+    lease.complete()
+    return result
+
+
+@shared_task(bind=True, acks_late=True, max_retries=10)
+def generate_single_image_task(self, job_id, collection_id, user_id, product_index, prompt_key, failures=0):
+    """
+    Generate a single image of a bulk job exactly once per
+    (job, product, prompt); see _generate_once().
+
+    failures counts the retries after failed attempts, which is what the
+    failure policy backs off on; request.retries also counts retries that
+    only waited for another delivery's lease. Once Celery has no retries
+    left the attempt is not retryable, so a failure is recorded on the job
+    instead of being re-raised by task.retry().
+    """
+    can_retry = self.request.retries < self.max_retries
+
+    def generate(lease):
+        # Shared job state comes from the snapshot taken at job creation;
+        # jobs created before snapshots existed rebuild it per task.
+        job_context = load_job_context(job_id)
         return generate_single_product_model_image_background(
             collection_id=collection_id,
             user_id=user_id,
             product_index=product_index,
             prompt_key=prompt_key,
             job_id=job_id,
+            job_context=job_context,
+            retries=failures if can_retry else None,
+            lease=lease,
         )
-        
-    except (NotUniqueError, OperationError) as e:
-        # Unique constraint violation - another worker already acquired the lock
-        # This is expected behavior in a multi-worker setup
-        error_str = str(e).lower()
-        if 'duplicate' in error_str or 'e11000' in error_str or 'unique' in error_str:
-            return "duplicate-blocked"
-        # Re-raise if it's a different operation error
-        raise
-    except ValidationError as e:
-        # If validation fails (e.g., URL format), check if it's a duplicate scenario
-        # This shouldn't happen with valid URL, but handle gracefully
-        error_str = str(e).lower()
-        if 'duplicate' in error_str or 'e11000' in error_str or 'unique' in error_str:
-            return "duplicate-blocked"
-        # Re-raise validation errors so we can see what's wrong
-        raise
+
+    return _generate_once(self, job_id, product_index, prompt_key, generate, user_id=user_id)
+
+
+@shared_task(bind=True, acks_late=True, max_retries=10)
+def regenerate_product_model_image_task(self, collection_id, user_id, params, job_id):
+    """
+    Regenerate one image for regenerate_product_model_image, which has
+    already validated and charged the request. The single-image job
+    carries the result.
+    """
+    def generate(lease):
+        return regenerate_product_model_image_background(
+            collection_id, user_id, params, job_id=job_id, lease=lease)
+
+    return _generate_once(self, job_id, params["product_index"], "regenerate", generate, user_id=user_id)
+
+
+@shared_task(bind=True, acks_late=True, max_retries=10)
+def generate_product_model_composite_task(self, collection_id, product_url, model_url, prompt_text, job_id):
+    """Generate the composite image of generate_product_model_api."""
+    def generate(lease):
+        return generate_product_model_composite_background(
+            collection_id, product_url, model_url, prompt_text, job_id=job_id, lease=lease)
+
+    return _generate_once(self, job_id, 0, "composite", generate)
+
+
+@shared_task(bind=True)
+def process_workflow_images_task(self, collection_id, category, images):
+    """
+    Upload and analyze workflow images saved by api_upload_workflow_image;
+    see workflow_uploads.py.
+    """
+    from .workflow_uploads import process_workflow_images
+
+    try:
+        return process_workflow_images(collection_id, category, images)
     except Exception as e:
-        # Check for MongoDB duplicate key error codes
-        error_str = str(e).lower()
-        if 'duplicate' in error_str or 'e11000' in error_str:
-            return "duplicate-blocked"
-        report_handled_exception(e, request=self.request, context={"user_id": user_id})
+        report_handled_exception(e, request=self.request, context={"collection_id": collection_id})
         raise
 
 
@@ -85,3 +157,31 @@ def generate_ai_images_task(self, collection_id, user_id):
     except Exception as e:
         report_handled_exception(e, request=self.request, context={"user_id": user_id})
         raise
+
+
+@shared_task
+def reconcile_queue_counters_task():
+    """
+    Periodic (Celery beat) correction of queue load counters against the
+    broker and the workers. Runs on the "maintenance" queue so it does not
+    touch the counters it corrects.
+    """
+    from .queue_load_manager import reconcile_queue_counters
+    import logging
+
+    result = reconcile_queue_counters()
+    if result["total_drift"]:
+        logging.getLogger(__name__).warning(
+            f"Queue counter drift {result['total_drift']} corrected "
+            f"(workers inspected: {result['inspected']})")
+    return {"total_drift": result["total_drift"], "inspected": result["inspected"]}
+
+
+@shared_task
+def fair_share_dispatch_task():
+    """
+    Periodic (Celery beat) fair-share dispatch, in case no task finished
+    recently to trigger it. Runs on the "maintenance" queue.
+    """
+    from .fair_share import dispatch
+    return dispatch()
@@ -1,7 +1,7 @@
 
 
 from django.urls import path
-from . import views, api_views, api_views_extended
+from . import views, api_views, api_views_extended, job_events
 
 app_name = "probackendapp"
 
@@ -66,6 +66,8 @@ urlpatterns = [
          api_views.api_project_setup_select, name="api_project_setup_select"),
     path("api/projects/<str:project_id>/collections/<str:collection_id>/upload-workflow-image/",
          api_views.api_upload_workflow_image, name="api_upload_workflow_image"),
+    path("api/projects/<str:project_id>/collections/<str:collection_id>/workflow-images/status/",
+         api_views.api_workflow_image_status, name="api_workflow_image_status"),
     path("api/projects/<str:project_id>/collections/<str:collection_id>/remove-workflow-image/",
          api_views.api_remove_workflow_image, name="api_remove_workflow_image"),
 
@@ -83,10 +85,16 @@ urlpatterns = [
          api_views.api_generate_all_product_model_images, name="api_generate_all_product_model_images"),
     path("api/collections/<str:collection_id>/images-status/",
          api_views.api_collection_images_status, name="api_collection_images_status"),
+    path("api/collections/<str:collection_id>/products/<int:product_index>/generated-images/",
+         api_views.api_product_generated_images, name="api_product_generated_images"),
     path("api/task-status/<str:task_id>/",
          api_views.get_task_status, name="get_task_status"),
     path("api/jobs/<str:job_id>/images/",
          api_views.api_job_images, name="api_job_images"),
+    path("api/jobs/<str:job_id>/events/",
+         job_events.api_job_events, name="api_job_events"),
+    path("api/jobs/<str:job_id>/cancel/",
+         api_views.api_cancel_job, name="api_cancel_job"),
     path("api/collections/<str:collection_id>/regenerate/",
          api_views.api_regenerate_product_model_image, name="api_regenerate_product_model_image"),
 
@@ -124,6 +132,12 @@ urlpatterns = [
          api_views_extended.api_get_model_usage_stats, name='api_get_model_usage_stats'),
     path('api/projects/<str:project_id>/user-role/',
          api_views_extended.api_get_user_role, name='api_get_user_role'),
+    path('api/admin/fair-share/',
+         api_views_extended.api_admin_fair_share, name='api_admin_fair_share'),
+    path('api/admin/analysis-cache/',
+         api_views_extended.api_admin_analysis_cache, name='api_admin_analysis_cache'),
+    path('api/admin/image-preflight/',
+         api_views_extended.api_admin_image_preflight, name='api_admin_image_preflight'),
 
     # Recent History API endpoints
     path('api/recent/history/',
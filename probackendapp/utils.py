@@ -3,41 +3,42 @@ import requests
 import json
 import re
 import hashlib
+import threading
 from dotenv import load_dotenv
-from imgbackend.ai_utils import genai
+from imgbackend.ai_utils import get_client, image_part
 
 load_dotenv()
 GEMINI_TEXT_MODEL = os.getenv("GEMINI_TEXT_MODEL", "gemini-2.5-pro")
 
 
-def call_gemini_api(prompt: str, image_url: str = None):
+def call_gemini_api(prompt: str, image_url: str = None, image_bytes: bytes = None, mime_type: str = None):
     """
     Call Gemini API with optional image URL for vision analysis.
 
     Args:
         prompt: Text prompt for the API
         image_url: Optional image URL for vision analysis
+        image_bytes: Optional image content, used instead of downloading
+            image_url when the caller already has the file
+        mime_type: MIME type of image_bytes (default image/jpeg)
 
     Returns:
         API response text or None on error
     """
-    import base64
-
     try:
-        client = genai.Client(api_key=os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY"))
+        client = get_client()
 
-        if image_url:
+        if image_bytes is None and image_url:
             img_response = requests.get(image_url, timeout=30)
             img_response.raise_for_status()
-            img_base64 = base64.b64encode(img_response.content).decode("utf-8")
+            image_bytes = img_response.content
             mime_type = img_response.headers.get("content-type", "image/jpeg").split(";")[0]
-            if not mime_type.startswith("image/"):
+
+        if image_bytes is not None:
+            if not mime_type or not mime_type.startswith("image/"):
                 mime_type = "image/jpeg"
 
-            contents = [
-                prompt,
-                {"inline_data": {"mime_type": mime_type, "data": img_base64}},
-            ]
+            contents = [prompt, image_part(image_bytes, mime_type)]
         else:
             contents = prompt
 
@@ -51,6 +52,63 @@ def call_gemini_api(prompt: str, image_url: str = None):
         return None
 
 
+# Per-process cap on concurrent call_gemini_api_many() calls, shared by all
+# requests served by the process
+_gemini_text_slots = None
+_gemini_text_slots_lock = threading.Lock()
+
+
+def _get_gemini_text_slots():
+    global _gemini_text_slots
+    with _gemini_text_slots_lock:
+        if _gemini_text_slots is None:
+            from django.conf import settings
+            _gemini_text_slots = threading.BoundedSemaphore(
+                max(1, int(getattr(settings, "GEMINI_TEXT_CONCURRENCY", 5))))
+        return _gemini_text_slots
+
+
+def call_gemini_api_many(prompts: dict):
+    """
+    Run call_gemini_api for independent text prompts concurrently on a
+    bounded thread pool. At most GEMINI_TEXT_CONCURRENCY calls are in
+    flight per process, however many requests use this at once.
+
+    Args:
+        prompts: Mapping of key -> prompt
+
+    Returns:
+        Dict of key -> (response text or None, error or None, seconds)
+    """
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    slots = _get_gemini_text_slots()
+
+    def run(prompt):
+        with slots:
+            started = time.monotonic()
+            try:
+                return call_gemini_api(prompt), None, time.monotonic() - started
+            except Exception as e:
+                return None, e, time.monotonic() - started
+
+    if not prompts:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(prompts)) as executor:
+        futures = {key: executor.submit(run, prompt) for key, prompt in prompts.items()}
+        return {key: future.result() for key, future in futures.items()}
+
+
+def get_prompt_fingerprint(prompt: str, model: str = None) -> str:
+    """
+    Deterministic fingerprint of a text generation request: the rendered
+    prompt and the model that answers it.
+    """
+    payload = json.dumps({"model": model or GEMINI_TEXT_MODEL, "prompt": prompt}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
 def parse_gemini_response(raw_response):
     """Extract JSON safely from Gemini API response"""
     if isinstance(raw_response, str):
@@ -150,9 +208,9 @@ def generate_images_from_prompt(prompt):
 
 def get_prompt_from_db(prompt_key, default_prompt=None, **format_kwargs):
     """
-    Fetch a prompt from the database by key. If not found or inactive, return default_prompt.
-    Format the prompt with provided kwargs if it's a template.
-    Automatically inserts instructions and rules from the database if {instructions} and {rules} placeholders exist.
+    Fetch a prompt by key. If not found or inactive, return default_prompt.
+    Same lookup as prompt_initializer.get_prompt_from_db, served from the
+    process-local prompt registry.
 
     Args:
         prompt_key: The key identifier for the prompt
@@ -162,83 +220,8 @@ def get_prompt_from_db(prompt_key, default_prompt=None, **format_kwargs):
     Returns:
         The formatted prompt content from database or default_prompt
     """
-    try:
-        from .models import PromptMaster
-        prompt = PromptMaster.objects(
-            prompt_key=prompt_key, is_active=True).first()
-        if prompt:
-            prompt_content = prompt.prompt_content
-            instructions = prompt.instructions or ""
-            rules = prompt.rules or ""
-
-            # Add instructions and rules to format_kwargs if they exist in the prompt
-            if '{instructions}' in prompt_content or '{rules}' in prompt_content:
-                if 'instructions' not in format_kwargs:
-                    format_kwargs['instructions'] = instructions
-                if 'rules' not in format_kwargs:
-                    format_kwargs['rules'] = rules
-            elif instructions or rules:
-                # If placeholders don't exist but instructions/rules do, append them
-                # Find insertion point (before "Generate prompts" or before JSON section)
-                insertion_text = ""
-                if instructions:
-                    insertion_text += f"\n\n{instructions}"
-                if rules:
-                    insertion_text += f"\n\n{rules}"
-
-                # Also add global_instruction_rule if provided
-                global_rule = format_kwargs.get('global_instruction_rule', '')
-                if global_rule:
-                    insertion_text += f"\n{global_rule}"
-
-                # Insert before "Generate prompts" if it exists
-                if 'Generate prompts for the following' in prompt_content:
-                    parts = prompt_content.split(
-                        'Generate prompts for the following', 1)
-                    if len(parts) == 2:
-                        prompt_content = parts[0].rstrip(
-                        ) + insertion_text + '\n\nGenerate prompts for the following' + parts[1]
-                # Or insert before JSON section
-                elif 'Respond ONLY in valid JSON' in prompt_content:
-                    prompt_content = prompt_content.replace(
-                        'Respond ONLY in valid JSON',
-                        insertion_text + '\n\nRespond ONLY in valid JSON'
-                    )
-                # Or just append at the end before any closing braces
-                else:
-                    prompt_content = prompt_content.rstrip() + insertion_text
-
-            # Format the prompt if kwargs are provided
-            if format_kwargs:
-                try:
-                    return prompt_content.format(**format_kwargs)
-                except KeyError as e:
-                    print(
-                        f"Warning: Missing format variable {e} in prompt {prompt_key}, using as-is")
-                    return prompt_content
-            print(f"Prompt content: {prompt_content}")
-            return prompt_content
-    except Exception as e:
-        print(f"Error fetching prompt from database: {e}")
-
-    # Fallback to default and format if needed
-    if default_prompt:
-        # Add default empty strings for instructions and rules if placeholders exist
-        if '{instructions}' in default_prompt or '{rules}' in default_prompt:
-            if 'instructions' not in format_kwargs:
-                format_kwargs['instructions'] = ""
-            if 'rules' not in format_kwargs:
-                format_kwargs['rules'] = ""
-        if format_kwargs:
-            try:
-                return default_prompt.format(**format_kwargs)
-            except KeyError as e:
-                print(
-                    f"Warning: Missing format variable {e} in default prompt, using as-is")
-                return default_prompt
-        return default_prompt
-
-    return None
+    from .prompt_registry import get_prompt_from_db as get_registry_prompt
+    return get_registry_prompt(prompt_key, default_prompt, **format_kwargs)
 
 
 def get_queue_for_user(user_id, num_queues=20):
@@ -287,8 +270,8 @@ def enqueue_task_to_user_queue(task, queue_user_id, *args, **kwargs):
 def enqueue_task_with_load_balancing(task, *args, **kwargs):
     """
     Enqueue a Celery task using dynamic load-based queue selection.
-    Selects the queue with the lowest (pending + running) count.
-    Atomically increments the pending counter before enqueueing.
+    Selects the queue with the lowest (pending + running) count and
+    reserves a pending slot on it in the same atomic operation.
 
     Args:
         task: Celery task (e.g., generate_ai_images_task)
@@ -298,16 +281,55 @@ def enqueue_task_with_load_balancing(task, *args, **kwargs):
     Returns:
         AsyncResult: The result of apply_async
     """
+    from probackendapp.queue_load_manager import select_best_queue
+
+    # Select the least-loaded queue and reserve its pending slot
+    # BEFORE enqueueing (one atomic operation)
+    queue_name = select_best_queue(reserve=1)
+
+    # Enqueue the task to the selected queue
+    try:
+        return task.apply_async(args=args, kwargs=kwargs, queue=queue_name)
+    except Exception:
+        # Nothing was enqueued; give the reserved slot back
+        from probackendapp.queue_load_manager import decrement_pending
+        decrement_pending(queue_name)
+        raise
+
+
+def enqueue_interactive_task(task, *args, **kwargs):
+    """
+    Enqueue a Celery task a user is waiting on (single image, regeneration)
+    in the priority lane: least-loaded queue, ahead of queued bulk work.
+    If interactive tasks already hold their maximum share of the workers the
+    task is sent at bulk priority instead, so bulk jobs are never starved.
+
+    Args:
+        task: Celery task (e.g., regenerate_image_task)
+        *args: Positional arguments for the task
+        **kwargs: Keyword arguments for the task
+
+    Returns:
+        AsyncResult: The result of apply_async, with the chosen queue as
+        its queue_name attribute
+    """
+    import uuid
     from probackendapp.queue_load_manager import (
-        select_best_queue,
-        increment_pending
+        select_interactive_queue,
+        release_interactive_slot,
+        decrement_pending,
     )
 
-    # Select the least-loaded queue
-    queue_name = select_best_queue()
-
-    # Increment pending counter BEFORE enqueueing (atomic operation)
-    increment_pending(queue_name)
+    task_id = str(uuid.uuid4())
+    queue_name, priority = select_interactive_queue(task_id)
 
-    # Enqueue the task to the selected queue
-    return task.apply_async(args=args, kwargs=kwargs, queue=queue_name)
+    try:
+        result = task.apply_async(args=args, kwargs=kwargs, queue=queue_name,
+                                  priority=priority, task_id=task_id)
+    except Exception:
+        # Nothing was enqueued; give the reserved slots back
+        decrement_pending(queue_name)
+        release_interactive_slot(task_id)
+        raise
+    result.queue_name = queue_name
+    return result
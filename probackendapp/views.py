@@ -1,4 +1,4 @@
-from imgbackend.ai_utils import genai, types
+from imgbackend.ai_utils import types, image_part
 from .models import Collection, ProductImage  # ✅ ensure ProductImage is imported
 import io
 import cloudinary.uploader
@@ -22,6 +22,7 @@ from mongoengine.errors import DoesNotExist
 from rest_framework.response import Response
 from .utils import request_suggestions, call_gemini_api, parse_gemini_response
 from common.middleware import authenticate
+from .permissions import require_collection_role
 from common.error_reporter import report_handled_exception
 from common.user_friendly_errors import get_user_friendly_message
 from CREDITS.utils import get_image_model_name
@@ -407,7 +408,7 @@ Generate prompts for the following 4 types. Respond ONLY in valid JSON:
 
 
 try:
-    from imgbackend.ai_utils import genai, types
+    from imgbackend.ai_utils import types, get_client
     has_genai = True
 except ImportError:
     has_genai = False
@@ -543,7 +544,7 @@ def generate_ai_images_background(collection_id, user_id):
     if not has_genai:
         return {"success": False, "error": "Gemini SDK not available."}
 
-    client = genai.Client()
+    client = get_client()
     model_name = get_image_model_name(default_model=settings.IMAGE_MODEL_NAME)
 
     # Build optional extra requirements from collection (e.g. jewelry, outfit style)
@@ -916,21 +917,23 @@ def upload_product_images_api(request, collection_id):
         local_dir = os.path.join(settings.MEDIA_ROOT, "product_images")
         os.makedirs(local_dir, exist_ok=True)
 
+        from .image_preflight import save_normalized_upload
+
         new_product_images = []
 
         for index, file in enumerate(uploaded_files):
+            # Normalised (oriented, downscaled, metadata stripped) copy is
+            # what gets uploaded and later sent to Gemini
+            local_path = save_normalized_upload(
+                file, os.path.join(local_dir, file.name), "product")
+
             upload_result = cloudinary.uploader.upload(
-                file,
+                local_path,
                 folder="collection_product_images",
                 overwrite=True
             )
             cloud_url = upload_result.get("secure_url")
 
-            local_path = os.path.join(local_dir, file.name)
-            with open(local_path, "wb") as f:
-                for chunk in file.chunks():
-                    f.write(chunk)
-
             # Ornament fitting rules (from frontend ornamentRules.js), same index as ornament_types
             rules_for_index = ornament_rules[index] if index < len(ornament_rules) else ""
 
@@ -1013,14 +1016,22 @@ def generate_product_model_page(request, collection_id):
 
 
 @csrf_exempt
+@authenticate
+@require_collection_role(['owner', 'editor'])
 def generate_product_model_api(request, collection_id):
     """
     Generate composite AI image combining a product and selected model
     using Gemini, aligning naturally with realistic shadows & lighting.
+
+    Responds 202 with a single-image job_id; the composite is generated by
+    a Celery task and delivered through the job event stream or
+    api/jobs/<job_id>/images/. Only owners and editors of the collection's
+    project may start it; the job belongs to the requesting user.
     """
     try:
+        import uuid
+
         collection = Collection.objects.get(id=collection_id)
-        item = collection.items[0]
 
         product_url = request.POST.get("product_url")
         model_url = request.POST.get("model_url")
@@ -1032,24 +1043,57 @@ def generate_product_model_api(request, collection_id):
         if not (getattr(settings, "GEMINI_API_KEY", "") or getattr(settings, "GOOGLE_API_KEY", "")):
             return Response({"success": False, "error": "GEMINI/GOOGLE API key not configured."})
 
+        from .tasks import generate_product_model_composite_task
+        job_id = str(uuid.uuid4())
+        task_id = _start_single_image_job(
+            job_id, generate_product_model_composite_task,
+            collection_id, product_url, model_url, prompt_text,
+            user=request.user, collection=collection,
+        )
+
+        return Response({
+            "success": True,
+            "message": "Image generation started.",
+            "job_id": job_id,
+            "task_id": task_id,
+            "status": "pending",
+        }, status=202)
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        report_handled_exception(e, request=request)
+        return Response({"success": False, "error": str(e)}, status=500)
+
+
+def generate_product_model_composite_background(collection_id, product_url, model_url, prompt_text, job_id=None, lease=None):
+    """
+    Background part of generate_product_model_api, called by Celery.
+    With a lease (generation_lock.GenerationLease) the result is only
+    stored while the lease is still held.
+
+    Returns:
+        Dict with success status and the composite image url and path
+    """
+    import requests
+    import base64
+    import os
+    import uuid
+    from datetime import datetime
+    from .generation_lock import LeaseLost
+
+    try:
         # ✅ Initialize Gemini client
-        client = genai.Client()
+        client = get_client()
         model_name = get_image_model_name(default_model=settings.IMAGE_MODEL_NAME)
 
-        import requests
-        import base64
-        import os
-        import uuid
-
         # Download both images
-        product_data = base64.b64encode(
-            requests.get(product_url).content).decode("utf-8")
-        model_data = base64.b64encode(
-            requests.get(model_url).content).decode("utf-8")
+        product_data = requests.get(product_url).content
+        model_data = requests.get(model_url).content
 
         contents = [
-            {"inline_data": {"mime_type": "image/jpeg", "data": model_data}},
-            {"inline_data": {"mime_type": "image/jpeg", "data": product_data}},
+            image_part(model_data),
+            image_part(product_data),
             {"text": f"Place the product naturally on the model according to this prompt: {prompt_text}. Maintain realism, shadows, proportions, and lighting."}
         ]
 
@@ -1069,7 +1113,7 @@ def generate_product_model_api(request, collection_id):
                 break
 
         if not generated_bytes:
-            return Response({"success": False, "error": "Gemini did not return an image."})
+            raise ValueError("Gemini did not return an image.")
 
         # Save locally
         output_dir = os.path.join("media", "composite_images", str(
@@ -1089,18 +1133,29 @@ def generate_product_model_api(request, collection_id):
             resource_type="image"
         )
 
-        result = {
+        image_info = {
             "url": cloud_upload["secure_url"],
-            "path": local_path
+            "cloud_url": cloud_upload["secure_url"],
+            "path": local_path,
+            "local_path": local_path,
+            "collection_id": str(collection_id),
+            "created_at": datetime.now(timezone.utc).isoformat(),
         }
+        if lease:
+            lease.check()
+        if job_id:
+            _complete_single_image_job(job_id, image_info)
+        return {"success": True, "image": image_info}
 
-        return Response({"success": True, "image": result})
-
+    except LeaseLost:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
-        report_handled_exception(e, request=request)
-        return Response({"success": False, "error": str(e)}, status=500)
+        report_handled_exception(e, context={"path": "generate_product_model_composite_background", "job_id": job_id})
+        if job_id:
+            _fail_single_image_job(job_id, get_user_friendly_message(e))
+        return {"success": False, "error": get_user_friendly_message(e)}
 
 
 # @csrf_exempt
@@ -1567,97 +1622,15 @@ def _check_ornament_type_match(product_ornament_type, master_analysis_text):
     return False
 
 
-def generate_single_product_model_image_background(collection_id, user_id, product_index, prompt_key, job_id=None):
+def get_product_model_prompt_templates():
     """
-    Generate a single image for a specific product index and prompt key.
-    This is the core worker logic used by Celery so that each task
-    is responsible for exactly ONE image.
+    Resolve the prompt templates for the four product image types
+    (white background, background replace, model, campaign) from
+    PromptMaster, falling back to the built-in defaults.
     """
-    import os
-    import base64
-    import uuid
-    import json
-    import traceback
-    import cloudinary.uploader
-    from datetime import datetime
-    from imgbackend.ai_utils import genai, types
-    from django.conf import settings
+    from .prompt_initializer import get_prompt_from_db
 
-    from .job_models import ImageGenerationJob
-
-    try:
-        # === Credit Check and Deduction ===
-        from CREDITS.utils import deduct_credits, get_user_organization, get_credit_settings
-        from users.models import User, Role
-
-        # Get dynamic credit settings
-        credit_settings = get_credit_settings()
-        CREDITS_PER_IMAGE = credit_settings['credits_per_image_generation']
-
-        # Get user
-        user = User.objects(id=user_id).first()
-        if not user:
-            return {"success": False, "error": "User not found"}
-
-        # Get collection first to access project
-        collection = Collection.objects.get(id=collection_id)
-
-        # Check if user has organization - if not, allow generation without credit deduction
-        organization = get_user_organization(user)
-        if organization:
-            # Check and deduct credits before generation
-            credit_result = deduct_credits(
-                organization=organization,
-                user=user,
-                amount=CREDITS_PER_IMAGE,
-                reason=f"Product model image generation - {prompt_key}",
-                project=collection.project if hasattr(
-                    collection, 'project') else None,
-                metadata={"type": "product_model_image",
-                          "prompt_key": prompt_key, "product_index": product_index}
-            )
-
-            if not credit_result['success']:
-                return {"success": False, "error": credit_result['message']}
-        # If no organization, allow generation to proceed without credit deduction
-        if not collection.items:
-            return {"success": False, "error": "No items found in collection."}
-
-        item = collection.items[0]
-
-        if not hasattr(item, "selected_model") or not item.selected_model:
-            return {"success": False, "error": "No model selected. Please select a model first."}
-
-        selected_model = item.selected_model
-        model_local_path = selected_model.get("local")
-        model_cloud_url = selected_model.get("cloud")
-
-        # Check if model local path exists, if not try to download from cloud URL
-        if not model_local_path or not os.path.exists(model_local_path):
-            return {"success": False, "error": "Selected model image not found on server."}
-
-        if not hasattr(item, "generated_prompts") or not item.generated_prompts:
-            return {"success": False, "error": "No generated prompts found."}
-
-        # Bound check for product index
-        if product_index < 0 or product_index >= len(item.product_images):
-            return {"success": False, "error": "Invalid product index."}
-
-        if prompt_key not in item.generated_prompts:
-            return {"success": False, "error": f"Prompt key '{prompt_key}' not found."}
-
-        # Read model image once
-        with open(model_local_path, "rb") as f:
-            model_bytes = f.read()
-        model_b64 = base64.b64encode(model_bytes).decode("utf-8")
-
-        client = genai.Client()
-        model_name = get_image_model_name(default_model=settings.IMAGE_MODEL_NAME)
-
-        # Prompt templates
-        from .prompt_initializer import get_prompt_from_db
-
-        default_white_bg = """remove the background from the product image and replace it with a clean, elegant white studio background.
+    default_white_bg = """remove the background from the product image and replace it with a clean, elegant white studio background.
         Do NOT modify, alter, or redesign the product in any way — its color, shape, texture, and proportions must remain exactly the same.(important dont change the product image) 
 Generate a high-quality product photo on a clean, elegant white studio background. 
 The product should appear exactly as in the input image, only placed against a professional white background. 
@@ -1665,7 +1638,7 @@ Ensure balanced, soft studio lighting with natural shadows and realistic reflect
 Highlight product clarity and detail. 
 Follow this specific style prompt: {prompt_text}"""
 
-        default_bg_replace = """Use the provided ornament product image as the hero subject of a professional product photography shot. 
+    default_bg_replace = """Use the provided ornament product image as the hero subject of a professional product photography shot. 
 Do NOT redraw, reinterpret, or change the ornament in any way. Do NOT modify the ornament's shape, texture, color, size, material, reflections, orientation, or proportions. The ornament must appear exactly as in the original product image.
 
 CAMERA ANGLE AND PERSPECTIVE (CRITICAL): Follow the EXACT camera angle and perspective described in the style reference below. If the style reference specifies a camera angle (e.g., "elevated diagonal perspective", "overhead 90-degree angle", "flat-lay top-down view"), you MUST use that EXACT angle. Do NOT default to a flat-lay view unless explicitly specified in the style reference.
@@ -1700,7 +1673,7 @@ The style reference below contains the EXACT description including camera angle,
 {prompt_text}
 """
 
-        default_model = """CRITICAL MODEL PRESERVATION REQUIREMENTS - MANDATORY:
+    default_model = """CRITICAL MODEL PRESERVATION REQUIREMENTS - MANDATORY:
 
 Use the uploaded model image as the absolute identity reference. The generated model MUST look EXACTLY the same as the uploaded model with ZERO changes to:
 
@@ -1748,7 +1721,7 @@ Use this style reference strictly for framing, mood, and environment (NOT for mo
 {prompt_text}
 """
 
-        default_campaign = """CRITICAL MODEL PRESERVATION REQUIREMENTS - MANDATORY:
+    default_campaign = """CRITICAL MODEL PRESERVATION REQUIREMENTS - MANDATORY:
 
 Create a professional campaign-style image where the uploaded model MUST look EXACTLY the same as the uploaded model image with ZERO changes to:
 
@@ -1785,12 +1758,113 @@ Ensure cinematic yet natural studio lighting, soft shadows, and high-end magazin
 STYLE REFERENCE:
 Follow this specific style prompt: {prompt_text}"""
 
-        prompt_templates = {
-            "white_background": get_prompt_from_db("white_background_template", default_white_bg),
-            "background_replace": get_prompt_from_db("background_replace_template", default_bg_replace),
-            "model_image": get_prompt_from_db("model_image_template", default_model),
-            "campaign_image": get_prompt_from_db("campaign_image_template", default_campaign),
-        }
+    return {
+        "white_background": get_prompt_from_db("white_background_template", default_white_bg),
+        "background_replace": get_prompt_from_db("background_replace_template", default_bg_replace),
+        "model_image": get_prompt_from_db("model_image_template", default_model),
+        "campaign_image": get_prompt_from_db("campaign_image_template", default_campaign),
+    }
+
+
+def generate_single_product_model_image_background(collection_id, user_id, product_index, prompt_key, job_id=None, job_context=None, retries=None, lease=None):
+    """
+    Generate a single image for a specific product index and prompt key.
+    This is the core worker logic used by Celery so that each task
+    is responsible for exactly ONE image.
+
+    Bulk jobs pass the job's context snapshot (see job_context.py) so the
+    task does not re-read the user, collection, credit settings and prompt
+    templates. Without a snapshot one is built on the fly.
+
+    With `retries` (the task's retry count) a failure worth retrying under
+    common.failure_policy raises RetryableFailure instead of failing the
+    job; the retried attempt is not charged again.
+
+    With a lease (generation_lock.GenerationLease) the task stops with
+    LeaseLost before charging credits or storing the image if another
+    delivery has taken the work over.
+    """
+    import os
+    import base64
+    import uuid
+    import json
+    import traceback
+    import cloudinary.uploader
+    from datetime import datetime
+    from imgbackend.ai_utils import types, get_client, guess_image_mime_type, image_part, image_part_from_file
+
+    from .job_models import ImageGenerationJob
+    from .job_context import build_job_context, get_model_image_bytes, JobContextError
+    from .image_results import push_generated_image
+    from .job_progress import record_image_completed, record_image_failed, record_job_status
+    from .job_cancellation import is_job_cancelled
+    from .generation_lock import LeaseLost, claim_credit_charge, get_credit_charge_key, release_credit_charge
+    from common.failure_policy import RetryableFailure, classify_failure, get_retry_countdown
+
+    try:
+        from CREDITS.utils import deduct_credits
+        from users.models import User
+        from organization.models import Organization
+
+        if job_context is None:
+            user = User.objects(id=user_id).first()
+            if not user:
+                return {"success": False, "error": "User not found"}
+            collection = Collection.objects.get(id=collection_id)
+            try:
+                job_context = build_job_context(collection, user)
+            except JobContextError as context_error:
+                return {"success": False, "error": str(context_error)}
+
+        # The job may have been cancelled while this task waited for its lock
+        if is_job_cancelled(job_id):
+            return {"success": False, "error": "Job was cancelled."}
+
+        # === Credit Check and Deduction ===
+        CREDITS_PER_IMAGE = job_context["credits_per_image"]
+
+        # Check if user has organization - if not, allow generation without credit deduction.
+        # The snapshot holds ids only; references are enough for the atomic balance update.
+        organization_id = job_context.get("organization_id")
+        charge_key = get_credit_charge_key(job_id, product_index, prompt_key) if job_id else None
+        if lease:
+            lease.check()
+        if organization_id and claim_credit_charge(charge_key):
+            project_id = job_context.get("project_id")
+            credit_result = deduct_credits(
+                organization=Organization(id=organization_id),
+                user=User(id=user_id),
+                amount=CREDITS_PER_IMAGE,
+                reason=f"Product model image generation - {prompt_key}",
+                project=Project(id=project_id) if project_id else None,
+                metadata={"type": "product_model_image",
+                          "prompt_key": prompt_key, "product_index": product_index}
+            )
+
+            if not credit_result['success']:
+                release_credit_charge(charge_key)
+                return {"success": False, "error": credit_result['message']}
+        # If no organization, allow generation to proceed without credit deduction
+
+        selected_model = job_context["selected_model"]
+        generated_prompts = job_context["generated_prompts"]
+        products = job_context["products"]
+
+        # Bound check for product index
+        if str(product_index) not in products:
+            return {"success": False, "error": "Invalid product index."}
+
+        if prompt_key not in generated_prompts:
+            return {"success": False, "error": f"Prompt key '{prompt_key}' not found."}
+
+        # Model image is read once per worker process
+        model_bytes = get_model_image_bytes(job_context)
+        if not model_bytes:
+            return {"success": False, "error": "Selected model image not found on server."}
+
+        client = get_client()
+        model_name = job_context["model_name"]
+        prompt_templates = job_context["prompt_templates"]
 
         # Logger
         import logging
@@ -1801,17 +1875,17 @@ Follow this specific style prompt: {prompt_text}"""
         except Exception:
             logger = logging.getLogger(__name__)
 
-        product = item.product_images[product_index]
+        product = products[str(product_index)]
+        product_url = product.get("url")
 
         # Check if product has uploaded_image_path
-        if not hasattr(product, 'uploaded_image_path') or not product.uploaded_image_path:
+        if not product.get("path"):
             # Fallback to uploaded_image_url if path is not available
-            if hasattr(product, 'uploaded_image_url') and product.uploaded_image_url:
+            if product_url:
                 # Try to download from URL if path doesn't exist
                 product_path = None
                 try:
-                    response = requests.get(
-                        product.uploaded_image_url, timeout=10)
+                    response = requests.get(product_url, timeout=10)
                     if response.status_code == 200:
                         # Save temporarily
                         temp_dir = os.path.join(
@@ -1822,7 +1896,7 @@ Follow this specific style prompt: {prompt_text}"""
                         with open(product_path, "wb") as f:
                             f.write(response.content)
                     else:
-                        return {"success": False, "error": f"Could not download product image from URL: {product.uploaded_image_url}"}
+                        return {"success": False, "error": f"Could not download product image from URL: {product_url}"}
                 except Exception as download_error:
                     logger.error(
                         f"[JOB {job_id}] Error downloading product image: {download_error}")
@@ -1830,7 +1904,7 @@ Follow this specific style prompt: {prompt_text}"""
             else:
                 return {"success": False, "error": "Product image path or URL not found."}
         else:
-            product_path = product.uploaded_image_path
+            product_path = product["path"]
 
         if not product_path or not os.path.exists(product_path):
             msg = f"[JOB {job_id}] Product image path does not exist: {product_path}"
@@ -1838,11 +1912,9 @@ Follow this specific style prompt: {prompt_text}"""
             print(msg)
             return {"success": False, "error": "Product image path does not exist."}
 
-        with open(product_path, "rb") as f:
-            product_bytes = f.read()
-        product_b64 = base64.b64encode(product_bytes).decode("utf-8")
+        product_part = image_part_from_file(product_path)
 
-        prompt_text = item.generated_prompts.get(prompt_key, "")
+        prompt_text = generated_prompts.get(prompt_key, "")
         if not prompt_text or not prompt_text.strip():
             return {"success": False, "error": f"Prompt for key '{prompt_key}' is empty."}
 
@@ -1852,9 +1924,10 @@ Follow this specific style prompt: {prompt_text}"""
         if template:
             custom_prompt = template.format(prompt_text=prompt_text)
 
+        model_path = job_context["selected_model"]["local"]
         contents = [
-            {"inline_data": {"mime_type": "image/jpeg", "data": model_b64}},
-            {"inline_data": {"mime_type": "image/jpeg", "data": product_b64}},
+            image_part(model_bytes, guess_image_mime_type(model_path)),
+            product_part,
             {"text": custom_prompt},
         ]
 
@@ -1904,28 +1977,6 @@ Follow this specific style prompt: {prompt_text}"""
             resource_type="image",
         )
 
-        # Reload collection to avoid race conditions from concurrent tasks
-        try:
-            collection.reload()
-        except Exception as reload_error:
-            logger.warning(
-                f"[JOB {job_id}] Could not reload collection: {reload_error}. Continuing with existing reference.")
-
-        # Re-validate item and product after reload
-        if not collection.items or len(collection.items) == 0:
-            return {"success": False, "error": "Collection items not found after reload."}
-
-        item = collection.items[0]
-
-        # Validate product_index is still valid
-        if not hasattr(item, "product_images") or not item.product_images:
-            return {"success": False, "error": "No product images found in collection."}
-
-        if product_index < 0 or product_index >= len(item.product_images):
-            return {"success": False, "error": f"Invalid product index {product_index} after reload. Collection has {len(item.product_images)} products."}
-
-        product = item.product_images[product_index]
-
         # Store result in product
         new_image_data = {
             "type": prompt_key,
@@ -1941,34 +1992,10 @@ Follow this specific style prompt: {prompt_text}"""
             },
         }
 
-        # Ensure generated_images list exists
-        if not hasattr(product, 'generated_images') or product.generated_images is None:
-            product.generated_images = []
-
-        product.generated_images.append(new_image_data)
-
-        # Explicitly mark the field as modified for MongoEngine
-        collection.items[0].product_images[product_index] = product
-
-        # Save with explicit update
-        collection.save()
-
-        # Verify save worked
-        try:
-            collection.reload()
-            if collection.items and len(collection.items) > 0:
-                item = collection.items[0]
-                if hasattr(item, "product_images") and item.product_images and product_index < len(item.product_images):
-                    saved_product = item.product_images[product_index]
-                    if hasattr(saved_product, 'generated_images') and saved_product.generated_images:
-                        if len(saved_product.generated_images) == 0:
-                            logger.error(
-                                f"[JOB {job_id}] WARNING: Image not saved to collection! product_index={product_index}, prompt_key={prompt_key}")
-                            print(
-                                f"[JOB {job_id}] WARNING: Image not saved to collection! product_index={product_index}, prompt_key={prompt_key}")
-        except Exception as verify_error:
-            logger.warning(
-                f"[JOB {job_id}] Could not verify save: {verify_error}")
+        if lease:
+            lease.check()
+        # Stored as its own document - concurrent tasks never overwrite each other's results
+        push_generated_image(collection_id, product_index, new_image_data)
 
         # Track history (re-use existing utility)
         try:
@@ -1976,14 +2003,14 @@ Follow this specific style prompt: {prompt_text}"""
 
             track_project_image_generation(
                 user_id=str(user_id),
-                collection_id=str(collection.id),
+                collection_id=str(collection_id),
                 image_type=f"project_{prompt_key}",
                 image_url=cloud_upload["secure_url"],
                 prompt=prompt_text,
                 local_path=local_path,
                 metadata={
                     "model_used": selected_model.get("type"),
-                    "product_url": product.uploaded_image_url,
+                    "product_url": product_url,
                     "model_name": selected_model.get("name", ""),
                     "generation_type": prompt_key,
                 },
@@ -1996,7 +2023,7 @@ Follow this specific style prompt: {prompt_text}"""
         if job_id:
             try:
                 # Verify job is still active before tracking (prevents old jobs from adding images)
-                job = ImageGenerationJob.objects(job_id=job_id).first()
+                job = ImageGenerationJob.objects(job_id=job_id).only("status").first()
                 if not job:
                     logger.warning(
                         f"[JOB {job_id}] Job not found, skipping job tracking")
@@ -2011,7 +2038,7 @@ Follow this specific style prompt: {prompt_text}"""
                     image_info = {
                         "cloud_url": cloud_upload["secure_url"],
                         "local_path": local_path,
-                        "collection_id": str(collection.id),
+                        "collection_id": str(collection_id),
                         "product_index": product_index,
                         "prompt_key": prompt_key,
                         "created_at": datetime.now(timezone.utc).isoformat(),
@@ -2021,12 +2048,22 @@ Follow this specific style prompt: {prompt_text}"""
                         push__images=image_info,
                         set__status="running",
                     )
-
-                    # Re-fetch to check completion
-                    job = ImageGenerationJob.objects(job_id=job_id).first()
-                    if job and job.completed_images >= job.total_images:
-                        job.status = "completed"
-                        job.save()
+                    # Mirror into Redis so pollers don't have to read Mongo
+                    progress = record_image_completed(job_id, image_info)
+                    if progress:
+                        completed_images, total_images = progress
+                    else:
+                        job = ImageGenerationJob.objects(job_id=job_id).only(
+                            "completed_images", "total_images").first()
+                        completed_images = job.completed_images if job else 0
+                        total_images = job.total_images if job else 1
+
+                    if total_images and completed_images >= total_images:
+                        ImageGenerationJob.objects(job_id=job_id, status="running").update_one(
+                            set__status="completed",
+                            set__updated_at=datetime.utcnow(),
+                        )
+                        record_job_status(job_id, "completed")
             except Exception as job_error:
                 print(
                     f"Error updating ImageGenerationJob {job_id}: {job_error}")
@@ -2039,16 +2076,29 @@ Follow this specific style prompt: {prompt_text}"""
             "product_index": product_index,
         }
 
+    except LeaseLost:
+        raise
     except Exception as e:
+        failure_class = classify_failure(e)
+        if retries is not None and not is_job_cancelled(job_id):
+            countdown = get_retry_countdown(failure_class, retries, minimum=getattr(e, "retry_in", 0))
+            if countdown is not None:
+                print(f"[JOB {job_id}] {failure_class} failure for {prompt_key}/{product_index}, "
+                      f"retrying in {countdown:.0f}s: {e}")
+                raise RetryableFailure(failure_class, countdown, str(e)) from e
+
         traceback.print_exc()
-        report_handled_exception(e, context={"user_id": user_id, "path": "generate_single_product_model_image_background", "job_id": job_id})
+        report_handled_exception(e, context={"user_id": user_id, "path": "generate_single_product_model_image_background",
+                                             "job_id": job_id, "failure_class": failure_class})
         if job_id:
+            record_image_failed(job_id, product_index, prompt_key, get_user_friendly_message(e))
             try:
                 job = ImageGenerationJob.objects(job_id=job_id).first()
                 if job and job.status != "completed":
                     job.status = "failed"
                     job.error = get_user_friendly_message(e)
                     job.save()
+                    record_job_status(job_id, "failed", job.error)
             except Exception:
                 pass
         return {"success": False, "error": get_user_friendly_message(e)}
@@ -2067,7 +2117,7 @@ def generate_all_product_model_images_background(collection_id, user_id):
     import traceback
     import cloudinary.uploader
     from datetime import datetime
-    from imgbackend.ai_utils import genai, types
+    from imgbackend.ai_utils import types, get_client, image_part_from_file
     from django.conf import settings
 
     try:
@@ -2118,153 +2168,16 @@ def generate_all_product_model_images_background(collection_id, user_id):
         # ---------------------------
         # 2. Read model image once
         # ---------------------------
-        with open(model_local_path, "rb") as f:
-            model_bytes = f.read()
-        model_b64 = base64.b64encode(model_bytes).decode("utf-8")
+        model_part = image_part_from_file(model_local_path)
 
-        client = genai.Client()
+        client = get_client()
         model_name = get_image_model_name(default_model=settings.IMAGE_MODEL_NAME)
 
         # ---------------------------
         # 3. Prompt templates
         # ---------------------------
         # Get prompt templates from database with fallback
-        from .prompt_initializer import get_prompt_from_db
-
-        default_white_bg = """remove the background from the product image and replace it with a clean, elegant white studio background.
-        Do NOT modify, alter, or redesign the product in any way — its color, shape, texture, and proportions must remain exactly the same.(important dont change the product image) 
-Generate a high-quality product photo on a clean, elegant white studio background. 
-The product should appear exactly as in the input image, only placed against a professional white background. 
-Ensure balanced, soft studio lighting with natural shadows and realistic reflections. 
-Highlight product clarity and detail. 
-Follow this specific style prompt: {prompt_text}"""
-
-        default_bg_replace = """Use the provided ornament product image as the hero subject of a professional product photography shot. 
-Do NOT redraw, reinterpret, or change the ornament in any way. Do NOT modify the ornament's shape, texture, color, size, material, reflections, orientation, or proportions. The ornament must appear exactly as in the original product image.
-
-CAMERA ANGLE AND PERSPECTIVE (CRITICAL): Follow the EXACT camera angle and perspective described in the style reference below. If the style reference specifies a camera angle (e.g., "elevated diagonal perspective", "overhead 90-degree angle", "flat-lay top-down view"), you MUST use that EXACT angle. Do NOT default to a flat-lay view unless explicitly specified in the style reference.
-
-The ornament must stay clearly visible, well-framed, and the dominant focal point of the composition.
-
-Surround the ornament with carefully chosen supporting elements and objects that enhance its appeal, such as coordinated fabrics, jewelry props, trays, soft decor pieces, or festive details, while keeping the scene clean and premium. 
-All added elements must support the ornament, not compete with it.
-
-Place the ornament on a realistic premium surface such as silk fabric, velvet, marble, or textured stone, maintaining full physical contact between the ornament and the surface with grounded shadows directly beneath it (unless the style reference specifies a different placement or arrangement).
-
-Create a studio-quality product photography environment with:
-- soft diffused lighting (adjust based on style reference)
-- gentle warm highlights
-- clean, natural shadow falloff
-- high surface and material realism
-- crisp focus on the ornament and slightly softer focus on surrounding elements
-
-Background and props may add mood and storytelling but must remain visually secondary to the ornament. 
-The ornament must always remain the sharpest, brightest, and most visually dominant element in the frame.
-
-MASTER ANALYSIS FOLLOWING (CRITICAL): If the style prompt below is a comprehensive master theme analysis, you MUST follow it EXACTLY without missing a single detail. The master analysis contains specific information about:
-- Exact camera angle and perspective (e.g., "elevated diagonal perspective", "photographed from an overhead 90-degree angle", "flat-lay top-down view") - FOLLOW THIS EXACTLY
-- Exact placement and positioning of ornaments (e.g., "rests diagonally", "gracefully drapes", "positioned elegantly beside", "commands attention") - FOLLOW THIS EXACTLY
-- Precise lighting conditions (e.g., "soft, warm ambient lighting", "shallow depth of field", "soft diffused top lighting") - FOLLOW THIS EXACTLY
-- Specific surface materials and textures (e.g., "light beige, rectangular jewelry box", "soft, neutral surface", "silk fabric, velvet, marble") - FOLLOW THIS EXACTLY
-- Exact artistic style and mood (e.g., "sophisticated minimalism", "opulent heritage", "serene luxury") - FOLLOW THIS EXACTLY
-- All supporting elements and props mentioned (e.g., flowers, decorative pieces, fabrics, vintage treasure chest, ceremonial fabric) - FOLLOW THIS EXACTLY
-- Follow EVERY detail from the master analysis exactly as described - do not generalize or simplify any aspect.
-
-The style reference below contains the EXACT description including camera angle, placement, lighting, materials, and all visual elements. Follow it PRECISELY:
-{prompt_text}
-"""
-
-        default_model = """CRITICAL MODEL PRESERVATION REQUIREMENTS - MANDATORY:
-
-Use the uploaded model image as the absolute identity reference. The generated model MUST look EXACTLY the same as the uploaded model with ZERO changes to:
-
-FACIAL STRUCTURE (MANDATORY - EXACT MATCH):
-- Exact facial bone structure: jawline, cheekbones, chin shape, forehead shape
-- Exact facial proportions: face width, face length, facial symmetry
-- Exact eye structure: eye shape, eye size, eye spacing, eyelid shape, eyebrow shape and position
-- Exact nose structure: nose shape, nose size, nostril shape, bridge height
-- Exact mouth structure: lip shape, lip size, lip thickness, mouth width
-- Exact facial features positioning: distance between features, feature alignment
-
-AGE PRESERVATION (MANDATORY - EXACT MATCH):
-- Exact age appearance: maintain the exact same age look as the uploaded model
-- Exact skin characteristics: skin texture, skin tone, skin undertones, complexion
-- Exact facial maturity: maintain the same level of facial maturity and age markers
-- Do NOT make the model look younger or older - maintain EXACT age appearance
-
-ADDITIONAL PRESERVATION REQUIREMENTS:
-- Exact skin tone, skin texture, complexion, undertones, and skin characteristics
-- Exact hair: hair color, hair texture, hair style, hair length, hairline, and any highlights or natural variations
-- Exact body proportions: height, build, body shape, muscle definition, and physical characteristics
-- Exact facial expressions style and natural features
-- Exact distinctive characteristics and unique features
-- Do NOT beautify, stylize, enhance, or alter the model in ANY way
-- The model's identity must remain 100% identical to the original uploaded model image
-
-PRODUCT PRESERVATION:
-Place ONLY the given uploaded product (ornament/jewelry) on the model. The product must remain 100% identical to the original product image with NO changes in design, shape, stone layout, metal finish, color, texture, reflections, or micro detailing. Do NOT reinterpret, redraw, enhance, or modify the product in any way.
-
-INTEGRATION:
-Ensure natural and physically accurate product fitting on the model with correct scale, proportion, weight placement, and gravity behavior. Match the original lighting interaction between the product and the model's skin for seamless realism.
-
-QUALITY STANDARDS:
-The final image must appear as a high-end professional fashion product photography shoot with:
-- soft studio lighting
-- natural shadow falloff
-- balanced highlights
-- clean depth separation
-- sharp focus on the product and model
-
-STYLE REFERENCE:
-Follow the pose, framing, and environmental styling ONLY as described in the style reference below, without changing the product or the model identity.
-
-Use this style reference strictly for framing, mood, and environment (NOT for modifying the product or model):
-{prompt_text}
-"""
-
-        default_campaign = """CRITICAL MODEL PRESERVATION REQUIREMENTS - MANDATORY:
-
-Create a professional campaign-style image where the uploaded model MUST look EXACTLY the same as the uploaded model image with ZERO changes to:
-
-FACIAL STRUCTURE (MANDATORY - EXACT MATCH):
-- Exact facial bone structure: jawline, cheekbones, chin shape, forehead shape
-- Exact facial proportions: face width, face length, facial symmetry
-- Exact eye structure: eye shape, eye size, eye spacing, eyelid shape, eyebrow shape and position
-- Exact nose structure: nose shape, nose size, nostril shape, bridge height
-- Exact mouth structure: lip shape, lip size, lip thickness, mouth width
-- Exact facial features positioning: distance between features, feature alignment
-
-AGE PRESERVATION (MANDATORY - EXACT MATCH):
-- Exact age appearance: maintain the exact same age look as the uploaded model
-- Exact skin characteristics: skin texture, skin tone, skin undertones, complexion
-- Exact facial maturity: maintain the same level of facial maturity and age markers
-- Do NOT make the model look younger or older - maintain EXACT age appearance
-
-ADDITIONAL PRESERVATION REQUIREMENTS:
-- Exact skin tone, skin texture, complexion, undertones, and skin characteristics
-- Exact hair: hair color, hair texture, hair style, hair length, hairline, and any highlights or natural variations
-- Exact body proportions: height, build, body shape, muscle definition, and physical characteristics
-- Exact facial expressions style and natural features
-- Exact distinctive characteristics and unique features
-- Do NOT beautify, stylize, enhance, or alter the model in ANY way
-- The model's identity must remain 100% identical to the original uploaded model image
-
-PRODUCT PRESERVATION:
-The model is wearing ONLY the given product, keeping the product exactly as it appears in the original product image — no changes in color, shape, or design.
-
-STYLING:
-Use a lifestyle or editorial-style background that enhances the brand aesthetic while maintaining focus on the product. 
-Ensure cinematic yet natural studio lighting, soft shadows, and high-end magazine-quality realism.
-
-STYLE REFERENCE:
-Follow this specific style prompt: {prompt_text}"""
-
-        prompt_templates = {
-            "white_background": get_prompt_from_db('white_background_template', default_white_bg),
-            "background_replace": get_prompt_from_db('background_replace_template', default_bg_replace),
-            "model_image": get_prompt_from_db('model_image_template', default_model),
-            "campaign_image": get_prompt_from_db('campaign_image_template', default_campaign),
-        }
+        prompt_templates = get_product_model_prompt_templates()
 
         # ---------------------------
         # 4. Loop through each product image
@@ -2310,9 +2223,7 @@ Follow this specific style prompt: {prompt_text}"""
             logger.info(log_msg)
             print(log_msg)
 
-            with open(product_path, "rb") as f:
-                product_bytes = f.read()
-            product_b64 = base64.b64encode(product_bytes).decode("utf-8")
+            product_part = image_part_from_file(product_path)
 
             # Clear any old generated images for this run
             product.generated_images = []
@@ -2414,8 +2325,6 @@ Follow this specific style prompt: {prompt_text}"""
                                         theme_img, 'analysis', '').strip()
 
                                     # Parse JSON analysis to get type and description
-                                    import json
-                                    import re
                                     theme_analysis_type = None
                                     theme_analysis_main_category = None
                                     theme_analysis_description = None
@@ -2930,8 +2839,8 @@ Follow this specific style prompt: {prompt_text}"""
                                 print(log_msg)
 
                     contents = [
-                        {"inline_data": {"mime_type": "image/jpeg", "data": model_b64}},
-                        {"inline_data": {"mime_type": "image/jpeg", "data": product_b64}},
+                        model_part,
+                        product_part,
                         {"text": custom_prompt},
                     ]
 
@@ -3282,45 +3191,20 @@ def regenerate_product_model_image(request, collection_id):
     Regenerate a specific generated image using Google GenAI (Gemini).
     Allows specifying a different model (AI or real) for regeneration.
     Tracks model usage statistics.
+
+    The request is validated and charged here; the Gemini call runs in a
+    Celery task in the interactive priority lane. Responds 202 with a
+    single-image job_id whose result arrives like a bulk job's: on the job
+    event stream or by polling api/jobs/<job_id>/images/.
     """
     import json
     import os
     import uuid
-    import base64
     import traceback
-    import cloudinary.uploader
-    from datetime import datetime
-    from imgbackend.ai_utils import genai, types
 
     # Get user from authentication middleware
     user = request.user
 
-    # === Credit Check and Deduction ===
-    from CREDITS.utils import deduct_credits, get_user_organization, get_credit_settings
-    from users.models import Role
-
-    # Get dynamic credit settings
-    credit_settings = get_credit_settings()
-    CREDITS_PER_REGENERATION = credit_settings['credits_per_regeneration']
-
-    # Check if user has organization - if not, allow generation without credit deduction
-    organization = get_user_organization(user)
-    if organization:
-        # Check and deduct credits before regeneration
-        credit_result = deduct_credits(
-            organization=organization,
-            user=user,
-            amount=CREDITS_PER_REGENERATION,
-            reason="Product model image regeneration",
-            project=None,
-            metadata={"type": "regenerate_product_model_image",
-                      "collection_id": collection_id}
-        )
-
-        if not credit_result['success']:
-            return Response({"success": False, "error": credit_result['message']}, status=400)
-    # If no organization, allow generation to proceed without credit deduction
-
     try:
         data = json.loads(request.body)
         product_image_path = data.get("product_image_path")
@@ -3343,15 +3227,20 @@ def regenerate_product_model_image(request, collection_id):
         # This could be either an original generated image or a regenerated image
         target_generated = None
         target_product = None
+        target_product_index = None
         is_regenerated_image = False
         original_prompt = None
 
-        for p in item.product_images:
-            for g in p.generated_images:
+        from .image_results import get_generated_images_by_product
+        generated_by_product = get_generated_images_by_product(collection)
+
+        for p_idx, p in enumerate(item.product_images):
+            for g in generated_by_product.get(p_idx, []):
                 # Check if it's the original generated image
                 if g.get("local_path") == generated_image_path:
                     target_generated = g
                     target_product = p
+                    target_product_index = p_idx
                     original_prompt = g.get("prompt")
                     break
 
@@ -3361,6 +3250,7 @@ def regenerate_product_model_image(request, collection_id):
                         if regen.get("local_path") == generated_image_path:
                             target_generated = g  # Store the parent generated image
                             target_product = p
+                            target_product_index = p_idx
                             is_regenerated_image = True
                             original_prompt = regen.get(
                                 "prompt", g.get("prompt"))
@@ -3373,10 +3263,6 @@ def regenerate_product_model_image(request, collection_id):
         if not target_generated:
             return Response({"success": False, "error": "Generated image not found"}, status=404)
 
-        # --- Google GenAI setup ---
-        client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
-        model_name = get_image_model_name(default_model=settings.IMAGE_MODEL_NAME)
-
         # Determine which model to use
         if use_different_model and new_model_data:
             model_to_use = new_model_data
@@ -3388,23 +3274,14 @@ def regenerate_product_model_image(request, collection_id):
         if not model_to_use:
             return Response({"success": False, "error": "No model specified for regeneration"})
 
-        # Load model image
+        # Fail fast on missing files instead of in the worker
         model_local_path = model_to_use.get("local")
         if not model_local_path or not os.path.exists(model_local_path):
             return Response({"success": False, "error": "Model image not found"})
 
-        with open(model_local_path, "rb") as f:
-            model_bytes = f.read()
-        model_b64 = base64.b64encode(model_bytes).decode("utf-8")
-
-        # Load product image
         if not os.path.exists(product_image_path):
             return Response({"success": False, "error": "Product image not found"})
 
-        with open(product_image_path, "rb") as f:
-            product_bytes = f.read()
-        product_b64 = base64.b64encode(product_bytes).decode("utf-8")
-
         # Build custom prompt based on the original image type
         # Combine original prompt context with new modifications
         original_type = target_generated.get("type", "model_image")
@@ -3453,11 +3330,127 @@ def regenerate_product_model_image(request, collection_id):
                 new_prompt=new_prompt or ""
             )
 
+        # === Credit Check and Deduction ===
+        from CREDITS.utils import deduct_credits, get_user_organization, get_credit_settings
+
+        # Get dynamic credit settings
+        credit_settings = get_credit_settings()
+        CREDITS_PER_REGENERATION = credit_settings['credits_per_regeneration']
+
+        # Check if user has organization - if not, allow generation without credit deduction
+        organization = get_user_organization(user)
+        credit_charge = None
+        if organization:
+            # Check and deduct credits before queueing the regeneration;
+            # the job refunds them if its task never runs
+            credit_result = deduct_credits(
+                organization=organization,
+                user=user,
+                amount=CREDITS_PER_REGENERATION,
+                reason="Product model image regeneration",
+                project=None,
+                metadata={"type": "regenerate_product_model_image",
+                          "collection_id": collection_id}
+            )
+
+            if not credit_result['success']:
+                return Response({"success": False, "error": credit_result['message']}, status=400)
+            credit_charge = {
+                "organization_id": str(organization.id),
+                "user_id": str(user.id),
+                "amount": CREDITS_PER_REGENERATION,
+            }
+        # If no organization, allow generation to proceed without credit deduction
+
+        # Everything the worker needs, resolved now so it does not depend on
+        # the collection changing while the task waits in the queue
+        params = {
+            "product_image_path": product_image_path,
+            "product_image_url": target_product.uploaded_image_url,
+            "product_index": target_product_index,
+            "parent_local_path": target_generated.get("local_path"),
+            "parent_image_id": str(target_generated.get("id", "unknown")),
+            "parent_regeneration_count": len(target_generated.get("regenerated_images", [])),
+            "new_prompt": new_prompt or "",
+            "original_prompt": original_base_prompt,
+            "combined_prompt": custom_prompt,
+            "type": original_type,
+            "use_different_model": bool(use_different_model),
+            "model_used": {
+                "type": model_to_use.get("type"),  # 'ai' or 'real'
+                "local": model_to_use.get("local"),
+                "cloud": model_to_use.get("cloud"),
+                "name": model_to_use.get("name", "")
+            },
+        }
+
+        from .tasks import regenerate_product_model_image_task
+        job_id = str(uuid.uuid4())
+        task_id = _start_single_image_job(
+            job_id, regenerate_product_model_image_task,
+            collection_id, str(user.id), params,
+            user=user, collection=collection, credit_charge=credit_charge,
+        )
+
+        return Response({
+            "success": True,
+            "message": "Regeneration started.",
+            "job_id": job_id,
+            "task_id": task_id,
+            "status": "pending",
+            "type": original_type,
+            "product_image_url": target_product.uploaded_image_url,
+            "used_different_model": use_different_model
+        }, status=202)
+
+    except Exception as e:
+        traceback.print_exc()
+        report_handled_exception(e, request=request)
+        return Response({"success": False, "error": str(e)}, status=500)
+
+
+def regenerate_product_model_image_background(collection_id, user_id, params, job_id=None, lease=None):
+    """
+    Background part of regenerate_product_model_image, called by Celery.
+    Generates the image, stores it as a regeneration of its parent image,
+    tracks history and finishes the single-image job.
+
+    Args:
+        collection_id: Collection of the image
+        user_id: Requesting user
+        params: Request snapshot built by regenerate_product_model_image
+        job_id: Single-image ImageGenerationJob to finish
+        lease: GenerationLease; the image is only stored while it is held
+
+    Returns:
+        Dict with success status and the regenerated image
+    """
+    import os
+    import uuid
+    import base64
+    import traceback
+    import cloudinary.uploader
+    from datetime import datetime
+    from imgbackend.ai_utils import types, get_client, image_part_from_file
+    from .generation_lock import LeaseLost
+    from .job_cancellation import refund_job_credits
+
+    stored = False
+    try:
+        collection = Collection.objects.get(id=collection_id)
+
+        model_part = image_part_from_file(params["model_used"]["local"])
+        product_part = image_part_from_file(params["product_image_path"])
+
+        # --- Google GenAI setup ---
+        client = get_client(api_key=os.getenv("GOOGLE_API_KEY"))
+        model_name = get_image_model_name(default_model=settings.IMAGE_MODEL_NAME)
+
         # Generate with model and product
         contents = [
-            {"inline_data": {"mime_type": "image/jpeg", "data": model_b64}},
-            {"inline_data": {"mime_type": "image/jpeg", "data": product_b64}},
-            {"text": custom_prompt}
+            model_part,
+            product_part,
+            {"text": params["combined_prompt"]}
         ]
 
         config = types.GenerateContentConfig(
@@ -3481,7 +3474,7 @@ def regenerate_product_model_image(request, collection_id):
                 break
 
         if not generated_bytes:
-            return Response({"success": False, "error": "No image generated by GenAI"})
+            raise ValueError("No image generated by GenAI")
 
         # --- Save new regenerated image locally ---
         new_filename = f"{uuid.uuid4()}_regenerated.png"
@@ -3504,65 +3497,166 @@ def regenerate_product_model_image(request, collection_id):
         # This tracks which model was used for each regeneration, supporting both AI and Real models
         # Model count is calculated as: 1 (original) + len(regenerated_images)
         # Model types used are tracked in the model_used field for each version
+        original_base_prompt = params["original_prompt"]
         regenerated_data = {
             # Use new prompt if provided, otherwise original
-            "prompt": new_prompt or original_base_prompt,
+            "prompt": params["new_prompt"] or original_base_prompt,
             "original_prompt": original_base_prompt,
-            "combined_prompt": custom_prompt,
-            "type": original_type,
+            "combined_prompt": params["combined_prompt"],
+            "type": params["type"],
             "local_path": local_output_path,
             "cloud_url": cloud_url,
             "created_at": datetime.now(timezone.utc).isoformat(),
-            "product_image_path": product_image_path,
-            "model_used": {
-                "type": model_to_use.get("type"),  # 'ai' or 'real'
-                "local": model_to_use.get("local"),
-                "cloud": model_to_use.get("cloud"),
-                "name": model_to_use.get("name", "")
-            }
+            "product_image_path": params["product_image_path"],
+            "model_used": params["model_used"],
         }
 
-        target_generated.setdefault(
-            "regenerated_images", []).append(regenerated_data)
-        collection.save()
+        if lease:
+            lease.check()
+        # Append to the parent generated image in a single update
+        from .image_results import push_regenerated_image
+        if not push_regenerated_image(collection_id, params["product_index"], params["parent_local_path"], regenerated_data):
+            raise ValueError("Generated image not found")
+        stored = True
+        regeneration_count = params["parent_regeneration_count"] + 1
 
         # Track regeneration in history
         try:
             from .history_utils import track_image_regeneration
             track_image_regeneration(
-                user_id=str(request.user.id),
-                original_image_id=str(target_generated.get("id", "unknown")),
+                user_id=str(user_id),
+                original_image_id=params["parent_image_id"],
                 new_image_url=cloud_url,
-                new_prompt=new_prompt or "",
+                new_prompt=params["new_prompt"],
                 original_prompt=original_base_prompt,
-                image_type=original_type,
+                image_type=params["type"],
                 project_id=str(collection.project.id),
                 collection_id=str(collection.id),
                 local_path=local_output_path,
                 metadata={
-                    "model_used": regenerated_data["model_used"],
-                    "regeneration_count": len(target_generated.get("regenerated_images", [])),
-                    "used_different_model": use_different_model
+                    "model_used": params["model_used"],
+                    "regeneration_count": regeneration_count,
+                    "used_different_model": params["use_different_model"]
                 }
             )
         except Exception as history_error:
             print(f"Error tracking regeneration history: {history_error}")
 
-        return Response({
-            "success": True,
+        # Same fields the synchronous endpoint used to return
+        image_info = {
             "url": cloud_url,
+            "cloud_url": cloud_url,
             "local_path": local_output_path,
-            "model_used": regenerated_data["model_used"],
+            "collection_id": str(collection_id),
+            "product_index": params["product_index"],
+            "model_used": params["model_used"],
             "original_prompt": original_base_prompt,
-            "new_prompt": new_prompt or "",
-            "combined_prompt": custom_prompt,
-            "type": original_type,
-            "regeneration_count": len(target_generated.get("regenerated_images", [])),
-            "product_image_url": target_product.uploaded_image_url,
-            "used_different_model": use_different_model
-        })
+            "new_prompt": params["new_prompt"],
+            "combined_prompt": params["combined_prompt"],
+            "type": params["type"],
+            "regeneration_count": regeneration_count,
+            "product_image_url": params["product_image_url"],
+            "used_different_model": params["use_different_model"],
+            "created_at": regenerated_data["created_at"],
+        }
+        if job_id:
+            _complete_single_image_job(job_id, image_info)
+        return {"success": True, **image_info}
 
+    except LeaseLost:
+        raise
     except Exception as e:
         traceback.print_exc()
-        report_handled_exception(e, request=request)
-        return Response({"success": False, "error": str(e)}, status=500)
+        report_handled_exception(e, context={"user_id": user_id, "path": "regenerate_product_model_image_background", "job_id": job_id})
+        if job_id:
+            _fail_single_image_job(job_id, get_user_friendly_message(e))
+            if not stored:
+                # Charged up front by regenerate_product_model_image
+                refund_job_credits(job_id, reason="Refund: regeneration failed")
+        return {"success": False, "error": get_user_friendly_message(e)}
+
+
+def _start_single_image_job(job_id, task, *args, user=None, collection=None, credit_charge=None):
+    """
+    Create a one-image ImageGenerationJob and enqueue its task in the
+    interactive priority lane. The task receives job_id as keyword argument.
+
+    credit_charge (organization_id, user_id, amount) records credits the
+    caller already deducted; they are refunded if enqueueing fails, the
+    job is cancelled before its task runs or the generation fails.
+
+    Returns:
+        Celery task id
+    """
+    from .job_models import ImageGenerationJob
+    from .job_progress import init_job_progress
+    from .job_cancellation import refund_job_credits
+    from .utils import enqueue_interactive_task
+
+    job = ImageGenerationJob(
+        job_id=job_id,
+        user=user,
+        project=collection.project if collection else None,
+        collection=collection,
+        total_images=1,
+        completed_images=0,
+        status="pending",
+        credit_charge=credit_charge or {},
+    )
+    job.save()
+    init_job_progress(job_id, 1, status="pending")
+
+    try:
+        result = enqueue_interactive_task(task, *args, job_id=job_id)
+    except Exception as e:
+        _fail_single_image_job(job_id, get_user_friendly_message(e))
+        refund_job_credits(job_id)
+        raise
+
+    # Lets api/jobs/<job_id>/cancel/ revoke the task before it starts
+    ImageGenerationJob.objects(job_id=job_id).update_one(
+        set__task_ids=[result.id],
+        set__task_queues={result.id: result.queue_name},
+    )
+    return result.id
+
+
+def _complete_single_image_job(job_id, image_info):
+    """Record the image of a single-image job and mark it completed."""
+    from datetime import datetime
+    from .job_models import ImageGenerationJob
+    from .job_progress import record_image_completed, record_job_status
+
+    try:
+        updated = ImageGenerationJob.objects(job_id=job_id, status__in=["pending", "running"]).update_one(
+            inc__completed_images=1,
+            push__images=image_info,
+            set__status="completed",
+            set__updated_at=datetime.utcnow(),
+        )
+        if not updated:
+            # Cancelled while the image was generated
+            return
+        record_image_completed(job_id, image_info)
+        record_job_status(job_id, "completed")
+    except Exception as job_error:
+        print(f"Error updating ImageGenerationJob {job_id}: {job_error}")
+
+
+def _fail_single_image_job(job_id, error):
+    """Mark a single-image job failed and announce it."""
+    from datetime import datetime
+    from .job_models import ImageGenerationJob
+    from .job_progress import record_image_failed, record_job_status
+
+    try:
+        updated = ImageGenerationJob.objects(job_id=job_id, status__in=["pending", "running"]).update_one(
+            set__status="failed",
+            set__error=error,
+            set__updated_at=datetime.utcnow(),
+        )
+        if updated:
+            record_image_failed(job_id, None, None, error)
+            record_job_status(job_id, "failed", error)
+    except Exception as job_error:
+        print(f"Error updating ImageGenerationJob {job_id}: {job_error}")
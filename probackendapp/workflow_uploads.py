@@ -0,0 +1,254 @@
+"""
+Background upload and analysis of workflow images (theme, background, pose,
+location, color).
+
+The upload request only writes each file to MEDIA_ROOT and $pushes an
+UploadedImage with status "pending" onto items[0].uploaded_<category>_images.
+process_workflow_images() then runs, in a Celery task, the Cloudinary
+upload and the Gemini analysis of every file concurrently, both from the
+local bytes (the analysis no longer downloads the image back from
+Cloudinary). Each result is written as soon as it arrives with a positional
+update addressed by image_id, so the UI can poll the images' status:
+
+  pending -> processing -> completed | failed
+
+Every status change stamps status_updated_at. An image left pending or
+processing for WORKFLOW_UPLOAD_STALE_SECONDS (its task was never delivered
+or died with its worker) is marked failed by settle_stale_uploads(), so it
+cannot block setup-select forever; a late result still overwrites it.
+
+Like image_results.py, writes never reload and save() the whole Collection,
+so the task cannot lose or clobber concurrent changes to the collection.
+"""
+
+import json
+import logging
+import mimetypes
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from django.conf import settings
+
+from .models import Collection
+
+logger = logging.getLogger(__name__)
+
+WORKFLOW_CATEGORIES = ('theme', 'background', 'pose', 'location', 'color')
+IN_PROGRESS_STATUSES = ('pending', 'processing')
+
+
+def _category_path(category: str) -> str:
+    return f"items.0.uploaded_{category}_images"
+
+
+def add_pending_uploads(collection_id, category: str, uploaded_images: list) -> bool:
+    """$push new UploadedImage entries without rewriting the collection."""
+    path = _category_path(category)
+    now = datetime.utcnow()
+    entries = [dict(img.to_mongo().to_dict(), status_updated_at=now) for img in uploaded_images]
+    result = Collection._get_collection().update_one(
+        {"_id": ObjectId(str(collection_id)), "items.0": {"$exists": True}},
+        {"$push": {path: {"$each": entries}}},
+    )
+    return result.modified_count > 0
+
+
+def update_uploaded_image(collection_id, category: str, image_id: str, fields: dict) -> bool:
+    """Set fields on one uploaded image, addressed by its image_id."""
+    path = _category_path(category)
+    if "status" in fields:
+        fields = dict(fields, status_updated_at=datetime.utcnow())
+    result = Collection._get_collection().update_one(
+        {"_id": ObjectId(str(collection_id)), f"{path}.image_id": image_id},
+        {"$set": {f"{path}.$.{key}": value for key, value in fields.items()}},
+    )
+    return result.matched_count > 0
+
+
+def get_uploaded_images(collection_id, category: str = None) -> list:
+    """Uploaded workflow images of a collection as dicts, for status polling."""
+    categories = [category] if category else WORKFLOW_CATEGORIES
+    doc = Collection._get_collection().find_one(
+        {"_id": ObjectId(str(collection_id))},
+        {f"items.uploaded_{c}_images": 1 for c in categories},
+    )
+    if not doc or not doc.get("items"):
+        return []
+    item = doc["items"][0]
+    images = []
+    for c in categories:
+        for img in item.get(f"uploaded_{c}_images", []):
+            images.append({
+                "image_id": img.get("image_id"),
+                "category": c,
+                "status": img.get("status", "completed"),
+                "cloud_url": img.get("cloud_url"),
+                "local_path": img.get("local_path"),
+                "original_filename": img.get("original_filename"),
+                "analysis": img.get("analysis", ""),
+                "error": img.get("error"),
+                "status_updated_at": img.get("status_updated_at"),
+            })
+    return images
+
+
+def settle_stale_uploads(collection_id) -> list:
+    """
+    Mark images stuck in pending/processing for WORKFLOW_UPLOAD_STALE_SECONDS
+    as failed. Images without status_updated_at (queued before it existed)
+    count as stale. An image whose status changed meanwhile is left alone.
+
+    Returns:
+        Categories that still have images in progress
+    """
+    stale_seconds = int(getattr(settings, "WORKFLOW_UPLOAD_STALE_SECONDS", 900))
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_seconds)
+    in_progress = set()
+    for image in get_uploaded_images(collection_id):
+        if image["status"] not in IN_PROGRESS_STATUSES:
+            continue
+        updated_at = image["status_updated_at"]
+        if updated_at is None or updated_at < cutoff:
+            path = _category_path(image["category"])
+            result = Collection._get_collection().update_one(
+                {"_id": ObjectId(str(collection_id)), path: {"$elemMatch": {
+                    "image_id": image["image_id"],
+                    "status": image["status"],
+                    "status_updated_at": updated_at,
+                }}},
+                {"$set": {
+                    f"{path}.$.status": "failed",
+                    f"{path}.$.error": "Processing timed out; please upload the image again",
+                    f"{path}.$.status_updated_at": datetime.utcnow(),
+                }},
+            )
+            if result.modified_count:
+                logger.warning(f"Workflow image {image['image_id']} was {image['status']} "
+                               f"since {updated_at}; marked failed")
+                continue
+        in_progress.add(image["category"])
+    return [category for category in WORKFLOW_CATEGORIES if category in in_progress]
+
+
+def analysis_fields(category: str, analysis_result) -> dict:
+    """
+    Turn an analyze_uploaded_image() result into UploadedImage fields.
+
+    Theme images store their analysis as JSON with type and description
+    (angle shot included in the description), plus the extracted
+    ornament_type, angle_shot and theme_description.
+    """
+    # Handle both old format (string) and new format (dict)
+    if isinstance(analysis_result, dict):
+        analysis_text = analysis_result.get("analysis", "")
+        ornament_type = analysis_result.get("ornament_type", "")
+        angle_shot = analysis_result.get("angle_shot", "")
+        theme_description = analysis_result.get("theme_description", analysis_text)
+    else:
+        # Legacy format (string)
+        analysis_text = analysis_result if analysis_result else ""
+        ornament_type = ""
+        angle_shot = ""
+        theme_description = analysis_text
+
+    if category != 'theme':
+        return {"analysis": analysis_text}
+
+    # extract_theme_analysis already returns the JSON; build it otherwise
+    if not (isinstance(analysis_result, dict) and analysis_text):
+        ornament_readable = ornament_type.replace('_', ' ').replace('-', ' ') if ornament_type else ""
+        angle_readable = angle_shot.replace('_', ' ').replace('-', ' ') if angle_shot else ""
+        description_with_angle = theme_description
+        if angle_readable and angle_readable.lower() not in theme_description.lower():
+            description_with_angle = f"{theme_description} The overall angle shot is {angle_readable}."
+        analysis_text = json.dumps({
+            "type": ornament_readable,
+            "description": description_with_angle,
+        })
+
+    return {
+        "analysis": analysis_text,
+        "ornament_type": ornament_type,
+        "angle_shot": angle_shot,
+        "theme_description": theme_description,
+    }
+
+
+def _upload(local_path: str, category: str) -> str:
+    import cloudinary.uploader
+
+    # Local files are named <timestamp>_<original name>
+    name = os.path.splitext(os.path.basename(local_path))[0]
+    upload_result = cloudinary.uploader.upload(
+        local_path,
+        folder=f"workflow_images/{category}",
+        public_id=f"{category}_{name}",
+        overwrite=True
+    )
+    return upload_result.get("secure_url")
+
+
+def _analyze(image_bytes: bytes, mime_type: str, category: str) -> dict:
+    from .api_views import analyze_uploaded_image
+
+    return analysis_fields(category, analyze_uploaded_image(
+        None, category, image_bytes=image_bytes, mime_type=mime_type))
+
+
+def process_workflow_images(collection_id, category: str, images: list) -> dict:
+    """
+    Upload and analyze pending workflow images concurrently.
+
+    Args:
+        collection_id: Collection the images belong to
+        category: Workflow category of all the images
+        images: Dicts with image_id and local_path
+
+    Returns:
+        Dict with the number of completed and failed images
+    """
+    max_workers = max(1, int(getattr(settings, "WORKFLOW_UPLOAD_MAX_WORKERS", 8)))
+    remaining = {}
+    failed = set()
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, 2 * len(images) or 1)) as executor:
+        futures = {}
+        for image in images:
+            image_id = image["image_id"]
+            local_path = image["local_path"]
+            try:
+                with open(local_path, "rb") as f:
+                    image_bytes = f.read()
+            except OSError as e:
+                update_uploaded_image(collection_id, category, image_id,
+                                      {"status": "failed", "error": str(e)})
+                failed.add(image_id)
+                continue
+
+            mime_type = mimetypes.guess_type(local_path)[0] or "image/jpeg"
+            update_uploaded_image(collection_id, category, image_id, {"status": "processing"})
+            futures[executor.submit(_upload, local_path, category)] = (image_id, "upload")
+            futures[executor.submit(_analyze, image_bytes, mime_type, category)] = (image_id, "analysis")
+            remaining[image_id] = 2
+
+        for future in as_completed(futures):
+            image_id, step = futures[future]
+            remaining[image_id] -= 1
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.warning(f"Workflow image {image_id} {step} failed: {e}")
+                failed.add(image_id)
+                update_uploaded_image(collection_id, category, image_id,
+                                      {"status": "failed", "error": f"{step} failed: {e}"})
+                continue
+
+            fields = {"cloud_url": result} if step == "upload" else dict(result)
+            if not remaining[image_id] and image_id not in failed:
+                fields["status"] = "completed"
+            update_uploaded_image(collection_id, category, image_id, fields)
+
+    return {"completed": len(remaining) - len(failed & set(remaining)),
+            "failed": len(failed)}